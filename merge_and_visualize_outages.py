@@ -12,6 +12,13 @@ This script:
    - Call distribution by hour of day
    - Call duration analysis
 
+Nothing here reads the transcript text, so call_transcripts_db.csv is
+loaded without it (see transcript_factory/transcript_table.py) and each
+transcript is copied from it into merged_call_data.csv as that is written.
+Compressed transcripts (a transcript_zst column, see
+transcript_factory/transcript_codec.py) are copied the same way, and the
+dictionary is copied next to merged_call_data.csv.
+
 Usage:
     python merge_and_visualize_outages.py
 """
@@ -21,6 +28,9 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from datetime import datetime
 
+from transcript_factory.transcript_codec import COMPRESSED_COLUMN, copy_dictionary
+from transcript_factory.transcript_table import read_metadata, write_with_bodies
+
 # File paths
 CALL_DATA_FILE = "data/call_data.csv"
 CALL_TRANSCRIPTS_FILE = "data/call_transcripts_db.csv"
@@ -47,9 +57,12 @@ def load_and_merge_data():
     if not os.path.exists(CALL_TRANSCRIPTS_FILE):
         raise FileNotFoundError(f"File not found: {CALL_TRANSCRIPTS_FILE}")
     
-    call_transcripts = pd.read_csv(CALL_TRANSCRIPTS_FILE)
+    # The transcript column holds call_id references, filled in when saving
+    call_transcripts = read_metadata(CALL_TRANSCRIPTS_FILE)
     print(f"  Loaded {len(call_transcripts)} records")
     print(f"  Columns: {list(call_transcripts.columns)}")
+    if COMPRESSED_COLUMN in call_transcripts.columns:
+        print(f"  Transcripts are compressed; keeping them compressed in the merged data")
     
     # Merge on call_id
     print(f"\nMerging datasets on 'call_id'...")
@@ -71,7 +84,8 @@ def load_and_merge_data():
     
     # Save merged data
     print(f"\nSaving merged data to {OUTPUT_MERGED_FILE}...")
-    merged.to_csv(OUTPUT_MERGED_FILE, index=False)
+    write_with_bodies(merged, CALL_TRANSCRIPTS_FILE, OUTPUT_MERGED_FILE)
+    copy_dictionary(CALL_TRANSCRIPTS_FILE, OUTPUT_MERGED_FILE)
     print(f"  Saved successfully!")
     
     return merged
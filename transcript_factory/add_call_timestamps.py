@@ -28,6 +28,11 @@ Logic overview
 
 This script does not modify the original CSV; it writes a new file
 with an extra 'call_datetime' column (string, ISO-like format).
+The transcripts themselves are never loaded into pandas: the calls are
+read without them (see transcript_table.py) and each one is copied from
+the input CSV as its row is written. Compressed transcripts (a
+transcript_zst column) are copied through the same way, along with
+their .zdict dictionary.
 """
 
 import random
@@ -37,6 +42,9 @@ from typing import Dict, List, Optional
 
 import pandas as pd
 
+from transcript_codec import copy_dictionary
+from transcript_table import body_column, read_metadata, write_with_bodies
+
 
 # ---------------------------------------------------------------------------
 # Outage configuration (mirrors data_requirements)
@@ -184,16 +192,18 @@ def assign_outage_timestamps(
     non_technical_indices: List[int] = []
     event_to_indices: Dict[int, List[int]] = {}
 
-    for idx, row in df.iterrows():
-        if pd.isna(row.get("zip")):
+    # Plain column lists: a Series per row (iterrows) costs more than the lookups
+    zips = df["zip"].tolist() if "zip" in df.columns else [None] * len(df)
+    for idx, zip_value, is_technical in zip(df.index, zips, technical_mask.tolist()):
+        if pd.isna(zip_value):
             # No ZIP: treat as non-outage
             non_technical_indices.append(idx)
             continue
 
-        zip_norm = _normalize_zip(row["zip"])
+        zip_norm = _normalize_zip(zip_value)
         event = zip_to_event.get(zip_norm)
 
-        if technical_mask.iloc[idx] and event is not None:
+        if is_technical and event is not None:
             event_to_indices.setdefault(event.event_id, []).append(idx)
         else:
             non_technical_indices.append(idx)
@@ -228,17 +238,22 @@ def assign_outage_timestamps(
     return pd.Series(ts_strings, index=df.index, name="call_datetime")
 
 
-def main():
+def add_call_timestamps(
+    customers_file: str,
+    transcripts_file: str,
+    output_file: str,
+    seed: int = 42,
+) -> None:
+    """
+    Write a copy of the transcripts-with-customers CSV with zip, city,
+    outage_event_id and call_datetime columns added.
+    """
     print("=" * 70)
     print("ADD DATETIME STAMPS TO CALL TRANSCRIPTS (WITH CUSTOMERS)")
     print("=" * 70)
 
     # Make randomness reproducible
-    random.seed(42)
-
-    customers_file = "../data/customers.csv"
-    transcripts_file = "call_transcripts_with_customers.csv"
-    output_file = "call_transcripts_with_customers_with_times.csv"
+    random.seed(seed)
 
     print(f"Loading customers from: {customers_file}")
     customers_df = pd.read_csv(customers_file)
@@ -252,9 +267,11 @@ def main():
         )
 
     print(f"Loading transcripts-with-customers from: {transcripts_file}")
-    calls_df = pd.read_csv(transcripts_file)
-
-    required_call_cols = {"call_id", "customer_id", "call_reason", "transcript"}
+    # The transcript column holds call_id references; write_with_bodies fills
+    # in the text (plain or compressed) from transcripts_file
+    calls_df = read_metadata(transcripts_file)
+    text_col = body_column(calls_df.columns) or "transcript"
+    required_call_cols = {"call_id", "customer_id", "call_reason", text_col}
     if not required_call_cols.issubset(calls_df.columns):
         raise ValueError(
             f"call_transcripts_with_customers.csv missing required columns. "
@@ -278,11 +295,11 @@ def main():
     # Assign event IDs (optional, handy for debugging/analysis)
     print("Assigning outage events by ZIP...")
     event_ids: List[Optional[int]] = []
-    for _, row in calls_with_zip.iterrows():
-        if pd.isna(row.get("zip")):
+    for zip_value in calls_with_zip["zip"].tolist():
+        if pd.isna(zip_value):
             event_ids.append(None)
             continue
-        zip_norm = _normalize_zip(row["zip"])
+        zip_norm = _normalize_zip(zip_value)
         event = ZIP_TO_EVENT.get(zip_norm)
         event_ids.append(event.event_id if event is not None else None)
     calls_with_zip["outage_event_id"] = event_ids
@@ -294,22 +311,37 @@ def main():
     )
 
     # Reorder columns: keep original first, then zip/city, event, datetime
-    base_cols = ["call_id", "customer_id", "call_reason", "transcript"]
+    base_cols = ["call_id", "customer_id", "call_reason", text_col]
     extra_cols = ["zip", "city", "outage_event_id", "call_datetime"]
     ordered_cols = [c for c in base_cols + extra_cols if c in calls_with_zip.columns]
     calls_with_zip = calls_with_zip[ordered_cols]
 
     print(f"\nSaving updated calls with datetime to: {output_file}")
-    calls_with_zip.to_csv(output_file, index=False)
+    write_with_bodies(calls_with_zip, transcripts_file, output_file)
+    copy_dictionary(transcripts_file, output_file)
     print(f"✓ Saved {len(calls_with_zip)} rows.")
 
     print("\nSample of updated data:")
-    print(calls_with_zip.head(5))
+    print(calls_with_zip.drop(columns=text_col, errors="ignore").head(5))
 
     print("\nDone.")
     print("=" * 70)
 
 
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Add outage-aware call timestamps")
+    parser.add_argument("--customers", default="../data/customers.csv", help="customers.csv path")
+    parser.add_argument("--transcripts", default="call_transcripts_with_customers.csv",
+                        help="Input transcripts-with-customers CSV")
+    parser.add_argument("--output", default="call_transcripts_with_customers_with_times.csv",
+                        help="Output CSV")
+    args = parser.parse_args()
+
+    add_call_timestamps(args.customers, args.transcripts, args.output)
+
+
 if __name__ == "__main__":
     main()
 
@@ -8,6 +8,12 @@ This script:
 3. Assigns customer IDs to transcripts to simulate outage-related call patterns
 4. Writes updated call_transcripts.csv with customer_id column
 
+Only the call metadata is loaded (see transcript_table.py); the
+transcripts are copied from the input CSV into the output as it is
+written. A compressed call_transcripts.csv (transcript_zst column, see
+transcript_codec.py) is passed through the same way, and its dictionary
+is copied next to the output.
+
 Outage Events:
 - Event 1: TX Dallas (75201, 75234, 75219, 75232) - 219 customers
 - Event 2: CT Bridgeport (06673, 06604) - 126 customers  
@@ -21,6 +27,9 @@ import pandas as pd
 import random
 from collections import defaultdict
 
+from transcript_codec import copy_dictionary
+from transcript_table import body_column, read_metadata, write_with_bodies
+
 # Define outage events
 OUTAGE_EVENTS = [
     {
@@ -104,16 +113,25 @@ def load_customers_by_zip(customers_file):
     
     return customers_by_zip
 
+def transcript_column(transcripts_df):
+    """The column holding transcripts: transcript, or transcript_zst when compressed."""
+    return body_column(transcripts_df.columns) or 'transcript'
+
 def load_transcripts(transcripts_file):
-    """Load call transcripts."""
+    """
+    Load call transcripts, without the transcript text.
+    
+    The transcript column holds each row's call_id; save_updated_transcripts
+    copies the text itself from transcripts_file.
+    """
     print(f"\nLoading transcripts from {transcripts_file}...")
     
     try:
-        transcripts_df = pd.read_csv(transcripts_file)
+        transcripts_df = read_metadata(transcripts_file)
         print(f"✓ Loaded {len(transcripts_df)} transcripts")
         
-        # Verify required columns
-        required_columns = ['call_id', 'call_reason', 'transcript']
+        # Verify required columns (transcripts may be plain or compressed)
+        required_columns = ['call_id', 'call_reason', transcript_column(transcripts_df)]
         if not all(col in transcripts_df.columns for col in required_columns):
             print(f"ERROR: CSV columns found: {list(transcripts_df.columns)}")
             print(f"ERROR: Required columns: {required_columns}")
@@ -161,6 +179,7 @@ def assign_customer_ids(transcripts_df, customers_by_zip, outage_events):
     print(f"\nTotal customers available: {len(all_customers)}")
     
     # Track which technical transcripts have been assigned
+    technical_call_ids = technical_transcripts['call_id'].tolist()
     technical_idx = 0
     assigned_technical = []
     
@@ -207,7 +226,7 @@ def assign_customer_ids(transcripts_df, customers_by_zip, outage_events):
             customer_id = random.choice(affected_customers)
             
             assigned_technical.append({
-                'call_id': technical_transcripts.iloc[technical_idx]['call_id'],
+                'call_id': technical_call_ids[technical_idx],
                 'customer_id': customer_id,
                 'event_id': event_id
             })
@@ -225,7 +244,7 @@ def assign_customer_ids(transcripts_df, customers_by_zip, outage_events):
     for i in range(remaining_technical):
         customer_id = random.choice(all_customers)
         assigned_technical.append({
-            'call_id': technical_transcripts.iloc[technical_idx]['call_id'],
+            'call_id': technical_call_ids[technical_idx],
             'customer_id': customer_id,
             'event_id': None  # Not outage-related
         })
@@ -238,12 +257,12 @@ def assign_customer_ids(transcripts_df, customers_by_zip, outage_events):
     
     # Assign billing and account management calls to random customers
     print(f"\nAssigning {len(billing_transcripts)} billing inquiry calls...")
-    for _, row in billing_transcripts.iterrows():
-        customer_mapping[row['call_id']] = random.choice(all_customers)
+    for call_id in billing_transcripts['call_id'].tolist():
+        customer_mapping[call_id] = random.choice(all_customers)
     
     print(f"Assigning {len(account_transcripts)} account management calls...")
-    for _, row in account_transcripts.iterrows():
-        customer_mapping[row['call_id']] = random.choice(all_customers)
+    for call_id in account_transcripts['call_id'].tolist():
+        customer_mapping[call_id] = random.choice(all_customers)
     
     print(f"\nTotal customer assignments: {len(customer_mapping)}")
     
@@ -260,49 +279,74 @@ def assign_customer_ids(transcripts_df, customers_by_zip, outage_events):
     
     return transcripts_df
 
-def save_updated_transcripts(transcripts_df, output_file):
-    """Save updated transcripts with customer_id column."""
+def save_updated_transcripts(transcripts_df, output_file, transcripts_file):
+    """
+    Save updated transcripts with customer_id column.
+    
+    Args:
+        transcripts_df: Transcripts from load_transcripts, with customer_id added
+        output_file: Where to write them
+        transcripts_file: The CSV they were loaded from, to copy the text from
+    """
     print(f"\nSaving updated transcripts to {output_file}...")
     
     # Reorder columns to put customer_id after call_id
-    columns = ['call_id', 'customer_id', 'call_reason', 'transcript']
+    columns = ['call_id', 'customer_id', 'call_reason', transcript_column(transcripts_df)]
     transcripts_df = transcripts_df[columns]
     
-    transcripts_df.to_csv(output_file, index=False)
+    write_with_bodies(transcripts_df, transcripts_file, output_file)
     print(f"✓ Saved {len(transcripts_df)} transcripts with customer IDs")
     
     # Print sample
     print("\nSample of updated data:")
     print(transcripts_df[['call_id', 'customer_id', 'call_reason']].head(10))
 
-def main():
-    """Main execution function."""
+def add_customer_ids(customers_file, transcripts_file, output_file, outage_events=OUTAGE_EVENTS, seed=42):
+    """
+    Add a customer_id column to a transcripts CSV.
+    
+    Args:
+        customers_file: customers.csv (customer_id, customer_name, zip, city)
+        transcripts_file: Transcripts CSV (call_id, call_reason, transcript)
+        output_file: Where to write the transcripts with customer IDs
+        outage_events: Outage events that drive the technical_support calls
+        seed: Random seed, so reruns assign the same customers
+    """
     print("="*70)
     print("ADD CUSTOMER IDs TO CALL TRANSCRIPTS")
     print("="*70)
     
     # Set random seed for reproducibility
-    random.seed(42)
-    
-    # File paths
-    customers_file = '../data/customers.csv'
-    transcripts_file = 'call_transcripts.csv'
-    output_file = 'call_transcripts_with_customers.csv'
+    random.seed(seed)
     
     # Load data
     customers_by_zip = load_customers_by_zip(customers_file)
     transcripts_df = load_transcripts(transcripts_file)
     
     # Assign customer IDs
-    updated_transcripts_df = assign_customer_ids(transcripts_df, customers_by_zip, OUTAGE_EVENTS)
+    updated_transcripts_df = assign_customer_ids(transcripts_df, customers_by_zip, outage_events)
     
     # Save updated transcripts
-    save_updated_transcripts(updated_transcripts_df, output_file)
+    save_updated_transcripts(updated_transcripts_df, output_file, transcripts_file)
+    copy_dictionary(transcripts_file, output_file)
     
     print("\n" + "="*70)
     print("COMPLETE!")
     print("="*70)
     print(f"\nUpdated transcripts saved to: {output_file}")
+
+def main():
+    """Main execution function."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Add customer IDs to call transcripts")
+    parser.add_argument("--customers", default="../data/customers.csv", help="customers.csv path")
+    parser.add_argument("--transcripts", default="call_transcripts.csv", help="Input transcripts CSV")
+    parser.add_argument("--output", default="call_transcripts_with_customers.csv", help="Output CSV")
+    args = parser.parse_args()
+    
+    add_customer_ids(args.customers, args.transcripts, args.output)
+    
     print("\nNext steps:")
     print("1. Review the output file to verify customer assignments")
     print("2. Use this file to add datetime stamps for outage events")
@@ -310,4 +354,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,254 @@
+"""
+Message Batches Backend
+=======================
+Generates transcripts through the Anthropic Message Batches API instead of
+one interactive request per transcript.
+
+Requests are packed into batch submissions, the batches are polled until
+they finish, and the results are streamed straight into the category
+folders as they are read back. Batches are cheaper per token and are not
+bound by the interactive requests-per-minute limit, which makes them the
+better choice for runs of tens of thousands of transcripts that do not
+need to finish in minutes.
+
+Used through ParallelTranscriptFactory(backend="batch"), which keeps the
+same generate_batch() and generate_to_disk() interfaces as the interactive
+backend; generate_bulk_transcripts_parallel.py --backend batch runs a bulk
+job this way.
+"""
+
+import asyncio
+import itertools
+from typing import Awaitable, Callable, Iterable, List, Tuple
+
+from job_journal import FAILED, IN_FLIGHT
+
+
+class BatchTranscriptBackend:
+    """Submit, poll and collect transcript generation through message batches."""
+
+    # Anthropic accepts up to 100,000 requests per batch; smaller batches
+    # finish sooner and let results start streaming back earlier
+    DEFAULT_MAX_REQUESTS_PER_BATCH = 10_000
+
+    # Batches generate_to_disk keeps submitted at once; the next batch's
+    # jobs are only pulled (and, with leases, claimed) when one finishes
+    DEFAULT_MAX_PENDING_BATCHES = 4
+
+    def __init__(self, factory, poll_interval: float = 30.0, max_requests_per_batch: int = None,
+                 max_pending_batches: int = None):
+        """
+        Args:
+            factory: ParallelTranscriptFactory providing the client, prompts and saving
+            poll_interval: Seconds between batch status checks
+            max_requests_per_batch: Requests packed into each batch submission
+            max_pending_batches: Batches generate_to_disk has submitted at once
+        """
+        self.factory = factory
+        self.poll_interval = poll_interval
+        self.max_requests_per_batch = max_requests_per_batch or self.DEFAULT_MAX_REQUESTS_PER_BATCH
+        self.max_pending_batches = max_pending_batches or self.DEFAULT_MAX_PENDING_BATCHES
+
+    @staticmethod
+    def custom_id(category: str, index: int) -> str:
+        """Request id that round-trips the category and index through the batch."""
+        return f"{category}-{index:06d}"
+
+    @staticmethod
+    def parse_custom_id(custom_id: str) -> Tuple[str, int]:
+        """Inverse of custom_id()."""
+        category, _, index = custom_id.rpartition("-")
+        return category, int(index)
+
+    def _build_request(self, category: str, index: int, model: str, max_tokens: int, temperature: float) -> dict:
+        """One batch entry: the same message parameters as an interactive call."""
+        return {
+            "custom_id": self.custom_id(category, index),
+            "params": {
+                "model": model,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "messages": self.factory._build_messages(category)
+            }
+        }
+
+    async def _wait_for_batch(self, batch_id: str):
+        """Poll a batch until it has finished processing."""
+        client = self.factory.client
+        while True:
+            batch = await client.messages.batches.retrieve(batch_id)
+            if batch.processing_status == "ended":
+                return batch
+
+            counts = batch.request_counts
+            print(f"⏳ Batch {batch_id}: {counts.succeeded} succeeded, {counts.errored} errored, "
+                  f"{counts.processing} processing", flush=True)
+            await asyncio.sleep(self.poll_interval)
+
+    async def _run_batch(
+        self,
+        requests: List[dict],
+        save: Callable[[str, str, int], Awaitable[None]],
+        journal=None
+    ) -> int:
+        """
+        Submit one batch, wait for it, and hand each result to `save` as it is read back.
+
+        Requests that error, or that never come back because the batch
+        itself failed, are counted as errors (and journaled as failed).
+
+        Args:
+            requests: Batch entries from _build_request()
+            save: Coroutine function called with (category, transcript, index)
+            journal: Optional JobJournal; jobs are recorded in flight once
+                submitted and failed if their request errors
+
+        Returns:
+            Number of transcripts handed to `save`
+        """
+        client = self.factory.client
+        stats = self.factory.stats
+        unresolved = {request["custom_id"] for request in requests}
+        saved = 0
+
+        try:
+            batch = await client.messages.batches.create(requests=requests)
+            print(f"📦 Submitted batch {batch.id} with {len(requests)} requests", flush=True)
+            if journal:
+                for request in requests:
+                    journal.record(*self.parse_custom_id(request["custom_id"]), IN_FLIGHT)
+
+            await self._wait_for_batch(batch.id)
+
+            async for entry in await client.messages.batches.results(batch.id):
+                unresolved.discard(entry.custom_id)
+                category, index = self.parse_custom_id(entry.custom_id)
+                result = entry.result
+
+                if result.type != "succeeded":
+                    error = getattr(result, "error", None)
+                    print(f"\n⚠️  Batch request {entry.custom_id} {result.type}: {error}")
+                    stats["errors"] += 1
+                    if journal:
+                        journal.record(category, index, FAILED, error=f"{result.type}: {error}")
+                    continue
+
+                transcript = result.message.content[0].text
+                await save(category, transcript, index)
+
+                stats["total_generated"] += 1
+                stats["by_category"][category] += 1
+                saved += 1
+            error = "missing from the batch results"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+        if unresolved:
+            print(f"\n⚠️  {len(unresolved)} of {len(requests)} batch requests failed: {error}")
+            stats["errors"] += len(unresolved)
+            if journal:
+                for custom_id in sorted(unresolved):
+                    journal.record(*self.parse_custom_id(custom_id), FAILED, error=error)
+        else:
+            print(f"✅ Batch {batch.id} complete: {saved}/{len(requests)} transcripts saved", flush=True)
+        return saved
+
+    async def generate_batch(
+        self,
+        category: str,
+        count: int,
+        start_index: int = 1,
+        model: str = "claude-haiku-4-5-20251001",
+        max_tokens: int = 20000,
+        temperature: float = 1
+    ) -> List[Tuple[str, str, int]]:
+        """
+        Generate `count` transcripts for a category through message batches.
+
+        Results are saved to the category folder as they are streamed back,
+        and also returned, matching the interactive generate_batch().
+
+        Args:
+            category: Call category
+            count: Number of transcripts to generate
+            start_index: Starting index for numbering
+            model: Anthropic model to use
+            max_tokens: Maximum tokens in each response
+            temperature: Temperature for generation
+
+        Returns:
+            List of (category, transcript, index) tuples
+        """
+        requests = [
+            self._build_request(category, index, model, max_tokens, temperature)
+            for index in range(start_index, start_index + count)
+        ]
+
+        chunks = [
+            requests[i:i + self.max_requests_per_batch]
+            for i in range(0, len(requests), self.max_requests_per_batch)
+        ]
+
+        results = []
+
+        async def save(category, transcript, index):
+            await asyncio.to_thread(self.factory.save_transcript, category, transcript, index)
+            results.append((category, transcript, index))
+
+        await asyncio.gather(*(self._run_batch(chunk, save) for chunk in chunks))
+        return sorted(results, key=lambda result: result[2])
+
+    async def generate_to_disk(
+        self,
+        jobs: Iterable[Tuple[str, int]],
+        writer,
+        journal=None,
+        model: str = "claude-haiku-4-5-20251001",
+        max_tokens: int = 20000,
+        temperature: float = 1
+    ) -> int:
+        """
+        Generate (category, index) jobs through message batches, streaming
+        each result to the writer as it is read back.
+
+        The jobs are packed into batches of max_requests_per_batch, with up
+        to max_pending_batches submitted at once. The next batch's jobs are
+        pulled from the iterator only when a submitted batch finishes, so a
+        lazy job source such as shard_lease.sharded_jobs claims its lease
+        blocks one batch at a time instead of all at the start. Results go
+        to the writer's bounded queue as they are read back, so only the
+        pending batch entries, not the transcripts, are held in memory.
+
+        Args:
+            jobs: Iterable of (category, index) pairs to generate
+            writer: Started AsyncTranscriptWriter that persists the results
+            journal: Optional JobJournal to record in-flight and failed jobs
+                (the writer's on_saved callback should record "done")
+            model: Anthropic model to use
+            max_tokens: Maximum tokens in each response
+            temperature: Temperature for generation
+
+        Returns:
+            Number of transcripts handed to the writer
+        """
+        jobs = iter(jobs)
+        pending = set()
+        saved = 0
+        try:
+            while True:
+                chunk = [
+                    self._build_request(category, index, model, max_tokens, temperature)
+                    for category, index in itertools.islice(jobs, self.max_requests_per_batch)
+                ]
+                if chunk:
+                    pending.add(asyncio.create_task(self._run_batch(chunk, writer.put, journal=journal)))
+                if not pending:
+                    return saved
+                if chunk and len(pending) < self.max_pending_batches:
+                    continue
+                # Wait for a free slot (or, once the jobs run out, for the rest)
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                saved += sum(task.result() for task in done)
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,224 @@
+"""
+Offline Generation Benchmark
+============================
+Measures the throughput of ParallelTranscriptFactory against the in-process
+SimulatedAnthropicClient, so concurrency can be tuned and regressions caught
+without network access or API credits.
+
+For each max_concurrent value in the sweep, the benchmark runs the real
+production path (generate_to_disk + AsyncTranscriptWriter, saving into a
+temporary folder) and reports:
+- transcripts/second
+- p50/p95/p99 latency from dispatch until the file is on disk
+- event-loop lag (how late a 10 ms timer fires while the run is going)
+- the concurrency limit the adaptive limiter settled on (the sweep value is
+  its ceiling; pass --fixed-concurrency to pin it instead)
+
+Usage:
+    python benchmark_generation.py
+    python benchmark_generation.py --concurrency 10,50,100,200 --requests 2000
+    python benchmark_generation.py --latency exponential --latency-median 2 --decode-tps 150
+    python benchmark_generation.py --stream --decode-tps 150
+    python benchmark_generation.py --json results.json
+    python benchmark_generation.py --baseline results.json --tolerance 0.1
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from generate_bulk_transcripts_parallel import ParallelTranscriptFactory, interleave_jobs
+from simulated_client import LatencyModel, SimulatedAnthropicClient
+from transcript_writer import AsyncTranscriptWriter
+
+# Effectively unlimited budgets: the benchmark measures the engine, not quotas
+UNLIMITED_RPM = 10_000_000
+UNLIMITED_TPM = 10_000_000_000
+
+LAG_PROBE_INTERVAL = 0.01
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+async def _monitor_loop_lag(samples: List[float], stop: asyncio.Event):
+    """Record how late a fixed-interval timer fires."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + LAG_PROBE_INTERVAL
+        await asyncio.sleep(LAG_PROBE_INTERVAL)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def run_once(args, max_concurrent: int) -> Dict[str, float]:
+    """Generate args.requests transcripts at one concurrency level."""
+    client = SimulatedAnthropicClient(
+        latency=LatencyModel(args.latency, median=args.latency_median, sigma=args.latency_sigma),
+        output_tokens_mean=args.output_tokens,
+        output_tokens_sd=args.output_tokens_sd,
+        decode_tokens_per_second=args.decode_tps,
+        seed=args.seed
+    )
+    factory = ParallelTranscriptFactory(
+        client=client,
+        max_concurrent=max_concurrent,
+        adaptive_concurrency=not args.fixed_concurrency,
+        streaming=args.stream,
+        requests_per_minute=UNLIMITED_RPM,
+        input_tokens_per_minute=UNLIMITED_TPM
+    )
+    output_dir = Path(tempfile.mkdtemp(prefix="bench_"))
+    factory.base_dir = output_dir
+
+    dispatched = {}
+    latencies = []
+
+    def timed_jobs():
+        for job in interleave_jobs({"technical_support": args.requests}, {"technical_support": 1}):
+            dispatched[job] = time.perf_counter()
+            yield job
+
+    def on_saved(category, index):
+        latencies.append(time.perf_counter() - dispatched.pop((category, index)))
+
+    lag_samples: List[float] = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(_monitor_loop_lag(lag_samples, stop))
+
+    start = time.perf_counter()
+    try:
+        # The factory logs a few requests per hundred; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            async with AsyncTranscriptWriter(
+                factory.save_transcript,
+                max_queue_size=max_concurrent * 2,
+                on_saved=on_saved
+            ) as writer:
+                await factory.generate_to_disk(timed_jobs(), writer)
+        elapsed = time.perf_counter() - start
+    finally:
+        stop.set()
+        await lag_task
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    latencies.sort()
+    lag_samples.sort()
+    return {
+        "max_concurrent": max_concurrent,
+        "completed": len(latencies),
+        "errors": factory.stats["errors"],
+        "seconds": elapsed,
+        "transcripts_per_second": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "loop_lag_p50_ms": percentile(lag_samples, 50) * 1000,
+        "loop_lag_p99_ms": percentile(lag_samples, 99) * 1000,
+        "loop_lag_max_ms": (lag_samples[-1] if lag_samples else 0.0) * 1000,
+        "peak_in_flight": client.peak_in_flight,
+        "final_limit": factory.concurrency.current_limit
+    }
+
+
+def print_table(results: List[Dict[str, float]]):
+    print(f"\n{'conc':>6} {'limit':>6} {'done':>6} {'err':>4} {'tx/s':>8} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} "
+          f"{'lag p50':>8} {'lag p99':>8} {'lag max':>8}")
+    print("-" * 89)
+    for r in results:
+        print(f"{r['max_concurrent']:>6} {r['final_limit']:>6} {r['completed']:>6} {r['errors']:>4} "
+              f"{r['transcripts_per_second']:>8.1f} {r['latency_p50']:>7.3f} {r['latency_p95']:>7.3f} "
+              f"{r['latency_p99']:>7.3f} {r['loop_lag_p50_ms']:>6.1f}ms {r['loop_lag_p99_ms']:>6.1f}ms "
+              f"{r['loop_lag_max_ms']:>6.1f}ms")
+
+
+def check_baseline(results: List[Dict[str, float]], baseline_path: str, tolerance: float) -> bool:
+    """Compare throughput against a saved run; False if any level regressed."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["max_concurrent"]: r for r in json.load(f)["results"]}
+
+    ok = True
+    print(f"\nComparing against baseline {baseline_path} (tolerance {tolerance:.0%}):")
+    for r in results:
+        base = baseline.get(r["max_concurrent"])
+        if base is None:
+            continue
+        floor = base["transcripts_per_second"] * (1 - tolerance)
+        status = "✓" if r["transcripts_per_second"] >= floor else "✗ REGRESSION"
+        ok = ok and r["transcripts_per_second"] >= floor
+        print(f"  {status} conc={r['max_concurrent']}: {r['transcripts_per_second']:.1f} tx/s "
+              f"(baseline {base['transcripts_per_second']:.1f})")
+    return ok
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark transcript generation against a simulated API")
+    parser.add_argument("--concurrency", default="10,25,50,100",
+                       help="Comma-separated max_concurrent values to sweep")
+    parser.add_argument("--requests", type=int, default=500,
+                       help="Transcripts to generate per concurrency level")
+    parser.add_argument("--latency", choices=LatencyModel.DISTRIBUTIONS, default="lognormal",
+                       help="Base latency distribution")
+    parser.add_argument("--latency-median", type=float, default=0.5,
+                       help="Median base latency in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5,
+                       help="Latency spread (lognormal sigma / uniform fraction)")
+    parser.add_argument("--output-tokens", type=int, default=1500,
+                       help="Mean transcript length in tokens")
+    parser.add_argument("--output-tokens-sd", type=int, default=400,
+                       help="Standard deviation of transcript length")
+    parser.add_argument("--decode-tps", type=float, default=0.0,
+                       help="Simulated decode speed (tokens/s) added to latency; 0 disables")
+    parser.add_argument("--stream", action="store_true",
+                       help="Use the streaming request path")
+    parser.add_argument("--fixed-concurrency", action="store_true",
+                       help="Pin concurrency at each sweep value instead of adapting up to it")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Fail if throughput regresses versus this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                       help="Allowed throughput drop versus the baseline (fraction)")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    print("=" * 82)
+    print("OFFLINE GENERATION BENCHMARK")
+    print("=" * 82)
+    print(f"\nRequests per level: {args.requests}")
+    print(f"Latency: {args.latency} (median {args.latency_median}s, sigma {args.latency_sigma})")
+    print(f"Output: {args.output_tokens} ± {args.output_tokens_sd} tokens"
+          + (f", decode {args.decode_tps:.0f} tokens/s" if args.decode_tps else ""))
+
+    results = []
+    for level in levels:
+        print(f"\n▶ max_concurrent={level} ...", flush=True)
+        results.append(asyncio.run(run_once(args, level)))
+
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
+
+    if args.baseline and not check_baseline(results, args.baseline, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,872 @@
+"""
+BM25 Transcript Search
+======================
+An inverted index over the transcripts CSV, for finding calls by what was
+said without scanning every transcript:
+
+    index = BM25Index("call_transcripts.bm25")
+    index.update("call_transcripts.csv")          # index new and changed calls
+    index.search("router reboot failing", k=10)   # [(call_id, score), ...]
+    index.search('"reboot the router" modem', call_reason="technical_support")
+
+Calls are ranked by Okapi BM25 over the query words. A quoted phrase only
+matches calls where its words appear next to each other, in order.
+Words are runs of letters and digits, lowercased ("don't" is "don" "t").
+
+Layout of the index directory (call_transcripts.bm25/ next to the CSV):
+- seg_000001.bm25, ...: immutable segments, each covering a batch of
+  calls. A segment holds its sorted term dictionary, the postings of every
+  term (document gaps, then term frequencies) and the positions of every
+  posting (gaps within the call), all as LEB128 varints, plus each call's
+  call_id, length in words, content digest and call_reason. Queries read
+  segments through mmap and decode only the terms they ask for.
+- manifest.json: the live segments and which of their calls are deleted.
+  It is replaced atomically, after the segments it names are written;
+  files it doesn't name are leftovers of an interrupted update and are
+  removed by the next one.
+
+Updates are incremental. Every call's digest is compared with the one
+indexed, and only new and changed calls are tokenized, into new segments.
+A changed or removed call is marked deleted in its old segment. Once
+there are more than MAX_SEGMENTS segments, or a segment is mostly
+deleted, segments are merged postings-to-postings without re-reading any
+transcript.
+
+Document frequencies and the average call length count deleted calls
+until their segment is merged, as in Lucene; scores drift slightly
+between merges but rankings are unaffected in practice.
+
+Usage:
+    python bm25_index.py build                        # index call_transcripts.csv
+    python bm25_index.py search "router reboot failing" -k 10
+    python bm25_index.py search '"reboot the router"' --call-reason technical_support --show
+    python bm25_index.py stats
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import re
+import struct
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from transcript_codec import get_transcripts, iter_calls
+
+MANIFEST_FILENAME = "manifest.json"
+SEGMENT_PATTERN = "seg_{:06d}.bm25"
+SEGMENT_GLOB = "seg_*.bm25"
+INDEX_SUFFIX = ".bm25"
+
+# Calls per segment when building; bounds the memory a build needs
+# (roughly 40 bytes per word of the batch)
+DOCS_PER_SEGMENT = 20_000
+# More segments than this and the smallest are merged
+MAX_SEGMENTS = 16
+# A segment with more of its calls deleted than this is rewritten
+MAX_DELETED_FRACTION = 0.3
+
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+# magic, format version, length of the JSON header that follows
+_HEADER = struct.Struct("<4sIQ")
+_MAGIC = b"BM25"
+_VERSION = 1
+_ALIGN = 8
+
+# Bytes that make up words: ASCII letters (folded to lowercase), digits and
+# every non-ASCII byte, so UTF-8 words stay whole. Anything else separates.
+_WORD_BYTES = bytearray(b" " * 256)
+for _c in range(256):
+    if chr(_c).isascii() and chr(_c).isalnum():
+        _WORD_BYTES[_c] = ord(chr(_c).lower())
+    elif _c >= 128:
+        _WORD_BYTES[_c] = _c
+_WORD_BYTES = bytes(_WORD_BYTES)
+
+
+def tokenize(text: str) -> List[bytes]:
+    """Lowercased UTF-8 words of a text, in order."""
+    if not text.isascii():
+        text = text.lower()
+    return text.encode("utf-8").translate(_WORD_BYTES).split()
+
+
+def text_digest(text: str) -> int:
+    """64-bit content digest, to tell whether a call's transcript changed."""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def default_index_dir(table_path) -> Path:
+    """call_transcripts.csv -> call_transcripts.bm25"""
+    table_path = Path(table_path)
+    return table_path.with_name(table_path.stem + INDEX_SUFFIX)
+
+
+# -- Varints ----------------------------------------------------------------
+
+def varint_sizes(values: np.ndarray) -> np.ndarray:
+    """Bytes each value takes as a varint."""
+    values = np.asarray(values, dtype=np.uint64)
+    sizes = np.ones(len(values), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        more = values >= np.uint64(1 << shift)
+        if not more.any():
+            break
+        sizes += more
+    return sizes
+
+
+def varint_encode(values: np.ndarray) -> np.ndarray:
+    """LEB128-encode non-negative integers, 7 bits per byte, all at once."""
+    values = np.asarray(values, dtype=np.uint64)
+    nbytes = varint_sizes(values)
+    starts = np.cumsum(nbytes) - nbytes
+    out = np.empty(int(nbytes.sum()), dtype=np.uint8)
+    for k in range(int(nbytes.max()) if len(values) else 0):
+        has = nbytes > k
+        chunk = (values[has] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        continues = (nbytes[has] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[has] + k] = chunk | continues
+    return out
+
+
+def varint_decode(data: np.ndarray) -> np.ndarray:
+    """Decode a run of LEB128 varints into uint64 values."""
+    data = np.asarray(data, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.uint64)
+    ends = data < 0x80
+    if ends.all():
+        return data.astype(np.uint64)
+    starts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+    value_of_byte = np.cumsum(ends) - ends
+    shifts = (np.arange(len(data)) - starts[value_of_byte]) * 7
+    parts = (data & 0x7F).astype(np.uint64) << shifts.astype(np.uint64)
+    return np.add.reduceat(parts, starts)
+
+
+def _group_cumsum(gaps: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """Undo gap encoding within consecutive groups of the given sizes."""
+    total = np.cumsum(gaps, dtype=np.int64)
+    starts = np.cumsum(sizes) - sizes
+    nonempty = sizes > 0
+    base = np.zeros(len(sizes), dtype=np.int64)
+    base[nonempty] = total[starts[nonempty]] - gaps[starts[nonempty]].astype(np.int64)
+    return total - np.repeat(base, sizes)
+
+
+def _group_gaps(values: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """Gap-encode values within consecutive groups (first of each group kept as is)."""
+    gaps = values.astype(np.int64).copy()
+    gaps[1:] -= values[:-1]
+    starts = (np.cumsum(sizes) - sizes)[sizes > 0]
+    gaps[starts] = values[starts]
+    return gaps
+
+
+# -- Segments ---------------------------------------------------------------
+
+@dataclass
+class SegmentData:
+    """A segment's content, decoded: what gets encoded into a segment file."""
+    terms: List[bytes]            # sorted
+    post_term: np.ndarray         # per posting, sorted by (term, doc): term number
+    post_doc: np.ndarray          # ... call ordinal in the segment
+    post_tf: np.ndarray           # ... occurrences of the term in the call
+    positions: np.ndarray         # word positions, grouped by posting in posting order
+    call_ids: np.ndarray          # per call
+    lengths: np.ndarray           # per call, in words
+    digests: np.ndarray           # per call, text_digest()
+    reasons: np.ndarray           # per call, index into reason_names
+    reason_names: List[str]
+
+
+def build_segment_data(calls: List[Tuple[int, str, str]]) -> SegmentData:
+    """
+    Tokenize a batch of calls into postings.
+
+    Args:
+        calls: (call_id, call_reason, transcript) tuples
+    """
+    vocab: Dict[bytes, int] = {}
+    first_seen = itertools.count()
+    token_ids = []
+    for _, _, text in calls:
+        words = tokenize(text)
+        token_ids.append(np.fromiter(map(vocab.setdefault, words, first_seen),
+                                     dtype=np.int64, count=len(words)))
+    lengths = np.array([len(ids) for ids in token_ids], dtype=np.int64)
+    tokens = np.concatenate(token_ids) if token_ids else np.zeros(0, dtype=np.int64)
+    del token_ids
+
+    # vocab values are first-seen counters; renumber terms in sorted order
+    terms = sorted(vocab)
+    seen_at = np.fromiter((vocab[term] for term in terms), dtype=np.int64, count=len(terms))
+    by_seen = np.argsort(seen_at)
+    tokens = by_seen[np.searchsorted(seen_at[by_seen], tokens)]
+
+    docs = np.repeat(np.arange(len(calls), dtype=np.int64), lengths)
+    positions = np.arange(len(tokens), dtype=np.int64) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    # Stable: within a term, tokens stay in (doc, position) order
+    order = np.argsort(tokens, kind="stable")
+    tokens, docs, positions = tokens[order], docs[order], positions[order]
+    del order
+    new_posting = np.ones(len(tokens), dtype=bool)
+    new_posting[1:] = (tokens[1:] != tokens[:-1]) | (docs[1:] != docs[:-1])
+    posting_starts = np.flatnonzero(new_posting)
+
+    reason_names = sorted({reason for _, reason, _ in calls})
+    reason_codes = {reason: code for code, reason in enumerate(reason_names)}
+    return SegmentData(
+        terms=terms,
+        post_term=tokens[posting_starts],
+        post_doc=docs[posting_starts],
+        post_tf=np.diff(np.append(posting_starts, len(tokens))),
+        positions=positions,
+        call_ids=np.array([call_id for call_id, _, _ in calls], dtype=np.int64),
+        lengths=lengths,
+        digests=np.array([text_digest(text) for _, _, text in calls], dtype=np.uint64),
+        reasons=np.array([reason_codes[reason] for _, reason, _ in calls], dtype=np.uint16),
+        reason_names=reason_names,
+    )
+
+
+def write_segment(path: Path, data: SegmentData):
+    """Encode a segment and write it atomically."""
+    n_terms = len(data.terms)
+    df = np.bincount(data.post_term, minlength=n_terms).astype(np.int64)
+    term_starts = np.cumsum(df) - df                      # first posting of each term
+    rank = np.arange(len(data.post_term)) - term_starts[data.post_term]
+
+    # Per term: df doc gaps, then df term frequencies
+    doc_gaps = _group_gaps(data.post_doc, df)
+    values = np.empty(2 * len(data.post_term), dtype=np.int64)
+    values[2 * term_starts[data.post_term] + rank] = doc_gaps
+    values[2 * term_starts[data.post_term] + df[data.post_term] + rank] = data.post_tf
+    postings = varint_encode(values)
+    value_bytes = np.concatenate(([0], np.cumsum(varint_sizes(values))))
+    postings_offsets = value_bytes[np.append(2 * term_starts, len(values))]
+
+    # Per posting: position gaps within the call
+    position_values = _group_gaps(data.positions, data.post_tf)
+    positions = varint_encode(position_values)
+    position_bytes = np.concatenate(([0], np.cumsum(varint_sizes(position_values))))
+    first_position = np.concatenate(([0], np.cumsum(data.post_tf)))
+    positions_offsets = position_bytes[first_position[np.append(term_starts, len(data.post_term))]]
+
+    term_blob = b"".join(data.terms)
+    term_offsets = np.concatenate(([0], np.cumsum([len(term) for term in data.terms], dtype=np.int64)))
+
+    arrays = {
+        "terms": np.frombuffer(term_blob, dtype=np.uint8),
+        "term_offsets": term_offsets.astype(np.uint64),
+        "df": df.astype(np.uint32),
+        "postings_bytes": postings,
+        "postings_offsets": postings_offsets.astype(np.uint64),
+        "positions_bytes": positions,
+        "positions_offsets": positions_offsets.astype(np.uint64),
+        "call_ids": data.call_ids.astype(np.int64),
+        "lengths": data.lengths.astype(np.uint32),
+        "digests": data.digests.astype(np.uint64),
+        "reasons": data.reasons.astype(np.uint16),
+    }
+    header = {"docs": len(data.call_ids), "words": int(data.lengths.sum()),
+              "reasons": data.reason_names, "arrays": {}}
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = [array.dtype.str, len(array), offset]
+        offset += -(-array.nbytes // _ALIGN) * _ALIGN
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = -(-(_HEADER.size + len(header_bytes)) // _ALIGN) * _ALIGN
+
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + header["arrays"][name][2])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Segment:
+    """One segment file, memory-mapped."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{self.path} is not a version {_VERSION} BM25 segment")
+        header = json.loads(self._map[_HEADER.size:_HEADER.size + header_length])
+        data_start = -(-(_HEADER.size + header_length) // _ALIGN) * _ALIGN
+        self.doc_count: int = header["docs"]
+        self.word_count: int = header["words"]
+        self.reason_names: List[str] = header["reasons"]
+        self._array_names = list(header["arrays"])
+        for name, (dtype, length, offset) in header["arrays"].items():
+            setattr(self, name, np.frombuffer(self._map, dtype=np.dtype(dtype), count=length,
+                                              offset=data_start + offset))
+        self.term_count = len(self.df)
+
+    def term(self, number: int) -> bytes:
+        return self.terms[self.term_offsets[number]:self.term_offsets[number + 1]].tobytes()
+
+    def term_number(self, term: bytes) -> int:
+        """Binary search of the term dictionary; -1 if the term isn't in this segment."""
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.term(middle) < term:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < self.term_count and self.term(low) == term else -1
+
+    def postings(self, number: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(call ordinals, term frequencies) of one term."""
+        start, end = self.postings_offsets[number], self.postings_offsets[number + 1]
+        values = varint_decode(self.postings_bytes[start:end]).astype(np.int64)
+        df = int(self.df[number])
+        return np.cumsum(values[:df]), values[df:]
+
+    def positions_of(self, number: int, tf: np.ndarray) -> np.ndarray:
+        """Word positions of one term, grouped by posting (tf[i] positions for posting i)."""
+        start, end = self.positions_offsets[number], self.positions_offsets[number + 1]
+        return _group_cumsum(varint_decode(self.positions_bytes[start:end]).astype(np.int64), tf)
+
+    def reason_code(self, reason: str) -> int:
+        return self.reason_names.index(reason) if reason in self.reason_names else -1
+
+    def decode(self) -> SegmentData:
+        """Everything in the segment, for merging."""
+        df = self.df.astype(np.int64)
+        term_starts = np.cumsum(df) - df
+        post_term = np.repeat(np.arange(self.term_count), df)
+        rank = np.arange(len(post_term)) - term_starts[post_term]
+        values = varint_decode(self.postings_bytes).astype(np.int64)
+        doc_gaps = values[2 * term_starts[post_term] + rank]
+        post_tf = values[2 * term_starts[post_term] + df[post_term] + rank]
+        return SegmentData(
+            terms=[self.term(number) for number in range(self.term_count)],
+            post_term=post_term,
+            post_doc=_group_cumsum(doc_gaps, df),
+            post_tf=post_tf,
+            positions=_group_cumsum(varint_decode(self.positions_bytes).astype(np.int64), post_tf),
+            call_ids=np.array(self.call_ids),
+            lengths=np.array(self.lengths),
+            digests=np.array(self.digests),
+            reasons=np.array(self.reasons),
+            reason_names=list(self.reason_names),
+        )
+
+    def close(self):
+        for name in self._array_names:
+            self.__dict__.pop(name, None)
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # a caller still holds a view; the map closes when it is collected
+
+
+def merge_segment_data(parts: List[Tuple[SegmentData, Set[int]]]) -> SegmentData:
+    """
+    Combine decoded segments into one, dropping deleted calls.
+
+    Args:
+        parts: (segment content, ordinals of its deleted calls), in call order
+    """
+    terms = sorted(set().union(*(data.terms for data, _ in parts)))
+    term_number = {term: number for number, term in enumerate(terms)}
+    reason_names = sorted(set().union(*(data.reason_names for data, _ in parts)))
+
+    post_term, post_doc, post_tf, positions = [], [], [], []
+    call_ids, lengths, digests, reasons = [], [], [], []
+    doc_offset = 0
+    for data, deleted in parts:
+        live = np.ones(len(data.call_ids), dtype=bool)
+        live[list(deleted)] = False
+        new_ordinal = np.cumsum(live) - 1 + doc_offset
+        keep = live[data.post_doc]
+        term_map = np.array([term_number[term] for term in data.terms], dtype=np.int64)
+        reason_map = np.array([reason_names.index(name) for name in data.reason_names], dtype=np.uint16)
+
+        post_term.append(term_map[data.post_term[keep]])
+        post_doc.append(new_ordinal[data.post_doc[keep]])
+        post_tf.append(data.post_tf[keep])
+        positions.append(data.positions[np.repeat(keep, data.post_tf)])
+        call_ids.append(data.call_ids[live])
+        lengths.append(data.lengths[live])
+        digests.append(data.digests[live])
+        reasons.append(reason_map[data.reasons[live]] if len(reason_map) else data.reasons[live])
+        doc_offset += int(live.sum())
+
+    post_term, post_doc = np.concatenate(post_term), np.concatenate(post_doc)
+    post_tf, positions = np.concatenate(post_tf), np.concatenate(positions)
+
+    # Postings back into (term, doc) order, carrying their positions along
+    order = np.lexsort((post_doc, post_term))
+    starts = np.cumsum(post_tf) - post_tf
+    sizes = post_tf[order]
+    gather = np.repeat(starts[order] - (np.cumsum(sizes) - sizes), sizes) + np.arange(int(sizes.sum()))
+    return SegmentData(
+        terms=terms,
+        post_term=post_term[order],
+        post_doc=post_doc[order],
+        post_tf=sizes,
+        positions=positions[gather],
+        call_ids=np.concatenate(call_ids),
+        lengths=np.concatenate(lengths),
+        digests=np.concatenate(digests),
+        reasons=np.concatenate(reasons),
+        reason_names=reason_names,
+    )
+
+
+def _build_segment_file(path: str, calls: List[Tuple[int, str, str]]) -> str:
+    """Worker: tokenize a batch of calls into a segment file."""
+    write_segment(Path(path), build_segment_data(calls))
+    return path
+
+
+class _InlineExecutor:
+    """Runs each submitted call on the spot; stands in for a one-worker process pool."""
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+# -- The index --------------------------------------------------------------
+
+def parse_query(query: str) -> Tuple[List[bytes], List[List[bytes]]]:
+    """
+    Split a query into its words and its quoted phrases.
+
+    Returns:
+        (every distinct word, including those inside phrases; the phrases as word lists)
+    """
+    words, phrases = [], []
+    for phrase, bare in re.findall(r'"([^"]*)"|(\S+)', query):
+        if phrase:
+            phrase_words = tokenize(phrase)
+            if phrase_words:
+                phrases.append(phrase_words)
+                words.extend(phrase_words)
+        else:
+            words.extend(tokenize(bare))
+    return list(dict.fromkeys(words)), phrases
+
+
+class BM25Index:
+    """A directory of BM25 segments plus the manifest naming the live ones."""
+
+    def __init__(self, index_dir, k1: float = DEFAULT_K1, b: float = DEFAULT_B):
+        """
+        Open an index (an empty one if the directory has no manifest yet).
+
+        Args:
+            index_dir: Index directory, e.g. call_transcripts.bm25
+            k1: BM25 term-frequency saturation
+            b: BM25 length normalization
+        """
+        self.index_dir = Path(index_dir)
+        self.k1 = k1
+        self.b = b
+        self.segments: List[Segment] = []
+        self.deleted: List[Set[int]] = []
+        self._manifest = {"version": _VERSION, "next_segment": 1, "segments": []}
+        if self.manifest_path.exists():
+            self._manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        self._load()
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.index_dir / MANIFEST_FILENAME
+
+    def _load(self):
+        """Open the segments the manifest names."""
+        for segment in self.segments:
+            segment.close()
+        self.segments = [Segment(self.index_dir / entry["name"]) for entry in self._manifest["segments"]]
+        self.deleted = [set(entry["deleted"]) for entry in self._manifest["segments"]]
+        self._live_masks = []
+        for segment, deleted in zip(self.segments, self.deleted):
+            live = np.ones(segment.doc_count, dtype=bool)
+            live[list(deleted)] = False
+            self._live_masks.append(live)
+        self._norms: Dict[int, np.ndarray] = {}
+
+    @property
+    def doc_count(self) -> int:
+        """Calls in the index, not counting deleted ones."""
+        return sum(segment.doc_count - len(deleted) for segment, deleted in zip(self.segments, self.deleted))
+
+    def _indexed(self) -> Dict[int, Tuple[int, int, int]]:
+        """{call_id: (segment position, ordinal, digest)} of the live calls."""
+        indexed = {}
+        for position, (segment, live) in enumerate(zip(self.segments, self._live_masks)):
+            ordinals = np.flatnonzero(live)
+            for ordinal, call_id, digest in zip(ordinals.tolist(), segment.call_ids[ordinals].tolist(),
+                                                segment.digests[ordinals].tolist()):
+                indexed[call_id] = (position, ordinal, digest)
+        return indexed
+
+    # -- Updating -----------------------------------------------------------
+
+    def update(self, table_path, workers: Optional[int] = None, rebuild: bool = False,
+               docs_per_segment: int = DOCS_PER_SEGMENT) -> Dict[str, int]:
+        """
+        Bring the index in line with a transcripts CSV.
+
+        Args:
+            table_path: Transcripts CSV (call_id, call_reason, transcript or transcript_zst)
+            workers: Processes tokenizing batches of calls (default: CPU count)
+            rebuild: Start from an empty index instead of updating
+            docs_per_segment: Calls per new segment
+
+        Returns:
+            Counts of added, changed, removed and unchanged calls, and segments afterwards
+        """
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        if rebuild:
+            self._manifest = {"version": _VERSION, "next_segment": self._manifest["next_segment"],
+                              "segments": []}
+            self._load()
+        workers = workers or os.cpu_count() or 1
+
+        indexed = self._indexed()
+        seen: Set[int] = set()
+        counts = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+        new_names: List[str] = []
+        batch: List[Tuple[int, str, str]] = []
+
+        def segment_path() -> Path:
+            number = self._manifest["next_segment"]
+            self._manifest["next_segment"] = number + 1
+            name = SEGMENT_PATTERN.format(number)
+            new_names.append(name)
+            return self.index_dir / name
+
+        with ProcessPoolExecutor(max_workers=workers) if workers > 1 else _InlineExecutor() as pool:
+            pending = []
+            for call_id, reason, text in iter_calls(table_path):
+                seen.add(call_id)
+                previous = indexed.get(call_id)
+                if previous is not None:
+                    if previous[2] == text_digest(text):
+                        counts["unchanged"] += 1
+                        continue
+                    self.deleted[previous[0]].add(previous[1])
+                    counts["changed"] += 1
+                else:
+                    counts["added"] += 1
+                batch.append((call_id, reason, text))
+                if len(batch) >= docs_per_segment:
+                    # Keep at most `workers` batches of text in memory at once
+                    if len(pending) >= workers:
+                        pending.pop(0).result()
+                    pending.append(pool.submit(_build_segment_file, str(segment_path()), batch))
+                    batch = []
+            if batch:
+                pending.append(pool.submit(_build_segment_file, str(segment_path()), batch))
+            for future in pending:
+                future.result()
+
+        for call_id, (position, ordinal, _) in indexed.items():
+            if call_id not in seen:
+                self.deleted[position].add(ordinal)
+                counts["removed"] += 1
+
+        entries = [{"name": segment.path.name, "deleted": sorted(deleted)}
+                   for segment, deleted in zip(self.segments, self.deleted)]
+        entries += [{"name": name, "deleted": []} for name in new_names]
+        entries = self._merge(entries)
+        self._commit(entries, table_path)
+        counts["segments"] = len(self.segments)
+        return counts
+
+    def _merge(self, entries: List[dict]) -> List[dict]:
+        """Apply the merge policy to a list of manifest entries; returns the new list."""
+        sizes = {segment.path.name: segment.doc_count for segment in self.segments}
+        for entry in entries:
+            if entry["name"] not in sizes:
+                segment = Segment(self.index_dir / entry["name"])
+                sizes[entry["name"]] = segment.doc_count
+                segment.close()
+        entries = [entry for entry in entries if sizes[entry["name"]] > len(entry["deleted"])]
+
+        to_merge = {entry["name"] for entry in entries
+                    if len(entry["deleted"]) > MAX_DELETED_FRACTION * sizes[entry["name"]]}
+        if len(entries) > MAX_SEGMENTS:
+            by_size = sorted(entries, key=lambda entry: sizes[entry["name"]] - len(entry["deleted"]))
+            to_merge.update(entry["name"] for entry in by_size[:len(entries) - MAX_SEGMENTS + 1])
+        if not to_merge:
+            return entries
+
+        parts = []
+        for entry in entries:
+            if entry["name"] in to_merge:
+                segment = Segment(self.index_dir / entry["name"])
+                parts.append((segment.decode(), set(entry["deleted"])))
+                segment.close()
+        number = self._manifest["next_segment"]
+        self._manifest["next_segment"] = number + 1
+        name = SEGMENT_PATTERN.format(number)
+        write_segment(self.index_dir / name, merge_segment_data(parts))
+        return [entry for entry in entries if entry["name"] not in to_merge] + [{"name": name, "deleted": []}]
+
+    def _commit(self, entries: List[dict], table_path):
+        """Write the manifest atomically, then drop files it no longer names."""
+        self._manifest["segments"] = entries
+        self._manifest["source"] = str(Path(table_path).resolve())
+        self._manifest["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        tmp = self.manifest_path.with_name(MANIFEST_FILENAME + ".tmp")
+        tmp.write_text(json.dumps(self._manifest, indent=1), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
+
+        self._load()
+        keep = {entry["name"] for entry in entries}
+        for path in self.index_dir.glob(SEGMENT_GLOB + "*"):
+            if path.name not in keep:
+                path.unlink(missing_ok=True)
+
+    # -- Searching ----------------------------------------------------------
+
+    def _norm(self, position: int, average_length: float) -> np.ndarray:
+        """k1 * (1 - b + b * length / average length) per call of a segment."""
+        norm = self._norms.get(position)
+        if norm is None:
+            lengths = self.segments[position].lengths.astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * lengths / average_length)
+            self._norms[position] = norm
+        return norm
+
+    @staticmethod
+    def _phrase_matches(segment: Segment, phrase: List[bytes]) -> np.ndarray:
+        """Ordinals of the calls where the phrase's words appear consecutively."""
+        words = []
+        for offset, word in enumerate(phrase):
+            number = segment.term_number(word)
+            if number < 0:
+                return np.zeros(0, dtype=np.int64)
+            words.append((int(segment.df[number]), offset, number))
+
+        # Candidate phrase starts as (call << 32) + position, from the rarest
+        # word first. Postings come sorted by call and position, so each
+        # word's keys are sorted too and a binary search intersects them.
+        starts = None
+        for _, offset, number in sorted(words):
+            docs, tf = segment.postings(number)
+            keys = (np.repeat(docs, tf) << 32) + segment.positions_of(number, tf) - offset
+            if starts is None:
+                starts = keys
+            else:
+                found = np.minimum(np.searchsorted(keys, starts), len(keys) - 1)
+                starts = starts[keys[found] == starts]
+            if not len(starts):
+                break
+        return np.unique(starts >> 32)
+
+    def search(self, query: str, k: int = 10, call_reason: Optional[str] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k calls for a query.
+
+        Args:
+            query: Words, and "quoted phrases" that must appear word for word
+            k: How many calls to return
+            call_reason: Only rank calls with this call_reason
+
+        Returns:
+            [(call_id, score), ...], best first
+        """
+        words, phrases = parse_query(query)
+        if not words or not self.segments:
+            return []
+        numbers = [[segment.term_number(word) for word in words] for segment in self.segments]
+        total_docs = sum(segment.doc_count for segment in self.segments)
+        average_length = sum(segment.word_count for segment in self.segments) / max(total_docs, 1)
+        df = np.zeros(len(words))
+        for segment, segment_numbers in zip(self.segments, numbers):
+            for i, number in enumerate(segment_numbers):
+                if number >= 0:
+                    df[i] += segment.df[number]
+        idf = np.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+
+        best_scores, best_ids = [], []
+        for position, (segment, segment_numbers) in enumerate(zip(self.segments, numbers)):
+            if all(number < 0 for number in segment_numbers):
+                continue
+            norm = self._norm(position, average_length)
+            scores = np.zeros(segment.doc_count, dtype=np.float32)
+            for i, number in enumerate(segment_numbers):
+                if number < 0:
+                    continue
+                docs, tf = segment.postings(number)
+                tf = tf.astype(np.float32)
+                scores[docs] += idf[i] * tf * (self.k1 + 1) / (tf + norm[docs])
+
+            candidates = (scores > 0) & self._live_masks[position]
+            if call_reason is not None:
+                candidates &= segment.reasons == segment.reason_code(call_reason)
+            for phrase in phrases:
+                matching = np.zeros(segment.doc_count, dtype=bool)
+                matching[self._phrase_matches(segment, phrase)] = True
+                candidates &= matching
+            ordinals = np.flatnonzero(candidates)
+            if len(ordinals) > k:
+                # Keep every call tied with the k-th score; ties go to the lowest call_id below
+                kth = np.partition(scores[ordinals], len(ordinals) - k)[len(ordinals) - k]
+                ordinals = ordinals[scores[ordinals] >= kth]
+            best_scores.append(scores[ordinals])
+            best_ids.append(segment.call_ids[ordinals])
+
+        if not best_scores:
+            return []
+        scores = np.concatenate(best_scores)
+        call_ids = np.concatenate(best_ids)
+        order = np.lexsort((call_ids, -scores))[:k]
+        return [(int(call_ids[i]), float(scores[i])) for i in order]
+
+    def stats(self) -> dict:
+        """Calls, segments, words and on-disk size of the index."""
+        return {
+            "calls": self.doc_count,
+            "deleted": sum(len(deleted) for deleted in self.deleted),
+            "segments": len(self.segments),
+            "words": sum(segment.word_count for segment in self.segments),
+            "terms": sum(segment.term_count for segment in self.segments),
+            "bytes": sum(segment.path.stat().st_size for segment in self.segments),
+            "updated_at": self._manifest.get("updated_at"),
+        }
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def build_index(table_path, index_dir=None, rebuild: bool = False, workers: Optional[int] = None) -> Dict[str, int]:
+    """
+    Create or update the BM25 index of a transcripts CSV.
+
+    Args:
+        table_path: Transcripts CSV
+        index_dir: Index directory (default: next to the CSV, e.g. call_transcripts.bm25)
+        rebuild: Reindex every call instead of only new and changed ones
+        workers: Processes tokenizing calls (default: CPU count)
+
+    Returns:
+        Counts of added, changed, removed and unchanged calls, and segments
+    """
+    index_dir = Path(index_dir) if index_dir else default_index_dir(table_path)
+    start = time.time()
+    print(f"Indexing {table_path} into {index_dir}...")
+    with BM25Index(index_dir) as index:
+        counts = index.update(table_path, workers=workers, rebuild=rebuild)
+        calls = index.doc_count
+    print(f"✓ {calls} calls indexed in {time.time() - start:.1f}s: {counts['added']} added, "
+          f"{counts['changed']} changed, {counts['removed']} removed, {counts['unchanged']} unchanged "
+          f"({counts['segments']} segments)")
+    return counts
+
+
+def _snippet(text: str, words: List[bytes], width: int = 160) -> str:
+    """The line of a transcript that mentions the most query words."""
+    targets = set(words)
+    best, best_hits = "", 0
+    for line in text.splitlines():
+        hits = len(targets.intersection(tokenize(line)))
+        if hits > best_hits:
+            best, best_hits = line.strip(), hits
+    return best if len(best) <= width else best[:width - 3] + "..."
+
+
+def main():
+    """Build, query or inspect the transcript search index."""
+    default_table = str(Path(__file__).parent / "call_transcripts.csv")
+    parser = argparse.ArgumentParser(description="BM25 full-text search over call transcripts")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Index new and changed transcripts of a CSV")
+    build.add_argument("--table", default=default_table, help="Transcripts CSV (default: ./call_transcripts.csv)")
+    build.add_argument("--index", help="Index directory (default: next to the CSV, .bm25)")
+    build.add_argument("--rebuild", action="store_true", help="Reindex every call from scratch")
+    build.add_argument("--workers", type=int, help="Tokenizing processes (default: CPU count)")
+
+    search = sub.add_parser("search", help="Top calls for a query")
+    search.add_argument("query", help='Words, and "quoted phrases" that must appear as written')
+    search.add_argument("-k", type=int, default=10, help="Number of calls (default: 10)")
+    search.add_argument("--call-reason", help="Only calls with this call_reason")
+    search.add_argument("--table", default=default_table, help="Transcripts CSV (default: ./call_transcripts.csv)")
+    search.add_argument("--index", help="Index directory (default: next to the CSV, .bm25)")
+    search.add_argument("--show", action="store_true", help="Print a matching line of each call")
+
+    stats = sub.add_parser("stats", help="Show the size of the index")
+    stats.add_argument("--table", default=default_table, help="Transcripts CSV (default: ./call_transcripts.csv)")
+    stats.add_argument("--index", help="Index directory (default: next to the CSV, .bm25)")
+    args = parser.parse_args()
+
+    index_dir = Path(args.index) if args.index else default_index_dir(args.table)
+    if args.command == "build":
+        build_index(args.table, index_dir, rebuild=args.rebuild, workers=args.workers)
+        return 0
+
+    if not (index_dir / MANIFEST_FILENAME).exists():
+        print(f"❌ No index at {index_dir}; run: python bm25_index.py build --table {args.table}")
+        return 1
+    with BM25Index(index_dir) as index:
+        if args.command == "stats":
+            stats = index.stats()
+            print(f"  {stats['calls']} calls ({stats['deleted']} deleted, not yet merged away)")
+            print(f"  {stats['segments']} segments, {stats['terms']} terms, {stats['words']} words")
+            print(f"  {stats['bytes'] / 1e6:.1f} MB on disk, updated {stats['updated_at']}")
+            return 0
+
+        start = time.perf_counter()
+        results = index.search(args.query, k=args.k, call_reason=args.call_reason)
+        elapsed = (time.perf_counter() - start) * 1000
+    print(f"{len(results)} calls in {elapsed:.1f} ms")
+    texts = get_transcripts(args.table, [call_id for call_id, _ in results]) if args.show and results else {}
+    words, _ = parse_query(args.query)
+    for call_id, score in results:
+        print(f"  {call_id}  {score:7.3f}")
+        if call_id in texts:
+            print(f"      {_snippet(texts[call_id], words)}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,244 @@
+"""
+Call ID Registry
+================
+Gives every transcript a call_id that never changes, keyed by its
+identity ({category}/{filename}), so adding or removing one transcript
+doesn't renumber the others:
+
+    with CallIdRegistry(base_dir) as registry:
+        ids = registry.assign([("billing_inquiry", "billing_inquiry_0042.txt"), ...])
+        registry.call_id("billing_inquiry", "billing_inquiry_0042.txt")
+        registry.lookup(1041)                    # -> (category, filename)
+
+New transcripts get the next id after the highest ever handed out, in
+the order they are passed in. The first assignment over an existing
+corpus, in sorted (category, filename) order from FIRST_CALL_ID, matches
+the numbering create_transcript_csv used before the registry existed.
+Ids of deleted transcripts are never reused; a transcript that comes back
+under the same name gets its old id back.
+
+The registry also remembers what each output CSV was last built from
+(per call_id: a stat stamp and a content digest). That lets
+create_transcript_csv --append read only the transcripts that are new or
+changed since then.
+
+The database lives at {base_dir}/call_id_registry.sqlite in WAL mode,
+next to the transcript manifest. Unlike the manifest it cannot be rebuilt
+from the folders: the ids it holds are the ones the CSVs and any database
+loaded from them are keyed on.
+"""
+
+import argparse
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+REGISTRY_FILENAME = "call_id_registry.sqlite"
+FIRST_CALL_ID = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS call_ids (
+    call_id INTEGER PRIMARY KEY,
+    category TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    assigned_at TEXT,
+    UNIQUE (category, filename)
+);
+CREATE TABLE IF NOT EXISTS ingested (
+    output TEXT NOT NULL,
+    call_id INTEGER NOT NULL,
+    stamp TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (output, call_id)
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    output TEXT PRIMARY KEY,
+    format TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    built_at TEXT
+);
+"""
+
+
+class CallIdRegistry:
+    """SQLite table of stable call_ids, one per category/filename."""
+
+    def __init__(self, base_dir, path=None, first_call_id: int = FIRST_CALL_ID):
+        """
+        Open (or create) the registry.
+
+        Args:
+            base_dir: Transcripts root
+            path: Database path (default: base_dir/call_id_registry.sqlite)
+            first_call_id: Id handed out first in an empty registry
+        """
+        self.base_dir = Path(base_dir)
+        self.path = Path(path) if path else self.base_dir / REGISTRY_FILENAME
+        self.first_call_id = first_call_id
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit, with explicit transactions where several writes belong together
+        self._conn = sqlite3.connect(str(self.path), timeout=30.0, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # -- call_ids ---------------------------------------------------------
+
+    def assign(self, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+        """
+        Look up call_ids, handing out new ones to transcripts not seen before.
+
+        Safe across processes: the assignment runs in one write transaction.
+
+        Args:
+            keys: (category, filename) pairs; new ones are numbered in this order
+
+        Returns:
+            {(category, filename): call_id} for every key
+        """
+        keys = list(keys)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                known = {(category, filename): call_id for call_id, category, filename
+                         in self._conn.execute("SELECT call_id, category, filename FROM call_ids")}
+                highest = self._conn.execute("SELECT MAX(call_id) FROM call_ids").fetchone()[0]
+                next_id = self.first_call_id if highest is None else highest + 1
+
+                assigned_at = datetime.now().isoformat(timespec="seconds")
+                new_rows = []
+                for key in keys:
+                    if key not in known:
+                        known[key] = next_id
+                        new_rows.append((next_id, key[0], key[1], assigned_at))
+                        next_id += 1
+                self._conn.executemany("INSERT INTO call_ids VALUES (?, ?, ?, ?)", new_rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {key: known[key] for key in keys}
+
+    def call_id(self, category: str, filename: str) -> Optional[int]:
+        """The call_id of one transcript, or None if it was never assigned one."""
+        rows = self._query("SELECT call_id FROM call_ids WHERE category = ? AND filename = ?",
+                           (category, filename))
+        return rows[0][0] if rows else None
+
+    def lookup(self, call_id: int) -> Optional[Tuple[str, str]]:
+        """(category, filename) of a call_id, or None."""
+        rows = self._query("SELECT category, filename FROM call_ids WHERE call_id = ?", (call_id,))
+        return tuple(rows[0]) if rows else None
+
+    def count(self) -> int:
+        """Number of call_ids ever handed out."""
+        return self._query("SELECT COUNT(*) FROM call_ids")[0][0]
+
+    def categories(self) -> Dict[str, int]:
+        """{category: number of call_ids}."""
+        return dict(self._query("SELECT category, COUNT(*) FROM call_ids GROUP BY category ORDER BY category"))
+
+    # -- What each output was built from -----------------------------------
+
+    @staticmethod
+    def _output_key(output) -> str:
+        return str(Path(output).resolve())
+
+    def ingested(self, output) -> Dict[int, Tuple[str, str]]:
+        """{call_id: (stamp, digest)} of the rows in `output` as last built."""
+        rows = self._query("SELECT call_id, stamp, digest FROM ingested WHERE output = ?",
+                           (self._output_key(output),))
+        return {call_id: (stamp, digest) for call_id, stamp, digest in rows}
+
+    def output_state(self, output) -> Optional[Tuple[str, int, int]]:
+        """(format, size, mtime_ns) of `output` right after it was last built, or None."""
+        rows = self._query("SELECT format, size, mtime_ns FROM outputs WHERE output = ?",
+                           (self._output_key(output),))
+        return tuple(rows[0]) if rows else None
+
+    def record_build(self, output, output_format: str, rows: Iterable[Tuple[int, str, str]],
+                     removed: Iterable[int] = (), replace: bool = False):
+        """
+        Record what `output` now holds. Call once it is written and closed.
+
+        Args:
+            output: The output file
+            output_format: How it was written (e.g. "csv", "csv+zstd"); an
+                append only continues a file of the same format
+            rows: (call_id, stamp, digest) of rows written or refreshed
+            removed: call_ids whose rows were dropped
+            replace: The output was rebuilt; forget every earlier row
+        """
+        key = self._output_key(output)
+        stat = Path(output).stat()
+        built_at = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if replace:
+                    self._conn.execute("DELETE FROM ingested WHERE output = ?", (key,))
+                self._conn.executemany("DELETE FROM ingested WHERE output = ? AND call_id = ?",
+                                       ((key, call_id) for call_id in removed))
+                self._conn.executemany("INSERT OR REPLACE INTO ingested VALUES (?, ?, ?, ?)",
+                                       ((key, call_id, stamp, digest) for call_id, stamp, digest in rows))
+                self._conn.execute("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?)",
+                                   (key, output_format, stat.st_size, stat.st_mtime_ns, built_at))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def main():
+    """Look up call_ids, or list how many each category holds."""
+    parser = argparse.ArgumentParser(description="Inspect the stable call_id registry")
+    parser.add_argument("base_dir", nargs="?", default=str(Path(__file__).parent / "transcripts"),
+                       help="Transcripts root (default: ./transcripts)")
+    parser.add_argument("--call-id", type=int, help="Show which transcript a call_id belongs to")
+    parser.add_argument("--file", help="Show the call_id of {category}/{filename}")
+    args = parser.parse_args()
+
+    with CallIdRegistry(args.base_dir) as registry:
+        if args.call_id is not None:
+            found = registry.lookup(args.call_id)
+            if found is None:
+                print(f"❌ call_id {args.call_id} was never assigned")
+                return 1
+            print(f"{args.call_id}: {found[0]}/{found[1]}")
+            return 0
+        if args.file:
+            category, _, filename = args.file.partition("/")
+            call_id = registry.call_id(category, filename)
+            if call_id is None:
+                print(f"❌ {args.file} has no call_id yet")
+                return 1
+            print(f"{args.file}: {call_id}")
+            return 0
+
+        print(f"  {registry.count()} call_ids assigned")
+        for category, count in registry.categories().items():
+            print(f"  {category}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
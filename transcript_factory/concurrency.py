@@ -0,0 +1,175 @@
+"""
+Adaptive Concurrency Limiter
+============================
+AIMD (additive-increase / multiplicative-decrease) control of how many API
+requests are in flight at once, replacing a fixed-size semaphore.
+
+- Slow start: until the first sign of trouble the limit grows by one per
+  successful request, roughly doubling every round trip.
+- Congestion avoidance: afterwards it grows by about one per round trip
+  (1/limit per success), but only while recent latency stays within
+  `latency_tolerance` times the long-run baseline.
+- On a 429, 529 or timeout the limit is multiplied by `decrease_factor`,
+  at most once per round trip so a burst of failures from the same
+  overload only counts once.
+
+The limit always stays between `min_limit` and `max_limit`, so the
+configured max_concurrent becomes a ceiling rather than a fixed setting.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+
+class AdaptiveConcurrencyLimiter:
+    """Async concurrency limit that tunes itself from latency and congestion."""
+
+    def __init__(
+        self,
+        max_limit: int,
+        initial_limit: Optional[int] = None,
+        min_limit: int = 1,
+        additive_increase: float = 1.0,
+        decrease_factor: float = 0.7,
+        latency_tolerance: float = 2.0,
+        fast_alpha: float = 0.2,
+        slow_alpha: float = 0.02
+    ):
+        """
+        Args:
+            max_limit: Highest allowed number of in-flight requests
+            initial_limit: Starting limit (default: min(10, max_limit))
+            min_limit: Lowest allowed limit
+            additive_increase: Growth per round trip in congestion avoidance
+            decrease_factor: Multiplier applied to the limit on congestion
+            latency_tolerance: Stop growing once recent latency exceeds the
+                baseline by this factor
+            fast_alpha: EWMA weight for recent latency
+            slow_alpha: EWMA weight for the baseline latency
+        """
+        self.max_limit = max_limit
+        self.min_limit = max(1, min(min_limit, max_limit))
+        if initial_limit is None:
+            initial_limit = min(10, max_limit)
+        self.limit = float(max(self.min_limit, min(initial_limit, max_limit)))
+        self.additive_increase = additive_increase
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.fast_alpha = fast_alpha
+        self.slow_alpha = slow_alpha
+
+        self.in_flight = 0
+        self.slow_start = True
+        self.recent_latency: Optional[float] = None
+        self.baseline_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._waiters: deque = deque()
+
+        self.stats = {
+            "peak_limit": int(self.limit),
+            "peak_in_flight": 0,
+            "increases": 0,
+            "decreases": 0
+        }
+
+    @classmethod
+    def fixed(cls, limit: int) -> "AdaptiveConcurrencyLimiter":
+        """A limiter pinned at `limit` (behaves like a plain semaphore)."""
+        return cls(max_limit=limit, initial_limit=limit, min_limit=limit)
+
+    @property
+    def current_limit(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    async def acquire(self):
+        """Wait until a request slot is free under the current limit."""
+        if not self._waiters and self.in_flight < self.current_limit:
+            self._take_slot()
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as we were cancelled: give it back
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def _take_slot(self):
+        self.in_flight += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.in_flight)
+
+    def _wake_waiters(self):
+        while self._waiters and self.in_flight < self.current_limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._take_slot()
+            waiter.set_result(None)
+
+    def release(self):
+        """Return a request slot."""
+        self.in_flight -= 1
+        self._wake_waiters()
+
+    def _latency_healthy(self) -> bool:
+        if self.recent_latency is None or self.baseline_latency is None:
+            return True
+        return self.recent_latency <= self.latency_tolerance * self.baseline_latency
+
+    def on_success(self, latency: float):
+        """
+        Record a completed request and grow the limit if things look healthy.
+
+        Args:
+            latency: Seconds the request took
+        """
+        if self.recent_latency is None:
+            self.recent_latency = self.baseline_latency = latency
+        else:
+            self.recent_latency += self.fast_alpha * (latency - self.recent_latency)
+            self.baseline_latency += self.slow_alpha * (latency - self.baseline_latency)
+
+        if self.limit >= self.max_limit:
+            return
+        if not self._latency_healthy():
+            # Queueing somewhere: hold steady and leave slow start
+            self.slow_start = False
+            return
+
+        if self.slow_start:
+            self.limit += 1
+        else:
+            self.limit += self.additive_increase / self.limit
+        self.limit = min(self.limit, float(self.max_limit))
+        self.stats["increases"] += 1
+        self.stats["peak_limit"] = max(self.stats["peak_limit"], self.current_limit)
+        self._wake_waiters()
+
+    def on_congestion(self):
+        """Shrink the limit after a 429, 529 or timeout."""
+        self.slow_start = False
+        now = time.monotonic()
+        # One cut per round trip: the other failures were already in flight
+        if now - self._last_decrease < (self.recent_latency or 1.0):
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        self.stats["decreases"] += 1
+
+    def __repr__(self):
+        return (f"AdaptiveConcurrencyLimiter(limit={self.current_limit}, "
+                f"in_flight={self.in_flight}, max={self.max_limit})")
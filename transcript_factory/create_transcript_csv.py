@@ -3,107 +3,534 @@
 Create a CSV file from transcript text files in subdirectories.
 
 Generates a CSV with columns:
-- call_id: Ascending integer IDs
+- call_id: Stable integer ID of the transcript (see call_id_registry.py)
 - call_reason: Subdirectory name (account_management, billing_inquiry, technical_support)
 - transcript: Full text content of the transcript file
+
+call_ids are kept in {transcripts_dir}/call_id_registry.sqlite, so a
+transcript keeps its call_id when others are added or removed. Rows are
+written in call_id order. On a corpus seen for the first time this is the
+old numbering: sorted folders and files, counting up from 1000.
+
+Files are read by a pool of threads, and rows are written as they arrive.
+Only the transcript bodies are streamed: the text in memory is bounded by
+the reads in flight, however large the corpus is. The file listing and the
+(call_id, stamp, digest) kept per row for the registry still take a few
+hundred bytes per transcript.
+Transcripts packed into a segment store (see segment_store.py) are read
+from it. Any .txt file not in the store is still read from its folder.
+
+An output path ending in .parquet, .arrow or .feather is written in that
+columnar format instead, with call_reason dictionary-encoded. This needs
+the optional pyarrow package.
+
+With --compress, each transcript is stored as a zstd frame compressed
+against a dictionary trained on a sample of the corpus, in a
+transcript_zst column (see transcript_codec.py). This needs the optional
+zstandard package.
+
+With --append, only transcripts that are new or changed since the output
+was last built are read. A transcript counts as changed when its size or
+mtime moved and its content hash differs. New rows with the highest
+call_ids are appended in place. Anything else (a changed or removed
+transcript, a returning call_id) is patched in while the old rows are
+copied over. The rows that changed are also written to a delta CSV
+(call_transcripts.delta.csv by default) with a `change` column of added,
+changed or removed.
 """
 
 import os
 import csv
+import hashlib
+import heapq
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from call_id_registry import FIRST_CALL_ID, CallIdRegistry
+from segment_store import RecordLocation, SegmentStore
+from transcript_codec import (COMPRESSED_COLUMN, DEFAULT_LEVEL, DEFAULT_SAMPLE_SIZE, TranscriptCodec,
+                              copy_dictionary, dictionary_path, sample_texts)
+from transcript_manifest import TranscriptManifest
+
+FIELDNAMES = ['call_id', 'call_reason', 'transcript']
+
+# File opens are I/O bound, so this can be well above the CPU count
+DEFAULT_WORKERS = 32
+
+# Columnar output is written in batches of about this much transcript text
+ARROW_BATCH_BYTES = 16 * 1024 * 1024
+
+PARQUET_SUFFIXES = ('.parquet',)
+ARROW_SUFFIXES = ('.arrow', '.feather')
+
+
+def _quote(value):
+    """Double embedded quotes, as csv.QUOTE_ALL does."""
+    return value.replace('"', '""')
+
+
+def _source_stamp(source):
+    """Cheap change check: size and mtime of a file, or where a packed record sits."""
+    if isinstance(source, RecordLocation):
+        return f"seg:{source.segment}:{source.offset}:{source.length}"
+    try:
+        stat = os.stat(source)
+    except OSError:
+        return ''
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
 
-def create_transcript_csv(transcripts_dir, output_csv):
+def _read_transcript(source, store=None, codec=None):
     """
-    Create a CSV from transcript files in subdirectories.
+    Read one transcript (a file path or a store location) and hash it.
+    Errors are returned rather than raised.
+    """
+    try:
+        if isinstance(source, RecordLocation):
+            content = str(store.read_location(source), 'utf-8')
+        else:
+            with open(source, 'r', encoding='utf-8') as f:
+                content = f.read()
+        digest = hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+        # Compressing here spreads the work over the reader threads
+        return (codec.encode(content) if codec else content), digest, None
+    except Exception as e:
+        return None, None, e
+
+
+def read_transcripts(files, workers=DEFAULT_WORKERS, store=None, codec=None):
+    """
+    Read transcripts on a thread pool, in order.
+    
+    Only a bounded window of reads runs ahead of the consumer, so
+    memory doesn't grow with the number of files.
     
     Args:
-        transcripts_dir: Path to the directory containing transcript subdirectories
-        output_csv: Path to the output CSV file
+        files: Iterable of tuples whose last item is the source: a file
+            path, or a RecordLocation in `store`
+        workers: Number of reader threads
+        store: SegmentStore the RecordLocations point into
+        codec: TranscriptCodec to compress each transcript with (content is
+            then its base64 frame)
+    
+    Yields:
+        Each tuple extended with (content, digest, error); either
+        content/digest or error is set. The digest is of the plain text.
+    """
+    window = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcript-reader") as executor:
+        for item in files:
+            window.append((item, executor.submit(_read_transcript, item[-1], store, codec)))
+            if len(window) >= workers * 4:
+                item, future = window.popleft()
+                yield item + future.result()
+        while window:
+            item, future = window.popleft()
+            yield item + future.result()
+
+
+class CsvRowWriter:
     """
-    # Initialize variables
-    call_id = 1000  # Starting call_id
-    rows = []
+    Streams rows to a CSV with every field quoted.
     
-    # Get the transcripts directory path
-    transcripts_path = Path(transcripts_dir)
+    Rows are formatted by hand rather than through csv.writer, which walks
+    every character of a multi-kilobyte transcript. The output is byte for
+    byte what csv.writer(quoting=csv.QUOTE_ALL) writes.
+    """
     
-    if not transcripts_path.exists():
-        raise FileNotFoundError(f"Transcripts directory not found: {transcripts_dir}")
+    def __init__(self, output_path, call_reasons, fieldnames=FIELDNAMES, append=False):
+        self._file = open(output_path, 'a' if append else 'w', newline='', encoding='utf-8')
+        if not append:
+            # Quote all fields for safety
+            csv.writer(self._file, quoting=csv.QUOTE_ALL).writerow(fieldnames)
     
-    print(f"Scanning transcripts directory: {transcripts_path}")
+    def write(self, call_id, call_reason, transcript):
+        self._file.write(f'"{call_id}","{_quote(call_reason)}","{_quote(transcript)}"\r\n')
     
-    # Walk through all subdirectories
-    for call_reason_dir in sorted(transcripts_path.iterdir()):
-        if call_reason_dir.is_dir():
-            call_reason = call_reason_dir.name
-            print(f"Processing {call_reason}...")
-            
-            # Get all .txt files in this subdirectory
-            transcript_files = sorted(call_reason_dir.glob('*.txt'))
-            
-            for transcript_file in transcript_files:
-                try:
-                    # Read the transcript content
-                    with open(transcript_file, 'r', encoding='utf-8') as f:
-                        transcript_content = f.read()
-                    
-                    # Add row to our data
-                    rows.append({
-                        'call_id': call_id,
-                        'call_reason': call_reason,
-                        'transcript': transcript_content
-                    })
-                    
-                    call_id += 1
-                    
-                except Exception as e:
-                    print(f"Error reading {transcript_file}: {e}")
-                    continue
-            
-            print(f"  Processed {len(transcript_files)} files from {call_reason}")
-    
-    # Write to CSV with proper quoting
-    print(f"\nWriting {len(rows)} rows to CSV: {output_csv}")
-    
-    with open(output_csv, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['call_id', 'call_reason', 'transcript']
-        writer = csv.DictWriter(
-            csvfile, 
-            fieldnames=fieldnames,
-            quoting=csv.QUOTE_ALL  # Quote all fields for safety
-        )
+    def close(self):
+        self._file.close()
+
+
+class ArrowRowWriter:
+    """
+    Streams rows to Parquet or an Arrow IPC file in record batches.
+    
+    call_reason is stored as a dictionary column over the category names,
+    so each row holds a small integer instead of the repeated string.
+    """
+    
+    def __init__(self, output_path, call_reasons):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet/Arrow output needs pyarrow: pip install pyarrow") from None
+        
+        self._pa = pa
+        self._reasons = pa.array(list(call_reasons), pa.string())
+        self._reason_index = {reason: i for i, reason in enumerate(call_reasons)}
+        self.schema = pa.schema([
+            ('call_id', pa.int64()),
+            ('call_reason', pa.dictionary(pa.int16(), pa.string())),
+            ('transcript', pa.large_string()),
+        ])
         
-        # Write header
-        writer.writeheader()
+        if Path(output_path).suffix.lower() in PARQUET_SUFFIXES:
+            self._writer = pq.ParquetWriter(str(output_path), self.schema, compression='zstd')
+        else:
+            self._writer = pa.ipc.new_file(str(output_path), self.schema)
         
-        # Write all rows
-        writer.writerows(rows)
+        self._clear()
+    
+    def _clear(self):
+        self._ids, self._reason_ids, self._texts = [], [], []
+        self._buffered_bytes = 0
+    
+    def write(self, call_id, call_reason, transcript):
+        self._ids.append(call_id)
+        self._reason_ids.append(self._reason_index[call_reason])
+        self._texts.append(transcript)
+        self._buffered_bytes += len(transcript)
+        if self._buffered_bytes >= ARROW_BATCH_BYTES:
+            self._flush()
+    
+    def _flush(self):
+        if not self._ids:
+            return
+        pa = self._pa
+        batch = pa.record_batch([
+            pa.array(self._ids, pa.int64()),
+            pa.DictionaryArray.from_arrays(pa.array(self._reason_ids, pa.int16()), self._reasons),
+            pa.array(self._texts, pa.large_string()),
+        ], schema=self.schema)
+        self._writer.write_batch(batch)
+        self._clear()
+    
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def _row_writer(output_path, call_reasons):
+    """Pick the writer for the output file's extension."""
+    suffix = Path(output_path).suffix.lower()
+    if suffix in PARQUET_SUFFIXES + ARROW_SUFFIXES:
+        return ArrowRowWriter(output_path, call_reasons)
+    return CsvRowWriter(output_path, call_reasons)
+
+
+def _train_codec(entries, store, workers, level):
+    """Train a compression dictionary on a sample of the transcripts."""
+    sample = sample_texts(entries, DEFAULT_SAMPLE_SIZE)
+    print(f"\nTraining a compression dictionary on {len(sample)} transcripts...")
+    texts = [content for *_, content, _, error in read_transcripts(sample, workers, store) if error is None]
+    return TranscriptCodec.train(texts, level=level)
+
+
+def _list_transcripts(transcripts_path, store):
+    """
+    List every transcript under transcripts_path.
+    
+    File listings come from the manifest (rescanning only changed folders),
+    packed transcripts from the segment store's index.
+    
+    Returns:
+        (call_reasons, [(call_reason, filename, source), ...]), sorted
+    """
+    call_reasons = {d.name for d in transcripts_path.iterdir() if d.is_dir()}
+    if store:
+        call_reasons.update(store.categories())
+    call_reasons = sorted(call_reasons)
     
-    print(f"✓ Successfully created CSV with {len(rows)} rows")
+    listed = []
+    with TranscriptManifest.open(transcripts_path, categories=call_reasons) as manifest:
+        for call_reason in call_reasons:
+            packed = store.locations(call_reason) if store else {}
+            names = sorted(set(manifest.list(call_reason)).union(packed))
+            folder = os.path.join(transcripts_path, call_reason)
+            listed.extend((call_reason, name, packed.get(name) or os.path.join(folder, name)) for name in names)
+            print(f"  Found {len(names)} transcripts in {call_reason}"
+                  + (f" ({len(packed)} packed)" if packed else ""))
+    return call_reasons, listed
+
+
+def _output_format(output_csv, compress):
+    """How an output is written; an append only continues a file of the same format."""
+    suffix = Path(output_csv).suffix.lower()
+    if suffix in PARQUET_SUFFIXES + ARROW_SUFFIXES:
+        return suffix.lstrip('.')
+    return 'csv+zstd' if compress else 'csv'
+
+
+def default_delta_path(output_csv):
+    """Where --append writes its delta by default: call_transcripts.delta.csv."""
+    output = Path(output_csv)
+    return output.with_name(f"{output.stem}.delta{output.suffix}")
+
+
+def _append_blocker(registry, output_csv, output_format):
+    """Why output_csv can't be appended to, or None if it can."""
+    if output_format not in ('csv', 'csv+zstd'):
+        return "Parquet/Arrow output is always written in full"
+    state = registry.output_state(output_csv)
+    if state is None:
+        return "no earlier build of it is recorded"
+    try:
+        stat = os.stat(output_csv)
+    except FileNotFoundError:
+        return "it doesn't exist"
+    built_format, size, mtime_ns = state
+    if built_format != output_format:
+        return f"it was built as {built_format}"
+    if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+        return "it was modified after it was built"
+    if output_format == 'csv+zstd' and not dictionary_path(output_csv).exists():
+        return "its compression dictionary is missing"
+    return None
+
+
+def _build_full(entries, call_reasons, output_csv, output_format, registry, workers, store,
+                compress, compression_level):
+    """Write every transcript to output_csv. Returns the number of rows."""
+    codec = None
+    if compress:
+        codec = _train_codec(entries, store, workers, compression_level)
+        writer = CsvRowWriter(output_csv, call_reasons, FIELDNAMES[:-1] + [COMPRESSED_COLUMN])
+    else:
+        writer = _row_writer(output_csv, call_reasons)
+    
+    # Read concurrently, write in call_id order as the reads complete
+    print(f"\nReading {len(entries)} files with {workers} threads and writing to: {output_csv}")
+    
+    # Stamps are taken before each read, so a file changed mid-build is reread next time
+    stamped = ((call_id, call_reason, _source_stamp(source), source) for call_id, call_reason, source in entries)
+    built = []
+    reason_counts = {}
+    try:
+        for call_id, call_reason, stamp, transcript_file, content, digest, error in read_transcripts(
+                stamped, workers, store, codec):
+            if error is not None:
+                print(f"Error reading {transcript_file}: {error}")
+                continue
+            
+            writer.write(call_id, call_reason, content)
+            built.append((call_id, stamp, digest))
+            reason_counts[call_reason] = reason_counts.get(call_reason, 0) + 1
+    finally:
+        writer.close()
+    
+    if codec:
+        codec.save(dictionary_path(output_csv))
+    elif dictionary_path(output_csv).exists():
+        # Left over from an earlier compressed build
+        dictionary_path(output_csv).unlink()
+    registry.record_build(output_csv, output_format, built, replace=True)
+    
+    rows = len(built)
+    print(f"✓ Successfully created {Path(output_csv).suffix.lstrip('.').upper() or 'CSV'} with {rows} rows")
     print(f"  Output file: {output_csv}")
     
     # Print summary statistics
     print("\nSummary by call_reason:")
-    reason_counts = {}
-    for row in rows:
-        reason = row['call_reason']
-        reason_counts[reason] = reason_counts.get(reason, 0) + 1
-    
     for reason, count in sorted(reason_counts.items()):
         print(f"  {reason}: {count} transcripts")
+    
+    return rows
+
+
+def _patch_csv(output_csv, fieldnames, new_rows, removed):
+    """Rewrite output_csv with new_rows merged in by call_id and removed call_ids dropped."""
+    def kept_rows(reader):
+        for row in reader:
+            call_id = int(row[0])
+            if call_id not in removed and call_id not in new_rows:
+                yield call_id, row[1], row[2]
+    
+    patched = f"{output_csv}.tmp"
+    added = ((call_id, new_rows[call_id][0], new_rows[call_id][1]) for call_id in sorted(new_rows))
+    with open(output_csv, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader)
+        writer = CsvRowWriter(patched, None, fieldnames)
+        try:
+            for call_id, call_reason, content in heapq.merge(kept_rows(reader), added, key=lambda row: row[0]):
+                writer.write(call_id, call_reason, content)
+        finally:
+            writer.close()
+    os.replace(patched, output_csv)
+
+
+def _write_delta(delta_csv, fieldnames, new_rows, removed, registry):
+    """Write the rows an append added, changed or removed, with a change column."""
+    with open(delta_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(fieldnames + ['change'])
+        for call_id in sorted(set(new_rows).union(removed)):
+            if call_id in new_rows:
+                writer.writerow([call_id, *new_rows[call_id]])
+            else:
+                writer.writerow([call_id, registry.lookup(call_id)[0], '', 'removed'])
+
+
+def _append_rows(entries, output_csv, output_format, registry, workers, store, compression_level, delta_csv):
+    """
+    Bring an existing CSV up to date, reading only new or changed transcripts.
+    
+    Returns:
+        Number of rows now in the CSV
+    """
+    recorded = registry.ingested(output_csv)
+    codec = None
+    fieldnames = FIELDNAMES
+    if output_format == 'csv+zstd':
+        codec = TranscriptCodec.load(dictionary_path(output_csv), compression_level)
+        fieldnames = FIELDNAMES[:-1] + [COMPRESSED_COLUMN]
+    
+    current = {call_id for call_id, _, _ in entries}
+    removed = sorted(set(recorded) - current)
+    to_read = []
+    for call_id, call_reason, source in entries:
+        stamp = _source_stamp(source)
+        if call_id not in recorded or recorded[call_id][0] != stamp:
+            to_read.append((call_id, call_reason, stamp, source))
+    print(f"\nAppending to {output_csv}: {len(to_read)} of {len(entries)} transcripts are new or touched, "
+          f"{len(removed)} removed")
+    
+    # call_id -> (call_reason, content, change)
+    new_rows = {}
+    refreshed = []
+    for call_id, call_reason, stamp, transcript_file, content, digest, error in read_transcripts(
+            to_read, workers, store, codec):
+        if error is not None:
+            # A row that fails to read keeps its last good version
+            print(f"Error reading {transcript_file}: {error}")
+            continue
+        if call_id in recorded:
+            if digest == recorded[call_id][1]:
+                # Touched but not changed: only its stamp is refreshed
+                refreshed.append((call_id, stamp, digest))
+                continue
+            new_rows[call_id] = (call_reason, content, 'changed')
+        else:
+            new_rows[call_id] = (call_reason, content, 'added')
+        refreshed.append((call_id, stamp, digest))
+    
+    added = sum(1 for *_, change in new_rows.values() if change == 'added')
+    changed = len(new_rows) - added
+    only_appends = (not removed and not changed
+                    and (not new_rows or min(new_rows) > max(recorded, default=FIRST_CALL_ID - 1)))
+    if only_appends:
+        writer = CsvRowWriter(output_csv, None, fieldnames, append=True)
+        try:
+            for call_id in sorted(new_rows):
+                writer.write(call_id, *new_rows[call_id][:2])
+        finally:
+            writer.close()
+    else:
+        _patch_csv(output_csv, fieldnames, new_rows, set(removed))
+    
+    delta_csv = delta_csv or default_delta_path(output_csv)
+    _write_delta(delta_csv, fieldnames, new_rows, removed, registry)
+    copy_dictionary(output_csv, delta_csv)
+    registry.record_build(output_csv, output_format, refreshed, removed=removed)
+    
+    rows = len(recorded) - len(removed) + added
+    how = "appended in place" if only_appends else "patched in"
+    print(f"✓ {added} added, {changed} changed, {len(removed)} removed ({how}); "
+          f"{len(entries) - len(new_rows)} unchanged")
+    print(f"  Output file: {output_csv} ({rows} rows)")
+    print(f"  Delta: {delta_csv}")
+    return rows
+
+
+def create_transcript_csv(transcripts_dir, output_csv, workers=DEFAULT_WORKERS, compress=False,
+                          compression_level=DEFAULT_LEVEL, append=False, delta_csv=None):
+    """
+    Create a CSV from transcript files in subdirectories.
+    
+    Args:
+        transcripts_dir: Path to the directory containing transcript subdirectories
+        output_csv: Path to the output file (.csv, or .parquet/.arrow/.feather for columnar output)
+        workers: Number of threads reading files
+        compress: Store dictionary-compressed transcripts in a transcript_zst
+            column, with the dictionary in {output_csv}.zdict (CSV only)
+        compression_level: zstd level
+        append: Update an earlier build of output_csv with only the new and
+            changed transcripts (falls back to a full build if it can't)
+        delta_csv: Where an append writes its delta (default: next to
+            output_csv, e.g. call_transcripts.delta.csv)
+    
+    Returns:
+        Number of rows in the output
+    """
+    # Get the transcripts directory path
+    transcripts_path = Path(transcripts_dir)
+    
+    if not transcripts_path.exists():
+        raise FileNotFoundError(f"Transcripts directory not found: {transcripts_dir}")
+    if compress and Path(output_csv).suffix.lower() in PARQUET_SUFFIXES + ARROW_SUFFIXES:
+        raise ValueError("--compress applies to CSV output; Parquet/Arrow output is compressed by the format")
+    
+    print(f"Scanning transcripts directory: {transcripts_path}")
+    
+    store = SegmentStore(transcripts_path) if SegmentStore.exists(transcripts_path) else None
+    try:
+        call_reasons, listed = _list_transcripts(transcripts_path, store)
+        with CallIdRegistry(transcripts_path) as registry:
+            # Existing transcripts keep their call_ids; new ones are numbered after the highest
+            call_ids = registry.assign((call_reason, name) for call_reason, name, _ in listed)
+            entries = sorted(((call_ids[(call_reason, name)], call_reason, source)
+                              for call_reason, name, source in listed), key=lambda entry: entry[0])
+            output_format = _output_format(output_csv, compress)
+            
+            if append:
+                blocker = _append_blocker(registry, output_csv, output_format)
+                if blocker is None:
+                    return _append_rows(entries, output_csv, output_format, registry, workers, store,
+                                        compression_level, delta_csv)
+                print(f"\n↻ Building {output_csv} in full: {blocker}")
+                # A delta from an earlier append no longer describes this output
+                stale_delta = Path(delta_csv or default_delta_path(output_csv))
+                for path in (stale_delta, dictionary_path(stale_delta)):
+                    if path.exists():
+                        path.unlink()
+            
+            return _build_full(entries, call_reasons, output_csv, output_format, registry, workers, store,
+                               compress, compression_level)
+    finally:
+        if store:
+            store.close()
 
 
 if __name__ == "__main__":
+    import argparse
+    
     # Set paths relative to this script
     script_dir = Path(__file__).parent
-    transcripts_dir = script_dir / "transcripts"
-    output_csv = script_dir / "call_transcripts.csv"
+    
+    parser = argparse.ArgumentParser(description="Collect transcript files into one CSV (or Parquet/Arrow file)")
+    parser.add_argument("--transcripts-dir", default=str(script_dir / "transcripts"),
+                       help="Folder of category subfolders (default: ./transcripts)")
+    parser.add_argument("--output", default=str(script_dir / "call_transcripts.csv"),
+                       help="Output file; .parquet/.arrow/.feather for columnar output (needs pyarrow)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                       help=f"Threads reading files (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--compress", action="store_true",
+                       help="Store dictionary-compressed transcripts (transcript_zst column; needs zstandard)")
+    parser.add_argument("--compression-level", type=int, default=DEFAULT_LEVEL,
+                       help=f"zstd level for --compress (default: {DEFAULT_LEVEL})")
+    parser.add_argument("--append", action="store_true",
+                       help="Only read transcripts that are new or changed since the last build of --output")
+    parser.add_argument("--delta",
+                       help="Where --append writes the added/changed/removed rows (default: <output>.delta.csv)")
+    args = parser.parse_args()
     
     # Create the CSV
-    create_transcript_csv(transcripts_dir, output_csv)
+    create_transcript_csv(args.transcripts_dir, args.output, workers=args.workers,
+                          compress=args.compress, compression_level=args.compression_level,
+                          append=args.append, delta_csv=args.delta)
     
     print("\n" + "="*60)
     print("CSV creation complete!")
     print("="*60)
-
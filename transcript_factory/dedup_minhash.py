@@ -0,0 +1,371 @@
+"""
+Near-Duplicate Detection
+========================
+MinHash signatures plus an LSH (locality-sensitive hashing) index, for
+spotting transcripts that are nearly identical to one already in the
+corpus. Every request for a category sends the same prompt, so at
+temperature 1 some outputs come back as near copies of each other.
+
+    index = MinHashIndex(threshold=0.8)
+    match = index.query(text)          # ("billing_inquiry/..._0042.txt", 0.91) or None
+    index.add("billing_inquiry/billing_inquiry_0043.txt", text)
+
+How it works:
+- A transcript is reduced to its set of word 5-grams (shingles).
+- `num_perm` hash permutations are applied with numpy. The minimum of each
+  one forms the signature. The fraction of positions where two signatures
+  agree estimates the Jaccard similarity of their shingle sets.
+- The signature is cut into `bands` bands. Transcripts that match exactly
+  in any band become candidates, and only candidates are compared. Bands
+  and rows are chosen so pairs above `threshold` almost always collide.
+
+A query costs one signature and a few dict lookups, so it takes well under
+a millisecond at any corpus size.
+
+Standalone scan of an existing transcripts tree:
+
+    python dedup_minhash.py transcripts --threshold 0.8 --output near_duplicates.csv
+"""
+
+import argparse
+import csv
+import os
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from transcript_manifest import TranscriptManifest
+
+DEFAULT_NUM_PERM = 128
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_SHINGLE_SIZE = 5
+SIGNATURES_FILENAME = "dedup_signatures.npz"
+
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def _mix32(values: np.ndarray) -> np.ndarray:
+    """Murmur3's 32-bit finalizer: a bijection that spreads every input bit."""
+    values = values ^ (values >> np.uint32(16))
+    values = values * np.uint32(0x85EBCA6B)
+    values = values ^ (values >> np.uint32(13))
+    values = values * np.uint32(0xC2B2AE35)
+    return values ^ (values >> np.uint32(16))
+
+
+def choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    Pick (bands, rows) with bands * rows == num_perm whose LSH threshold
+    (1/bands) ** (1/rows) comes closest to `threshold` without exceeding it.
+    """
+    best = (num_perm, 1)
+    best_gap = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        lsh_threshold = (1 / bands) ** (1 / rows)
+        # Staying below the target keeps false negatives rare; the exact
+        # signature comparison filters the extra candidates
+        if lsh_threshold > threshold:
+            continue
+        gap = threshold - lsh_threshold
+        if best_gap is None or gap < best_gap:
+            best, best_gap = (bands, rows), gap
+    return best
+
+
+class MinHashIndex:
+    """Streaming MinHash/LSH index of transcripts keyed by "category/filename"."""
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        num_perm: int = DEFAULT_NUM_PERM,
+        shingle_size: int = DEFAULT_SHINGLE_SIZE,
+        seed: int = 1
+    ):
+        """
+        Args:
+            threshold: Estimated Jaccard similarity at or above which two
+                transcripts count as near-duplicates
+            num_perm: Number of hash permutations (signature length)
+            shingle_size: Words per shingle
+            seed: Seed for the permutations (signatures are only comparable
+                between indexes built with the same seed and num_perm)
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+
+        # Permutations of the 32-bit hash space: h -> a * h + b (mod 2**32), a odd
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64).astype(np.uint32) | np.uint32(1)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64).astype(np.uint32)
+
+        self.keys: List[str] = []
+        self._signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._count = 0
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self._positions: Dict[str, int] = {}
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key: str):
+        return key in self._positions
+
+    # -- Signatures -------------------------------------------------------
+
+    def _shingle_hashes(self, text: str) -> np.ndarray:
+        # Whitespace words (crc32 is stable across processes, unlike hash())
+        words = text.lower().split()
+        if not words:
+            return np.zeros(1, dtype=np.uint32)
+        word_hashes = np.fromiter(map(zlib.crc32, map(str.encode, words)), dtype=np.uint64, count=len(words))
+        k = min(self.shingle_size, len(words))
+        # Polynomial combination of k consecutive word hashes, mod 2**32
+        shingles = np.zeros(len(words) - k + 1, dtype=np.uint64)
+        for offset in range(k):
+            shingles = (shingles * np.uint64(1_000_003) + word_hashes[offset:len(words) - k + 1 + offset]) & _MAX_HASH
+        return _mix32(np.unique(shingles).astype(np.uint32))
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature (num_perm uint32 values) of a transcript."""
+        # Shingle hashes are already mixed, so an affine map per permutation
+        # is enough; uint32 arithmetic wraps mod 2**32
+        permuted = np.multiply.outer(self._shingle_hashes(text), self._a)
+        permuted += self._b
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    # -- Index ------------------------------------------------------------
+
+    def query(self, text: str = None, signature: Optional[np.ndarray] = None) -> Optional[Tuple[str, float]]:
+        """
+        Find the most similar indexed transcript at or above the threshold.
+
+        Args:
+            text: Transcript text (or pass a precomputed signature)
+            signature: Signature from signature()
+
+        Returns:
+            (key, estimated_similarity) of the best match, or None
+        """
+        if signature is None:
+            signature = self.signature(text)
+        candidates = set()
+        for band, band_key in enumerate(self._band_keys(signature)):
+            candidates.update(self._buckets[band].get(band_key, ()))
+        if not candidates:
+            return None
+
+        rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarities = (self._signatures[rows] == signature).mean(axis=1)
+        best = int(similarities.argmax())
+        if similarities[best] < self.threshold:
+            return None
+        return self.keys[rows[best]], float(similarities[best])
+
+    def add(self, key: str, text: str = None, signature: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Index a transcript. Adding a key that is already indexed does nothing.
+
+        Returns:
+            The transcript's signature
+        """
+        if signature is None:
+            signature = self.signature(text)
+        if key in self._positions:
+            return signature
+
+        if self._count == len(self._signatures):
+            grown = np.empty((max(1024, 2 * self._count), self.num_perm), dtype=np.uint32)
+            grown[:self._count] = self._signatures[:self._count]
+            self._signatures = grown
+        position = self._count
+        self._signatures[position] = signature
+        self._count += 1
+        self.keys.append(key)
+        self._positions[key] = position
+        for band, band_key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(band_key, []).append(position)
+        return signature
+
+    def check_and_add(self, key: str, text: str) -> Optional[Tuple[str, float]]:
+        """query() then add(), computing the signature once."""
+        signature = self.signature(text)
+        match = self.query(signature=signature)
+        self.add(key, signature=signature)
+        return match
+
+    # -- Persistence ------------------------------------------------------
+
+    def save(self, path):
+        """Write keys and signatures to an .npz file (buckets are rebuilt on load)."""
+        path = Path(path)
+        # Write aside and rename, so concurrent workers never see a torn file
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(
+                f,
+                keys=np.array(self.keys, dtype=str),
+                signatures=self._signatures[:self._count],
+                params=np.array([self.num_perm, self.shingle_size, self.seed])
+            )
+        os.replace(tmp_path, path)
+
+    def load(self, path, only: Optional[set] = None) -> int:
+        """
+        Add the signatures saved by save(), skipping keys already indexed.
+
+        Args:
+            path: File written by save()
+            only: If given, load just these keys
+
+        Returns:
+            Number of signatures loaded (0 if the file was built with
+            different parameters)
+        """
+        with np.load(path) as data:
+            if list(data["params"]) != [self.num_perm, self.shingle_size, self.seed]:
+                return 0
+            keys, signatures = data["keys"], data["signatures"]
+        loaded = 0
+        for key, signature in zip(keys.tolist(), signatures):
+            if only is None or key in only:
+                self.add(key, signature=signature)
+                loaded += 1
+        return loaded
+
+    @classmethod
+    def for_corpus(
+        cls,
+        base_dir,
+        categories: Optional[Iterable[str]] = None,
+        cache: bool = True,
+        store=None,
+        **kwargs
+    ) -> "MinHashIndex":
+        """
+        Index every transcript under base_dir (listed from the manifest,
+        or from `store`, a SegmentStore, when transcripts are packed).
+
+        With `cache`, signatures are kept in {base_dir}/dedup_signatures.npz,
+        so later runs only read and hash the transcripts added since.
+        """
+        base_dir = Path(base_dir)
+        index = cls(**kwargs)
+        if store is not None:
+            corpus = [(category, filename)
+                      for category in (categories or store.categories())
+                      for filename in store.list(category)]
+        else:
+            with TranscriptManifest.open(base_dir, categories=categories) as manifest:
+                corpus = [(category, filename)
+                          for category in (categories or manifest.categories())
+                          for filename in manifest.list(category)]
+
+        # Cached signatures of files that were since deleted are dropped
+        cache_path = base_dir / SIGNATURES_FILENAME
+        if cache and cache_path.exists():
+            index.load(cache_path, only={f"{category}/{filename}" for category, filename in corpus})
+
+        added = 0
+        for category, filename in corpus:
+            key = f"{category}/{filename}"
+            if key in index:
+                continue
+            if store is not None:
+                index.add(key, store.get_file(category, filename))
+            else:
+                with open(base_dir / category / filename, "r", encoding="utf-8") as f:
+                    index.add(key, f.read())
+            added += 1
+
+        if cache and added:
+            index.save(cache_path)
+        return index
+
+
+def scan_corpus(base_dir, threshold: float = DEFAULT_THRESHOLD, num_perm: int = DEFAULT_NUM_PERM,
+                shingle_size: int = DEFAULT_SHINGLE_SIZE) -> List[dict]:
+    """
+    Find near-duplicates in an existing transcripts tree.
+
+    Files are visited in manifest order; each one is compared against the
+    files before it, so the first copy is kept as the original.
+
+    Returns:
+        One dict per near-duplicate: category, filename, duplicate_of, similarity
+    """
+    base_dir = Path(base_dir)
+    index = MinHashIndex(threshold=threshold, num_perm=num_perm, shingle_size=shingle_size)
+    duplicates = []
+    with TranscriptManifest.open(base_dir) as manifest:
+        for category in manifest.categories():
+            for filename in manifest.list(category):
+                with open(base_dir / category / filename, "r", encoding="utf-8") as f:
+                    match = index.check_and_add(f"{category}/{filename}", f.read())
+                if match:
+                    duplicates.append({
+                        "category": category,
+                        "filename": filename,
+                        "duplicate_of": match[0],
+                        "similarity": round(match[1], 3)
+                    })
+    return duplicates
+
+
+def write_duplicates_csv(duplicates: List[dict], output_csv):
+    """Write near-duplicate records (see scan_corpus) to a CSV file."""
+    with open(output_csv, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["category", "filename", "duplicate_of", "similarity"])
+        writer.writeheader()
+        writer.writerows(duplicates)
+
+
+def main():
+    """Scan a transcripts tree for near-duplicates."""
+    parser = argparse.ArgumentParser(description="Find near-duplicate transcripts with MinHash/LSH")
+    parser.add_argument("base_dir", nargs="?", default=str(Path(__file__).parent / "transcripts"),
+                       help="Transcripts root (default: ./transcripts)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                       help=f"Estimated Jaccard similarity that counts as a duplicate (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM,
+                       help=f"MinHash signature length (default: {DEFAULT_NUM_PERM})")
+    parser.add_argument("--shingle-size", type=int, default=DEFAULT_SHINGLE_SIZE,
+                       help=f"Words per shingle (default: {DEFAULT_SHINGLE_SIZE})")
+    parser.add_argument("--output", type=str, default=None,
+                       help="Write the duplicates to this CSV file")
+    args = parser.parse_args()
+
+    print(f"🔍 Scanning {args.base_dir} for near-duplicates (threshold {args.threshold})...")
+    duplicates = scan_corpus(args.base_dir, args.threshold, args.num_perm, args.shingle_size)
+
+    by_category = {}
+    for duplicate in duplicates:
+        by_category[duplicate["category"]] = by_category.get(duplicate["category"], 0) + 1
+    print(f"\n{'⚠️ ' if duplicates else '✓'} {len(duplicates)} near-duplicate transcripts found")
+    for category, count in sorted(by_category.items()):
+        print(f"  {category}: {count}")
+    for duplicate in duplicates[:10]:
+        print(f"  - {duplicate['category']}/{duplicate['filename']} ~ {duplicate['duplicate_of']} "
+              f"({duplicate['similarity']:.0%})")
+    if len(duplicates) > 10:
+        print(f"  ... and {len(duplicates) - 10} more")
+
+    if args.output:
+        write_duplicates_csv(duplicates, args.output)
+        print(f"\n📄 Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -5,6 +5,8 @@ Generates 1,000 transcripts with specific category ratios:
 - 700 outage (technical_support)
 - 150 billing (billing_inquiry)
 - 150 upgrade (account_management)
+
+Use --workers N to run N API calls at once (see TranscriptFactory).
 """
 
 import os
@@ -13,8 +15,13 @@ from generate_transcripts import TranscriptFactory
 from datetime import datetime
 
 
-def generate_bulk_with_ratio():
-    """Generate 1,000 transcripts with specified ratio."""
+def generate_bulk_with_ratio(workers=1):
+    """
+    Generate 1,000 transcripts with specified ratio.
+    
+    Args:
+        workers: Number of API calls to run at once
+    """
     
     # Define the counts for each category
     category_counts = {
@@ -32,11 +39,12 @@ def generate_bulk_with_ratio():
     print("\nBreakdown by category:")
     for category, count in category_counts.items():
         print(f"  - {category}: {count} transcripts")
+    print(f"\nWorkers: {workers}")
     print("\n" + "=" * 80)
     
     # Initialize the factory
     try:
-        factory = TranscriptFactory()
+        factory = TranscriptFactory(workers=workers)
     except ValueError as e:
         print(f"\n❌ Error: {e}")
         print("\nPlease set your ANTHROPIC_API_KEY environment variable:")
@@ -55,35 +63,40 @@ def generate_bulk_with_ratio():
         print(f"Target: {count} transcripts")
         print(f"{'=' * 80}\n")
         
-        for i in range(count):
+        # Numbered filenames are fixed up front, so they stay in order
+        # even when several workers finish out of order
+        jobs = [(category, f"{category}_{i+1:04d}") for i in range(count)]
+        completed = 0
+        
+        for _, filename, transcript, error in factory.generate_jobs(jobs):
+            if error:
+                print(f"\n⚠️  Error generating transcript {filename} for {category}: {error}")
+                print("Continuing with next transcript...")
+                continue
+            
             try:
-                # Generate transcript
-                transcript = factory.generate_transcript(category)
-                
-                # Save with numbered filename
-                filename = f"{category}_{i+1:04d}"
                 factory.save_transcript(category, transcript, custom_filename=filename)
-                
-                total_generated += 1
-                
-                # Progress update every 10 transcripts
-                if (i + 1) % 10 == 0:
-                    elapsed = (datetime.now() - start_time).total_seconds()
-                    avg_time = elapsed / total_generated
-                    remaining = (total_count - total_generated) * avg_time
-                    
-                    print(f"\n📊 Progress Update:")
-                    print(f"  - {category}: {i+1}/{count} completed")
-                    print(f"  - Overall: {total_generated}/{total_count} ({total_generated/total_count*100:.1f}%)")
-                    print(f"  - Avg time per transcript: {avg_time:.2f}s")
-                    print(f"  - Est. time remaining: {remaining/60:.1f} minutes")
-                
             except Exception as e:
-                print(f"\n⚠️  Error generating transcript {i+1} for {category}: {e}")
+                print(f"\n⚠️  Error saving transcript {filename} for {category}: {e}")
                 print("Continuing with next transcript...")
                 continue
+            
+            completed += 1
+            total_generated += 1
+            
+            # Progress update every 10 transcripts
+            if completed % 10 == 0:
+                elapsed = (datetime.now() - start_time).total_seconds()
+                avg_time = elapsed / total_generated
+                remaining = (total_count - total_generated) * avg_time
+                
+                print(f"\n📊 Progress Update:")
+                print(f"  - {category}: {completed}/{count} completed")
+                print(f"  - Overall: {total_generated}/{total_count} ({total_generated/total_count*100:.1f}%)")
+                print(f"  - Avg time per transcript: {avg_time:.2f}s")
+                print(f"  - Est. time remaining: {remaining/60:.1f} minutes")
         
-        print(f"\n✅ Completed {category}: {count} transcripts generated")
+        print(f"\n✅ Completed {category}: {completed}/{count} transcripts generated")
     
     # Final summary
     end_time = datetime.now()
@@ -107,8 +120,15 @@ def generate_bulk_with_ratio():
 
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Generate 1,000 transcripts with the standard category ratio")
+    parser.add_argument("--workers", type=int, default=1,
+                       help="Number of API calls to run at once (default: 1)")
+    args = parser.parse_args()
+    
     try:
-        exit_code = generate_bulk_with_ratio()
+        exit_code = generate_bulk_with_ratio(workers=args.workers)
         exit(exit_code)
     except KeyboardInterrupt:
         print("\n\n⚠️  Generation interrupted by user")
@@ -9,16 +9,53 @@ Generates 1,000 transcripts with specific category ratios using parallel request
 Uses asyncio for concurrent API calls with rate limiting to respect:
 - 4K requests per minute
 - 4M input tokens per minute
+
+Both budgets are enforced by a token-bucket limiter (see rate_limiter.py)
+that also adapts to 429s and the API's rate-limit headers. Transcripts are
+written to disk as soon as each one completes (see transcript_writer.py).
+The number of requests in flight adapts to latency and congestion, up to
+max_concurrent (see concurrency.py).
+
+With --stream, responses are streamed: text is appended to a .part file as
+it arrives, a request only times out if no data arrives for
+--idle-timeout seconds, and time-to-first-token and tokens/s are recorded.
+
+Large runs can be split across processes and hosts that share the output
+folder, either with static shards (--shard i/N) or with lease files that
+workers claim block by block (--lease-dir DIR); see shard_lease.py.
 """
 
 import os
+import sys
+import time
 import asyncio
+import itertools
+import subprocess
+import tempfile
+import threading
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 import anthropic
+import httpx
 from collections import defaultdict
 
+from batch_backend import BatchTranscriptBackend
+from concurrency import AdaptiveConcurrencyLimiter
+from generation_metrics import GenerationMetrics, RequestRecord, format_seconds
+from http_pool import DEFAULT_KEEPALIVE_EXPIRY, ConnectionStats, build_http_client, http2_available, prewarm
+from job_journal import JobJournal, DONE, FAILED, IN_FLIGHT
+from multi_transcript import group_jobs, multi_transcript_instructions, split_transcripts
+from rate_limiter import DEFAULT_INPUT_TOKENS_PER_MINUTE, DEFAULT_REQUESTS_PER_MINUTE, AsyncRateLimiter
+from retry_policy import IncompleteStreamError, RetryPolicy
+from segment_store import SegmentStore
+from shard_lease import (
+    DEFAULT_BLOCK_SIZE, DEFAULT_LEASE_TTL, LeaseManager, StaticShard,
+    missing_indices, parse_shard, sharded_jobs
+)
+from transcript_manifest import TranscriptManifest
+from transcript_writer import AsyncTranscriptWriter
+
 
 class ParallelTranscriptFactory:
     """Factory for generating synthetic call transcripts with parallel processing."""
@@ -32,41 +69,201 @@ class ParallelTranscriptFactory:
         "service_activation": "upgrade_details.txt"
     }
     
-    def __init__(self, api_key=None, max_concurrent=50, requests_per_minute=3800):
+    BACKENDS = ("interactive", "batch")
+    STORAGES = ("files", "segments")
+    DEDUP_ACTIONS = ("flag", "requeue")
+    
+    # A transcript that keeps coming back as a near-duplicate is kept
+    # (and flagged) after this many regenerations
+    MAX_DEDUP_REGENERATIONS = 2
+    
+    # Requests spent on one group of transcripts before its missing
+    # indices are given up on (see generate_transcript_group)
+    MAX_GROUP_ROUNDS = 3
+    
+    # Rough characters-per-token ratio used until the API reports real usage
+    CHARS_PER_TOKEN = 3.5
+    
+    # Streamed text is flushed to the .part file in chunks of about this size
+    STREAM_FLUSH_CHARS = 4096
+    
+    def __init__(
+        self,
+        api_key=None,
+        max_concurrent=50,
+        requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+        input_tokens_per_minute=DEFAULT_INPUT_TOKENS_PER_MINUTE,
+        max_attempts=5,
+        backend="interactive",
+        base_url=None,
+        batch_poll_interval=30.0,
+        prompt_caching=True,
+        client=None,
+        request_timeout=60.0,
+        adaptive_concurrency=True,
+        initial_concurrency=None,
+        streaming=False,
+        stream_idle_timeout=30.0,
+        http2=None,
+        keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY,
+        dedup_index=None,
+        dedup_action="flag",
+        transcripts_per_request=1,
+        storage="files"
+    ):
         """
         Initialize the factory with Anthropic API key and rate limiting.
         
         Args:
             api_key: Anthropic API key (defaults to env var)
-            max_concurrent: Maximum concurrent requests (default: 50)
+            max_concurrent: Ceiling on concurrent requests (default: 50)
             requests_per_minute: Max requests per minute (default: 3800, under 4K limit)
+            input_tokens_per_minute: Max input tokens per minute (default: 3.8M, under 4M limit)
+            max_attempts: Attempts per transcript before giving up (default: 5)
+            backend: "interactive" (one request per transcript) or "batch"
+                (Message Batches API, cheaper for very large runs)
+            base_url: Optional API base URL (e.g. a local stand-in server)
+            batch_poll_interval: Seconds between status checks in batch mode
+            prompt_caching: Mark the static prompt for provider-side prompt caching
+            client: Optional pre-built async client. Anything exposing the
+                `messages.with_raw_response.create(...)` (and, for batch mode,
+                `messages.batches`) surface of anthropic.AsyncAnthropic works,
+                e.g. simulated_client.SimulatedAnthropicClient for offline runs.
+                When given, no API key is needed.
+            request_timeout: Seconds before a single request is abandoned and retried
+                (non-streaming mode)
+            adaptive_concurrency: Grow and shrink the number of in-flight
+                requests from observed latency, 429s and timeouts (AIMD);
+                if False, always run max_concurrent requests
+            initial_concurrency: Starting limit in adaptive mode
+                (default: min(10, max_concurrent))
+            streaming: Stream responses, writing text to disk as it arrives
+                and timing out only when the stream goes idle
+            stream_idle_timeout: Seconds without a stream event before a
+                streaming request is abandoned and retried
+            http2: Use HTTP/2 (default: if the h2 package is installed)
+            keepalive_expiry: Seconds idle pooled connections stay open
+            dedup_index: Optional dedup_minhash.MinHashIndex; every new
+                transcript is checked against it and then added
+            dedup_action: What to do with a near-duplicate: "flag" (save it
+                and list it in self.duplicates) or "requeue" (regenerate it,
+                up to MAX_DEDUP_REGENERATIONS times)
+            transcripts_per_request: Transcripts asked for in each response
+                (interactive backend). K > 1 cuts input tokens and requests
+                per transcript by about K; keep K transcripts within max_tokens
+            storage: "files" (one .txt per transcript) or "segments" (appended
+                to the packed segment store under base_dir)
         """
-        self.api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
-        if not self.api_key:
-            raise ValueError("ANTHROPIC_API_KEY not found. Set it as environment variable or pass to constructor.")
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Invalid backend. Must be one of: {self.BACKENDS}")
+        if storage not in self.STORAGES:
+            raise ValueError(f"Invalid storage. Must be one of: {self.STORAGES}")
+        if dedup_action not in self.DEDUP_ACTIONS:
+            raise ValueError(f"Invalid dedup_action. Must be one of: {self.DEDUP_ACTIONS}")
         
-        self.client = anthropic.AsyncAnthropic(api_key=self.api_key)
+        self.api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
+        self.http2 = False
+        self.connection_stats = None
+        if client is None:
+            if not self.api_key:
+                raise ValueError("ANTHROPIC_API_KEY not found. Set it as environment variable or pass to constructor.")
+            
+            # Connection pool sized to the concurrency ceiling, with reuse stats
+            self.http2 = http2_available() if http2 is None else http2
+            self.connection_stats = ConnectionStats()
+            http_client = build_http_client(
+                max_concurrent,
+                keepalive_expiry=keepalive_expiry,
+                http2=self.http2,
+                stats=self.connection_stats
+            )
+            
+            # Retries are handled by our own RetryPolicy, not the SDK
+            client = anthropic.AsyncAnthropic(
+                api_key=self.api_key,
+                base_url=base_url,
+                max_retries=0,
+                http_client=http_client
+            )
+        self.client = client
         self.base_dir = Path(__file__).parent
+        self.prompts_dir = self.base_dir.parent / "prompts"
         self.prompt_template = self._load_prompt()
         
+        # Rendered prompts and request messages, built once per category
+        self.prompt_caching = prompt_caching
+        self._rendered_prompts = {}
+        self._messages_by_category = {}
+        for category in self.CATEGORY_DETAILS_MAP:
+            self._build_messages(category)
+        
         # Rate limiting
         self.max_concurrent = max_concurrent
         self.requests_per_minute = requests_per_minute
-        self.min_delay_between_requests = 60.0 / requests_per_minute  # seconds between requests
+        self.input_tokens_per_minute = input_tokens_per_minute
+        self.rate_limiter = AsyncRateLimiter(requests_per_minute, input_tokens_per_minute)
         
-        # Semaphore for controlling concurrent requests
-        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.request_timeout = request_timeout
+        self.transcripts_per_request = max(1, transcripts_per_request)
+        self.streaming = streaming
+        self.stream_idle_timeout = stream_idle_timeout
+        
+        # Limit on in-flight requests: AIMD-tuned up to max_concurrent, or fixed
+        self.adaptive_concurrency = adaptive_concurrency
+        if adaptive_concurrency:
+            self.concurrency = AdaptiveConcurrencyLimiter(max_concurrent, initial_limit=initial_concurrency)
+        else:
+            self.concurrency = AdaptiveConcurrencyLimiter.fixed(max_concurrent)
+        
+        # Classified retries: backoff for 429/5xx/timeouts, none for other 4xx
+        self.retry_policy = RetryPolicy(max_attempts=max_attempts)
+        
+        # Generation backend used by generate_batch
+        self.backend = backend
+        self.batch_backend = BatchTranscriptBackend(self, poll_interval=batch_poll_interval)
+        
+        # Last observed input token usage per category (refines the estimate)
+        self._input_tokens_by_category = {}
+        
+        # Refuse to overwrite an existing transcript (set when several
+        # workers share the output folder)
+        self.no_clobber = False
+        
+        # Index of saved transcripts, opened on first use (see manifest).
+        # Files are saved from writer threads, so the manifest and segment
+        # store are opened under a lock
+        self._manifest = None
+        self._open_lock = threading.Lock()
+        
+        # "files": one .txt per transcript; "segments": packed into the
+        # segment store (see segment_store.py), opened on first use
+        self.storage = storage
+        self._segment_store = None
+        
+        # Near-duplicate detection (interactive backend only)
+        self.dedup_index = dedup_index
+        self.dedup_action = dedup_action
+        self.duplicates = []
+        
+        # Per-request timings and token usage (see generation_metrics)
+        self.metrics = GenerationMetrics()
         
         # Stats tracking
         self.stats = {
             "total_generated": 0,
             "errors": 0,
-            "by_category": defaultdict(int)
+            "retries": 0,
+            "cached_input_tokens": 0,
+            "duplicates_flagged": 0,
+            "duplicates_requeued": 0,
+            "by_category": defaultdict(int),
+            # Streaming mode: one record per request with ttft / tokens_per_second
+            "stream_timings": []
         }
     
     def _load_prompt(self):
         """Load the prompt template from prompt.txt"""
-        prompt_path = self.base_dir.parent / "prompts" / "prompt.txt"
+        prompt_path = self.prompts_dir / "prompt.txt"
         with open(prompt_path, "r", encoding="utf-8") as f:
             return f.read()
     
@@ -76,11 +273,68 @@ class ParallelTranscriptFactory:
             raise ValueError(f"No call details mapped for category: {category}")
         
         details_file = self.CATEGORY_DETAILS_MAP[category]
-        details_path = self.base_dir.parent / "prompts" / "call_category" / details_file
+        details_path = self.prompts_dir / "call_category" / details_file
         
         with open(details_path, "r", encoding="utf-8") as f:
             return f.read().strip()
     
+    def _render_prompt(self, category: str) -> str:
+        """
+        Prompt for a category with {{CALL_DETAILS}} filled in.
+        
+        Rendered once per category and then served from memory, so requests
+        never touch the prompt files.
+        """
+        prompt = self._rendered_prompts.get(category)
+        if prompt is None:
+            call_details = self._load_call_details(category)
+            prompt = self.prompt_template.replace("{{CALL_DETAILS}}", call_details)
+            self._rendered_prompts[category] = prompt
+        return prompt
+    
+    def _build_messages(self, category: str, count: int = 1) -> list:
+        """
+        Messages API request content for a category, built once and reused.
+        
+        The whole prompt is identical for every request in a category, so the
+        block is marked with cache_control; the API then serves repeat
+        requests from its prompt cache (once the prompt is long enough to
+        qualify for the model) and cached reads stop counting against the
+        input-token budget. Asking for several transcripts adds a second,
+        uncached block after it, so the cached prefix stays the same.
+        """
+        messages = self._messages_by_category.get((category, count))
+        if messages is None:
+            block = {
+                "type": "text",
+                "text": self._render_prompt(category)
+            }
+            if self.prompt_caching:
+                block["cache_control"] = {"type": "ephemeral"}
+            content = [block]
+            if count > 1:
+                content.append({"type": "text", "text": multi_transcript_instructions(count)})
+            messages = [
+                {
+                    "role": "user",
+                    "content": content
+                }
+            ]
+            self._messages_by_category[(category, count)] = messages
+        return messages
+    
+    def _estimate_input_tokens(self, category: str, prompt: str) -> int:
+        """
+        Estimate input tokens for a request so the TPM budget can be enforced.
+        
+        Uses the real usage reported for this category once we have it,
+        and a characters-per-token heuristic before that.
+        """
+        known = self._input_tokens_by_category.get(category)
+        if known:
+            return known
+        return int(len(prompt) / self.CHARS_PER_TOKEN) + 1
+    
     async def generate_transcript(
         self, 
         category: str, 
@@ -90,7 +344,10 @@ class ParallelTranscriptFactory:
         temperature=1
     ) -> Tuple[str, str, int]:
         """
-        Generate a single transcript asynchronously.
+        Generate a single transcript asynchronously, retrying transient failures.
+        
+        Rate limits, overloads, 5xx responses and timeouts are retried with
+        exponential backoff and jitter; other errors fail immediately.
         
         Args:
             category: Call category
@@ -102,67 +359,430 @@ class ParallelTranscriptFactory:
         Returns:
             Tuple of (category, transcript_text, index)
         """
+        regenerations = 0
+        while True:
+            try:
+                transcript = await self._request_with_retries(category, index, model, max_tokens, temperature)
+            except Exception:
+                self.stats["errors"] += 1
+                raise
+            
+            if self.dedup_index is not None and self._requeue_duplicate(category, index, transcript, regenerations):
+                regenerations += 1
+                continue
+            self._count_generated(category)
+            return category, transcript, index
+    
+    async def generate_transcript_group(
+        self,
+        category: str,
+        indices: List[int],
+        model="claude-haiku-4-5-20251001",
+        max_tokens=20000,
+        temperature=1
+    ) -> Tuple[List[Tuple[str, str, int]], Dict[int, str]]:
+        """
+        Generate several transcripts for a category from as few requests as possible.
+        
+        All of them are requested in one response (see multi_transcript),
+        which is split into files for `indices` in order. Whatever is still
+        missing (a response cut off by max_tokens, a malformed section, a
+        near-duplicate being requeued) is requested again, up to
+        MAX_GROUP_ROUNDS requests in total.
+        
+        Args:
+            category: Call category
+            indices: Index numbers to fill
+            model: Anthropic model to use
+            max_tokens: Maximum tokens in each response (shared by all its transcripts)
+            temperature: Temperature for generation
+            
+        Returns:
+            Tuple of ([(category, transcript_text, index), ...], {failed_index: reason})
+        """
+        remaining = list(indices)
+        results = []
+        reason = "no valid transcript in the response"
+        for round_number in range(self.MAX_GROUP_ROUNDS):
+            if not remaining:
+                break
+            count = len(remaining)
+            try:
+                text = await self._request_with_retries(
+                    category, remaining[0], model, max_tokens, temperature, count=count
+                )
+            except Exception as e:
+                reason = f"{type(e).__name__}: {e}"
+                break
+            
+            if count > 1:
+                # A multi-transcript stream's .part file can't be promoted
+                self.partial_path(category, remaining[0]).unlink(missing_ok=True)
+                transcripts = split_transcripts(text, count)
+            else:
+                transcripts = [text]
+            
+            for transcript in transcripts:
+                index = remaining[0]
+                if self.dedup_index is not None and self._requeue_duplicate(category, index, transcript, round_number):
+                    continue
+                remaining.pop(0)
+                results.append((category, transcript, index))
+            
+            if remaining and round_number + 1 < self.MAX_GROUP_ROUNDS:
+                print(f"\n✂️  {category}: kept {count - len(remaining)} of {count} transcripts from one response, "
+                      f"requesting the other {len(remaining)}")
+        
+        self._count_generated(category, len(results))
+        if remaining:
+            self.stats["errors"] += len(remaining)
+            print(f"\n⚠️  Gave up on {len(remaining)} {category} transcripts "
+                  f"(#{', #'.join(map(str, remaining))}): {reason}")
+        return results, {index: reason for index in remaining}
+    
+    async def _request_with_retries(
+        self,
+        category: str,
+        index: int,
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        count: int = 1
+    ) -> str:
+        """
+        Make one request, retrying transient failures, and record its metrics.
+        
+        Args:
+            category: Call category
+            index: Index of the (first) transcript requested
+            model: Anthropic model to use
+            max_tokens: Maximum tokens in the response
+            temperature: Temperature for generation
+            count: Transcripts requested in this response
+            
+        Returns:
+            Response text
+        """
+        label = f"{category} #{index}" if count == 1 else f"{category} #{index} (+{count - 1} more)"
+        record = RequestRecord(category=category, index=index, outcome="ok", attempts=0, transcripts=count)
+        request_started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            record.attempts = attempt
+            try:
+                _, text, _ = await self._generate_once(category, index, model, max_tokens, temperature, record, count)
+            except Exception as e:
+                self.metrics.record_attempt_error(e)
+                if not self.retry_policy.should_retry(e, attempt):
+                    record.outcome = type(e).__name__
+                    record.total_seconds = time.monotonic() - request_started
+                    self.metrics.record_request(record)
+                    raise
+                
+                # Back off outside the concurrency limit so the slot can be reused
+                delay = self.retry_policy.backoff(attempt, e)
+                self.stats["retries"] += 1
+                print(f"\n🔁 Retrying {label} in {delay:.1f}s "
+                      f"(attempt {attempt + 1}/{self.retry_policy.max_attempts})")
+                await asyncio.sleep(delay)
+                continue
+            
+            record.total_seconds = time.monotonic() - request_started
+            self.metrics.record_request(record)
+            return text
+    
+    def _count_generated(self, category: str, count: int = 1):
+        self.stats["total_generated"] += count
+        self.stats["by_category"][category] += count
+    
+    def _requeue_duplicate(self, category: str, index: int, transcript: str, regenerations: int) -> bool:
+        """
+        Check a new transcript against the dedup index.
+        
+        Returns:
+            True if it should be regenerated; otherwise it is (flagged if
+            need be and) added to the index
+        """
+        signature = self.dedup_index.signature(transcript)
+        match = self.dedup_index.query(signature=signature)
+        if match:
+            duplicate_of, similarity = match
+            if self.dedup_action == "requeue" and regenerations < self.MAX_DEDUP_REGENERATIONS:
+                print(f"\n♻️  {category} #{index} is a near-duplicate of {duplicate_of} "
+                      f"({similarity:.0%} similar), regenerating")
+                self.stats["duplicates_requeued"] += 1
+                return True
+            
+            print(f"\n🪞 {category} #{index} is a near-duplicate of {duplicate_of} ({similarity:.0%} similar)")
+            self.stats["duplicates_flagged"] += 1
+            self.duplicates.append({
+                "category": category,
+                "filename": self.transcript_path(category, index).name,
+                "duplicate_of": duplicate_of,
+                "similarity": round(similarity, 3)
+            })
+        
+        self.dedup_index.add(f"{category}/{self.transcript_path(category, index).name}", signature=signature)
+        return False
+    
+    async def _generate_once(
+        self,
+        category: str,
+        index: int,
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        record: Optional[RequestRecord] = None,
+        count: int = 1
+    ) -> Tuple[str, str, int]:
+        """
+        Make a single generation attempt.
+        
+        Args:
+            category: Call category
+            index: Index number for this transcript
+            model: Anthropic model to use
+            max_tokens: Maximum tokens in response
+            temperature: Temperature for generation
+            record: Optional RequestRecord to fill in with this attempt's
+                waits, timings and token usage
+            count: Transcripts to ask for in this one response
+            
+        Returns:
+            Tuple of (category, response_text, index)
+        """
+        if record is None:
+            record = RequestRecord(category=category, index=index, outcome="ok")
 
-        # Use semaphore to limit concurrent requests
-        async with self.semaphore:
+        # Hold one of the (adaptively sized) request slots
+        slot_requested = time.monotonic()
+        async with self.concurrency:
+            record.queue_wait += time.monotonic() - slot_requested
             try:
                 # Debug: Log when request starts
                 if index <= 3 or index % 100 == 0:
                     print(f"🔄 Starting {category} #{index}...", flush=True)
                 
-                # Load call details for this category
-                call_details = self._load_call_details(category)
+                # Prompt rendered once per category at startup
+                prompt = self._render_prompt(category)
                 
-                # Replace {{CALL_DETAILS}} placeholder in prompt
-                prompt = self.prompt_template.replace("{{CALL_DETAILS}}", call_details)
+                # Wait for room in both the request and input-token budgets
+                budget_requested = time.monotonic()
+                await self.rate_limiter.acquire(self._estimate_input_tokens(category, prompt))
+                record.rate_limit_wait += time.monotonic() - budget_requested
                 
-                # Call Anthropic API asynchronously with timeout
-                message = await asyncio.wait_for(
-                    self.client.messages.create(
-                        model=model,
-                        max_tokens=max_tokens,
-                        temperature=temperature,
-                        messages=[
-                            {
-                                "role": "user",
-                                "content": [
-                                    {
-                                        "type": "text",
-                                        "text": prompt
-                                    }
-                                ]
-                            }
-                        ]
-                    ),
-                    timeout=60.0  # 60 second timeout per request
+                request_started = time.monotonic()
+                if self.streaming:
+                    transcript, usage, headers = await self._stream_message(
+                        category, index, model, max_tokens, temperature, record, count
+                    )
+                else:
+                    # Call Anthropic API asynchronously with timeout
+                    # (raw response so we can read the rate-limit headers)
+                    response = await asyncio.wait_for(
+                        self.client.messages.with_raw_response.create(
+                            model=model,
+                            max_tokens=max_tokens,
+                            temperature=temperature,
+                            messages=self._build_messages(category, count)
+                        ),
+                        # Several transcripts take proportionally longer to write
+                        timeout=self.request_timeout * count
+                    )
+                    record.ttfb = time.monotonic() - request_started
+                    headers = response.headers
+                    message = response.parse()
+                    usage = message.usage
+                    transcript = message.content[0].text
+                record.latency = time.monotonic() - request_started
+                record.input_tokens = usage.input_tokens
+                record.output_tokens = usage.output_tokens
+                record.cache_read_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+                self.concurrency.on_success(record.latency)
+                self.rate_limiter.update_from_headers(headers)
+                self.rate_limiter.on_success()
+                # Cache reads don't count against the input-token budget; writes do
+                self._input_tokens_by_category[category] = (
+                    usage.input_tokens + (getattr(usage, "cache_creation_input_tokens", None) or 0)
                 )
+                self.stats["cached_input_tokens"] += getattr(usage, "cache_read_input_tokens", None) or 0
                 
                 # Debug: Log when request completes
                 if index <= 3 or index % 100 == 0:
                     print(f"✅ Completed {category} #{index}", flush=True)
                 
-                # Update stats immediately when a transcript completes
-                self.stats["total_generated"] += 1
-                self.stats["by_category"][category] += 1
-                
-                transcript = message.content[0].text
                 return category, transcript, index
                 
             except asyncio.TimeoutError:
-                print(f"\n⏱️  Timeout generating {category} #{index} (60s limit exceeded)")
-                self.stats["errors"] += 1
+                if self.streaming:
+                    print(f"\n⏱️  Stream for {category} #{index} stalled (no data for {self.stream_idle_timeout:.0f}s)")
+                else:
+                    print(f"\n⏱️  Timeout generating {category} #{index} ({self.request_timeout:.0f}s limit exceeded)")
+                self.concurrency.on_congestion()
+                raise
+            except anthropic.RateLimitError as e:
+                print(f"\n🚦 Rate limited generating {category} #{index}")
+                self.rate_limiter.on_rate_limited(e.response.headers)
+                self.concurrency.on_congestion()
+                raise
+            except (httpx.TransportError, IncompleteStreamError) as e:
+                # Connection dropped part-way through a streamed response
+                print(f"\n🔌 Stream for {category} #{index} dropped: {type(e).__name__} {e}")
                 raise
             except anthropic.APIError as e:
                 print(f"\n⚠️  API Error generating {category} #{index}: {e}")
-                self.stats["errors"] += 1
+                if getattr(e, "status_code", None) == 529:
+                    # Overloaded: back off on concurrency too
+                    self.concurrency.on_congestion()
                 raise
             except Exception as e:
                 print(f"\n⚠️  Unexpected error generating {category} #{index}: {type(e).__name__}: {e}")
                 import traceback
                 traceback.print_exc()
-                self.stats["errors"] += 1
                 raise
     
+    async def _stream_message(
+        self,
+        category: str,
+        index: int,
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        record: Optional[RequestRecord] = None,
+        count: int = 1
+    ):
+        """
+        Stream one response, appending its text to the transcript's .part file.
+        
+        Every wait (for the response headers and for each stream event) is
+        bounded by stream_idle_timeout, so a long but healthy generation is
+        never cut off while a stalled connection is dropped quickly. The
+        .part file is removed if the stream fails.
+        
+        Returns:
+            Tuple of (transcript_text, usage, response_headers)
+        """
+        started = time.monotonic()
+        response = await asyncio.wait_for(
+            self.client.messages.with_raw_response.create(
+                model=model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                messages=self._build_messages(category, count),
+                stream=True
+            ),
+            timeout=self.stream_idle_timeout
+        )
+        if record is not None:
+            record.ttfb = time.monotonic() - started
+        stream = response.parse()
+        events = stream.__aiter__()
+        
+        part_path = self.partial_path(category, index)
+        part_path.parent.mkdir(exist_ok=True)
+        part_file = open(part_path, "w", encoding="utf-8")
+        
+        chunks = []
+        pending = []
+        pending_chars = 0
+        usage = None
+        output_tokens = 0
+        first_token_at = None
+        stopped = False
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.__anext__(), timeout=self.stream_idle_timeout)
+                except StopAsyncIteration:
+                    break
+                
+                if event.type == "message_start":
+                    usage = event.message.usage
+                elif event.type == "content_block_delta" and getattr(event.delta, "type", None) == "text_delta":
+                    if first_token_at is None:
+                        first_token_at = time.monotonic()
+                    chunks.append(event.delta.text)
+                    pending.append(event.delta.text)
+                    pending_chars += len(event.delta.text)
+                    if pending_chars >= self.STREAM_FLUSH_CHARS:
+                        await asyncio.to_thread(part_file.write, "".join(pending))
+                        pending = []
+                        pending_chars = 0
+                elif event.type == "message_delta":
+                    output_tokens = event.usage.output_tokens
+                elif event.type == "message_stop":
+                    stopped = True
+            
+            if not stopped or usage is None:
+                raise IncompleteStreamError(f"Stream for {category} #{index} ended before message_stop")
+            if pending:
+                await asyncio.to_thread(part_file.write, "".join(pending))
+            part_file.close()
+        except BaseException:
+            part_file.close()
+            await stream.close()
+            part_path.unlink(missing_ok=True)
+            raise
+        
+        finished = time.monotonic()
+        usage.output_tokens = output_tokens or usage.output_tokens
+        
+        first_token_at = first_token_at or finished
+        decode_seconds = finished - first_token_at
+        self.stats["stream_timings"].append({
+            "category": category,
+            "index": index,
+            "ttft": first_token_at - started,
+            "seconds": finished - started,
+            "output_tokens": usage.output_tokens,
+            "tokens_per_second": usage.output_tokens / decode_seconds if decode_seconds > 0 else 0.0
+        })
+        return "".join(chunks), usage, response.headers
+    
+    async def prewarm_connections(self):
+        """
+        Open pooled connections before the first transcript request.
+        
+        One connection is enough with HTTP/2 (requests are multiplexed);
+        otherwise as many as the initial concurrency limit are opened.
+        Transient failures are retried like any other request.
+        """
+        connections = 1 if self.http2 else self.concurrency.current_limit
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                await prewarm(self.client, connections)
+                return
+            except Exception as e:
+                if not self.retry_policy.should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self.retry_policy.backoff(attempt, e))
+    
+    @property
+    def manifest(self) -> TranscriptManifest:
+        """
+        Manifest of the transcripts under base_dir, so counts and indices
+        never need a directory listing. Reopened if base_dir changes.
+        """
+        with self._open_lock:
+            if self._manifest is None or self._manifest.base_dir != self.base_dir:
+                if self._manifest is not None:
+                    self._manifest.close()
+                self._manifest = TranscriptManifest.open(self.base_dir, categories=self.CATEGORY_DETAILS_MAP)
+            return self._manifest
+    
+    @property
+    def segment_store(self) -> SegmentStore:
+        """Segment store under base_dir (storage="segments"). Reopened if base_dir changes."""
+        with self._open_lock:
+            if self._segment_store is None or self._segment_store.base_dir != self.base_dir:
+                if self._segment_store is not None:
+                    self._segment_store.close()
+                self._segment_store = SegmentStore(self.base_dir)
+            return self._segment_store
+    
     def get_existing_transcript_count(self, category: str) -> int:
         """
         Count how many transcripts already exist for a category.
@@ -173,13 +793,9 @@ class ParallelTranscriptFactory:
         Returns:
             Count of existing transcript files
         """
-        category_dir = self.base_dir / category
-        if not category_dir.exists():
-            return 0
-        
-        # Count files matching the pattern: {category}_XXXX.txt
-        existing_files = list(category_dir.glob(f"{category}_*.txt"))
-        return len(existing_files)
+        if self.storage == "segments":
+            return self.segment_store.count(category)
+        return self.manifest.count(category)
     
     def get_next_index(self, category: str) -> int:
         """
@@ -191,31 +807,24 @@ class ParallelTranscriptFactory:
         Returns:
             Next available index number (1-based)
         """
-        category_dir = self.base_dir / category
-        if not category_dir.exists():
-            return 1
-        
-        # Find all existing files and extract their indices
-        existing_files = list(category_dir.glob(f"{category}_*.txt"))
-        if not existing_files:
-            return 1
-        
-        # Extract the numeric indices from filenames
-        indices = []
-        for file in existing_files:
-            try:
-                # Extract number from filename like "technical_support_0001.txt"
-                filename = file.stem  # Gets filename without extension
-                number_part = filename.split('_')[-1]  # Get last part after underscore
-                indices.append(int(number_part))
-            except (ValueError, IndexError):
-                continue
-        
-        if not indices:
-            return 1
-        
-        # Return the next index after the highest existing one
-        return max(indices) + 1
+        if self.storage == "segments":
+            return self.segment_store.next_index(category)
+        return self.manifest.next_index(category)
+    
+    def transcript_exists(self, category: str, index: int) -> bool:
+        """Whether the transcript for a category and index has been saved."""
+        if self.storage == "segments":
+            return self.segment_store.contains(category, index)
+        return self.transcript_path(category, index).exists()
+    
+    def transcript_path(self, category: str, index: int) -> Path:
+        """Path of the numbered transcript file for a category and index."""
+        return self.base_dir / category / f"{category}_{index:04d}.txt"
+    
+    def partial_path(self, category: str, index: int) -> Path:
+        """Path a streaming response is written to until it completes."""
+        filepath = self.transcript_path(category, index)
+        return filepath.with_name(filepath.name + ".part")
     
     def save_transcript(self, category: str, transcript: str, index: int):
         """
@@ -226,15 +835,45 @@ class ParallelTranscriptFactory:
             transcript: Generated transcript text
             index: Index number for filename
         """
-        category_dir = self.base_dir / category
-        category_dir.mkdir(exist_ok=True)
+        filepath = self.transcript_path(category, index)
+        filepath.parent.mkdir(exist_ok=True)
+        
+        # A streamed transcript is already on disk in its .part file
+        part_path = self.partial_path(category, index)
         
-        filename = f"{category}_{index:04d}.txt"
-        filepath = category_dir / filename
+        if self.storage == "segments":
+            # Sharded workers must not repoint each other's records
+            self.segment_store.append(category, filepath.name, transcript, index=index,
+                                      replace=not self.no_clobber)
+            if self.streaming:
+                part_path.unlink(missing_ok=True)
+            return filepath
+        
+        promote = (
+            self.streaming and part_path.exists() and
+            part_path.stat().st_size == len(transcript.encode("utf-8"))
+        )
         
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(transcript)
+        if self.no_clobber:
+            # Write aside, then hard-link into place: link() fails atomically
+            # if another worker already saved this index
+            if promote:
+                tmp_path = part_path
+            else:
+                fd, tmp_path = tempfile.mkstemp(dir=filepath.parent, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(transcript)
+            try:
+                os.link(tmp_path, filepath)
+            finally:
+                os.unlink(tmp_path)
+        elif promote:
+            os.replace(part_path, filepath)
+        else:
+            with open(filepath, "w", encoding="utf-8") as f:
+                f.write(transcript)
         
+        self.manifest.record(category, filepath.name, index=index, size=len(transcript.encode("utf-8")))
         return filepath
     
     async def generate_batch(
@@ -246,6 +885,9 @@ class ParallelTranscriptFactory:
         """
         Generate multiple transcripts for a category in parallel.
         
+        With backend="batch" the requests go through the Message Batches API
+        and each transcript is also saved as its result streams back.
+        
         Args:
             category: Call category
             count: Number of transcripts to generate
@@ -254,6 +896,9 @@ class ParallelTranscriptFactory:
         Returns:
             List of (category, transcript, index) tuples
         """
+        if self.backend == "batch":
+            return await self.batch_backend.generate_batch(category, count, start_index=start_index)
+        
         tasks = [
             self.generate_transcript(category, i)
             for i in range(start_index, start_index + count)
@@ -271,10 +916,147 @@ class ParallelTranscriptFactory:
                 # Stats already updated in generate_transcript
         
         return successful_results
+    
+    async def generate_to_disk(
+        self,
+        jobs: Iterable[Tuple[str, int]],
+        writer: AsyncTranscriptWriter,
+        journal: Optional[JobJournal] = None
+    ) -> int:
+        """
+        Generate transcripts and stream each one to disk as soon as it finishes.
+        
+        Runs `max_concurrent` workers that pull (category, index) jobs from a
+        shared iterator, so only the in-flight requests and the writer's
+        bounded queue are held in memory, however many jobs there are. The
+        concurrency limiter decides how many of them have a request out.
+        With transcripts_per_request > 1, jobs of the same category are
+        grouped and each group is one request. With backend="batch" the jobs
+        go through the Message Batches API instead (see batch_backend).
+        
+        Args:
+            jobs: Iterable of (category, index) pairs to generate
+            writer: Started AsyncTranscriptWriter that persists the results
+            journal: Optional JobJournal to record in-flight and failed jobs
+                (the writer's on_saved callback should record "done")
+            
+        Returns:
+            Number of transcripts handed to the writer
+        """
+        if self.backend == "batch":
+            return await self.batch_backend.generate_to_disk(jobs, writer, journal=journal)
+        
+        # Each request covers up to transcripts_per_request jobs of one category
+        if self.transcripts_per_request > 1:
+            requests = group_jobs(jobs, self.transcripts_per_request)
+        else:
+            requests = ((category, [index]) for category, index in jobs)
+        completed = 0
+        
+        async def worker():
+            nonlocal completed
+            for category, indices in requests:
+                if journal:
+                    for index in indices:
+                        journal.record(category, index, IN_FLIGHT)
+                if self.transcripts_per_request > 1:
+                    results, failed = await self.generate_transcript_group(category, indices)
+                else:
+                    try:
+                        results, failed = [await self.generate_transcript(category, indices[0])], {}
+                    except Exception as e:
+                        # Already logged and counted in generate_transcript
+                        results, failed = [], {indices[0]: f"{type(e).__name__}: {e}"}
+                if journal:
+                    for index, error in failed.items():
+                        journal.record(category, index, FAILED, error=error)
+                for result in results:
+                    put_started = time.monotonic()
+                    await writer.put(*result)
+                    self.metrics.observe("writer_wait_seconds", time.monotonic() - put_started)
+                    completed += 1
+        
+        await asyncio.gather(*(worker() for _ in range(self.max_concurrent)))
+        return completed
 
 
-async def generate_all_parallel():
-    """Generate all 1,000 transcripts in parallel with progress tracking."""
+def interleave_jobs(
+    category_counts: Dict[str, int],
+    start_indices: Dict[str, int],
+    retry_indices: Optional[Dict[str, List[int]]] = None
+):
+    """
+    Lazily yield (category, index) jobs, round-robin across categories.
+    
+    Interleaving keeps every category progressing together, the way the
+    old one-batch-per-category gather did, without materializing the list.
+    Indices being redone from the journal come first, then fresh indices.
+    """
+    retry_indices = retry_indices or {}
+    ranges = {}
+    for category, count in category_counts.items():
+        redo = retry_indices.get(category, [])
+        fresh = range(start_indices[category], start_indices[category] + count - len(redo))
+        if count > 0:
+            ranges[category] = itertools.chain(redo, fresh)
+    while ranges:
+        for category in list(ranges):
+            index = next(ranges[category], None)
+            if index is None:
+                del ranges[category]
+            else:
+                yield category, index
+
+
+JOURNAL_FILENAME = "generation_journal.jsonl"
+
+
+async def generate_all_parallel(
+    resume: bool = False,
+    shard: Optional[Tuple[int, int]] = None,
+    lease_dir: Optional[str] = None,
+    fleet_size: int = 1,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    lease_ttl: float = DEFAULT_LEASE_TTL,
+    worker_id: Optional[str] = None,
+    max_concurrent: int = 50,
+    adaptive_concurrency: bool = True,
+    streaming: bool = False,
+    idle_timeout: float = 30.0,
+    http2: Optional[bool] = None,
+    dedup_threshold: Optional[float] = None,
+    dedup_action: str = "flag",
+    transcripts_per_request: int = 1,
+    storage: str = "files",
+    backend: str = "interactive"
+):
+    """
+    Generate all transcripts in parallel with progress tracking.
+    
+    Args:
+        resume: Redo the jobs the journal shows as unfinished from earlier
+            runs (failed, interrupted or never started) before new indices
+        shard: (i, N) to generate only shard i of N (static block striping)
+        lease_dir: Claim blocks through lease files in this shared directory
+        fleet_size: Number of workers sharing the API budget in lease mode
+            (with a shard, N is used)
+        block_size: Indices per shard/lease block
+        lease_ttl: Seconds before an abandoned lease can be taken over
+        worker_id: Name for this worker's leases and journal
+        max_concurrent: Ceiling on concurrent requests
+        adaptive_concurrency: Tune concurrency up to the ceiling (AIMD);
+            if False, always run max_concurrent requests
+        streaming: Stream responses to .part files with an idle timeout
+        idle_timeout: Seconds a stream may go silent before it is retried
+        http2: Force HTTP/2 on or off (default: on if h2 is installed)
+        dedup_threshold: Check new transcripts for near-duplicates of the
+            corpus at this estimated similarity (0-1); None to skip
+        dedup_action: "flag" or "requeue" near-duplicates
+        transcripts_per_request: Transcripts asked for in each response
+        storage: "files" or "segments" (packed segment store)
+        backend: "interactive" (one request per transcript) or "batch"
+            (Message Batches API; slower to finish, cheaper per token)
+    """
     
     # Define the TARGET counts for each category
     target_category_counts = {
@@ -283,9 +1065,26 @@ async def generate_all_parallel():
         "account_management": 300  # upgrade calls
     }
     
+    # Workers sharing the output folder split the account's budgets evenly
+    if shard:
+        fleet_size = shard[1]
+    fleet_size = max(1, fleet_size)
+    
     # Initialize factory first to check existing files
     try:
-        factory = ParallelTranscriptFactory()
+        factory = ParallelTranscriptFactory(
+            max_concurrent=max_concurrent,
+            adaptive_concurrency=adaptive_concurrency,
+            streaming=streaming,
+            stream_idle_timeout=idle_timeout,
+            http2=http2,
+            dedup_action=dedup_action,
+            transcripts_per_request=transcripts_per_request,
+            storage=storage,
+            backend=backend,
+            requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE // fleet_size,
+            input_tokens_per_minute=DEFAULT_INPUT_TOKENS_PER_MINUTE // fleet_size
+        )
     except ValueError as e:
         print(f"\n❌ Error: {e}")
         print("\nPlease set your ANTHROPIC_API_KEY environment variable:")
@@ -299,24 +1098,82 @@ async def generate_all_parallel():
     print("=" * 80)
     print("\n🔍 Checking for existing transcripts...\n")
     
-    category_counts = {}  # Actual counts to generate
-    start_indices = {}    # Starting index for each category
-    existing_counts = {}  # Existing transcript counts
-    
-    for category, target_count in target_category_counts.items():
-        existing_count = factory.get_existing_transcript_count(category)
-        existing_counts[category] = existing_count
-        
-        if existing_count >= target_count:
-            print(f"  ✓ {category}: {existing_count}/{target_count} (target already met, skipping)")
-            category_counts[category] = 0
-            start_indices[category] = factory.get_next_index(category)
+    claimer = None
+    if shard or lease_dir:
+        # Several workers share the output folder: each one fills the missing
+        # indices of the blocks it owns and never overwrites another's files
+        if shard:
+            claimer = StaticShard(*shard)
         else:
+            claimer = LeaseManager(lease_dir, worker_id=worker_id, ttl=lease_ttl)
+            # A batch holds its blocks' leases until it ends (possibly hours);
+            # claim one batch's worth at a time so other workers get the rest
+            factory.batch_backend.max_pending_batches = 1
+        factory.no_clobber = True
+        journal = JobJournal(factory.base_dir / JOURNAL_FILENAME.replace(".jsonl", f".{claimer.worker_id}.jsonl"))
+        
+        def exists(category, index):
+            return factory.transcript_exists(category, index)
+        
+        # Static shards know their blocks up front; leased blocks are claimed as we go
+        category_counts = missing_indices(
+            target_category_counts, exists, block_size,
+            owns=claimer.claim if shard else None
+        )
+        existing_counts = {}
+        scope = "in this shard" if shard else "across all workers"
+        for category, target_count in target_category_counts.items():
+            existing_counts[category] = factory.get_existing_transcript_count(category)
+            print(f"  ⚡ {category}: {existing_counts[category]}/{target_count} existing, "
+                  f"{category_counts[category]} missing {scope}")
+        print(f"\n🧩 Worker {claimer.worker_id} ({claimer!r}, blocks of {block_size} indices)")
+        
+        jobs = sharded_jobs(target_category_counts, block_size, claimer, exists)
+    else:
+        # Every job is journaled so failures and interruptions can be resumed
+        journal = JobJournal(factory.base_dir / JOURNAL_FILENAME)
+        
+        category_counts = {}  # Actual counts to generate
+        start_indices = {}    # Starting index for each new (not redone) job
+        existing_counts = {}  # Existing transcript counts
+        retry_indices = {}    # Journaled gaps being redone (--resume)
+        
+        for category, target_count in target_category_counts.items():
+            existing_count = factory.get_existing_transcript_count(category)
+            existing_counts[category] = existing_count
+            retry_indices[category] = []
+        
+            # Never reuse an index the journal already handed out
+            start_indices[category] = max(factory.get_next_index(category), journal.max_index(category) + 1)
+        
+            if existing_count >= target_count:
+                print(f"  ✓ {category}: {existing_count}/{target_count} (target already met, skipping)")
+                category_counts[category] = 0
+                continue
+        
             needed = target_count - existing_count
-            start_index = factory.get_next_index(category)
             category_counts[category] = needed
-            start_indices[category] = start_index
-            print(f"  ⚡ {category}: {existing_count}/{target_count} existing, will generate {needed} more (starting from #{start_index})")
+        
+            if resume:
+                for _, index in journal.pending(category):
+                    if factory.transcript_exists(category, index):
+                        # Saved, but the run died before journaling it
+                        journal.record(category, index, DONE)
+                    else:
+                        retry_indices[category].append(index)
+                retry_indices[category] = retry_indices[category][:needed]
+        
+            redo = len(retry_indices[category])
+            print(f"  ⚡ {category}: {existing_count}/{target_count} existing, will generate {needed} more "
+                  f"({redo} journaled gaps, new from #{start_indices[category]})")
+        
+        # Journal the new jobs before starting any of them
+        for category, count in category_counts.items():
+            fresh = count - len(retry_indices[category])
+            start = start_indices[category]
+            journal.plan((category, index) for index in range(start, start + fresh))
+        
+        jobs = interleave_jobs(category_counts, start_indices, retry_indices)
     
     total_count = sum(category_counts.values())
     total_target = sum(target_category_counts.values())
@@ -325,28 +1182,55 @@ async def generate_all_parallel():
     if total_count == 0:
         print("\n✅ All targets met! No new transcripts needed.")
         print("\n" + "=" * 80)
+        journal.close()
         return 0
     
+    if dedup_threshold is not None:
+        # numpy is only needed when deduplicating
+        from dedup_minhash import SIGNATURES_FILENAME, MinHashIndex, write_duplicates_csv
+        index_started = time.monotonic()
+        factory.dedup_index = MinHashIndex.for_corpus(
+            factory.base_dir, categories=list(target_category_counts), threshold=dedup_threshold,
+            store=factory.segment_store if factory.storage == "segments" else None
+        )
+        print(f"\n🪞 Near-duplicate check: {len(factory.dedup_index)} existing transcripts indexed "
+              f"in {time.monotonic() - index_started:.1f}s (threshold {dedup_threshold:.0%}, {dedup_action})")
+    
     print(f"\n📊 Summary:")
     print(f"  - Total target: {total_target} transcripts")
     print(f"  - Already exist: {total_existing} transcripts")
     print(f"  - To generate: {total_count} transcripts")
     print(f"\nConcurrency settings:")
-    print(f"  - Max concurrent requests: 50")
-    print(f"  - Target rate: ~3,800 requests/minute")
-    if total_count > 0:
-        print(f"  - Expected completion time: ~{max(10, total_count/200):.0f}-{max(15, total_count/150):.0f} seconds")
+    if factory.backend == "batch":
+        print(f"  - Backend: message batches of up to {factory.batch_backend.max_requests_per_batch:,} requests, "
+              f"{factory.batch_backend.max_pending_batches} at a time, "
+              f"polled every {factory.batch_backend.poll_interval:.0f}s")
+    elif factory.adaptive_concurrency:
+        print(f"  - Concurrent requests: adaptive, starting at {factory.concurrency.current_limit}, "
+              f"up to {factory.max_concurrent}")
+    else:
+        print(f"  - Concurrent requests: {factory.max_concurrent} (fixed)")
+    if factory.transcripts_per_request > 1:
+        print(f"  - Transcripts per request: {factory.transcripts_per_request} "
+              f"(about {factory.transcripts_per_request}x fewer requests and input tokens per transcript)")
+    if factory.backend == "batch":
+        # Batches aren't bound by the per-minute limits; most finish within an hour, all within 24
+        print(f"  - Expected completion time: usually under an hour, at most 24 hours")
+    else:
+        print(f"  - Target rate: ~{factory.requests_per_minute:,} requests/minute, "
+              f"~{factory.input_tokens_per_minute / 1e6:.2g}M input tokens/minute"
+              + (f" (1/{fleet_size} of the account budget)" if fleet_size > 1 else ""))
+        if total_count > 0:
+            print(f"  - Expected completion time: ~{max(10, total_count/200):.0f}-"
+                  f"{max(15, total_count/150):.0f} seconds")
     print("\n" + "=" * 80)
     
-    # Test API connection first
+    # Test the API key and open pooled connections (models.list costs no tokens)
     print("\n🔍 Testing API connection...")
     try:
-        test_message = await factory.client.messages.create(
-            model="claude-haiku-4-5-20251001",
-            max_tokens=100,
-            messages=[{"role": "user", "content": "Hello"}]
-        )
-        print("✅ API connection successful!")
+        await factory.prewarm_connections()
+        print(f"✅ API connection successful! ({factory.connection_stats.connections_opened} connections warmed"
+              f"{', HTTP/2' if factory.http2 else ''})")
     except Exception as e:
         print(f"❌ API connection test failed: {e}")
         print("\nPlease check:")
@@ -357,8 +1241,25 @@ async def generate_all_parallel():
     
     start_time = datetime.now()
     
-    # Create all tasks for all categories
+    # Metrics cover generation only (not planning or the connection test)
+    factory.metrics = GenerationMetrics()
+    metrics_name = f"generation_metrics_{start_time:%Y%m%d_%H%M%S}"
+    live_metrics_path = factory.base_dir / "generation_metrics.live.json"
+    if claimer:
+        metrics_name += f".{claimer.worker_id}"
+        live_metrics_path = factory.base_dir / f"generation_metrics.{claimer.worker_id}.live.json"
+    
     print("\n🚀 Starting parallel generation...\n")
+    print(f"📈 Live metrics: {live_metrics_path}\n")
+    
+    # Finished transcripts go straight to a bounded queue and are saved
+    # by background writers, so a crash only loses in-flight work
+    writer = AsyncTranscriptWriter(
+        factory.metrics.timed_save(factory.save_transcript),
+        max_queue_size=factory.max_concurrent * 2,
+        on_saved=lambda category, index: journal.record(category, index, DONE)
+    )
+    writer.start()
     
     # Progress tracking task
     async def track_progress():
@@ -379,7 +1280,17 @@ async def generate_all_parallel():
                     
                     # Use newline instead of carriage return to avoid conflicts with debug messages
                     print(f"\n📊 Progress: {current_count}/{total_count} ({current_count/total_count*100:.1f}%) | "
-                          f"Rate: {rate:.1f}/s | Errors: {factory.stats['errors']} | ETA: {eta:.0f}s")
+                          f"Rate: {rate:.1f}/s | Saved: {writer.stats['saved']} | Errors: {factory.stats['errors']} | "
+                          f"Concurrency: {factory.concurrency.current_limit}/{factory.max_concurrent} | "
+                          f"Throttle: {factory.rate_limiter.rate_scale:.0%} | ETA: {eta:.0f}s")
+                    snapshot = factory.metrics.snapshot()
+                    print(f"   Latency p50 {format_seconds(snapshot['latency_p50'])}, "
+                          f"p95 {format_seconds(snapshot['latency_p95'])} | "
+                          f"Waits: slot {format_seconds(snapshot['queue_wait_mean'])}, "
+                          f"rate limit {format_seconds(snapshot['rate_limit_wait_mean'])}, "
+                          f"writer {format_seconds(snapshot['writer_wait_mean'])} | "
+                          f"Bound by: {snapshot['bottleneck']}")
+                    factory.metrics.write_snapshot(live_metrics_path)
             
             last_count = current_count
             
@@ -390,34 +1301,21 @@ async def generate_all_parallel():
     # Start progress tracking
     progress_task = asyncio.create_task(track_progress())
     
+    # Keep our leases alive while we work on their blocks
+    heartbeat_task = None
+    if isinstance(claimer, LeaseManager):
+        heartbeat_task = asyncio.create_task(claimer.heartbeat())
+    
     try:
-        # Execute all generation tasks concurrently (not sequentially!)
-        print("Creating generation tasks...")
-        
-        # Create all batch tasks at once and gather them
-        # Filter out categories with 0 count (already at target)
-        categories_to_generate = {k: v for k, v in category_counts.items() if v > 0}
-        categories_list = list(categories_to_generate.keys())
-        batch_tasks = []
-        
-        for category in categories_list:
-            count = category_counts[category]
-            start_index = start_indices[category]
-            print(f"  - Queuing {count} transcripts for {category} (starting from #{start_index})")
-            # Create task objects (not just coroutines) to start execution
-            task = asyncio.create_task(factory.generate_batch(category, count, start_index=start_index))
-            batch_tasks.append(task)
-        
-        print("\n⏳ Generating all transcripts in parallel...\n")
-        print(f"✓ Started {len(batch_tasks)} batch tasks")
-        
-        # Wait for ALL batches to complete concurrently using gather
-        all_results = await asyncio.gather(*batch_tasks)
-        
-        # Map results back to categories
-        results_by_category = {}
-        for i, category in enumerate(categories_list):
-            results_by_category[category] = all_results[i]
+        for category, count in category_counts.items():
+            if count > 0 and claimer is None:
+                print(f"  - Queuing {count} transcripts for {category} (starting from #{start_indices[category]})")
+            elif count > 0:
+                print(f"  - Filling up to {count} missing {category} transcripts block by block")
+        
+        print("\n⏳ Generating all transcripts in parallel (saving as they complete)...\n")
+        
+        await factory.generate_to_disk(jobs, writer, journal=journal)
         
         print("\n✓ All generation tasks completed!")
         
@@ -433,17 +1331,24 @@ async def generate_all_parallel():
             await progress_task
         except asyncio.CancelledError:
             pass
+        
+        # Flush whatever is already queued before exiting
+        await writer.close()
+        journal.close()
+        
+        if heartbeat_task:
+            heartbeat_task.cancel()
+            try:
+                await heartbeat_task
+            except asyncio.CancelledError:
+                pass
+        if claimer:
+            claimer.release_all()
     
-    print("\n\n💾 Saving transcripts to disk...", end="", flush=True)
-    
-    # Save all results
-    saved_count = 0
-    for category, results in results_by_category.items():
-        for cat, transcript, index in results:
-            factory.save_transcript(cat, transcript, index)
-            saved_count += 1
-    
-    print(f" ✅ Saved {saved_count} files")
+    print(f"\n💾 Saved {writer.stats['saved']} files", end="")
+    if writer.stats["errors"]:
+        print(f" ({writer.stats['errors']} failed to save)", end="")
+    print()
     
     # Final summary
     end_time = datetime.now()
@@ -453,7 +1358,20 @@ async def generate_all_parallel():
     print("🎉 GENERATION COMPLETE!")
     print("=" * 80)
     print(f"\nTotal transcripts generated: {factory.stats['total_generated']}/{total_count}")
-    print(f"Errors: {factory.stats['errors']}")
+    print(f"Errors: {factory.stats['errors']} (after {factory.stats['retries']} retries)")
+    unfinished = len(journal.pending())
+    if unfinished and claimer:
+        print(f"⚠️  {unfinished} jobs are unfinished. Re-run any worker to fill the gaps.")
+    elif unfinished:
+        print(f"⚠️  {unfinished} journaled jobs are unfinished. Re-run with --resume to redo them.")
+    if factory.dedup_index is not None:
+        print(f"Near-duplicates: {factory.stats['duplicates_flagged']} flagged, "
+              f"{factory.stats['duplicates_requeued']} regenerated")
+        factory.dedup_index.save(factory.base_dir / SIGNATURES_FILENAME)
+        if factory.duplicates:
+            duplicates_csv = factory.base_dir / f"near_duplicates_{start_time:%Y%m%d_%H%M%S}.csv"
+            write_duplicates_csv(factory.duplicates, duplicates_csv)
+            print(f"  Flagged transcripts listed in {duplicates_csv}")
     print(f"\nBreakdown by category:")
     for category in target_category_counts.keys():
         generated = factory.stats['by_category'][category]
@@ -464,26 +1382,182 @@ async def generate_all_parallel():
     
     print(f"\n⏱️  Performance:")
     print(f"  - Total time: {total_time:.2f} seconds ({total_time/60:.2f} minutes)")
+    limiter_stats = factory.rate_limiter.stats
+    print(f"  - Rate limiter: {limiter_stats['waits']} waits ({limiter_stats['wait_seconds']:.1f}s total), "
+          f"{limiter_stats['rate_limited']} rate-limit responses")
+    concurrency_stats = factory.concurrency.stats
+    print(f"  - Concurrency: ended at {factory.concurrency.current_limit}, peaked at "
+          f"{concurrency_stats['peak_limit']} (limit cut {concurrency_stats['decreases']} times)")
+    print(f"  - Input tokens served from prompt cache: {factory.stats['cached_input_tokens']:,}")
+    print(f"  - HTTP: {factory.connection_stats.summary()}")
+    timings = factory.stats["stream_timings"]
+    if timings:
+        ttfts = sorted(t["ttft"] for t in timings)
+        speeds = sorted(t["tokens_per_second"] for t in timings)
+        print(f"  - Time to first token: p50 {ttfts[len(ttfts) // 2]:.2f}s, "
+              f"p95 {ttfts[int(len(ttfts) * 0.95)]:.2f}s")
+        print(f"  - Output speed: p50 {speeds[len(speeds) // 2]:.0f} tokens/s")
     if factory.stats['total_generated'] > 0:
         print(f"  - Average time per transcript: {total_time/factory.stats['total_generated']:.2f}s")
         print(f"  - Throughput: {factory.stats['total_generated']/total_time:.1f} transcripts/second")
     
-    print("\n📁 Files saved in:")
+    metrics = factory.metrics.snapshot()
+    print(f"\n📈 Request metrics (bound by: {metrics['bottleneck']}):")
+    print(f"  - Latency: p50 {format_seconds(metrics['latency_p50'])}, "
+          f"p95 {format_seconds(metrics['latency_p95'])} "
+          f"(first byte p50 {format_seconds(metrics['ttfb_p50'])})")
+    print(f"  - Mean waits per request: slot {format_seconds(metrics['queue_wait_mean'])}, "
+          f"rate limit {format_seconds(metrics['rate_limit_wait_mean'])}, "
+          f"writer queue {format_seconds(metrics['writer_wait_mean'])}, "
+          f"file save {format_seconds(metrics['save_mean'])}")
+    print(f"  - Output: {metrics['output_tokens_per_second']:,.0f} tokens/s")
+    metrics_paths = factory.metrics.write(factory.base_dir, metrics_name)
+    print(f"  - Exported: {metrics_paths['json'].name}, {metrics_paths['prometheus'].name}, "
+          f"{metrics_paths['records'].name}")
+    
+    if factory.storage == "segments":
+        print(f"\n📦 Segment store: {factory.base_dir}")
+    else:
+        print("\n📁 Files saved in:")
     for category in target_category_counts.keys():
-        category_dir = Path(__file__).parent / category
-        count = len(list(category_dir.glob(f"{category}_*.txt")))
-        print(f"  - {category_dir} ({count} files)")
+        category_dir = factory.base_dir / category
+        print(f"  - {category_dir} ({factory.get_existing_transcript_count(category)} transcripts)")
     
     print("\n" + "=" * 80)
     
     return 0
 
 
+def launch_local_shards(processes: int, argv: List[str]) -> int:
+    """
+    Run this script as `processes` local workers, one static shard each.
+    
+    Args:
+        processes: Number of worker processes (shards)
+        argv: Extra command-line arguments passed to every worker
+        
+    Returns:
+        0 if every worker succeeded, else 1
+    """
+    print(f"🚀 Launching {processes} local workers (--shard i/{processes})...")
+    children = [
+        subprocess.Popen([sys.executable, __file__, "--shard", f"{i}/{processes}", *argv])
+        for i in range(processes)
+    ]
+    try:
+        exit_codes = [child.wait() for child in children]
+    except KeyboardInterrupt:
+        for child in children:
+            child.terminate()
+        raise
+    
+    failed = sum(1 for code in exit_codes if code != 0)
+    if failed:
+        print(f"\n❌ {failed} of {processes} workers failed")
+        return 1
+    print(f"\n✅ All {processes} workers finished")
+    return 0
+
+
 def main():
     """Main entry point."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Generate transcripts in parallel")
+    parser.add_argument("--resume", action="store_true",
+                       help="Redo failed or interrupted jobs recorded in the job journal")
+    parser.add_argument("--shard",
+                       help="Generate only shard i of N (e.g. 0/4); start one worker per shard")
+    parser.add_argument("--lease-dir",
+                       help="Claim index blocks through lease files in this shared directory")
+    parser.add_argument("--fleet-size", type=int, default=1,
+                       help="Workers sharing the API budget in --lease-dir mode")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE,
+                       help=f"Indices per shard/lease block (default: {DEFAULT_BLOCK_SIZE})")
+    parser.add_argument("--lease-ttl", type=float, default=DEFAULT_LEASE_TTL,
+                       help="Seconds before a dead worker's lease can be taken over")
+    parser.add_argument("--worker-id",
+                       help="Name for this worker's leases and journal (default: host-pid)")
+    parser.add_argument("--max-concurrent", type=int, default=50,
+                       help="Ceiling on concurrent requests (default: 50)")
+    parser.add_argument("--fixed-concurrency", action="store_true",
+                       help="Always run --max-concurrent requests instead of adapting")
+    parser.add_argument("--stream", action="store_true",
+                       help="Stream responses to disk with an idle timeout instead of a 60s cap")
+    parser.add_argument("--idle-timeout", type=float, default=30.0,
+                       help="Seconds a stream may go silent before it is retried (default: 30)")
+    parser.add_argument("--no-http2", action="store_true",
+                       help="Stay on HTTP/1.1 even if the h2 package is installed")
+    parser.add_argument("--processes", type=int, default=0,
+                       help="Run this many local worker processes, one shard each")
+    parser.add_argument("--dedup-threshold", type=float, default=None,
+                       help="Check each new transcript for near-duplicates at this estimated "
+                            "similarity, e.g. 0.8 (needs numpy)")
+    parser.add_argument("--dedup-action", choices=ParallelTranscriptFactory.DEDUP_ACTIONS, default="flag",
+                       help="Keep and list near-duplicates (flag) or regenerate them (requeue)")
+    parser.add_argument("--transcripts-per-request", type=int, default=1,
+                       help="Ask for this many transcripts in each response (default: 1); "
+                            "cuts input tokens per transcript by about that factor")
+    parser.add_argument("--storage", choices=ParallelTranscriptFactory.STORAGES, default="files",
+                       help="Save one .txt per transcript (files) or append to the packed "
+                            "segment store (segments)")
+    parser.add_argument("--backend", choices=ParallelTranscriptFactory.BACKENDS, default="interactive",
+                       help="One request per transcript (interactive) or the Message Batches API "
+                            "(batch: cheaper per token, finishes within 24h)")
+    args = parser.parse_args()
+    
     try:
+        shard = parse_shard(args.shard) if args.shard else None
+    except ValueError as e:
+        parser.error(str(e))
+    if shard and args.lease_dir:
+        parser.error("--shard and --lease-dir are mutually exclusive")
+    if args.backend == "batch" and (args.stream or args.transcripts_per_request > 1
+                                    or args.dedup_threshold is not None):
+        parser.error("--stream, --transcripts-per-request and --dedup-threshold apply to "
+                     "the interactive backend only")
+    
+    try:
+        if args.processes > 1:
+            if shard or args.lease_dir:
+                parser.error("--processes starts its own shards; drop --shard/--lease-dir")
+            worker_args = ["--block-size", str(args.block_size), "--max-concurrent", str(args.max_concurrent)]
+            if args.fixed_concurrency:
+                worker_args.append("--fixed-concurrency")
+            if args.stream:
+                worker_args += ["--stream", "--idle-timeout", str(args.idle_timeout)]
+            if args.no_http2:
+                worker_args.append("--no-http2")
+            if args.transcripts_per_request > 1:
+                worker_args += ["--transcripts-per-request", str(args.transcripts_per_request)]
+            if args.storage != "files":
+                worker_args += ["--storage", args.storage]
+            if args.backend != "interactive":
+                worker_args += ["--backend", args.backend]
+            if args.dedup_threshold is not None:
+                worker_args += ["--dedup-threshold", str(args.dedup_threshold), "--dedup-action", args.dedup_action]
+            return launch_local_shards(args.processes, worker_args)
+        
         # Run the async function
-        exit_code = asyncio.run(generate_all_parallel())
+        exit_code = asyncio.run(generate_all_parallel(
+            resume=args.resume,
+            shard=shard,
+            lease_dir=args.lease_dir,
+            fleet_size=args.fleet_size,
+            block_size=args.block_size,
+            lease_ttl=args.lease_ttl,
+            worker_id=args.worker_id,
+            max_concurrent=args.max_concurrent,
+            adaptive_concurrency=not args.fixed_concurrency,
+            streaming=args.stream,
+            idle_timeout=args.idle_timeout,
+            http2=False if args.no_http2 else None,
+            dedup_threshold=args.dedup_threshold,
+            dedup_action=args.dedup_action,
+            transcripts_per_request=args.transcripts_per_request,
+            storage=args.storage,
+            backend=args.backend
+        ))
         return exit_code
     except KeyboardInterrupt:
         print("\n\n⚠️  Generation interrupted by user")
@@ -497,4 +1571,3 @@ def main():
 
 if __name__ == "__main__":
     exit(main())
-
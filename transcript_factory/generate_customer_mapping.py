@@ -8,6 +8,8 @@ import csv
 import random
 from pathlib import Path
 
+from transcript_manifest import TranscriptManifest
+
 
 def collect_transcripts(base_dir):
     """
@@ -19,13 +21,15 @@ def collect_transcripts(base_dir):
     categories = ['account_management', 'billing_inquiry', 'technical_support']
     transcripts = []
     
-    for category in categories:
-        category_path = os.path.join(base_dir, category)
-        if os.path.exists(category_path):
-            files = [f for f in os.listdir(category_path) if f.endswith('.txt')]
-            for filename in files:
-                transcripts.append((filename, category))
-            print(f"Found {len(files)} transcripts in {category}")
+    # The manifest answers the listing; folders are only rescanned if they
+    # changed since it was last updated
+    with TranscriptManifest.open(base_dir, categories=categories) as manifest:
+        for category in categories:
+            if os.path.exists(os.path.join(base_dir, category)):
+                files = manifest.list(category)
+                for filename in files:
+                    transcripts.append((filename, category))
+                print(f"Found {len(files)} transcripts in {category}")
     
     return transcripts
 
@@ -130,16 +134,20 @@ def print_statistics(mappings):
         print(f"  {category}: {count}")
 
 
-def main():
-    """Main function to generate customer mapping CSV."""
-    # Set random seed for reproducibility
-    random.seed(42)
+def generate_customer_mapping(base_dir, output_file, seed=42):
+    """
+    Map every transcript under base_dir to a synthetic customer ID.
     
-    # Get the script directory
-    script_dir = os.path.dirname(os.path.abspath(__file__))
+    Args:
+        base_dir: Directory holding the category folders
+        output_file: Where to write the mapping CSV
+        seed: Random seed, so reruns produce the same mapping
+    """
+    # Set random seed for reproducibility
+    random.seed(seed)
     
     print("Collecting transcripts from directories...")
-    transcripts = collect_transcripts(script_dir)
+    transcripts = collect_transcripts(base_dir)
     print(f"\nTotal transcripts found: {len(transcripts)}")
     
     print("\nAssigning customer IDs...")
@@ -149,7 +157,6 @@ def main():
     mappings.sort(key=lambda x: (x['customer_id'], x['transcript_filename']))
     
     # Write to CSV
-    output_file = os.path.join(script_dir, 'customer_transcript_mapping.csv')
     write_csv(mappings, output_file)
     
     # Print statistics
@@ -158,6 +165,14 @@ def main():
     print("\n✓ Customer mapping generation complete!")
 
 
+def main():
+    """Main function to generate customer mapping CSV."""
+    # Get the script directory
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    generate_customer_mapping(script_dir, os.path.join(script_dir, 'customer_transcript_mapping.csv'))
+
+
 if __name__ == '__main__':
     main()
 
@@ -3,13 +3,21 @@ Synthetic Transcript Generator using Anthropic API
 ==================================================
 This script generates synthetic call transcripts for different categories
 using the Anthropic Claude API.
+
+Calls run one at a time by default. Pass workers=N (--workers N) to run up
+to N calls at once on a thread pool that shares one rate limiter.
 """
 
 import os
+import threading
 import anthropic
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
 
+from rate_limiter import DEFAULT_INPUT_TOKENS_PER_MINUTE, DEFAULT_REQUESTS_PER_MINUTE, RateLimiter
+from transcript_manifest import TranscriptManifest
+
 
 class TranscriptFactory:
     """Factory for generating synthetic call transcripts."""
@@ -33,15 +41,54 @@ class TranscriptFactory:
         "service_activation": "upgrade_details.txt"
     }
     
-    def __init__(self, api_key=None):
-        """Initialize the factory with Anthropic API key."""
+    # Rough characters-per-token ratio used to charge the input token budget
+    CHARS_PER_TOKEN = 3.5
+    
+    def __init__(
+        self,
+        api_key=None,
+        prompt_caching=True,
+        workers=1,
+        requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+        input_tokens_per_minute=DEFAULT_INPUT_TOKENS_PER_MINUTE
+    ):
+        """
+        Initialize the factory with Anthropic API key.
+        
+        Args:
+            api_key: Anthropic API key (defaults to env var)
+            prompt_caching: Mark the static prompt for provider-side prompt caching
+            workers: Number of API calls to run at once (1 = one after another)
+            requests_per_minute: Request budget shared by the workers
+            input_tokens_per_minute: Input token budget shared by the workers
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        
         self.api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY not found. Set it as environment variable or pass to constructor.")
         
         self.client = anthropic.Anthropic(api_key=self.api_key)
+        self.workers = workers
+        
+        # Only needed once calls overlap; a single caller can't outrun the budget
+        self.rate_limiter = None
+        if workers > 1:
+            self.rate_limiter = RateLimiter(requests_per_minute, input_tokens_per_minute)
         self.base_dir = Path(__file__).parent
         self.prompt_template = self._load_prompt()
+        
+        # Index of saved transcripts, opened on first use (see manifest);
+        # the lock keeps worker threads from opening it twice
+        self._manifest = None
+        self._manifest_lock = threading.Lock()
+        
+        # Rendered prompts, built once per category
+        self.prompt_caching = prompt_caching
+        self._rendered_prompts = {}
+        for category in self.CATEGORIES:
+            self._render_prompt(category)
     
     def _load_prompt(self):
         """Load the prompt template from prompt.txt"""
@@ -64,6 +111,15 @@ class TranscriptFactory:
         with open(details_path, "r", encoding="utf-8") as f:
             return f.read().strip()
     
+    def _render_prompt(self, category):
+        """Prompt for a category with {{CALL_DETAILS}} filled in (rendered once, then cached)."""
+        prompt = self._rendered_prompts.get(category)
+        if prompt is None:
+            call_details = self._load_call_details(category)
+            prompt = self.prompt_template.replace("{{CALL_DETAILS}}", call_details)
+            self._rendered_prompts[category] = prompt
+        return prompt
+    
     def generate_transcript(self, category, model="claude-haiku-4-5-20251001", max_tokens=20000, temperature=1):
         """
         Generate a synthetic transcript for the given category.
@@ -80,35 +136,113 @@ class TranscriptFactory:
         if category not in self.CATEGORIES:
             raise ValueError(f"Invalid category. Must be one of: {self.CATEGORIES}")
         
-        # Load call details for this category
-        call_details = self._load_call_details(category)
+        # Prompt with {{CALL_DETAILS}} filled in, rendered once per category
+        prompt = self._render_prompt(category)
         
-        # Replace {{CALL_DETAILS}} placeholder in prompt
-        prompt = self.prompt_template.replace("{{CALL_DETAILS}}", call_details)
+        # The prompt is identical for every call in a category, so let the
+        # API cache it (applies once it is long enough for the model)
+        block = {
+            "type": "text",
+            "text": prompt
+        }
+        if self.prompt_caching:
+            block["cache_control"] = {"type": "ephemeral"}
         
         print(f"Generating transcript for category: {category}...")
         
+        if self.rate_limiter:
+            self.rate_limiter.acquire(len(prompt) / self.CHARS_PER_TOKEN)
+        
         # Call Anthropic API using the format from api_call_sample.py
-        message = self.client.messages.create(
-            model=model,
-            max_tokens=max_tokens,
-            temperature=temperature,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt
-                        }
-                    ]
-                }
-            ]
-        )
+        try:
+            response = self.client.messages.with_raw_response.create(
+                model=model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [block]
+                    }
+                ]
+            )
+        except anthropic.RateLimitError as e:
+            if self.rate_limiter:
+                self.rate_limiter.on_rate_limited(e.response.headers)
+            raise
+        
+        if self.rate_limiter:
+            self.rate_limiter.update_from_headers(response.headers)
+            self.rate_limiter.on_success()
         
+        message = response.parse()
         transcript = message.content[0].text
         return transcript
     
+    def generate_jobs(self, jobs, **generate_kwargs):
+        """
+        Generate transcripts for a list of jobs, `workers` at a time.
+        
+        Results come back as each call finishes, so with several workers
+        they can arrive out of order; give each job its own filename up
+        front to keep the numbering stable. A failed job is reported with
+        its error and does not stop the others.
+        
+        Args:
+            jobs: List of (category, filename) pairs
+            **generate_kwargs: Passed on to generate_transcript (model, max_tokens, ...)
+            
+        Yields:
+            (category, filename, transcript, error) with exactly one of
+            transcript/error set
+        """
+        if self.workers == 1:
+            for category, filename in jobs:
+                try:
+                    yield category, filename, self.generate_transcript(category, **generate_kwargs), None
+                except Exception as e:
+                    yield category, filename, None, e
+            return
+        
+        # Submit at most two calls per worker ahead, so a huge job list
+        # doesn't turn into a huge backlog of queued futures
+        pending = iter(jobs)
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="transcript") as executor:
+            try:
+                while True:
+                    for category, filename in pending:
+                        future = executor.submit(self.generate_transcript, category, **generate_kwargs)
+                        in_flight[future] = (category, filename)
+                        if len(in_flight) >= 2 * self.workers:
+                            break
+                    if not in_flight:
+                        return
+                    
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        category, filename = in_flight.pop(future)
+                        error = future.exception()
+                        yield category, filename, None if error else future.result(), error
+            finally:
+                # Stopped early (caller broke out or raised): drop queued calls
+                for future in in_flight:
+                    future.cancel()
+    
+    @property
+    def manifest(self):
+        """
+        Manifest of the transcripts under base_dir, synced with the folders
+        once when first opened and kept current by save_transcript after that.
+        Safe to use from the worker threads.
+        """
+        with self._manifest_lock:
+            if self._manifest is None or self._manifest.base_dir != self.base_dir:
+                if self._manifest is not None:
+                    self._manifest.close()
+                self._manifest = TranscriptManifest.open(self.base_dir, categories=self.CATEGORIES)
+            return self._manifest
+    
     def save_transcript(self, category, transcript, custom_filename=None):
         """
         Save transcript to the appropriate category directory.
@@ -135,6 +269,10 @@ class TranscriptFactory:
         with open(filepath, "w", encoding="utf-8") as f:
             f.write(transcript)
         
+        # Keep the transcript manifest current so listings skip the folder scan;
+        # record() also stores the folder's new mtime, so the next open won't rescan it
+        self.manifest.record(category, filename, size=len(transcript.encode("utf-8")))
+        
         print(f"Saved transcript to: {filepath}")
         return filepath
     
@@ -148,10 +286,13 @@ class TranscriptFactory:
         """
         print(f"\nGenerating {count} transcripts for {category}...")
         
-        for i in range(count):
-            print(f"\n--- Transcript {i+1}/{count} ---")
-            transcript = self.generate_transcript(category)
-            self.save_transcript(category, transcript)
+        if self.workers > 1:
+            self._generate_parallel(self._numbered_jobs([category], count))
+        else:
+            for i in range(count):
+                print(f"\n--- Transcript {i+1}/{count} ---")
+                transcript = self.generate_transcript(category)
+                self.save_transcript(category, transcript)
         
         print(f"\n✅ Completed generating {count} transcripts for {category}")
     
@@ -164,10 +305,33 @@ class TranscriptFactory:
         """
         print(f"\n🚀 Starting bulk generation: {count_per_category} transcripts per category")
         
-        for category in self.CATEGORIES:
-            self.generate_batch(category, count_per_category)
+        if self.workers > 1:
+            # One pool across every category, so it never drains between them
+            print(f"Running {self.workers} workers")
+            self._generate_parallel(self._numbered_jobs(self.CATEGORIES, count_per_category))
+        else:
+            for category in self.CATEGORIES:
+                self.generate_batch(category, count_per_category)
         
         print(f"\n🎉 All done! Generated {len(self.CATEGORIES) * count_per_category} total transcripts")
+    
+    @staticmethod
+    def _numbered_jobs(categories, count):
+        """(category, filename) jobs with timestamp-plus-number names that can't collide."""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return [
+            (category, f"transcript_{timestamp}_{i+1:04d}")
+            for category in categories
+            for i in range(count)
+        ]
+    
+    def _generate_parallel(self, jobs):
+        """Run jobs on the worker pool and save each as it finishes; stop at the first failure."""
+        for done, (category, filename, transcript, error) in enumerate(self.generate_jobs(jobs), 1):
+            print(f"\n--- Transcript {done}/{len(jobs)} ({category}) ---")
+            if error:
+                raise error
+            self.save_transcript(category, transcript, custom_filename=filename)
 
 
 def main():
@@ -182,11 +346,13 @@ def main():
     parser.add_argument("--all", action="store_true", 
                        help="Generate for all categories")
     parser.add_argument("--api-key", help="Anthropic API key (or set ANTHROPIC_API_KEY env var)")
+    parser.add_argument("--workers", type=int, default=1,
+                       help="Number of API calls to run at once (default: 1)")
     
     args = parser.parse_args()
     
     try:
-        factory = TranscriptFactory(api_key=args.api_key)
+        factory = TranscriptFactory(api_key=args.api_key, workers=args.workers)
         
         if args.all:
             factory.generate_all_categories(count_per_category=args.count)
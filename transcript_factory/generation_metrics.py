@@ -0,0 +1,334 @@
+"""
+Generation Metrics
+==================
+Per-request records and histograms for a bulk generation run, to show
+whether a run is bound by the rate limit, API latency or local disk I/O.
+
+Every finished request (success or final failure, after retries) becomes
+a RequestRecord:
+
+- queue_wait: time waiting for a concurrency slot
+- rate_limit_wait: time the token-bucket rate limiter held the request
+- ttfb: request start to response headers (for a non-streamed response the
+  API only sends headers once the whole message is generated, so this is
+  close to latency)
+- latency: request start to complete response (last attempt)
+- input/output/cache-read tokens from message.usage, attempts, category
+  and how many transcripts the request asked for
+
+Records are aggregated into fixed-bucket histograms. Two more histograms
+cover local I/O:
+- writer_wait: time blocked on a full writer queue
+- save_seconds: time to write one file
+
+write() exports everything in three forms:
+- JSON
+- Prometheus text exposition format (.prom), for a node_exporter
+  textfile collector
+- the raw records as JSON lines
+
+snapshot() gives the live view used by the progress display.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+METRIC_PREFIX = "transcript_generation"
+
+
+@dataclass
+class RequestRecord:
+    """One generation job, as seen by the factory."""
+    category: str
+    index: int
+    outcome: str  # "ok" or the final error type
+    attempts: int = 1
+    transcripts: int = 1  # transcripts asked for in the one response
+    queue_wait: float = 0.0
+    rate_limit_wait: float = 0.0
+    ttfb: Optional[float] = None
+    latency: Optional[float] = None
+    total_seconds: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus style) with quantile estimates."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        slot = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                slot = i
+                break
+        self.counts[slot] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by interpolating inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower  # beyond the largest bucket
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self) -> dict:
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            running += bucket_count
+            cumulative.append([bound, running])
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": self.mean,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": cumulative
+        }
+
+
+class GenerationMetrics:
+    """Collects RequestRecords and aggregates them into histograms."""
+
+    HISTOGRAMS = {
+        "queue_wait_seconds": SECONDS_BUCKETS,
+        "rate_limit_wait_seconds": SECONDS_BUCKETS,
+        "ttfb_seconds": SECONDS_BUCKETS,
+        "latency_seconds": SECONDS_BUCKETS,
+        "writer_wait_seconds": SECONDS_BUCKETS,
+        "save_seconds": SECONDS_BUCKETS,
+        "input_tokens": TOKEN_BUCKETS,
+        "output_tokens": TOKEN_BUCKETS
+    }
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.records: List[RequestRecord] = []
+        self.histograms: Dict[str, Histogram] = {
+            name: Histogram(buckets) for name, buckets in self.HISTOGRAMS.items()
+        }
+        self.requests = Counter()               # (category, outcome) -> jobs
+        self.tokens = defaultdict(Counter)      # category -> {"input": n, "output": n, "cache_read": n}
+        self.attempt_errors = Counter()         # error type -> failed attempts (retried or not)
+        self.retries = 0
+        self._lock = threading.Lock()           # histograms are also fed from writer threads
+
+    # -- Recording --------------------------------------------------------
+
+    def record_request(self, record: RequestRecord):
+        """Add a finished job."""
+        self.records.append(record)
+        self.requests[(record.category, record.outcome)] += 1
+        self.retries += record.attempts - 1
+        tokens = self.tokens[record.category]
+        tokens["input"] += record.input_tokens
+        tokens["output"] += record.output_tokens
+        tokens["cache_read"] += record.cache_read_tokens
+
+        observations = [
+            ("queue_wait_seconds", record.queue_wait),
+            ("rate_limit_wait_seconds", record.rate_limit_wait)
+        ]
+        if record.outcome == "ok":
+            observations += [
+                ("ttfb_seconds", record.ttfb or 0.0),
+                ("latency_seconds", record.latency or 0.0),
+                ("input_tokens", record.input_tokens),
+                ("output_tokens", record.output_tokens)
+            ]
+        with self._lock:
+            for name, value in observations:
+                self.histograms[name].observe(value)
+
+    def record_attempt_error(self, error: BaseException):
+        """Count a failed attempt by exception type."""
+        self.attempt_errors[type(error).__name__] += 1
+
+    def observe(self, name: str, value: float):
+        """Add one observation to a named histogram (thread-safe)."""
+        with self._lock:
+            self.histograms[name].observe(value)
+
+    def timed_save(self, save_fn: Callable) -> Callable:
+        """Wrap a blocking save function so its duration lands in save_seconds."""
+        def save(*args, **kwargs):
+            started = time.monotonic()
+            try:
+                return save_fn(*args, **kwargs)
+            finally:
+                self.observe("save_seconds", time.monotonic() - started)
+        return save
+
+    # -- Reporting --------------------------------------------------------
+
+    def bottleneck(self) -> str:
+        """
+        Best guess at what bounds the run, from where jobs spent their time:
+        "rate limit", "local I/O", "concurrency" (waiting for a slot) or
+        "API latency".
+        """
+        h = self.histograms
+        if not h["latency_seconds"].count:
+            return "unknown"
+        waits = {
+            "rate limit": h["rate_limit_wait_seconds"].sum,
+            "local I/O": h["writer_wait_seconds"].sum + h["save_seconds"].sum,
+            "concurrency": h["queue_wait_seconds"].sum,
+            "API latency": h["latency_seconds"].sum
+        }
+        return max(waits, key=waits.get)
+
+    def snapshot(self) -> dict:
+        """Compact live view: throughput, latency quantiles, token totals, bottleneck."""
+        elapsed = time.monotonic() - self.started
+        completed = sum(count for (_, outcome), count in self.requests.items() if outcome == "ok")
+        failed = sum(count for (_, outcome), count in self.requests.items() if outcome != "ok")
+        h = self.histograms
+        with self._lock:
+            return {
+                "elapsed_seconds": round(elapsed, 3),
+                "completed": completed,
+                "failed": failed,
+                "retries": self.retries,
+                "requests_per_second": completed / elapsed if elapsed > 0 else 0.0,
+                "output_tokens_per_second": (
+                    sum(tokens["output"] for tokens in self.tokens.values()) / elapsed if elapsed > 0 else 0.0
+                ),
+                "latency_p50": h["latency_seconds"].quantile(0.5),
+                "latency_p95": h["latency_seconds"].quantile(0.95),
+                "ttfb_p50": h["ttfb_seconds"].quantile(0.5),
+                "queue_wait_mean": h["queue_wait_seconds"].mean,
+                "rate_limit_wait_mean": h["rate_limit_wait_seconds"].mean,
+                "writer_wait_mean": h["writer_wait_seconds"].mean,
+                "save_mean": h["save_seconds"].mean,
+                "bottleneck": self.bottleneck()
+            }
+
+    def to_dict(self) -> dict:
+        """Full aggregate: snapshot, counters and every histogram."""
+        with self._lock:
+            histograms = {name: histogram.to_dict() for name, histogram in self.histograms.items()}
+        return {
+            "snapshot": self.snapshot(),
+            "requests": [
+                {"category": category, "outcome": outcome, "count": count}
+                for (category, outcome), count in sorted(self.requests.items())
+            ],
+            "tokens": {category: dict(tokens) for category, tokens in sorted(self.tokens.items())},
+            "attempt_errors": dict(self.attempt_errors),
+            "histograms": histograms
+        }
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+
+        name = f"{METRIC_PREFIX}_requests_total"
+        lines += [f"# HELP {name} Finished generation jobs by category and outcome.", f"# TYPE {name} counter"]
+        for (category, outcome), count in sorted(self.requests.items()):
+            lines.append(f'{name}{{category="{category}",outcome="{outcome}"}} {count}')
+
+        name = f"{METRIC_PREFIX}_retries_total"
+        lines += [f"# HELP {name} Retried attempts.", f"# TYPE {name} counter", f"{name} {self.retries}"]
+
+        name = f"{METRIC_PREFIX}_attempt_errors_total"
+        lines += [f"# HELP {name} Failed attempts by error type.", f"# TYPE {name} counter"]
+        for error, count in sorted(self.attempt_errors.items()):
+            lines.append(f'{name}{{error="{error}"}} {count}')
+
+        name = f"{METRIC_PREFIX}_tokens_total"
+        lines += [f"# HELP {name} Tokens reported in message.usage.", f"# TYPE {name} counter"]
+        for category, tokens in sorted(self.tokens.items()):
+            for kind, count in sorted(tokens.items()):
+                lines.append(f'{name}{{category="{category}",kind="{kind}"}} {count}')
+
+        with self._lock:
+            for metric, histogram in self.histograms.items():
+                name = f"{METRIC_PREFIX}_{metric}"
+                lines += [f"# HELP {name} Per-request {metric.replace('_', ' ')}.", f"# TYPE {name} histogram"]
+                running = 0
+                for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                    running += bucket_count
+                    lines.append(f'{name}_bucket{{le="{bound:g}"}} {running}')
+                lines.append(f'{name}_bucket{{le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum {histogram.sum:.6f}")
+                lines.append(f"{name}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory, run_name: str) -> Dict[str, Path]:
+        """
+        Export the run's metrics next to its transcripts.
+
+        Writes {run_name}.json (aggregate), {run_name}.prom (Prometheus
+        text) and {run_name}.requests.jsonl (one line per request).
+
+        Returns:
+            Paths written, keyed by "json", "prometheus" and "records"
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        paths = {
+            "json": directory / f"{run_name}.json",
+            "prometheus": directory / f"{run_name}.prom",
+            "records": directory / f"{run_name}.requests.jsonl"
+        }
+        _write_atomic(paths["json"], json.dumps(self.to_dict(), indent=2))
+        _write_atomic(paths["prometheus"], self.to_prometheus())
+        _write_atomic(paths["records"], "".join(json.dumps(_rounded(asdict(record))) + "\n" for record in self.records))
+        return paths
+
+    def write_snapshot(self, path):
+        """Replace a live snapshot file (for watching a run from outside)."""
+        _write_atomic(Path(path), json.dumps(self.snapshot(), indent=2))
+
+
+def _rounded(fields: dict) -> dict:
+    return {key: round(value, 6) if isinstance(value, float) else value for key, value in fields.items()}
+
+
+def _write_atomic(path: Path, text: str):
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def format_seconds(value: Optional[float]) -> str:
+    """Short human form of a duration for progress lines."""
+    if value is None:
+        return "-"
+    if value < 1:
+        return f"{value * 1000:.0f}ms"
+    return f"{value:.1f}s"
@@ -0,0 +1,122 @@
+"""
+HTTP Connection Pool
+====================
+Builds the httpx client behind anthropic.AsyncAnthropic with a connection
+pool sized to the generation concurrency, and counts how well connections
+are reused.
+
+- Pool limits follow max_concurrent, so requests never queue for a socket
+  and idle sockets stay open (keep-alive) between requests.
+- HTTP/2 is used when the optional `h2` package is installed
+  (pip install "httpx[http2]"); one connection then multiplexes many
+  concurrent requests.
+- Every request is traced through httpcore, so ConnectionStats can report
+  how many TCP connections and TLS handshakes a run actually paid for.
+- prewarm() opens the connections up front with cheap models.list calls,
+  which also validates the API key before generation starts.
+"""
+
+import asyncio
+import importlib.util
+from collections import Counter
+from typing import Optional
+
+import anthropic
+import httpx
+
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+
+
+def http2_available() -> bool:
+    """True if the optional h2 package needed for HTTP/2 is installed."""
+    return importlib.util.find_spec("h2") is not None
+
+
+class ConnectionStats:
+    """Counts requests, new connections and TLS handshakes on a client."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self.http_versions: Counter = Counter()
+
+    async def _trace(self, event_name: str, info: dict):
+        # httpcore emits "<step>.started" / "<step>.complete" / "<step>.failed"
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+        elif event_name == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+
+    async def on_request(self, request: httpx.Request):
+        self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def on_response(self, response: httpx.Response):
+        self.http_versions[response.http_version] += 1
+
+    @property
+    def reuse_ratio(self) -> float:
+        """Fraction of requests that went out on an already open connection."""
+        if not self.requests:
+            return 0.0
+        return max(0.0, 1 - self.connections_opened / self.requests)
+
+    def summary(self) -> str:
+        versions = ", ".join(f"{version} x{count}" for version, count in self.http_versions.most_common())
+        return (f"{self.connections_opened} connections for {self.requests} requests "
+                f"({self.reuse_ratio:.0%} reused), {self.tls_handshakes} TLS handshakes"
+                + (f" [{versions}]" if versions else ""))
+
+
+def build_http_client(
+    max_concurrent: int,
+    keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+    http2: Optional[bool] = None,
+    stats: Optional[ConnectionStats] = None
+) -> httpx.AsyncClient:
+    """
+    Build an httpx client for anthropic.AsyncAnthropic(http_client=...).
+
+    Args:
+        max_concurrent: Ceiling on concurrent requests; the pool gets a few
+            extra connections on top for probes and batch polling
+        keepalive_expiry: Seconds an idle connection is kept open
+        http2: Force HTTP/2 on or off (default: on if h2 is installed)
+        stats: Optional ConnectionStats to record connection reuse
+
+    Returns:
+        Configured async HTTP client (keeps the SDK's default timeouts)
+    """
+    if http2 is None:
+        http2 = http2_available()
+    elif http2 and not http2_available():
+        raise ValueError("HTTP/2 needs the h2 package: pip install \"httpx[http2]\"")
+
+    limits = httpx.Limits(
+        max_connections=max_concurrent + 4,
+        max_keepalive_connections=max_concurrent,
+        keepalive_expiry=keepalive_expiry
+    )
+    event_hooks = {}
+    if stats is not None:
+        event_hooks = {"request": [stats.on_request], "response": [stats.on_response]}
+
+    return anthropic.DefaultAsyncHttpxClient(limits=limits, http2=http2, event_hooks=event_hooks)
+
+
+async def prewarm(client, connections: int = 1):
+    """
+    Open connections before generation starts, using free models.list calls.
+
+    The first call doubles as a connection and credentials check, so errors
+    (bad key, no network) surface here rather than on the first transcript.
+
+    Args:
+        client: anthropic.AsyncAnthropic (or anything with `models.list`)
+        connections: How many connections to open concurrently
+    """
+    await client.models.list(limit=1)
+    if connections > 1:
+        # The first connection is idle again, so one of these reuses it
+        await asyncio.gather(*(client.models.list(limit=1) for _ in range(connections)))
@@ -0,0 +1,155 @@
+"""
+Job Journal
+===========
+Append-only record of every transcript job in a bulk generation run.
+
+Each line of the journal is a JSON event for one (category, index) job:
+
+    {"ts": "...", "category": "technical_support", "index": 42, "state": "done"}
+
+States move planned -> in_flight -> done | failed. Replaying the file gives
+the latest state of every job, so a crashed or partially failed run can be
+resumed by redoing exactly the jobs that never reached "done".
+"""
+
+import json
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PLANNED = "planned"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+STATES = (PLANNED, IN_FLIGHT, DONE, FAILED)
+
+
+class JobJournal:
+    """Append-only JSON-lines journal of transcript generation jobs."""
+
+    def __init__(self, path, fsync_every: int = 50):
+        """
+        Open (or create) a journal and replay its existing events.
+
+        Args:
+            path: Journal file path
+            fsync_every: Force events to disk after this many writes
+        """
+        self.path = Path(path)
+        self.fsync_every = fsync_every
+        self.states: Dict[Tuple[str, int], str] = {}
+        self.errors: Dict[Tuple[str, int], str] = {}
+        self._lock = threading.Lock()
+        self._unsynced = 0
+
+        self._replay()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _replay(self):
+        """Rebuild the latest state of every job from the journal file."""
+        if not self.path.exists():
+            return
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                    key = (event["category"], int(event["index"]))
+                    state = event["state"]
+                except (ValueError, KeyError, TypeError):
+                    # A crash can leave a torn final line; skip it
+                    continue
+                if state not in STATES:
+                    continue
+                self.states[key] = state
+                if state == FAILED:
+                    self.errors[key] = event.get("error", "")
+                else:
+                    self.errors.pop(key, None)
+
+    def record(self, category: str, index: int, state: str, error: Optional[str] = None):
+        """
+        Append one state change for a job.
+
+        Safe to call from writer threads as well as the event loop.
+
+        Args:
+            category: Call category
+            index: Transcript index
+            state: One of planned, in_flight, done, failed
+            error: Optional error description for failed jobs
+        """
+        if state not in STATES:
+            raise ValueError(f"Unknown job state: {state}")
+
+        event = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "category": category,
+            "index": index,
+            "state": state
+        }
+        if error:
+            event["error"] = error
+
+        with self._lock:
+            self._file.write(json.dumps(event) + "\n")
+            self._file.flush()
+            self._unsynced += 1
+            if state in (DONE, FAILED) and self._unsynced >= self.fsync_every:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+
+            key = (category, index)
+            self.states[key] = state
+            if state == FAILED:
+                self.errors[key] = error or ""
+            else:
+                self.errors.pop(key, None)
+
+    def plan(self, jobs: Iterable[Tuple[str, int]]):
+        """Record a batch of jobs as planned."""
+        for category, index in jobs:
+            self.record(category, index, PLANNED)
+
+    def pending(self, category: Optional[str] = None) -> List[Tuple[str, int]]:
+        """
+        Jobs that were planned but never finished (planned, in_flight or failed).
+
+        Args:
+            category: Optionally restrict to one category
+
+        Returns:
+            Sorted list of (category, index) pairs
+        """
+        return sorted(
+            key for key, state in self.states.items()
+            if state != DONE and (category is None or key[0] == category)
+        )
+
+    def max_index(self, category: str) -> int:
+        """Highest index ever journaled for a category (0 if none)."""
+        return max(
+            (index for cat, index in self.states if cat == category),
+            default=0
+        )
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        """Count jobs per category and state."""
+        counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {s: 0 for s in STATES})
+        for (category, _), state in self.states.items():
+            counts[category][state] += 1
+        return dict(counts)
+
+    def close(self):
+        """Flush and close the journal file."""
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
@@ -0,0 +1,626 @@
+"""
+Mock Anthropic API Server
+=========================
+Local stand-in for the parts of the Anthropic API the transcript factory
+uses, so generation can be exercised without spending API credits:
+
+- POST /v1/messages                         (interactive generation)
+- GET  /v1/models                           (model list, used as a warm-up probe)
+- POST /v1/messages/batches                 (batch submission)
+- GET  /v1/messages/batches/{id}            (batch status)
+- GET  /v1/messages/batches/{id}/results    (batch results, JSON lines)
+
+Responses are synthetic "Agent:/Customer:" transcripts. Point a client at
+it with `base_url=server.base_url`. Requests with "stream": true get a
+server-sent event stream (message_start, content_block_delta, ...).
+
+/v1/messages can also inject faults, either from a fixed script (consumed
+one per request, in order) or at random rates:
+
+- rate_limit        429 rate_limit_error with a retry-after header
+- overloaded        529 overloaded_error
+- server_error      500 api_error
+- bad_request       400 invalid_request_error (must not be retried)
+- slow_drip         headers sent, then the body (or stream) trickles out over drip_seconds
+- connection_reset  socket closed with a TCP reset before any response
+- truncated         content-length announced, half the body sent, socket closed
+                    (streams stop halfway through the events)
+- cut_off           complete 200 response with stop_reason "max_tokens": the text
+                    stops partway (a multi-transcript response loses its last one)
+
+Prompts that ask for several transcripts (multi_transcript) get that many,
+each wrapped in <transcript> tags.
+
+Usage:
+    python mock_api_server.py --port 8765
+    python mock_api_server.py --fault rate_limit=0.1 --fault overloaded=0.05
+
+or from Python:
+
+    with MockAnthropicServer(batch_processing_seconds=0.5) as server:
+        factory = ParallelTranscriptFactory(api_key="test", base_url=server.base_url)
+"""
+
+import json
+import random
+import socket
+import struct
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from multi_transcript import TRANSCRIPT_TAG, requested_count
+
+FAULTS = (
+    "rate_limit",
+    "overloaded",
+    "server_error",
+    "bad_request",
+    "slow_drip",
+    "connection_reset",
+    "truncated",
+    "cut_off"
+)
+
+AGENT_LINES = [
+    "Thank you for calling Frontier Communications, my name is {name}. How can I help you today?",
+    "I'm sorry to hear that. Let me pull up your account. (typing sounds)",
+    "Okay, I can see what's going on here. Give me just a moment...",
+    "I've gone ahead and made that change for you. Is there anything else I can help with?",
+    "Thank you for your patience, and have a great day."
+]
+
+CUSTOMER_LINES = [
+    "Hi, um... I'm calling about my {topic}.",
+    "Yeah, it's been like this since this morning. [inaudible] really frustrating.",
+    "Sure, the account number is... (pause) hold on... okay, 555-0123.",
+    "Oh, okay. That's great, thanks.",
+    "No, that's everything. Thanks for your help."
+]
+
+MOCK_MODEL = "claude-haiku-4-5-20251001"
+
+AGENT_NAMES = ["Sarah", "Mike", "Priya", "Jordan", "Elena", "Marcus"]
+TOPICS = ["internet", "bill", "service upgrade", "router", "account"]
+
+
+def fake_transcript(rng: random.Random, turns: int = 5) -> str:
+    """Build a synthetic transcript in the prompt's Agent/Customer format."""
+    name = rng.choice(AGENT_NAMES)
+    topic = rng.choice(TOPICS)
+    lines = []
+    for i in range(turns):
+        lines.append("Agent: " + AGENT_LINES[i % len(AGENT_LINES)].format(name=name))
+        lines.append("Customer: " + CUSTOMER_LINES[i % len(CUSTOMER_LINES)].format(topic=topic))
+    return "\n\n".join(lines)
+
+
+def fake_message(model: str, text: str, input_tokens: int) -> dict:
+    """A Messages API response body."""
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {
+            "input_tokens": input_tokens,
+            "output_tokens": max(1, len(text) // 4)
+        }
+    }
+
+
+def stream_events(message: dict, chunk_chars: int = 40) -> List[tuple]:
+    """Split a message into the (event, data) pairs of a streamed response."""
+    text = message["content"][0]["text"]
+    start = dict(message, content=[], stop_reason=None)
+    start["usage"] = dict(message["usage"], output_tokens=1)
+    events = [
+        ("message_start", {"type": "message_start", "message": start}),
+        ("content_block_start", {"type": "content_block_start", "index": 0,
+                                 "content_block": {"type": "text", "text": ""}})
+    ]
+    for i in range(0, len(text), chunk_chars):
+        events.append(("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                               "delta": {"type": "text_delta", "text": text[i:i + chunk_chars]}}))
+    events += [
+        ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+        ("message_delta", {"type": "message_delta",
+                           "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                           "usage": {"output_tokens": message["usage"]["output_tokens"]}}),
+        ("message_stop", {"type": "message_stop"})
+    ]
+    return events
+
+
+def _isoformat(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _prompt_text(params: dict) -> str:
+    """All text in a Messages API request body's messages."""
+    texts = []
+    for message in params.get("messages", []):
+        content = message.get("content", "")
+        if isinstance(content, str):
+            texts.append(content)
+        else:
+            texts.extend(block.get("text", "") for block in content)
+    return "\n".join(texts)
+
+
+def _count_input_tokens(params: dict) -> int:
+    """Rough input token count for a Messages API request body."""
+    return max(1, len(_prompt_text(params)) // 4)
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    """Request handler; state lives on the owning MockAnthropicServer."""
+
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def mock(self) -> "MockAnthropicServer":
+        return self.server.mock
+
+    def log_message(self, format, *args):
+        if self.mock.verbose:
+            super().log_message(format, *args)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("content-length") or 0)
+        body = self.rfile.read(length) if length else b""
+        return json.loads(body or b"{}")
+
+    def _send_json(self, status: int, payload, headers: dict = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.send_header("request-id", f"req_{uuid.uuid4().hex[:24]}")
+        for key, value in (headers or {}).items():
+            self.send_header(key, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, error_type: str, message: str, headers: dict = None):
+        self._send_json(status, {
+            "type": "error",
+            "error": {"type": error_type, "message": message}
+        }, headers)
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/v1/messages":
+            self._create_message()
+        elif path == "/v1/messages/batches":
+            self._create_batch()
+        else:
+            self._send_error(404, "not_found_error", f"Unknown path: {path}")
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        parts = path.split("/")
+        if path == "/v1/models":
+            self._send_json(200, {
+                "data": [{"type": "model", "id": MOCK_MODEL, "display_name": "Mock model",
+                          "created_at": "2025-01-01T00:00:00Z"}],
+                "has_more": False,
+                "first_id": MOCK_MODEL,
+                "last_id": MOCK_MODEL
+            })
+        # /v1/messages/batches/{id}[/results]
+        elif len(parts) >= 5 and parts[1:4] == ["v1", "messages", "batches"]:
+            batch_id = parts[4]
+            if len(parts) == 6 and parts[5] == "results":
+                self._batch_results(batch_id)
+            elif len(parts) == 5:
+                self._retrieve_batch(batch_id)
+            else:
+                self._send_error(404, "not_found_error", f"Unknown path: {path}")
+        else:
+            self._send_error(404, "not_found_error", f"Unknown path: {path}")
+
+    # -- Messages ---------------------------------------------------------
+
+    def _create_message(self):
+        params = self._read_json()
+        fault = self.mock.next_fault()
+        if fault in ("rate_limit", "overloaded", "server_error", "bad_request"):
+            self._send_status_fault(fault)
+            return
+        if fault == "connection_reset":
+            self._reset_connection()
+            return
+
+        if self.mock.response_latency:
+            time.sleep(self.mock.response_latency)
+        message = self.mock.generate_message(params, cut_off=fault == "cut_off")
+
+        if params.get("stream"):
+            events = stream_events(message)
+            if fault == "truncated":
+                self._send_stream(events[:len(events) // 2])
+                self._reset_connection()
+            else:
+                pause = self.mock.drip_seconds / len(events) if fault == "slow_drip" else 0.0
+                self._send_stream(events, pause)
+        elif fault == "slow_drip":
+            self._send_slow_drip(message)
+        elif fault == "truncated":
+            self._send_truncated(message)
+        else:
+            self._send_json(200, message, self.mock.rate_limit_headers())
+
+    def _send_stream(self, events: List[tuple], pause: float = 0.0):
+        """Send server-sent events with chunked transfer encoding."""
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        for key, value in self.mock.rate_limit_headers().items():
+            self.send_header(key, str(value))
+        self.end_headers()
+        try:
+            for event, data in events:
+                payload = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+                self.wfile.flush()
+                if pause:
+                    time.sleep(pause)
+            if events and events[-1][0] == "message_stop":
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+        except OSError:
+            # The client hung up (e.g. an idle timeout)
+            self.close_connection = True
+
+    # -- Faults -----------------------------------------------------------
+
+    def _send_status_fault(self, fault: str):
+        if fault == "rate_limit":
+            self._send_error(429, "rate_limit_error", "Number of requests has exceeded your rate limit",
+                             {"retry-after": self.mock.retry_after})
+        elif fault == "overloaded":
+            self._send_error(529, "overloaded_error", "Overloaded")
+        elif fault == "server_error":
+            self._send_error(500, "api_error", "Internal server error")
+        else:
+            self._send_error(400, "invalid_request_error", "messages: field required")
+
+    def _reset_connection(self):
+        """Drop the connection with a TCP RST instead of answering."""
+        self.close_connection = True
+        try:
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.connection.close()
+        except OSError:
+            pass
+
+    def _send_slow_drip(self, message: dict):
+        """Send the headers right away, then trickle the body out."""
+        body = json.dumps(message).encode("utf-8")
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+
+        chunks = 20
+        step = max(1, len(body) // chunks)
+        delay = self.mock.drip_seconds / chunks
+        try:
+            for i in range(0, len(body), step):
+                self.wfile.write(body[i:i + step])
+                self.wfile.flush()
+                time.sleep(delay)
+        except OSError:
+            # The client gave up on us, which is the point of this fault
+            self.close_connection = True
+
+    def _send_truncated(self, message: dict):
+        """Announce the full body, send half of it, then hang up."""
+        body = json.dumps(message).encode("utf-8")
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+        except OSError:
+            pass
+        self._reset_connection()
+
+    # -- Batches ----------------------------------------------------------
+
+    def _create_batch(self):
+        body = self._read_json()
+        requests = body.get("requests", [])
+        if not requests:
+            self._send_error(400, "invalid_request_error", "requests: must not be empty")
+            return
+        batch = self.mock.create_batch(requests)
+        self._send_json(200, self.mock.batch_object(batch))
+
+    def _retrieve_batch(self, batch_id: str):
+        batch = self.mock.batches.get(batch_id)
+        if batch is None:
+            self._send_error(404, "not_found_error", f"Batch not found: {batch_id}")
+            return
+        self._send_json(200, self.mock.batch_object(batch))
+
+    def _batch_results(self, batch_id: str):
+        batch = self.mock.batches.get(batch_id)
+        if batch is None:
+            self._send_error(404, "not_found_error", f"Batch not found: {batch_id}")
+            return
+        if not self.mock.batch_ended(batch):
+            self._send_error(400, "invalid_request_error", "Batch is still processing")
+            return
+
+        body = "".join(json.dumps(entry) + "\n" for entry in batch["results"]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("content-type", "application/binary")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    """Threading server that doesn't print tracebacks for deliberately broken connections."""
+
+    daemon_threads = True
+    # The default backlog of 5 drops SYNs when a client opens its whole
+    # pool at once; the retransmit then looks like a stalled stream
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        if self.mock.verbose:
+            super().handle_error(request, client_address)
+
+
+class MockAnthropicServer:
+    """In-process HTTP stand-in for the Anthropic API."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        batch_processing_seconds: float = 1.0,
+        batch_error_rate: float = 0.0,
+        response_latency: float = 0.0,
+        fault_script: Optional[List[Optional[str]]] = None,
+        fault_rates: Optional[Dict[str, float]] = None,
+        retry_after: float = 1.0,
+        drip_seconds: float = 5.0,
+        seed: int = 42,
+        verbose: bool = False
+    ):
+        """
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            batch_processing_seconds: How long a batch stays "in_progress"
+            batch_error_rate: Fraction of batch requests that come back errored
+            response_latency: Seconds to wait before answering /v1/messages
+            fault_script: Faults for the next /v1/messages requests, one per
+                request in order (None or "ok" means answer normally)
+            fault_rates: Probability of each fault once the script runs out,
+                e.g. {"rate_limit": 0.1, "overloaded": 0.05}
+            retry_after: retry-after seconds sent with injected 429s
+            drip_seconds: How long a slow_drip body takes to arrive
+            seed: Seed for the synthetic transcripts
+            verbose: Log every request
+        """
+        self.batch_processing_seconds = batch_processing_seconds
+        self.batch_error_rate = batch_error_rate
+        self.response_latency = response_latency
+        self.fault_script = list(fault_script or [])
+        self.fault_rates = dict(fault_rates or {})
+        self.retry_after = retry_after
+        self.drip_seconds = drip_seconds
+        self.faults_injected = Counter()
+        self.verbose = verbose
+        self.rng = random.Random(seed)
+        self.batches = {}
+        self.requests_served = 0
+        self._lock = threading.Lock()
+
+        unknown = [f for f in list(self.fault_rates) + self.fault_script if f not in FAULTS + (None, "ok")]
+        if unknown:
+            raise ValueError(f"Unknown faults {unknown}. Must be one of: {FAULTS}")
+
+        self.httpd = _QuietHTTPServer((host, port), _MockHandler)
+        self.httpd.mock = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def next_fault(self) -> Optional[str]:
+        """Pick the fault (if any) for the next /v1/messages request."""
+        with self._lock:
+            if self.fault_script:
+                fault = self.fault_script.pop(0)
+            else:
+                fault = None
+                roll = self.rng.random()
+                for name, rate in self.fault_rates.items():
+                    if roll < rate:
+                        fault = name
+                        break
+                    roll -= rate
+
+            if fault == "ok":
+                fault = None
+            if fault:
+                self.faults_injected[fault] += 1
+            return fault
+
+    def generate_message(self, params: dict, cut_off: bool = False) -> dict:
+        """
+        Synthesize a Messages API response for a request body.
+
+        Args:
+            params: Request body
+            cut_off: End the text early with stop_reason "max_tokens"
+        """
+        count = requested_count(_prompt_text(params))
+        with self._lock:
+            self.requests_served += 1
+            transcripts = [fake_transcript(self.rng, turns=self.rng.randint(4, 8)) for _ in range(count)]
+        if count == 1:
+            text = transcripts[0]
+        else:
+            text = "\n".join(f"<{TRANSCRIPT_TAG}>\n{t}\n</{TRANSCRIPT_TAG}>" for t in transcripts)
+        if cut_off:
+            text = text[:int(len(text) * 0.8)]
+        message = fake_message(params.get("model", "mock-model"), text, _count_input_tokens(params))
+        if cut_off:
+            message["stop_reason"] = "max_tokens"
+        return message
+
+    def rate_limit_headers(self) -> dict:
+        """Generous rate-limit headers, shaped like the real API's."""
+        reset = _isoformat(datetime.now(timezone.utc) + timedelta(seconds=60))
+        return {
+            "anthropic-ratelimit-requests-limit": 4000,
+            "anthropic-ratelimit-requests-remaining": 3999,
+            "anthropic-ratelimit-requests-reset": reset,
+            "anthropic-ratelimit-input-tokens-limit": 4000000,
+            "anthropic-ratelimit-input-tokens-remaining": 3999000,
+            "anthropic-ratelimit-input-tokens-reset": reset
+        }
+
+    def create_batch(self, requests: list) -> dict:
+        """Accept a batch; its results are computed up front and revealed when it ends."""
+        now = datetime.now(timezone.utc)
+        results = []
+        with self._lock:
+            for request in requests:
+                if self.rng.random() < self.batch_error_rate:
+                    result = {
+                        "type": "errored",
+                        "error": {
+                            "type": "error",
+                            "error": {"type": "overloaded_error", "message": "Overloaded"}
+                        }
+                    }
+                else:
+                    params = request.get("params", {})
+                    text = fake_transcript(self.rng, turns=self.rng.randint(4, 8))
+                    result = {
+                        "type": "succeeded",
+                        "message": fake_message(params.get("model", "mock-model"), text, _count_input_tokens(params))
+                    }
+                results.append({"custom_id": request["custom_id"], "result": result})
+
+            batch = {
+                "id": f"msgbatch_{uuid.uuid4().hex[:24]}",
+                "created_at": now,
+                "ends_at": now + timedelta(seconds=self.batch_processing_seconds),
+                "results": results
+            }
+            self.batches[batch["id"]] = batch
+        return batch
+
+    def batch_ended(self, batch: dict) -> bool:
+        return datetime.now(timezone.utc) >= batch["ends_at"]
+
+    def batch_object(self, batch: dict) -> dict:
+        """The MessageBatch JSON for a stored batch."""
+        ended = self.batch_ended(batch)
+        succeeded = sum(1 for r in batch["results"] if r["result"]["type"] == "succeeded")
+        total = len(batch["results"])
+        return {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else total,
+                "succeeded": succeeded if ended else 0,
+                "errored": total - succeeded if ended else 0,
+                "canceled": 0,
+                "expired": 0
+            },
+            "created_at": _isoformat(batch["created_at"]),
+            "expires_at": _isoformat(batch["created_at"] + timedelta(hours=24)),
+            "ended_at": _isoformat(batch["ends_at"]) if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{self.base_url}/v1/messages/batches/{batch['id']}/results" if ended else None
+        }
+
+
+def main():
+    """Run the mock server in the foreground."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local mock of the Anthropic API")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8765, help="Port to bind")
+    parser.add_argument("--batch-seconds", type=float, default=5.0,
+                       help="How long each batch stays in progress")
+    parser.add_argument("--fault", action="append", default=[], metavar="NAME=RATE",
+                       help=f"Inject a fault at a random rate (repeatable). Faults: {', '.join(FAULTS)}")
+    parser.add_argument("--retry-after", type=float, default=1.0,
+                       help="retry-after seconds sent with injected 429s")
+    parser.add_argument("--drip-seconds", type=float, default=90.0,
+                       help="How long slow_drip bodies take to arrive")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    fault_rates = {}
+    for spec in args.fault:
+        name, _, rate = spec.partition("=")
+        fault_rates[name] = float(rate or 0.1)
+
+    server = MockAnthropicServer(
+        host=args.host,
+        port=args.port,
+        batch_processing_seconds=args.batch_seconds,
+        fault_rates=fault_rates,
+        retry_after=args.retry_after,
+        drip_seconds=args.drip_seconds,
+        verbose=args.verbose
+    )
+    print(f"🧪 Mock Anthropic API listening on {server.base_url} (Ctrl-C to stop)")
+    if fault_rates:
+        print("   Injecting faults: " + ", ".join(f"{k}={v:.0%}" for k, v in fault_rates.items()))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping mock server")
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,93 @@
+"""
+Multi-Transcript Requests
+=========================
+Helpers for asking for several transcripts in one API response.
+
+Every request repeats the whole prompt, and input tokens are the binding
+rate limit. Asking for K transcripts per response cuts input tokens and
+request count per transcript by about K. The prompt gets one extra block
+asking for K distinct calls, each wrapped in <transcript> tags:
+
+    <transcript>
+    Agent: Thank you for calling...
+    </transcript>
+    <transcript>
+    Agent: ...
+    </transcript>
+
+split_transcripts() pulls the finished, well-formed transcripts back out.
+A response cut off by max_tokens loses only its unterminated last
+transcript; the caller asks again for whatever is still missing.
+"""
+
+import re
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+TRANSCRIPT_TAG = "transcript"
+
+# Shorter than any plausible call; catches empty or stub sections
+MIN_TRANSCRIPT_CHARS = 200
+
+_TRANSCRIPT_RE = re.compile(rf"<{TRANSCRIPT_TAG}>\s*(.*?)\s*</{TRANSCRIPT_TAG}>", re.DOTALL)
+_COUNT_RE = re.compile(r"Write (\d+) separate call transcripts")
+
+
+def multi_transcript_instructions(count: int) -> str:
+    """Prompt block asking for `count` distinct transcripts in tags."""
+    return (
+        f"Write {count} separate call transcripts for the scenario above, each a different "
+        f"call with its own customer, agent, circumstances, wording and length. "
+        f"Vary names, account details, problems and how each call unfolds so no two "
+        f"transcripts read alike.\n\n"
+        f"Wrap each transcript in <{TRANSCRIPT_TAG}></{TRANSCRIPT_TAG}> tags and output "
+        f"nothing outside the tags. Every transcript follows all of the formatting "
+        f"requirements above."
+    )
+
+
+def requested_count(prompt_text: str) -> int:
+    """Number of transcripts a prompt built with multi_transcript_instructions asks for (1 otherwise)."""
+    match = _COUNT_RE.search(prompt_text)
+    return int(match.group(1)) if match else 1
+
+
+def is_valid_transcript(text: str) -> bool:
+    """Whether a section looks like a transcript in the prompt's format."""
+    return (
+        len(text) >= MIN_TRANSCRIPT_CHARS and
+        text.startswith("Agent:") and
+        "Customer:" in text
+    )
+
+
+def split_transcripts(response_text: str, expected: int) -> List[str]:
+    """
+    Extract the complete, valid transcripts from a multi-transcript response.
+
+    Args:
+        response_text: Full response text
+        expected: Number of transcripts requested (extras are ignored)
+
+    Returns:
+        Up to `expected` transcripts, in response order
+    """
+    sections = (section.strip() for section in _TRANSCRIPT_RE.findall(response_text))
+    return [section for section in sections if is_valid_transcript(section)][:expected]
+
+
+def group_jobs(jobs: Iterable[Tuple[str, int]], size: int) -> Iterator[Tuple[str, List[int]]]:
+    """
+    Lazily group (category, index) jobs into (category, [indices]) requests
+    of up to `size` jobs from the same category.
+
+    Groups are emitted as soon as they fill up; partial groups are emitted
+    once the jobs run out.
+    """
+    pending: Dict[str, List[int]] = {}
+    for category, index in jobs:
+        group = pending.setdefault(category, [])
+        group.append(index)
+        if len(group) >= size:
+            yield category, pending.pop(category)
+    for category, indices in pending.items():
+        yield category, indices
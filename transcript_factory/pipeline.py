@@ -0,0 +1,521 @@
+"""
+Data Pipeline Runner
+====================
+Runs the post-generation scripts as one DAG of stages:
+
+    transcripts/ ──> transcripts_csv ──> customer_ids ──> call_timestamps ──> visualize
+         │                  ├──────────> search_index
+         │                  ├──────────> turn_table
+         │                  └──────────> similar_calls
+         └─────────> customer_mapping
+
+Each stage declares the files it reads and writes. A stage's inputs
+include its own script, so editing OUTAGE_EVENTS in add_customer_ids.py
+reruns customer_ids and whatever reads its output, but not transcripts_csv.
+
+A stage is skipped when its input hashes, its arguments and its outputs
+are all exactly as they were after its last successful run. The hashes
+live in pipeline_state.json along with each file's size and mtime, so an
+unchanged file is not re-read just to be hashed again. A stage whose
+output comes out byte-identical stops the rebuild there: the stages
+downstream see unchanged inputs and are skipped.
+
+Stages that don't depend on each other run at the same time, each in its
+own process. Each stage's output goes to pipeline_logs/<stage>.log.
+
+Transcript generation is not a stage. It costs API calls and is never
+rerun implicitly. The transcripts folder is the pipeline's source input.
+
+Usage:
+    python pipeline.py                     # bring everything up to date
+    python pipeline.py call_timestamps     # one stage plus what it needs
+    python pipeline.py --status            # show what would run
+    python pipeline.py --force customer_ids
+    python pipeline.py --compress          # transcripts zstd-compressed in the CSVs
+"""
+
+import argparse
+import contextlib
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from transcript_codec import dictionary_path
+
+STATE_FILENAME = "pipeline_state.json"
+LOG_DIRNAME = "pipeline_logs"
+
+# Files under a directory input that count towards its hash
+# (transcripts, and segment files when they are packed)
+DIRECTORY_INPUT_PATTERNS = ("*.txt", "*.seg")
+
+# Stage outcomes
+RAN = "ran"
+SKIPPED = "up to date"
+FAILED = "failed"
+BLOCKED = "blocked"
+STALE = "would run"
+
+
+@dataclass
+class Stage:
+    """One step of the pipeline."""
+    name: str
+    func: str                     # "module:function", called with **args
+    args: Dict[str, Any]          # keyword arguments (hashed as the stage's parameters)
+    inputs: List[str]             # files or directories read (including the stage's script)
+    outputs: List[str]            # files written
+    description: str = ""
+    depends_on: Set[str] = field(default_factory=set)
+
+
+def default_stages(root: Path, transcripts_dir: Optional[Path] = None,
+                   customers_file: Optional[Path] = None, compress: bool = False) -> List[Stage]:
+    """
+    The transcript_factory data flow, with every path made absolute.
+
+    Args:
+        root: transcript_factory directory (scripts and CSVs live here)
+        transcripts_dir: Folder of category subfolders (default: root/transcripts)
+        customers_file: customers.csv (default: root/../data/customers.csv)
+        compress: Keep transcripts dictionary-compressed in the CSVs; each
+            CSV then has a .zdict dictionary file alongside
+    """
+    transcripts_dir = Path(transcripts_dir or root / "transcripts").resolve()
+    customers_file = Path(customers_file or root.parent / "data" / "customers.csv").resolve()
+
+    transcripts_csv = root / "call_transcripts.csv"
+    with_customers = root / "call_transcripts_with_customers.csv"
+    with_times = root / "call_transcripts_with_customers_with_times.csv"
+    mapping_csv = root / "customer_transcript_mapping.csv"
+    search_index = root / "call_transcripts.bm25"
+    turns_dir = root / "call_transcripts.turns"
+    similarity_index = root / "call_transcripts.similar"
+
+    def with_dictionary(csv_path):
+        """A transcripts CSV plus, when compressed, its dictionary file."""
+        return [str(csv_path)] + ([str(dictionary_path(csv_path))] if compress else [])
+
+    stages = [
+        Stage(
+            name="transcripts_csv",
+            func="create_transcript_csv:create_transcript_csv",
+            # Appending reads only new or changed transcripts; the CSV comes out
+            # the same as a full build
+            args={"transcripts_dir": str(transcripts_dir), "output_csv": str(transcripts_csv),
+                  "compress": compress, "append": True},
+            inputs=[str(transcripts_dir), str(root / "create_transcript_csv.py")],
+            outputs=with_dictionary(transcripts_csv),
+            description="Collect transcript files into one CSV"
+        ),
+        Stage(
+            name="search_index",
+            func="bm25_index:build_index",
+            # Only new and changed transcripts are tokenized
+            args={"table_path": str(transcripts_csv), "index_dir": str(search_index)},
+            inputs=[*with_dictionary(transcripts_csv), str(root / "bm25_index.py")],
+            outputs=[str(search_index / "manifest.json")],
+            description="Update the BM25 full-text index of the transcripts"
+        ),
+        Stage(
+            name="turn_table",
+            func="turn_table:build_turn_table",
+            args={"table_path": str(transcripts_csv), "output_dir": str(turns_dir)},
+            inputs=[*with_dictionary(transcripts_csv), str(root / "turn_table.py")],
+            outputs=[str(turns_dir / "turns.json")],
+            description="Split the transcripts into a columnar table of speaker turns"
+        ),
+        Stage(
+            name="similar_calls",
+            func="similar_calls:build_similarity_index",
+            # Only new and changed transcripts are embedded
+            args={"table_path": str(transcripts_csv), "index_dir": str(similarity_index)},
+            inputs=[*with_dictionary(transcripts_csv), str(root / "similar_calls.py")],
+            outputs=[str(similarity_index / "meta.json")],
+            description="Update the vector index behind 'find similar calls'"
+        ),
+        Stage(
+            name="customer_mapping",
+            func="generate_customer_mapping:generate_customer_mapping",
+            args={"base_dir": str(transcripts_dir), "output_file": str(mapping_csv)},
+            inputs=[str(transcripts_dir), str(root / "generate_customer_mapping.py")],
+            outputs=[str(mapping_csv)],
+            description="Map transcript files to synthetic customers"
+        ),
+        Stage(
+            name="customer_ids",
+            func="add_customer_ids:add_customer_ids",
+            args={"customers_file": str(customers_file), "transcripts_file": str(transcripts_csv),
+                  "output_file": str(with_customers)},
+            inputs=[str(customers_file), *with_dictionary(transcripts_csv), str(root / "add_customer_ids.py")],
+            outputs=with_dictionary(with_customers),
+            description="Assign customers to calls following the outage events"
+        ),
+        Stage(
+            name="call_timestamps",
+            func="add_call_timestamps:add_call_timestamps",
+            args={"customers_file": str(customers_file), "transcripts_file": str(with_customers),
+                  "output_file": str(with_times)},
+            inputs=[str(customers_file), *with_dictionary(with_customers), str(root / "add_call_timestamps.py")],
+            outputs=with_dictionary(with_times),
+            description="Timestamp calls inside their outage windows"
+        ),
+        Stage(
+            name="visualize",
+            func="visualize_outages:visualize_outages",
+            args={"input_file": str(with_times), "output_dir": str(root)},
+            inputs=[str(with_times), str(root / "visualize_outages.py")],
+            outputs=[str(root / "outage_call_volume.png"), str(root / "outage_call_volume_by_event.png")],
+            description="Plot outage call volumes to PNG"
+        ),
+    ]
+    link_stages(stages)
+    return stages
+
+
+def link_stages(stages: List[Stage]):
+    """Fill in depends_on from matching outputs to inputs, rejecting cycles and duplicate outputs."""
+    producers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in producers:
+                raise ValueError(f"{output} is written by both {producers[output]} and {stage.name}")
+            producers[output] = stage.name
+
+    for stage in stages:
+        stage.depends_on = {producers[path] for path in stage.inputs if path in producers} - {stage.name}
+
+    # Kahn's algorithm; anything left over sits on a cycle
+    remaining = {stage.name: set(stage.depends_on) for stage in stages}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Pipeline has a dependency cycle among: {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+def select_stages(stages: List[Stage], targets: Optional[List[str]]) -> List[Stage]:
+    """The target stages plus everything upstream of them (all stages if no targets)."""
+    if not targets:
+        return list(stages)
+
+    by_name = {stage.name: stage for stage in stages}
+    unknown = [name for name in targets if name not in by_name]
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {', '.join(unknown)}. Stages: {', '.join(by_name)}")
+
+    wanted = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in wanted:
+            wanted.add(name)
+            pending.extend(by_name[name].depends_on)
+    return [stage for stage in stages if stage.name in wanted]
+
+
+class FileHasher:
+    """
+    SHA-256 content hashes, reusing the previous hash of any file whose
+    size and mtime haven't changed since it was last hashed.
+    """
+
+    def __init__(self, cache: Optional[Dict[str, list]] = None):
+        """
+        Args:
+            cache: {path: [size, mtime_ns, sha256]} from an earlier run
+        """
+        self.cache = cache if cache is not None else {}
+        self.files_hashed = 0
+
+    def hash_file(self, path: Path) -> Optional[str]:
+        """Hash of a file's bytes, or None if it doesn't exist."""
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+
+        key = str(path)
+        cached = self.cache.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        self.files_hashed += 1
+        self.cache[key] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def hash_path(self, path: str) -> Optional[str]:
+        """Hash of a file, or of a directory's matching files and their names."""
+        path = Path(path)
+        if not path.is_dir():
+            return self.hash_file(path)
+
+        digest = hashlib.sha256()
+        files = {file for pattern in DIRECTORY_INPUT_PATTERNS for file in path.rglob(pattern)}
+        for file in sorted(files):
+            file_hash = self.hash_file(file)
+            if file_hash is not None:
+                digest.update(f"{file.relative_to(path).as_posix()}\0{file_hash}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def prune(self, keep: Set[str]):
+        """Drop cache entries for files that no longer exist or are no longer tracked."""
+        for key in list(self.cache):
+            if key not in keep and not Path(key).exists():
+                del self.cache[key]
+
+
+def hash_args(args: Dict[str, Any]) -> str:
+    """Stable hash of a stage's keyword arguments."""
+    return hashlib.sha256(json.dumps(args, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _run_stage(func: str, args: Dict[str, Any], root: str, log_path: str) -> float:
+    """
+    Worker-process entry point: import and call one stage, logging its output.
+
+    Returns:
+        Seconds the stage took
+    """
+    # Stages save their plots to files; never try to open a window
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    if root not in sys.path:
+        sys.path.insert(0, root)
+
+    module_name, func_name = func.split(":")
+    started = time.monotonic()
+    with open(log_path, "w", encoding="utf-8") as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            getattr(importlib.import_module(module_name), func_name)(**args)
+        except BaseException:
+            traceback.print_exc()
+            raise
+    return time.monotonic() - started
+
+
+class Pipeline:
+    """Decides which stages are stale and runs them, in parallel where the DAG allows."""
+
+    def __init__(self, stages: List[Stage], root: Path, state_path: Optional[Path] = None):
+        """
+        Args:
+            stages: Stages to consider (see default_stages and select_stages)
+            root: Directory for logs and the default state file
+            state_path: Where hashes from the last runs are kept
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        self.root = Path(root)
+        self.state_path = Path(state_path or self.root / STATE_FILENAME)
+        self.log_dir = self.root / LOG_DIRNAME
+
+        self.state = self._load_state()
+        self.hasher = FileHasher(self.state.setdefault("files", {}))
+
+    def _load_state(self) -> Dict[str, Any]:
+        if not self.state_path.exists():
+            return {"stages": {}, "files": {}}
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            print(f"⚠️  Could not read {self.state_path.name}; every stage will rerun")
+            return {"stages": {}, "files": {}}
+        state.setdefault("stages", {})
+        return state
+
+    def _save_state(self):
+        tracked = {path for stage in self.stages.values() for path in stage.inputs + stage.outputs}
+        self.hasher.prune(tracked)
+        tmp_path = self.state_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def _fingerprint(self, stage: Stage) -> Dict[str, Any]:
+        return {
+            "args": hash_args(stage.args),
+            "inputs": {path: self.hasher.hash_path(path) for path in stage.inputs}
+        }
+
+    def why_stale(self, stage: Stage, fingerprint: Dict[str, Any]) -> Optional[str]:
+        """
+        Reason the stage must run, or None if it is up to date.
+
+        Args:
+            stage: Stage to check
+            fingerprint: Its current argument and input hashes
+        """
+        last = self.state["stages"].get(stage.name)
+        if last is None:
+            return "never run"
+        if last.get("args") != fingerprint["args"]:
+            return "arguments changed"
+        changed = [path for path, digest in fingerprint["inputs"].items() if last["inputs"].get(path) != digest]
+        if changed:
+            return f"{Path(changed[0]).name} changed"
+        for path in stage.outputs:
+            if self.hasher.hash_file(Path(path)) != last["outputs"].get(path):
+                return f"output {Path(path).name} missing or modified"
+        return None
+
+    def run(self, force: Set[str] = frozenset(), jobs: Optional[int] = None,
+            dry_run: bool = False) -> Dict[str, str]:
+        """
+        Bring the stages up to date.
+
+        Args:
+            force: Names of stages to rerun even if up to date
+            jobs: Most stages to run at once (default: CPU count)
+            dry_run: Only report what would run
+
+        Returns:
+            {stage name: outcome} (RAN, SKIPPED, FAILED, BLOCKED or STALE)
+        """
+        outcomes: Dict[str, str] = {}
+        waiting = dict(self.stages)
+        running = {}
+        self.log_dir.mkdir(exist_ok=True)
+
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+            while waiting or running:
+                for name, stage in list(waiting.items()):
+                    deps = stage.depends_on & set(self.stages)
+                    if any(dep not in outcomes for dep in deps):
+                        continue
+                    del waiting[name]
+
+                    if any(outcomes[dep] in (FAILED, BLOCKED) for dep in deps):
+                        outcomes[name] = BLOCKED
+                        print(f"⏭️  {name}: blocked by a failed upstream stage")
+                        continue
+                    if dry_run and any(outcomes[dep] == STALE for dep in deps):
+                        # Upstream would rebuild first; assume its output changes
+                        outcomes[name] = STALE
+                        print(f"🔸 {name}: would run (upstream stage would run)")
+                        continue
+
+                    fingerprint = self._fingerprint(stage)
+                    missing = [path for path, digest in fingerprint["inputs"].items() if digest is None]
+                    if missing:
+                        outcomes[name] = FAILED
+                        print(f"❌ {name}: missing input {missing[0]}")
+                        continue
+
+                    reason = "forced" if name in force else self.why_stale(stage, fingerprint)
+                    if reason is None:
+                        outcomes[name] = SKIPPED
+                        print(f"✓  {name}: up to date")
+                        continue
+                    if dry_run:
+                        outcomes[name] = STALE
+                        print(f"🔸 {name}: would run ({reason})")
+                        continue
+
+                    print(f"▶️  {name}: running ({reason})")
+                    log_path = self.log_dir / f"{name}.log"
+                    future = executor.submit(_run_stage, stage.func, stage.args, str(self.root), str(log_path))
+                    running[future] = (stage, fingerprint, log_path)
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, fingerprint, log_path = running.pop(future)
+                    outcomes[stage.name] = self._finish(stage, fingerprint, log_path, future)
+
+        self._save_state()
+        return outcomes
+
+    def _finish(self, stage: Stage, fingerprint: Dict[str, Any], log_path: Path, future) -> str:
+        """Record a finished stage's hashes (or report its failure)."""
+        error = future.exception()
+        missing = [path for path in stage.outputs if not Path(path).exists()]
+        if error is None and missing:
+            error = FileNotFoundError(f"stage did not write {Path(missing[0]).name}")
+
+        if error is not None:
+            print(f"❌ {stage.name}: {error} (log: {log_path})")
+            self.state["stages"].pop(stage.name, None)
+            self._save_state()
+            return FAILED
+
+        seconds = future.result()
+        self.state["stages"][stage.name] = {
+            **fingerprint,
+            "outputs": {path: self.hasher.hash_file(Path(path)) for path in stage.outputs},
+            "ran_at": datetime.now().isoformat(timespec="seconds"),
+            "seconds": round(seconds, 2)
+        }
+        self._save_state()
+        print(f"✅ {stage.name}: done in {seconds:.1f}s")
+        return RAN
+
+
+def main():
+    """Run or inspect the data pipeline."""
+    root = Path(__file__).resolve().parent
+
+    parser = argparse.ArgumentParser(description="Run the transcript data pipeline incrementally")
+    parser.add_argument("stages", nargs="*", help="Stages to bring up to date (default: all)")
+    parser.add_argument("--transcripts-dir", type=Path, help="Transcripts folder (default: ./transcripts)")
+    parser.add_argument("--customers", type=Path, help="customers.csv (default: ../data/customers.csv)")
+    parser.add_argument("--force", action="store_true", help="Rerun the named stages (or all) even if up to date")
+    parser.add_argument("--status", action="store_true", help="Show what would run without running it")
+    parser.add_argument("--jobs", type=int, help="Most stages to run at once (default: CPU count)")
+    parser.add_argument("--list", action="store_true", help="List the stages and exit")
+    parser.add_argument("--compress", action="store_true",
+                        help="Keep transcripts dictionary-compressed in the CSVs (needs zstandard)")
+    args = parser.parse_args()
+
+    stages = default_stages(root, args.transcripts_dir, args.customers, compress=args.compress)
+
+    if args.list:
+        for stage in stages:
+            after = f" (after {', '.join(sorted(stage.depends_on))})" if stage.depends_on else ""
+            print(f"{stage.name:18s} {stage.description}{after}")
+        return 0
+
+    try:
+        selected = select_stages(stages, args.stages)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    force = set()
+    if args.force:
+        force = set(args.stages) if args.stages else {stage.name for stage in selected}
+
+    pipeline = Pipeline(selected, root)
+    started = time.monotonic()
+    outcomes = pipeline.run(force=force, jobs=args.jobs, dry_run=args.status)
+
+    counts = {}
+    for outcome in outcomes.values():
+        counts[outcome] = counts.get(outcome, 0) + 1
+    summary = ", ".join(f"{count} {outcome}" for outcome, count in counts.items())
+    print(f"\n{summary} in {time.monotonic() - started:.1f}s "
+          f"({pipeline.hasher.files_hashed} files hashed)")
+
+    return 1 if any(outcome in (FAILED, BLOCKED) for outcome in outcomes.values()) else 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,342 @@
+"""
+Token-Bucket Rate Limiter
+=========================
+Client-side limiter for the Anthropic API that enforces both
+requests-per-minute and input-tokens-per-minute budgets.
+
+The limiter keeps one token bucket per budget and only lets a request
+through when both buckets can cover it. It also listens to the server:
+- `retry-after` on a 429 pauses all callers until the server is ready again
+- `anthropic-ratelimit-*` headers clamp the local buckets to what the
+  server says is actually left, so we slow down before hitting the wall
+- every 429 halves the effective rate, and each success restores a small
+  step of it, so throughput ramps back smoothly instead of bursting
+
+AsyncRateLimiter serves asyncio callers; RateLimiter is the same limiter
+for threads (see TranscriptFactory's workers mode).
+"""
+
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+# Account-wide API budgets (kept just under the 4K RPM / 4M ITPM limits)
+DEFAULT_REQUESTS_PER_MINUTE = 3800
+DEFAULT_INPUT_TOKENS_PER_MINUTE = 3_800_000
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Read the retry delay (in seconds) from response headers.
+
+    Args:
+        headers: Response headers
+
+    Returns:
+        Seconds to wait, or None if the server did not say
+    """
+    if headers is None:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000.0)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+
+    # Fall back to the HTTP-date form
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """Convert an RFC 3339 reset timestamp into seconds from now."""
+    if not value:
+        return None
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(0.0, (reset_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    """Parse an integer header value, ignoring junk."""
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, burst_seconds: float = 2.0):
+        """
+        Args:
+            rate_per_minute: Sustained refill rate
+            burst_seconds: Bucket capacity expressed in seconds of refill
+        """
+        self.rate_per_minute = float(rate_per_minute)
+        self.burst_seconds = burst_seconds
+        self.capacity = max(1.0, self.rate_per_minute / 60.0 * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def set_rate(self, rate_per_minute: float):
+        """Change the sustained rate (e.g. when the server reports a lower limit)."""
+        self.rate_per_minute = float(rate_per_minute)
+        self.capacity = max(1.0, self.rate_per_minute / 60.0 * self.burst_seconds)
+        self.tokens = min(self.tokens, self.capacity)
+
+    def refill(self, now: float, scale: float = 1.0):
+        """Add the tokens earned since the last refill."""
+        if now < self.updated:
+            # Paused until `updated` (see AsyncRateLimiter.on_rate_limited)
+            return
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_minute / 60.0 * scale)
+        self.updated = now
+
+    def time_until(self, amount: float, scale: float = 1.0) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        rate_per_second = self.rate_per_minute / 60.0 * scale
+        return (amount - self.tokens) / rate_per_second
+
+    def consume(self, amount: float):
+        """Take `amount` tokens (clamped to capacity so oversized requests still pass)."""
+        self.tokens -= min(amount, self.capacity)
+
+    def clamp(self, remaining: float):
+        """Never hold more tokens than the server says are left."""
+        self.tokens = min(self.tokens, float(remaining))
+
+
+class _BaseRateLimiter:
+    """Budget bookkeeping shared by the asyncio and threaded limiters."""
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        input_tokens_per_minute: float,
+        burst_seconds: float = 2.0,
+        min_rate_scale: float = 0.1,
+        recovery_step: float = 0.02,
+        default_retry_after: float = 1.0
+    ):
+        """
+        Args:
+            requests_per_minute: Request budget
+            input_tokens_per_minute: Input token budget
+            burst_seconds: How many seconds of budget may be spent at once
+            min_rate_scale: Lowest fraction of the configured rate we back off to
+            recovery_step: Fraction of the rate restored after each success
+            default_retry_after: Pause used when a 429 carries no retry-after
+        """
+        self.requests = TokenBucket(requests_per_minute, burst_seconds)
+        self.input_tokens = TokenBucket(input_tokens_per_minute, burst_seconds)
+        self.min_rate_scale = min_rate_scale
+        self.recovery_step = recovery_step
+        self.default_retry_after = default_retry_after
+
+        self.rate_scale = 1.0
+        self.blocked_until = 0.0
+
+        self.stats = {
+            "acquired": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "rate_limited": 0
+        }
+
+    def _refill(self, now: float):
+        self.requests.refill(now, self.rate_scale)
+        self.input_tokens.refill(now, self.rate_scale)
+
+    def _reserve(self, input_tokens: float) -> float:
+        """
+        Take one request's budget if it is available now.
+
+        Returns:
+            0 if the budget was taken, otherwise seconds to wait before trying again
+        """
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        delay = max(
+            self.requests.time_until(1, self.rate_scale),
+            self.input_tokens.time_until(input_tokens, self.rate_scale)
+        )
+        if delay <= 0:
+            self.requests.consume(1)
+            self.input_tokens.consume(input_tokens)
+        return max(0.0, delay)
+
+    def _record_acquire(self, waited: float):
+        self.stats["acquired"] += 1
+        if waited > 0:
+            self.stats["waits"] += 1
+            self.stats["wait_seconds"] += waited
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """
+        Fold the server's rate-limit headers into the local buckets.
+
+        Args:
+            headers: Response headers from a successful call
+        """
+        if headers is None:
+            return
+
+        now = time.monotonic()
+        self._refill(now)
+
+        for bucket, prefix in (
+            (self.requests, "anthropic-ratelimit-requests"),
+            (self.input_tokens, "anthropic-ratelimit-input-tokens")
+        ):
+            limit = _parse_int(headers.get(f"{prefix}-limit"))
+            remaining = _parse_int(headers.get(f"{prefix}-remaining"))
+
+            # The server knows our real tier; never plan above it
+            if limit and limit < bucket.rate_per_minute:
+                bucket.set_rate(limit)
+
+            if remaining is None:
+                continue
+            bucket.clamp(remaining)
+
+            if remaining <= 0:
+                reset_in = _parse_reset(headers.get(f"{prefix}-reset"))
+                if reset_in:
+                    self.blocked_until = max(self.blocked_until, now + reset_in)
+
+    def on_success(self):
+        """Restore a little of the rate after a successful request."""
+        self.rate_scale = min(1.0, self.rate_scale + self.recovery_step)
+
+    def on_rate_limited(self, headers: Optional[Mapping[str, str]] = None):
+        """
+        Back off after a 429: pause everyone and halve the effective rate.
+
+        Args:
+            headers: Headers from the 429 response (for retry-after)
+        """
+        retry_after = parse_retry_after(headers)
+        if retry_after is None:
+            retry_after = self.default_retry_after
+
+        self.stats["rate_limited"] += 1
+        self.rate_scale = max(self.min_rate_scale, self.rate_scale * 0.5)
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+        # Drain the buckets and start refilling only once the pause ends,
+        # so the resume is paced rather than a burst
+        for bucket in (self.requests, self.input_tokens):
+            bucket.tokens = min(bucket.tokens, 0.0)
+            bucket.updated = max(bucket.updated, self.blocked_until)
+
+
+class AsyncRateLimiter(_BaseRateLimiter):
+    """Adaptive requests/min + input-tokens/min limiter for asyncio callers."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, input_tokens: float = 0):
+        """
+        Wait until one request carrying `input_tokens` fits in both budgets.
+
+        Callers are served in arrival order, so a burst of waiters drains
+        smoothly at the configured rate instead of stampeding.
+
+        Args:
+            input_tokens: Estimated input tokens for the request
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        async with self._lock:
+            while True:
+                delay = self._reserve(input_tokens)
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+                waited += delay
+
+        self._record_acquire(waited)
+        return waited
+
+
+class RateLimiter(_BaseRateLimiter):
+    """Adaptive requests/min + input-tokens/min limiter shared by worker threads."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Waiters queue on one lock; the budget itself sits behind a second,
+        # short-held lock so header updates never wait out someone's sleep
+        self._queue = threading.Lock()
+        self._state = threading.Lock()
+
+    def acquire(self, input_tokens: float = 0):
+        """
+        Block until one request carrying `input_tokens` fits in both budgets.
+
+        The thread at the head of the queue sleeps while the rest wait
+        behind it, so a burst drains at the configured rate.
+
+        Args:
+            input_tokens: Estimated input tokens for the request
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        with self._queue:
+            while True:
+                with self._state:
+                    delay = self._reserve(input_tokens)
+                if delay <= 0:
+                    break
+                time.sleep(delay)
+                waited += delay
+
+        with self._state:
+            self._record_acquire(waited)
+        return waited
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        with self._state:
+            super().update_from_headers(headers)
+
+    def on_success(self):
+        with self._state:
+            super().on_success()
+
+    def on_rate_limited(self, headers: Optional[Mapping[str, str]] = None):
+        with self._state:
+            super().on_rate_limited(headers)
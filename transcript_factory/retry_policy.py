@@ -0,0 +1,93 @@
+"""
+Retry Policy
+============
+Classifies API failures and computes backoff delays for transcript jobs.
+
+- 429 rate limits: retried after the server's retry-after (or backoff)
+- 529 overloaded and other 5xx: retried with exponential backoff + jitter
+- timeouts and connection errors: retried with exponential backoff + jitter
+- streams that drop mid-response or carry an overloaded/api error event:
+  retried with exponential backoff + jitter
+- other 4xx (bad request, auth, not found, ...): never retried
+"""
+
+import asyncio
+import random
+from typing import Optional
+
+import anthropic
+import httpx
+
+from rate_limiter import parse_retry_after
+
+# Error event types that can arrive inside an otherwise successful (HTTP 200) stream
+RETRYABLE_STREAM_ERRORS = ("overloaded_error", "api_error", "rate_limit_error")
+
+
+class IncompleteStreamError(Exception):
+    """A streamed response ended before its message_stop event."""
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for transient API errors."""
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        """
+        Args:
+            max_attempts: Total attempts per job, including the first
+            base_delay: Backoff for the first retry (seconds)
+            max_delay: Upper bound on any single backoff (seconds)
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @staticmethod
+    def is_retryable(error: BaseException) -> bool:
+        """
+        Decide whether a failed request is worth retrying.
+
+        Args:
+            error: Exception raised by the request
+
+        Returns:
+            True for rate limits, overloads, 5xx, timeouts and dropped connections
+        """
+        if isinstance(error, (asyncio.TimeoutError, anthropic.APIConnectionError,
+                              httpx.TransportError, IncompleteStreamError)):
+            return True
+        if isinstance(error, anthropic.APIStatusError):
+            status = error.status_code
+            if status == 429 or status >= 500:
+                return True
+            # Mid-stream error events arrive on a 200 response
+            details = error.body.get("error") if isinstance(error.body, dict) else None
+            return isinstance(details, dict) and details.get("type") in RETRYABLE_STREAM_ERRORS
+        return False
+
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        """
+        Args:
+            error: Exception raised by the request
+            attempt: Attempt number that just failed (1-based)
+        """
+        return attempt < self.max_attempts and self.is_retryable(error)
+
+    def backoff(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """
+        Seconds to wait before the next attempt.
+
+        Args:
+            attempt: Attempt number that just failed (1-based)
+            error: The failure, used to honor a server-provided retry-after
+
+        Returns:
+            Delay in seconds
+        """
+        if isinstance(error, anthropic.APIStatusError):
+            retry_after = parse_retry_after(error.response.headers)
+            if retry_after is not None:
+                return min(self.max_delay, retry_after + random.uniform(0, self.base_delay))
+
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
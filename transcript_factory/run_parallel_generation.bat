@@ -55,7 +55,7 @@ echo ========================================
 echo.
 
 REM Run the parallel generation script
-python generate_bulk_transcripts_parallel.py
+python generate_bulk_transcripts_parallel.py %*
 
 if errorlevel 1 (
     echo.
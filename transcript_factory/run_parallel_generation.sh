@@ -56,7 +56,7 @@ echo "========================================"
 echo ""
 
 # Run the parallel generation script
-$PYTHON_CMD generate_bulk_transcripts_parallel.py
+$PYTHON_CMD generate_bulk_transcripts_parallel.py "$@"
 
 if [ $? -ne 0 ]; then
     echo ""
@@ -0,0 +1,559 @@
+"""
+Transcript Segment Store
+========================
+Packs transcripts into a few large append-only segment files instead of
+one small file each, with a SQLite index pointing at every record:
+
+    store = SegmentStore(base_dir)
+    store.append("billing_inquiry", "billing_inquiry_0042.txt", text, index=42)
+    store.get("billing_inquiry", 42)             # str, via mmap
+    store.read_bytes("billing_inquiry", 42)      # zero-copy memoryview
+    store.get_call(1041)                         # by call_id, once converted
+    for category, filename, text in store.iter_records(): ...
+
+Layout under base_dir (next to the category folders):
+- segment_000001.seg, segment_000002.seg, ...: framed records, appended
+  and never rewritten. Each record is a header (magic, CRC-32 of the
+  text, field lengths), the category, the filename, then the UTF-8 text.
+- segment_index.sqlite: (category, filename) -> segment, offset, length,
+  plus the record's index and call_id. WAL mode, like the manifest.
+
+Every writer creates a fresh segment with an exclusive create, so workers
+in separate processes never interleave bytes in one file. A segment is
+closed once it reaches SEGMENT_MAX_BYTES. Saving a filename again
+appends a new record and repoints the index; the old bytes stay in place
+as dead space.
+
+The index can always be rebuilt from the segments alone. On open, any
+records a crashed writer appended without indexing are picked up from
+the segment tails, and a torn final record is ignored.
+
+Convert an existing tree of .txt files with:
+    python segment_store.py convert [base_dir]
+"""
+
+import argparse
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from call_id_registry import CallIdRegistry
+from transcript_manifest import TranscriptManifest, parse_index
+
+INDEX_FILENAME = "segment_index.sqlite"
+SEGMENT_PATTERN = "segment_{:06d}.seg"
+SEGMENT_GLOB = "segment_*.seg"
+
+# A writer starts a new segment once its current one reaches this size
+SEGMENT_MAX_BYTES = 256 * 1024 * 1024
+
+# magic, crc32(text), len(category), len(filename), len(text)
+_HEADER = struct.Struct("<4sIHHI")
+_MAGIC = b"TSR1"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    category TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    idx INTEGER,
+    call_id INTEGER UNIQUE,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    crc INTEGER NOT NULL,
+    saved_at TEXT,
+    PRIMARY KEY (category, filename)
+);
+CREATE INDEX IF NOT EXISTS records_by_index ON records (category, idx);
+CREATE INDEX IF NOT EXISTS records_by_location ON records (segment, offset);
+"""
+
+# PRAGMA user_version of the current schema; 1 = only {category}_NNNN.txt records have an idx
+_SCHEMA_VERSION = 1
+
+
+class RecordLocation(NamedTuple):
+    """Where a record's text sits: segment number, byte offset and length."""
+    segment: int
+    offset: int
+    length: int
+
+
+def _segment_number(path: Path) -> int:
+    return int(path.stem.split("_")[-1])
+
+
+def scan_segment(path: Path, start: int = 0) -> Iterator[Tuple[str, str, int, int, int]]:
+    """
+    Walk the framed records of one segment file.
+
+    Stops at the first torn or corrupt record (a writer that died mid-append).
+
+    Args:
+        path: Segment file
+        start: Byte offset of the first record to read
+
+    Yields:
+        (category, filename, text offset, text length, crc)
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= start:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            pos = start
+            while pos + _HEADER.size <= size:
+                magic, crc, category_len, filename_len, length = _HEADER.unpack_from(data, pos)
+                text_offset = pos + _HEADER.size + category_len + filename_len
+                if magic != _MAGIC or text_offset + length > size:
+                    return
+                if zlib.crc32(data[text_offset:text_offset + length]) != crc:
+                    return
+                names = data[pos + _HEADER.size:text_offset]
+                category = names[:category_len].decode("utf-8")
+                filename = names[category_len:].decode("utf-8")
+                yield category, filename, text_offset, length, crc
+                pos = text_offset + length
+
+
+class SegmentStore:
+    """Append-only packed transcript store with an offset index."""
+
+    def __init__(self, base_dir, segment_max_bytes: int = SEGMENT_MAX_BYTES):
+        """
+        Open (or create) the store under base_dir and index any records
+        a previous writer appended but never indexed.
+
+        Args:
+            base_dir: Transcripts root (segments sit next to the category folders)
+            segment_max_bytes: Size at which a writer starts a new segment
+        """
+        self.base_dir = Path(base_dir)
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.base_dir / INDEX_FILENAME), timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+            # Older indexes numbered any name ending in _<digits>
+            with self._lock:
+                rows = self._conn.execute("SELECT category, filename FROM records").fetchall()
+                self._conn.executemany(
+                    "UPDATE records SET idx = ? WHERE category = ? AND filename = ?",
+                    ((parse_index(category, filename), category, filename) for category, filename in rows)
+                )
+                self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+                self._conn.commit()
+
+        # This writer's open segment (created on first append)
+        self._segment = None
+        self._segment_file = None
+        self._segment_size = 0
+
+        # Read-only maps, remapped when a segment has grown past them
+        self._maps = {}
+
+        self.recover()
+
+    @staticmethod
+    def exists(base_dir) -> bool:
+        """Whether base_dir holds a segment store."""
+        return (Path(base_dir) / INDEX_FILENAME).exists()
+
+    def segment_path(self, segment: int) -> Path:
+        return self.base_dir / SEGMENT_PATTERN.format(segment)
+
+    def segments(self) -> List[Path]:
+        """Segment files, oldest first."""
+        return sorted(self.base_dir.glob(SEGMENT_GLOB), key=_segment_number)
+
+    # -- Writes -----------------------------------------------------------
+
+    def _open_new_segment(self):
+        """Create the next free segment number exclusively for this writer."""
+        if self._segment_file is not None:
+            self._segment_file.close()
+        existing = self.segments()
+        number = _segment_number(existing[-1]) + 1 if existing else 1
+        while True:
+            try:
+                flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+                fd = os.open(self.segment_path(number), flags, 0o644)
+                break
+            except FileExistsError:
+                # Another writer took this number first
+                number += 1
+        self._segment = number
+        self._segment_file = os.fdopen(fd, "ab", buffering=0)
+        self._segment_size = 0
+
+    def append(self, category: str, filename: str, text: str, index: Optional[int] = None,
+               call_id: Optional[int] = None, replace: bool = True) -> RecordLocation:
+        """
+        Append one transcript and index it. Safe to call from writer threads.
+
+        Args:
+            category: Call category
+            filename: Logical filename (e.g. "billing_inquiry_0042.txt")
+            text: Transcript text
+            index: Numeric index within the category
+            call_id: Optional call_id to look the record up by
+            replace: Repoint an existing (category, filename) entry; if False,
+                raise FileExistsError instead (used by sharded workers)
+
+        Returns:
+            Location of the stored text
+        """
+        payload = text.encode("utf-8")
+        names = category.encode("utf-8") + filename.encode("utf-8")
+        crc = zlib.crc32(payload)
+        record = _HEADER.pack(_MAGIC, crc, len(category.encode("utf-8")), len(filename.encode("utf-8")),
+                              len(payload)) + names + payload
+        saved_at = datetime.now().isoformat(timespec="seconds")
+
+        with self._lock:
+            if not replace and self._lookup("category = ? AND filename = ?", (category, filename)):
+                raise FileExistsError(f"{category}/{filename} is already stored")
+
+            if self._segment_file is None or self._segment_size + len(record) > self.segment_max_bytes:
+                self._open_new_segment()
+            offset = self._segment_size + _HEADER.size + len(names)
+            # One write per record: a crash leaves at most one torn record at the tail
+            self._segment_file.write(record)
+            self._segment_size += len(record)
+
+            location = RecordLocation(self._segment, offset, len(payload))
+            sql = "INSERT OR REPLACE" if replace else "INSERT"
+            try:
+                self._conn.execute(
+                    f"{sql} INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (category, filename, index, call_id, *location, crc, saved_at)
+                )
+                self._conn.commit()
+            except sqlite3.IntegrityError:
+                self._conn.rollback()
+                # Another process recovering the segments may have indexed
+                # this very record already; only someone else's is a clash
+                if self._lookup("category = ? AND filename = ?", (category, filename)) != location:
+                    raise FileExistsError(f"{category}/{filename} is already stored") from None
+        return location
+
+    def assign_call_ids(self, assignments, reset: bool = False):
+        """
+        Set call_ids on stored records.
+
+        Args:
+            assignments: Iterable of (category, filename, call_id)
+            reset: Clear every existing call_id first (when renumbering)
+        """
+        with self._lock:
+            if reset:
+                self._conn.execute("UPDATE records SET call_id = NULL")
+            self._conn.executemany(
+                "UPDATE records SET call_id = ? WHERE category = ? AND filename = ?",
+                ((call_id, category, filename) for category, filename, call_id in assignments)
+            )
+            self._conn.commit()
+
+    # -- Recovery ---------------------------------------------------------
+
+    def recover(self) -> int:
+        """
+        Index records past the indexed end of each segment (appended by a
+        writer that died before indexing them).
+
+        Returns:
+            Number of records recovered
+        """
+        recovered = 0
+        for path in self.segments():
+            segment = _segment_number(path)
+            if segment == self._segment:
+                continue
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT offset + length FROM records WHERE segment = ? ORDER BY offset DESC LIMIT 1",
+                    (segment,)
+                ).fetchone()
+            indexed_end = row[0] if row else 0
+            if path.stat().st_size <= indexed_end:
+                continue
+
+            rows = [
+                (category, filename, parse_index(category, filename), None, segment, offset, length, crc, None)
+                for category, filename, offset, length, crc in scan_segment(path, indexed_end)
+            ]
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                self._conn.commit()
+            recovered += len(rows)
+        return recovered
+
+    def rebuild_index(self) -> int:
+        """
+        Rebuild the whole index by scanning every segment. Later records for
+        the same filename win, as they do when appending. call_ids are kept.
+
+        Returns:
+            Number of indexed records
+        """
+        with self._lock:
+            call_ids = dict(((c, f), i) for c, f, i in self._conn.execute(
+                "SELECT category, filename, call_id FROM records WHERE call_id IS NOT NULL"))
+            self._conn.execute("DELETE FROM records")
+            for path in self.segments():
+                segment = _segment_number(path)
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((category, filename, parse_index(category, filename), call_ids.get((category, filename)),
+                      segment, offset, length, crc, None)
+                     for category, filename, offset, length, crc in scan_segment(path))
+                )
+            self._conn.commit()
+            return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    # -- Reads ------------------------------------------------------------
+
+    def _lookup(self, where: str, params: tuple) -> Optional[RecordLocation]:
+        row = self._conn.execute(f"SELECT segment, offset, length FROM records WHERE {where}", params).fetchone()
+        return RecordLocation(*row) if row else None
+
+    def locate(self, category: str, index: int) -> Optional[RecordLocation]:
+        """Location of a record by (category, index), or None."""
+        with self._lock:
+            return self._lookup("category = ? AND idx = ?", (category, index))
+
+    def _map(self, location: RecordLocation) -> mmap.mmap:
+        data = self._maps.get(location.segment)
+        if data is None or len(data) < location.offset + location.length:
+            # The segment grew since it was mapped; an outgrown map is left
+            # to close itself once no caller holds a view into it
+            with open(self.segment_path(location.segment), "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[location.segment] = data
+        return data
+
+    def read_location(self, location: RecordLocation) -> memoryview:
+        """Zero-copy view of a record's UTF-8 bytes."""
+        with self._lock:
+            data = self._map(location)
+        return memoryview(data)[location.offset:location.offset + location.length]
+
+    def read_bytes(self, category: str, index: int) -> Optional[memoryview]:
+        """Zero-copy view of a record's UTF-8 bytes by (category, index), or None."""
+        location = self.locate(category, index)
+        return self.read_location(location) if location else None
+
+    def get(self, category: str, index: int) -> Optional[str]:
+        """Transcript text by (category, index), or None."""
+        data = self.read_bytes(category, index)
+        return str(data, "utf-8") if data is not None else None
+
+    def get_file(self, category: str, filename: str) -> Optional[str]:
+        """Transcript text by (category, filename), or None."""
+        with self._lock:
+            location = self._lookup("category = ? AND filename = ?", (category, filename))
+        return str(self.read_location(location), "utf-8") if location else None
+
+    def get_call(self, call_id: int) -> Optional[str]:
+        """Transcript text by call_id, or None."""
+        with self._lock:
+            location = self._lookup("call_id = ?", (call_id,))
+        return str(self.read_location(location), "utf-8") if location else None
+
+    def iter_records(self, category: Optional[str] = None, order: str = "location") -> Iterator[Tuple[str, str, str]]:
+        """
+        Every live record's text.
+
+        Args:
+            category: Only this category (default: all)
+            order: "location" (segment order, fastest for full scans) or
+                "name" (category, filename: the order of the old folder walk)
+
+        Yields:
+            (category, filename, text)
+        """
+        order_by = "segment, offset" if order == "location" else "category, filename"
+        where, params = ("WHERE category = ?", (category,)) if category else ("", ())
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT category, filename, segment, offset, length FROM records {where} ORDER BY {order_by}",
+                params
+            ).fetchall()
+        for record_category, filename, *location in rows:
+            yield record_category, filename, str(self.read_location(RecordLocation(*location)), "utf-8")
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def contains(self, category: str, index: int) -> bool:
+        return self.locate(category, index) is not None
+
+    def count(self, category: str, numbered: bool = True) -> int:
+        """
+        Number of records in a category.
+
+        Args:
+            category: Category
+            numbered: Count only "{category}_NNNN.txt" records; False counts every record
+        """
+        if numbered:
+            sql = "SELECT COUNT(*) FROM records WHERE category = ? AND idx IS NOT NULL"
+        else:
+            sql = "SELECT COUNT(*) FROM records WHERE category = ?"
+        return self._query(sql, (category,))[0][0]
+
+    def next_index(self, category: str) -> int:
+        """Index after the highest stored one (1 if there are none)."""
+        highest = self._query("SELECT MAX(idx) FROM records WHERE category = ?", (category,))[0][0]
+        return (highest or 0) + 1
+
+    def locations(self, category: str) -> Dict[str, RecordLocation]:
+        """{filename: location} for every record in a category."""
+        rows = self._query("SELECT filename, segment, offset, length FROM records WHERE category = ?", (category,))
+        return {filename: RecordLocation(*location) for filename, *location in rows}
+
+    def list(self, category: str) -> List[str]:
+        """Filenames in a category, sorted by name."""
+        rows = self._query("SELECT filename FROM records WHERE category = ? ORDER BY filename", (category,))
+        return [row[0] for row in rows]
+
+    def categories(self) -> List[str]:
+        rows = self._query("SELECT DISTINCT category FROM records ORDER BY category")
+        return [row[0] for row in rows]
+
+    def stats(self) -> dict:
+        """Record count, live text bytes and total segment bytes."""
+        records, live_bytes = self._query("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM records")[0]
+        segments = self.segments()
+        return {
+            "records": records,
+            "segments": len(segments),
+            "live_bytes": live_bytes,
+            "segment_bytes": sum(path.stat().st_size for path in segments)
+        }
+
+    def close(self):
+        with self._lock:
+            if self._segment_file is not None:
+                self._segment_file.close()
+                self._segment_file = None
+            for data in self._maps.values():
+                try:
+                    data.close()
+                except BufferError:
+                    # A caller still holds a memoryview; the map closes when it is dropped
+                    pass
+            self._maps.clear()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def convert_tree(base_dir) -> dict:
+    """
+    Pack every .txt transcript under base_dir's category folders into the
+    segment store, skipping records already stored with the same content.
+
+    Every stored record gets its call_id from the call_id registry, so the
+    store and create_transcript_csv agree on them.
+
+    Returns:
+        {"added": n, "unchanged": n, "failed": n}
+    """
+    base_dir = Path(base_dir)
+    counts = {"added": 0, "unchanged": 0, "failed": 0}
+
+    with TranscriptManifest.open(base_dir) as manifest, SegmentStore(base_dir) as store, \
+            CallIdRegistry(base_dir) as registry:
+        stored = {(c, f): crc for c, f, crc in store._query("SELECT category, filename, crc FROM records")}
+        for category in sorted(p.name for p in base_dir.iterdir() if p.is_dir()):
+            for filename in manifest.list(category):
+                try:
+                    with open(base_dir / category / filename, "r", encoding="utf-8") as f:
+                        text = f.read()
+                except Exception as e:
+                    print(f"  ⚠️  Could not read {category}/{filename}: {e}")
+                    counts["failed"] += 1
+                    continue
+
+                if stored.get((category, filename)) == zlib.crc32(text.encode("utf-8")):
+                    counts["unchanged"] += 1
+                else:
+                    store.append(category, filename, text, index=parse_index(category, filename))
+                    counts["added"] += 1
+
+        keys = sorted(store._query("SELECT category, filename FROM records"))
+        call_ids = registry.assign(keys)
+        store.assign_call_ids(((category, filename, call_ids[(category, filename)])
+                               for category, filename in keys), reset=True)
+    return counts
+
+
+def main():
+    """Convert a transcripts tree into a segment store, or inspect one."""
+    parser = argparse.ArgumentParser(description="Packed segment store for transcripts")
+    parser.add_argument("command", choices=("convert", "stats", "get", "rebuild-index"),
+                       help="convert: pack the .txt tree; stats: sizes; get: print one "
+                            "transcript; rebuild-index: rescan all segments")
+    parser.add_argument("base_dir", nargs="?", default=str(Path(__file__).parent / "transcripts"),
+                       help="Transcripts root (default: ./transcripts)")
+    parser.add_argument("--category", help="Category for get")
+    parser.add_argument("--index", type=int, help="Index for get")
+    parser.add_argument("--call-id", type=int, help="call_id for get")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        print(f"📦 Packing transcripts under {args.base_dir} into segments...")
+        counts = convert_tree(args.base_dir)
+        print(f"✓ {counts['added']} added, {counts['unchanged']} unchanged, {counts['failed']} failed")
+
+    with SegmentStore(args.base_dir) as store:
+        if args.command == "get":
+            if args.call_id is not None:
+                text = store.get_call(args.call_id)
+                if text is None:
+                    # Records saved since the last convert only have their id in the registry
+                    with CallIdRegistry(args.base_dir) as registry:
+                        found = registry.lookup(args.call_id)
+                    text = store.get_file(*found) if found else None
+            elif args.category and args.index is not None:
+                text = store.get(args.category, args.index)
+            else:
+                parser.error("get needs --call-id or --category and --index")
+            if text is None:
+                print("❌ No such transcript")
+                return 1
+            print(text)
+            return 0
+
+        if args.command == "rebuild-index":
+            print(f"✓ Rebuilt index: {store.rebuild_index()} records")
+
+        stats = store.stats()
+        print(f"  {stats['records']} records in {stats['segments']} segments")
+        print(f"  {stats['live_bytes'] / 1e6:.1f} MB live text, {stats['segment_bytes'] / 1e6:.1f} MB on disk")
+        for category in store.categories():
+            print(f"  {category}: {store.count(category, numbered=False)} transcripts")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
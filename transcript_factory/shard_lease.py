@@ -0,0 +1,322 @@
+"""
+Sharded Generation and Lease Files
+==================================
+Lets several processes (on one host or many, sharing a filesystem) generate
+one bulk run without ever handing out the same transcript index twice.
+
+Each category's index space 1..target is cut into fixed blocks of
+`block_size` indices. A worker only generates missing indices inside
+blocks it owns, and ownership comes from one of two claimers:
+
+- StaticShard ("--shard i/N"): worker i owns every block b with b % N == i.
+  No coordination at all; start exactly N workers.
+- LeaseManager ("--lease-dir DIR"): workers claim blocks on demand by
+  creating a lease file with O_CREAT | O_EXCL, so any number of workers can
+  join or leave. Leases are renewed by a heartbeat and expire if a worker
+  dies, after which another worker may take the block over.
+
+Either way the files on disk are the source of truth: a block is re-scanned
+for missing files when it is claimed, so rerunning a worker fills gaps left
+by failures or crashes.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_BLOCK_SIZE = 100
+DEFAULT_LEASE_TTL = 600.0
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    Parse a "--shard i/N" spec (0-based shard i of N).
+
+    Raises:
+        ValueError: If the spec is malformed or out of range
+    """
+    try:
+        shard_index, shard_count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}'. Expected i/N, e.g. 0/4")
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise ValueError(f"Invalid shard '{spec}'. Need 0 <= i < N")
+    return shard_index, shard_count
+
+
+def block_indices(block: int, block_size: int, limit: int) -> range:
+    """Transcript indices (1-based) covered by a block, capped at limit."""
+    start = block * block_size + 1
+    return range(start, min(start + block_size, limit + 1))
+
+
+def block_count(limit: int, block_size: int) -> int:
+    """Number of blocks needed to cover indices 1..limit."""
+    return (limit + block_size - 1) // block_size
+
+
+def default_worker_id() -> str:
+    """Identify this worker by host and process id."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class StaticShard:
+    """Owns every block whose number is congruent to the shard index."""
+
+    def __init__(self, shard_index: int, shard_count: int):
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.worker_id = f"shard-{shard_index}-of-{shard_count}"
+
+    def claim(self, category: str, block: int) -> bool:
+        return block % self.shard_count == self.shard_index
+
+    def release_all(self):
+        pass
+
+    def __repr__(self):
+        return f"StaticShard({self.shard_index}/{self.shard_count})"
+
+
+class LeaseManager:
+    """Claims blocks through exclusive lease files on a shared filesystem."""
+
+    def __init__(self, lease_dir, worker_id: Optional[str] = None, ttl: float = DEFAULT_LEASE_TTL):
+        """
+        Args:
+            lease_dir: Directory for lease files (shared by all workers)
+            worker_id: Name recorded in the leases (default: host-pid)
+            ttl: Seconds a lease stays valid without a heartbeat
+        """
+        self.lease_dir = Path(lease_dir)
+        self.worker_id = worker_id or default_worker_id()
+        self.ttl = ttl
+        self.held: Dict[Tuple[str, int], Path] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "claimed": 0,
+            "contended": 0,
+            "taken_over": 0
+        }
+
+    def lease_path(self, category: str, block: int) -> Path:
+        return self.lease_dir / category / f"block_{block:06d}.lease"
+
+    def _lease_body(self) -> str:
+        return json.dumps({
+            "worker": self.worker_id,
+            "expires": time.time() + self.ttl
+        })
+
+    def _is_expired(self, path: Path) -> bool:
+        """True if the lease at path has outlived its expiry time."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                expires = float(json.load(f)["expires"])
+        except FileNotFoundError:
+            return False
+        except (ValueError, KeyError, TypeError):
+            # Torn or foreign lease: fall back to its modification time
+            try:
+                expires = path.stat().st_mtime + self.ttl
+            except FileNotFoundError:
+                return False
+        return expires < time.time()
+
+    def _create(self, path: Path) -> bool:
+        """Atomically create the lease file; False if it already exists."""
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self._lease_body())
+            f.flush()
+            os.fsync(f.fileno())
+        return True
+
+    def _take_over(self, path: Path) -> bool:
+        """
+        Replace an expired lease with our own.
+
+        The stale lease is first renamed to a name unique to this worker;
+        rename is atomic, so only one contender can win it. If what we moved
+        turns out to be live (another worker took over a moment earlier),
+        it is put back and the claim is abandoned.
+        """
+        tombstone = path.with_name(f"{path.name}.stale-{self.worker_id}")
+        try:
+            os.rename(path, tombstone)
+        except FileNotFoundError:
+            return False
+        if not self._is_expired(tombstone):
+            try:
+                os.link(tombstone, path)
+            except FileExistsError:
+                pass
+            os.unlink(tombstone)
+            return False
+        os.unlink(tombstone)
+        return self._create(path)
+
+    def claim(self, category: str, block: int) -> bool:
+        """
+        Try to lease a block for this worker.
+
+        Returns:
+            True if the block is now held by this worker
+        """
+        key = (category, block)
+        if key in self.held:
+            return True
+
+        path = self.lease_path(category, block)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        claimed = self._create(path)
+        if not claimed and self._is_expired(path):
+            claimed = self._take_over(path)
+            if claimed:
+                self.stats["taken_over"] += 1
+
+        if not claimed:
+            self.stats["contended"] += 1
+            return False
+
+        with self._lock:
+            self.held[key] = path
+        self.stats["claimed"] += 1
+        return True
+
+    def _owner(self, path: Path) -> Optional[str]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f).get("worker")
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def renew(self):
+        """Push back the expiry of every held lease."""
+        with self._lock:
+            held = list(self.held.items())
+        for key, path in held:
+            if self._owner(path) != self.worker_id:
+                # We stalled past the TTL and another worker took the block
+                print(f"\n⚠️  Lost lease on {key[0]} block {key[1]}")
+                with self._lock:
+                    self.held.pop(key, None)
+                continue
+            tmp = path.with_name(f"{path.name}.{self.worker_id}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self._lease_body())
+            os.replace(tmp, path)
+
+    async def heartbeat(self):
+        """Renew held leases every third of the TTL until cancelled."""
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                await asyncio.to_thread(self.renew)
+            except OSError as e:
+                print(f"\n⚠️  Lease heartbeat failed: {e}")
+
+    def release_all(self):
+        """Delete every lease this worker holds."""
+        with self._lock:
+            held, self.held = self.held, {}
+        for path in held.values():
+            if self._owner(path) != self.worker_id:
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def __repr__(self):
+        return f"LeaseManager({self.lease_dir}, worker={self.worker_id})"
+
+
+def missing_indices(
+    targets: Dict[str, int],
+    exists: Callable[[str, int], bool],
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    owns: Optional[Callable[[str, int], bool]] = None
+) -> Dict[str, int]:
+    """
+    Count indices in 1..target with no transcript file, per category.
+
+    Args:
+        targets: Target transcript count (= highest index) per category
+        exists: exists(category, index) -> True if the transcript is on disk
+        block_size: Indices per block
+        owns: Optional owns(category, block) filter, e.g. StaticShard.claim
+    """
+    counts = {}
+    for category, target in targets.items():
+        counts[category] = sum(
+            1
+            for block in range(block_count(target, block_size))
+            if owns is None or owns(category, block)
+            for index in block_indices(block, block_size, target)
+            if not exists(category, index)
+        )
+    return counts
+
+
+def _category_jobs(
+    category: str,
+    target: int,
+    block_size: int,
+    claimer,
+    exists: Callable[[str, int], bool]
+) -> Iterator[Tuple[str, int]]:
+    """Missing indices of one category, block by block, claiming lazily."""
+    for block in range(block_count(target, block_size)):
+        indices = block_indices(block, block_size, target)
+        # Skip complete blocks without touching the lease directory
+        if all(exists(category, index) for index in indices):
+            continue
+        if not claimer.claim(category, block):
+            continue
+        for index in indices:
+            # Re-check: another worker may have filled it before we claimed
+            if not exists(category, index):
+                yield category, index
+
+
+def sharded_jobs(
+    targets: Dict[str, int],
+    block_size: int,
+    claimer,
+    exists: Callable[[str, int], bool]
+) -> Iterator[Tuple[str, int]]:
+    """
+    Lazily yield the (category, index) jobs this worker owns, round-robin
+    across categories.
+
+    Blocks are claimed only when the generator reaches them, so with a
+    LeaseManager fast workers naturally take more blocks than slow ones.
+
+    Args:
+        targets: Target transcript count (= highest index) per category
+        block_size: Indices per block
+        claimer: StaticShard or LeaseManager
+        exists: exists(category, index) -> True if the transcript is on disk
+    """
+    iterators: List[Iterator[Tuple[str, int]]] = [
+        _category_jobs(category, target, block_size, claimer, exists)
+        for category, target in targets.items()
+        if target > 0
+    ]
+    while iterators:
+        for iterator in list(iterators):
+            job = next(iterator, None)
+            if job is None:
+                iterators.remove(iterator)
+            else:
+                yield job
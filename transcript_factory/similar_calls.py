@@ -0,0 +1,801 @@
+"""
+Similar Calls
+=============
+Finds the calls most like a given call (or any text), offline and on the
+CPU:
+
+    index = SimilarityIndex("call_transcripts.similar")
+    index.update("call_transcripts.csv")      # embed new and changed calls
+    index.similar(1041, k=10)                 # [(call_id, cosine similarity), ...]
+    index.search_text("router keeps rebooting, tech visit scheduled", k=10)
+
+How it works:
+- Embedding: a transcript's words (as bm25_index tokenizes them) are hashed
+  into NUM_BUCKETS buckets with crc32, weighted by sublinear TF-IDF and
+  projected onto DIMENSIONS latent directions (LSA). The IDF weights and
+  projection come from a randomized truncated SVD of a sample of up to
+  FIT_SAMPLE calls, fitted on the first build and kept until --rebuild,
+  so vectors from different updates stay comparable.
+- Storage: unit-length vectors as float16 rows of a .f16 file, memory-mapped
+  for queries. New calls are appended; a changed or removed call's old row
+  is marked dead.
+- Search: an IVF (inverted file) index. Spherical k-means splits the
+  vectors into about sqrt(calls) clusters, splitting any cluster more than
+  MAX_CLUSTER_SIZE times the mean size; a query scores the centroids, then
+  only the rows of the `nprobe` nearest clusters. Clusters are
+  retrained once the index has grown RETRAIN_GROWTH times past the size
+  they were trained at; in between, new rows join their nearest cluster.
+- Layout: the first meta["sorted_rows"] rows of the vectors file are stored in
+  cluster order, so a probed cluster is one contiguous slice of the file
+  rather than a scattered gather. Rows appended since then are looked up
+  by cluster separately. The file is rewritten in cluster order, without
+  dead rows, whenever the clusters are retrained, dead rows pass
+  MAX_DEAD_FRACTION or appended rows pass MAX_UNSORTED_FRACTION.
+
+Files in the index directory (call_transcripts.similar/ next to the CSV):
+the embedding model (idf, buckets, projection), centroids, the vectors and
+one array per row column (call_id, digest, live, cluster), each under a
+versioned name such as call_id.7.npy, plus meta.json. An update never
+rewrites a file the current meta.json names: it writes new versions
+(appending to the vectors file is the exception, since rows past
+meta["rows"] are ignored), replaces meta.json atomically once they are all
+on disk, and only then deletes the files the new meta.json no longer names.
+An interrupted update leaves the previous index intact.
+
+Usage:
+    python similar_calls.py build                 # embed call_transcripts.csv
+    python similar_calls.py similar 1041 -k 10 --show
+    python similar_calls.py query "modem lights blinking orange, outage in my area"
+    python similar_calls.py stats
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from bm25_index import text_digest, tokenize
+from transcript_codec import get_transcripts, iter_calls
+
+META_FILENAME = "meta.json"
+INDEX_SUFFIX = ".similar"
+FORMAT_VERSION = 2
+MODEL_FILES = ("idf", "buckets", "projection")
+
+NUM_BUCKETS = 1 << 18
+DIMENSIONS = 128
+FIT_SAMPLE = 20_000
+CALLS_PER_BATCH = 1000
+
+KMEANS_SAMPLE = 50_000
+KMEANS_ITERATIONS = 10
+DEFAULT_NPROBE = 8
+RETRAIN_GROWTH = 4
+MAX_DEAD_FRACTION = 0.3
+MAX_UNSORTED_FRACTION = 0.25
+MAX_CLUSTER_SIZE = 2
+
+# Row columns saved next to the vectors
+ROW_COLUMNS = (("call_id", np.int64), ("digest", np.uint64), ("live", np.bool_), ("cluster", np.int32))
+
+# Sparse-times-dense products expand blocks of rows into dense matrices of
+# at most this many cells
+_DENSE_CELLS = 1 << 23
+_BLOCK_ROWS = 1024
+# Every float16 bit pattern as float32: a table lookup widens stored vectors
+# about twice as fast as astype()
+_F16_TO_F32 = np.arange(1 << 16, dtype=np.uint16).view(np.float16).astype(np.float32)
+_OPENING = re.compile(r"^\s*Customer\s*:\s*(.+)$", re.MULTILINE)
+
+
+def default_similarity_dir(table_path) -> Path:
+    """The similarity index of a transcripts CSV: call_transcripts.csv -> call_transcripts.similar"""
+    table_path = Path(table_path)
+    return table_path.with_name(table_path.stem + INDEX_SUFFIX)
+
+
+# -- Embedding --------------------------------------------------------------
+
+def hashed_counts(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Word counts of each text, by hash bucket.
+
+    Returns:
+        (row, bucket, count) triples, sorted by row then bucket
+    """
+    buckets = [np.fromiter(map(zlib.crc32, tokenize(text)), dtype=np.int64) for text in texts]
+    sizes = np.fromiter(map(len, buckets), dtype=np.int64, count=len(buckets))
+    if not sizes.sum():
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    keys = np.repeat(np.arange(len(texts), dtype=np.int64), sizes) * NUM_BUCKETS
+    keys += np.concatenate(buckets) & (NUM_BUCKETS - 1)
+    keys, counts = np.unique(keys, return_counts=True)
+    return keys // NUM_BUCKETS, keys % NUM_BUCKETS, counts
+
+
+def tfidf_weights(rows: np.ndarray, buckets: np.ndarray, counts: np.ndarray, idf: np.ndarray,
+                  n_rows: int) -> np.ndarray:
+    """Sublinear TF-IDF of each (row, bucket) pair, scaled so every row has unit length."""
+    weights = ((1 + np.log(counts)) * idf[buckets]).astype(np.float32)
+    norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=n_rows))
+    return weights / np.maximum(norms[rows], 1e-12).astype(np.float32)
+
+
+def _sparse_dot(rows: np.ndarray, cols: np.ndarray, values: np.ndarray, dense: np.ndarray,
+                n_rows: int) -> np.ndarray:
+    """
+    A sparse matrix times a dense one.
+
+    The sparse matrix is given as (row, col, value) triples sorted by row,
+    with no (row, col) pair twice. Each block of rows is expanded into a
+    dense matrix over just the columns it uses, so the products run in BLAS.
+    """
+    out = np.zeros((n_rows, dense.shape[1]), dtype=np.float32)
+    row_start = np.searchsorted(rows, np.arange(n_rows + 1))
+    first, block = 0, _BLOCK_ROWS
+    while first < n_rows:
+        last = min(first + block, n_rows)
+        span = slice(row_start[first], row_start[last])
+        used, local = np.unique(cols[span], return_inverse=True)
+        if (last - first) * len(used) > _DENSE_CELLS and last - first > 1:
+            block = max(1, _DENSE_CELLS // len(used))
+            continue
+        expanded = np.zeros((last - first, len(used)), dtype=np.float32)
+        expanded[rows[span] - first, local] = values[span]
+        out[first:last] = expanded @ np.asarray(dense[used], dtype=np.float32)
+        first = last
+    return out
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    """Rows scaled to unit length (all-zero rows stay zero)."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def fit_model(texts: Sequence[str], dimensions: int = DIMENSIONS, power_iterations: int = 4,
+              seed: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Fit the IDF weights and LSA projection on a sample of transcripts.
+
+    Args:
+        texts: Sample transcripts
+        dimensions: Latent dimensions to keep (fewer if the sample can't support them)
+        power_iterations: Subspace iterations of the randomized SVD
+        seed: Random seed, for reproducible models
+
+    Returns:
+        (idf, buckets, projection): float32 IDF of every bucket, the sorted
+        buckets the sample uses, and their float32 projection rows (other
+        buckets project to zero)
+    """
+    rows, buckets, counts = hashed_counts(texts)
+    n_docs = len(texts)
+    df = np.bincount(buckets, minlength=NUM_BUCKETS)
+    idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+    values = tfidf_weights(rows, buckets, counts, idf, n_docs)
+
+    # Work in the buckets the sample uses
+    active, cols = np.unique(buckets, return_inverse=True)
+    by_col = np.argsort(cols, kind="stable")
+    transposed = (cols[by_col], rows[by_col], values[by_col])
+
+    def times(dense):
+        return _sparse_dot(rows, cols, values, dense, n_docs)
+
+    def transposed_times(dense):
+        return _sparse_dot(*transposed, dense, len(active))
+
+    # Randomized range finder (Halko, Martinsson & Tropp), then the SVD of
+    # the small projected matrix B = Q^T A through the eigenvectors of B B^T
+    rank = max(1, min(dimensions + 10, n_docs, len(active)))
+    rng = np.random.default_rng(seed)
+    q, _ = np.linalg.qr(times(rng.standard_normal((len(active), rank)).astype(np.float32)))
+    for _ in range(power_iterations):
+        z, _ = np.linalg.qr(transposed_times(q))
+        q, _ = np.linalg.qr(times(z))
+    b_t = transposed_times(q).astype(np.float64)
+    eigenvalues, eigenvectors = np.linalg.eigh(b_t.T @ b_t)
+    order = np.argsort(eigenvalues)[::-1][:dimensions]
+    order = order[eigenvalues[order] > 1e-9 * max(eigenvalues.max(), 1e-30)]
+    projection = (b_t @ eigenvectors[:, order]) / np.sqrt(eigenvalues[order])
+    return idf, active, projection.astype(np.float32)
+
+
+def embed(texts: Sequence[str], idf: np.ndarray, buckets: np.ndarray, projection: np.ndarray) -> np.ndarray:
+    """Unit-length float32 vectors of transcripts (zero for a transcript with no known words)."""
+    if not len(buckets):
+        return np.zeros((len(texts), projection.shape[1]), dtype=np.float32)
+    rows, text_buckets, counts = hashed_counts(texts)
+    values = tfidf_weights(rows, text_buckets, counts, idf, len(texts))
+    at = np.minimum(np.searchsorted(buckets, text_buckets), len(buckets) - 1)
+    known = buckets[at] == text_buckets
+    return _normalized(_sparse_dot(rows[known], at[known], values[known], projection, len(texts)))
+
+
+def load_model(index_dir, files: Optional[Dict[str, str]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (idf, buckets, projection) of an index, as fit_model() returned them.
+
+    Args:
+        index_dir: Index directory
+        files: {name: filename} of the model files (default: from meta.json)
+    """
+    index_dir = Path(index_dir)
+    if files is None:
+        with open(index_dir / META_FILENAME, "r", encoding="utf-8") as f:
+            files = json.load(f)["files"]
+    return tuple(np.load(index_dir / files[name]) for name in MODEL_FILES)
+
+
+_worker_model = None
+
+
+def _load_worker_model(index_dir: str, files: Dict[str, str]):
+    """Process pool initializer: map the model once per worker."""
+    global _worker_model
+    _worker_model = load_model(index_dir, files)
+
+
+def _embed_batch(texts: List[str]) -> np.ndarray:
+    """Float16 vectors of a batch, with the worker's model."""
+    return embed(texts, *_worker_model).astype(np.float16)
+
+
+# -- Clustering -------------------------------------------------------------
+
+def _widened(vectors: np.ndarray) -> np.ndarray:
+    """Stored (float16) vectors as float32."""
+    if vectors.dtype != np.float16:
+        return np.asarray(vectors, dtype=np.float32)
+    return np.take(_F16_TO_F32, np.ascontiguousarray(vectors).view(np.uint16))
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 65_536) -> np.ndarray:
+    """Index of each vector's most similar centroid."""
+    nearest = np.zeros(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk):
+        block = _widened(vectors[start:start + chunk])
+        nearest[start:start + chunk] = (block @ centroids.T).argmax(axis=1)
+    return nearest
+
+
+def train_centroids(vectors: np.ndarray, clusters: int, iterations: int = KMEANS_ITERATIONS,
+                    seed: int = 0) -> np.ndarray:
+    """
+    Spherical k-means over unit vectors, with oversized clusters split.
+
+    A query's cost is the size of the clusters it probes, so any cluster
+    holding more than MAX_CLUSTER_SIZE times the mean share of the vectors
+    is split by a k-means of its own members into mean-sized parts.
+
+    Args:
+        vectors: Training vectors, float32
+        clusters: Number of centroids before splitting
+        iterations: Assign/update rounds
+        seed: Random seed
+
+    Returns:
+        Unit-length centroids, float32 of shape (at least clusters, dimensions)
+    """
+    centroids = _kmeans(vectors, clusters, iterations, seed)
+    mean_size = len(vectors) / len(centroids)
+    assigned = _nearest(vectors, centroids)
+    sizes = np.bincount(assigned, minlength=len(centroids))
+    oversized = np.flatnonzero(sizes > MAX_CLUSTER_SIZE * mean_size)
+    if not len(oversized):
+        return centroids
+    parts = [centroids[sizes <= MAX_CLUSTER_SIZE * mean_size]]
+    for c in oversized:
+        parts.append(_kmeans(vectors[assigned == c], int(np.ceil(sizes[c] / mean_size)), iterations, seed))
+    return np.concatenate(parts)
+
+
+def _kmeans(vectors: np.ndarray, clusters: int, iterations: int, seed: int) -> np.ndarray:
+    """Plain spherical k-means: unit-length float32 centroids."""
+    rng = np.random.default_rng(seed)
+    clusters = max(1, min(clusters, len(vectors)))
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assigned = _nearest(vectors, centroids)
+        order = np.argsort(assigned, kind="stable")
+        used, first = np.unique(assigned[order], return_index=True)
+        sums = np.add.reduceat(vectors[order], first, axis=0)
+        centroids[used] = _normalized(sums)
+        # Reseed clusters that lost every member
+        empty = np.setdiff1d(np.arange(clusters), used)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+    return centroids.astype(np.float32)
+
+
+# -- The index --------------------------------------------------------------
+
+def _sample_texts(table_path, size: int, seed: int = 0) -> List[str]:
+    """A reproducible uniform sample of the CSV's transcripts (reservoir sampling)."""
+    rng = random.Random(seed)
+    sample = []
+    for seen, (_, _, text) in enumerate(iter_calls(table_path)):
+        if len(sample) < size:
+            sample.append(text)
+        else:
+            slot = rng.randint(0, seen)
+            if slot < size:
+                sample[slot] = text
+    return sample
+
+
+def _batches(table_path, known: Dict[int, Tuple[int, int]], seen: set,
+             counts: Dict[str, int]) -> Iterator[Tuple[List[int], List[int], List[str]]]:
+    """(call_ids, digests, transcripts) of new and changed calls, CALLS_PER_BATCH at a time."""
+    call_ids, digests, texts = [], [], []
+    for call_id, _, text in iter_calls(table_path):
+        seen.add(call_id)
+        digest = text_digest(text)
+        previous = known.get(call_id)
+        if previous is not None and previous[1] == digest:
+            counts["unchanged"] += 1
+            continue
+        counts["changed" if previous is not None else "added"] += 1
+        call_ids.append(call_id)
+        digests.append(digest)
+        texts.append(text)
+        if len(texts) >= CALLS_PER_BATCH:
+            yield call_ids, digests, texts
+            call_ids, digests, texts = [], [], []
+    if texts:
+        yield call_ids, digests, texts
+
+
+class SimilarityIndex:
+    """Call embeddings plus an IVF index over them, in one directory."""
+
+    def __init__(self, index_dir, check_version: bool = True):
+        """
+        Open an index (an empty one if the directory has no meta.json yet).
+
+        Args:
+            index_dir: Index directory, e.g. call_transcripts.similar
+            check_version: Raise on an index of another format version; if
+                False, open it as empty so update(rebuild=True) replaces it
+        """
+        self.index_dir = Path(index_dir)
+        self.meta = None
+        meta_path = self.index_dir / META_FILENAME
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+            if self.meta.get("version") != FORMAT_VERSION:
+                if check_version:
+                    raise ValueError(f"{self.index_dir} has index version {self.meta.get('version')}, "
+                                     f"expected {FORMAT_VERSION}; rebuild it with --rebuild")
+                self.meta = None
+        self._load()
+
+    def _load(self):
+        """Load the model, map the vectors and arrange the live rows by cluster."""
+        rows = self.meta["rows"] if self.meta else 0
+        self.rows = {name: np.zeros(0, dtype=dtype) for name, dtype in ROW_COLUMNS}
+        self.vectors = np.zeros((0, self.meta["dimensions"] if self.meta else 0), dtype=np.float16)
+        self.model = self.centroids = None
+        if self.meta is None:
+            return
+
+        files = self.meta["files"]
+        self.model = load_model(self.index_dir, files)
+        self.centroids = np.load(self.index_dir / files["centroids"])
+        if rows:
+            for name, _ in ROW_COLUMNS:
+                self.rows[name] = np.load(self.index_dir / files[name])
+            # Rows past meta["rows"] are leftovers of an interrupted update.
+            # A plain array over the mapping skips np.memmap's per-index overhead
+            self.vectors = np.asarray(np.memmap(self.index_dir / files["vectors"], dtype=np.float16, mode="r",
+                                                shape=(rows, self.meta["dimensions"])))
+
+        live = np.flatnonzero(self.rows["live"])
+        self._by_call = live[np.argsort(self.rows["call_id"][live], kind="stable")]
+        self._sorted_calls = self.rows["call_id"][self._by_call]
+        # Sorted rows: cluster c is rows _cluster_start[c]:_cluster_start[c + 1] (dead ones included).
+        # Appended rows: cluster c is _appended[_appended_start[c]:_appended_start[c + 1]] (live only).
+        clusters = np.arange(len(self.centroids) + 1)
+        sorted_rows = self.meta.get("sorted_rows", 0)
+        self._cluster_start = np.searchsorted(self.rows["cluster"][:sorted_rows], clusters)
+        appended = live[live >= sorted_rows]
+        self._appended = appended[np.argsort(self.rows["cluster"][appended], kind="stable")]
+        self._appended_start = np.searchsorted(self.rows["cluster"][self._appended], clusters)
+
+    @property
+    def doc_count(self) -> int:
+        return len(self._by_call) if self.meta else 0
+
+    def _live_calls(self) -> Dict[int, Tuple[int, int]]:
+        """{call_id: (row, digest)} of the live rows."""
+        live = np.flatnonzero(self.rows["live"])
+        return dict(zip(self.rows["call_id"][live].tolist(),
+                        zip(live.tolist(), self.rows["digest"][live].tolist())))
+
+    def _row_of(self, call_id: int) -> Optional[int]:
+        """Live row of a call, or None."""
+        if not self.meta:
+            return None
+        at = int(np.searchsorted(self._sorted_calls, call_id))
+        found = at < len(self._sorted_calls) and self._sorted_calls[at] == call_id
+        return int(self._by_call[at]) if found else None
+
+    def update(self, table_path, workers: Optional[int] = None, rebuild: bool = False) -> Dict[str, int]:
+        """
+        Bring the index up to date with a transcripts CSV.
+
+        Args:
+            table_path: Transcripts CSV, plain or compressed
+            workers: Embedding processes (default: CPU count)
+            rebuild: Refit the model and re-embed every call
+
+        Returns:
+            Counts of added, changed, removed and unchanged calls
+        """
+        workers = workers or os.cpu_count() or 1
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        counts = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+        # Files written by this update, named in meta.json only once it is saved
+        self._files = dict(self.meta["files"]) if self.meta else {}
+        self._serial = self.meta["serial"] if self.meta else 0
+
+        if rebuild or self.meta is None:
+            print(f"Fitting the embedding on up to {FIT_SAMPLE} calls...")
+            sample = _sample_texts(table_path, FIT_SAMPLE)
+            if not sample:
+                raise ValueError(f"{table_path} has no transcripts")
+            idf, buckets, projection = fit_model(sample)
+            if not projection.shape[1]:
+                raise ValueError(f"The transcripts of {table_path} have no words to embed")
+            for name, array in zip(MODEL_FILES, (idf, buckets, projection)):
+                self._save_array(name, array)
+            self.meta = {"version": FORMAT_VERSION, "dimensions": projection.shape[1], "buckets": NUM_BUCKETS,
+                         "fit_calls": len(sample), "rows": 0, "clustered_rows": 0}
+            self.rows = {name: np.zeros(0, dtype=dtype) for name, dtype in ROW_COLUMNS}
+            self.centroids = np.zeros((0, projection.shape[1]), dtype=np.float32)
+            self._save_array("centroids", self.centroids)
+            # The old vectors stay in place for the old meta.json; start a new file
+            self._files["vectors"] = self._new_filename("vectors", ".f16")
+
+        known = self._live_calls()
+        live = self.rows["live"].copy()
+        seen = set()
+        new_ids, new_digests = [], []
+        vectors_path = self.index_dir / self._files["vectors"]
+        row_bytes = self.meta["dimensions"] * np.dtype(np.float16).itemsize
+
+        # Rows up to meta["rows"] are left alone; anything past them is unreferenced
+        with open(vectors_path, "ab") as f:
+            f.truncate(self.meta["rows"] * row_bytes)
+            for call_ids, digests, vectors in self._embedded(table_path, known, seen, counts, workers):
+                f.write(vectors.tobytes())
+                new_ids.extend(call_ids)
+                new_digests.extend(digests)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Rows of removed calls, and the old rows of changed ones, go dead
+        reembedded = set(new_ids)
+        dead = [row for call_id, (row, _) in known.items() if call_id not in seen or call_id in reembedded]
+        counts["removed"] = sum(1 for call_id in known if call_id not in seen)
+        live[dead] = False
+
+        rows = self.meta["rows"] + len(new_ids)
+        self.rows = {
+            "call_id": np.concatenate((self.rows["call_id"], np.asarray(new_ids, dtype=np.int64))),
+            "digest": np.concatenate((self.rows["digest"], np.asarray(new_digests, dtype=np.uint64))),
+            "live": np.concatenate((live, np.ones(len(new_ids), dtype=bool))),
+            "cluster": np.concatenate((self.rows["cluster"], np.zeros(len(new_ids), dtype=np.int32))),
+        }
+        vectors = np.memmap(vectors_path, dtype=np.float16, mode="r", shape=(rows, self.meta["dimensions"])) \
+            if rows else np.zeros((0, self.meta["dimensions"]), dtype=np.float16)
+
+        retrained = self._cluster(vectors, first_new=rows - len(new_ids))
+        sorted_rows = self.meta.get("sorted_rows", 0)
+        if (retrained or self.rows["live"].sum() < (1 - MAX_DEAD_FRACTION) * rows
+                or rows - sorted_rows > MAX_UNSORTED_FRACTION * rows):
+            vectors = self._rewrite(vectors)
+            rows = sorted_rows = len(vectors)
+
+        for name, _ in ROW_COLUMNS:
+            self._save_array(name, self.rows[name])
+        self.meta.update({"rows": rows, "sorted_rows": sorted_rows, "live": int(self.rows["live"].sum()),
+                          "nlist": len(self.centroids), "files": self._files, "serial": self._serial,
+                          "source": str(table_path), "updated_at": datetime.now().isoformat()})
+        self._save_meta()
+        del vectors
+        self._load()
+        self._remove_unreferenced()
+        return counts
+
+    def _embedded(self, table_path, known, seen, counts, workers: int):
+        """(call_ids, digests, float16 vectors) of each batch of new and changed calls, in order."""
+        batches = _batches(table_path, known, seen, counts)
+        if workers <= 1:
+            _load_worker_model(str(self.index_dir), self._files)
+            for call_ids, digests, texts in batches:
+                yield call_ids, digests, _embed_batch(texts)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_load_worker_model,
+                                 initargs=(str(self.index_dir), self._files)) as pool:
+            pending = deque()
+            for call_ids, digests, texts in batches:
+                # Keep at most two batches per worker of text in memory at once
+                if len(pending) >= 2 * workers:
+                    call_ids_done, digests_done, future = pending.popleft()
+                    yield call_ids_done, digests_done, future.result()
+                pending.append((call_ids, digests, pool.submit(_embed_batch, texts)))
+            while pending:
+                call_ids_done, digests_done, future = pending.popleft()
+                yield call_ids_done, digests_done, future.result()
+
+    def _rewrite(self, vectors: np.ndarray) -> np.ndarray:
+        """Write a new vectors file in cluster order, without dead rows."""
+        keep = np.flatnonzero(self.rows["live"])
+        keep = keep[np.argsort(self.rows["cluster"][keep], kind="stable")]
+        filename = self._new_filename("vectors", ".f16")
+        with open(self.index_dir / filename, "wb") as f:
+            for start in range(0, len(keep), 65_536):
+                f.write(np.ascontiguousarray(vectors[keep[start:start + 65_536]]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._files["vectors"] = filename
+        self.rows = {name: column[keep] for name, column in self.rows.items()}
+        if not len(keep):
+            return np.zeros((0, self.meta["dimensions"]), dtype=np.float16)
+        return np.memmap(self.index_dir / filename, dtype=np.float16, mode="r",
+                         shape=(len(keep), self.meta["dimensions"]))
+
+    def _cluster(self, vectors: np.ndarray, first_new: int) -> bool:
+        """
+        Assign new rows to clusters, retraining the clusters when the index has outgrown them.
+
+        Returns:
+            Whether the clusters were retrained (so every row may have moved)
+        """
+        live = np.flatnonzero(self.rows["live"])
+        if not len(live):
+            return False
+        retrain = not len(self.centroids) or len(live) > RETRAIN_GROWTH * self.meta["clustered_rows"]
+        if retrain:
+            rng = np.random.default_rng(0)
+            sample = np.sort(rng.choice(live, min(len(live), KMEANS_SAMPLE), replace=False))
+            clusters = int(round(np.sqrt(len(live))))
+            print(f"Clustering {len(live)} calls into {clusters} lists...")
+            self.centroids = train_centroids(_widened(vectors[sample]), clusters)
+            self._save_array("centroids", self.centroids)
+            self.meta["clustered_rows"] = len(live)
+            first_new = 0
+        new = live[live >= first_new]
+        self.rows["cluster"][new] = _nearest(vectors[new], self.centroids)
+        return retrain
+
+    def _new_filename(self, name: str, extension: str) -> str:
+        """A versioned filename for a new copy of one index file, e.g. call_id.7.npy."""
+        self._serial += 1
+        return f"{name}.{self._serial}{extension}"
+
+    def _save_array(self, name: str, array: np.ndarray):
+        """Write a new version of one array file, to be named in the next meta.json."""
+        filename = self._new_filename(name, ".npy")
+        with open(self.index_dir / filename, "wb") as f:
+            np.save(f, array)
+            f.flush()
+            os.fsync(f.fileno())
+        self._files[name] = filename
+
+    def _remove_unreferenced(self):
+        """Delete index files meta.json no longer names: old versions and leftovers of interrupted updates."""
+        stems = set(MODEL_FILES) | {"centroids", "vectors", "meta"} | {name for name, _ in ROW_COLUMNS}
+        keep = set(self.meta["files"].values()) | {META_FILENAME}
+        for path in self.index_dir.iterdir():
+            if path.is_file() and path.name not in keep and path.name.split(".")[0] in stems:
+                try:
+                    path.unlink()
+                except OSError:
+                    # Still mapped by a reader on a platform that forbids this; next update retries
+                    pass
+
+    def _save_meta(self):
+        staging = self.index_dir / (META_FILENAME + ".tmp")
+        with open(staging, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(staging, self.index_dir / META_FILENAME)
+
+    def _search(self, query: np.ndarray, k: int, nprobe: int, exact: bool,
+                exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Top-k live rows by cosine similarity to a unit query vector."""
+        if not self.doc_count or not query.any():
+            return []
+        sorted_rows = self.meta.get("sorted_rows", 0)
+        if exact:
+            spans = [(start, min(start + 65_536, sorted_rows)) for start in range(0, sorted_rows, 65_536)]
+            appended = self._appended
+        else:
+            nprobe = min(nprobe, len(self.centroids))
+            probed = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+            spans = [(self._cluster_start[c], self._cluster_start[c + 1]) for c in probed]
+            appended = np.concatenate([self._appended[self._appended_start[c]:self._appended_start[c + 1]]
+                                       for c in probed])
+
+        # Slices of the cluster-ordered rows, then a gather of the appended rows
+        candidates, scores = [], []
+        for start, stop in spans:
+            if stop > start:
+                rows = np.arange(start, stop)
+                keep = self.rows["live"][start:stop]
+                candidates.append(rows[keep])
+                scores.append((_widened(self.vectors[start:stop]) @ query)[keep])
+        for start in range(0, len(appended), 65_536):
+            rows = appended[start:start + 65_536]
+            candidates.append(rows)
+            scores.append(_widened(self.vectors[rows]) @ query)
+        candidates = np.concatenate(candidates or [np.zeros(0, np.int64)])
+        scores = np.concatenate(scores or [np.zeros(0, np.float32)])
+        if exclude is not None:
+            keep = candidates != exclude
+            candidates, scores = candidates[keep], scores[keep]
+        if len(scores) > k:
+            # Keep every call tied with the k-th score, so call_id decides ties
+            kth = -np.partition(-scores, k - 1)[k - 1]
+            keep = scores >= kth
+            candidates, scores = candidates[keep], scores[keep]
+        call_ids = self.rows["call_id"][candidates]
+        order = np.lexsort((call_ids, -scores))[:k]
+        return [(int(call_ids[i]), float(scores[i])) for i in order]
+
+    def similar(self, call_id: int, k: int = 10, nprobe: int = DEFAULT_NPROBE,
+                exact: bool = False) -> List[Tuple[int, float]]:
+        """
+        The calls most similar to an indexed call.
+
+        Args:
+            call_id: Call to match
+            k: Number of calls to return
+            nprobe: Clusters to search (more is slower and closer to exact)
+            exact: Compare against every call instead of using the clusters
+
+        Returns:
+            [(call_id, cosine similarity), ...], most similar first, without the call itself
+        """
+        row = self._row_of(call_id)
+        if row is None:
+            raise KeyError(f"call {call_id} isn't in the index")
+        query = _widened(self.vectors[row])
+        return self._search(query, k, nprobe, exact, exclude=row)
+
+    def search_text(self, text: str, k: int = 10, nprobe: int = DEFAULT_NPROBE,
+                    exact: bool = False) -> List[Tuple[int, float]]:
+        """The calls most similar to any text (a transcript, or a description of one)."""
+        if not self.meta:
+            return []
+        query = embed([text], *self.model)[0]
+        return self._search(query, k, nprobe, exact)
+
+    def stats(self) -> dict:
+        """Calls, rows, clusters and size on disk."""
+        return {
+            "calls": self.doc_count,
+            "rows": self.meta["rows"] if self.meta else 0,
+            "dimensions": self.meta["dimensions"] if self.meta else 0,
+            "clusters": len(self.centroids) if self.centroids is not None else 0,
+            "bytes": sum(path.stat().st_size for path in self.index_dir.glob("*") if path.is_file()),
+            "updated_at": self.meta.get("updated_at") if self.meta else None,
+        }
+
+
+def build_similarity_index(table_path, index_dir=None, rebuild: bool = False,
+                           workers: Optional[int] = None) -> Dict[str, int]:
+    """
+    Create or update the similarity index of a transcripts CSV.
+
+    Args:
+        table_path: Transcripts CSV
+        index_dir: Index directory (default: next to the CSV, e.g. call_transcripts.similar)
+        rebuild: Refit the embedding and re-embed every call
+        workers: Embedding processes (default: CPU count)
+
+    Returns:
+        Counts of added, changed, removed and unchanged calls
+    """
+    index_dir = Path(index_dir) if index_dir else default_similarity_dir(table_path)
+    start = time.time()
+    print(f"Embedding {table_path} into {index_dir}...")
+    index = SimilarityIndex(index_dir, check_version=not rebuild)
+    counts = index.update(table_path, workers=workers, rebuild=rebuild)
+    print(f"✓ {index.doc_count} calls embedded in {time.time() - start:.1f}s: {counts['added']} added, "
+          f"{counts['changed']} changed, {counts['removed']} removed, {counts['unchanged']} unchanged")
+    return counts
+
+
+def _opening(text: str, width: int = 140) -> str:
+    """The customer's first line, which usually says why they called."""
+    match = _OPENING.search(text)
+    line = " ".join((match.group(1) if match else text).split())
+    return line[:width] + ("..." if len(line) > width else "")
+
+
+def main():
+    """Build, query or inspect the similar-calls index."""
+    default_table = str(Path(__file__).parent / "call_transcripts.csv")
+    parser = argparse.ArgumentParser(description="Find calls similar to a call or a description")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def common(command):
+        command.add_argument("--table", default=default_table, help="Transcripts CSV (default: ./call_transcripts.csv)")
+        command.add_argument("--index", help="Index directory (default: next to the CSV, .similar)")
+
+    build = sub.add_parser("build", help="Embed new and changed transcripts of a CSV")
+    common(build)
+    build.add_argument("--rebuild", action="store_true", help="Refit the embedding and re-embed every call")
+    build.add_argument("--workers", type=int, help="Embedding processes (default: CPU count)")
+
+    for name, target, help_text in (("similar", "call_id", "Calls most like an indexed call"),
+                                    ("query", "text", "Calls most like a piece of text")):
+        command = sub.add_parser(name, help=help_text)
+        command.add_argument(target, type=int if target == "call_id" else str)
+        command.add_argument("-k", type=int, default=10, help="Number of calls (default: 10)")
+        command.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE,
+                             help=f"Clusters to search (default: {DEFAULT_NPROBE})")
+        command.add_argument("--exact", action="store_true", help="Compare against every call")
+        command.add_argument("--show", action="store_true", help="Print each call's opening customer line")
+        common(command)
+
+    stats = sub.add_parser("stats", help="Show the size of the index")
+    common(stats)
+    args = parser.parse_args()
+
+    index_dir = Path(args.index) if args.index else default_similarity_dir(args.table)
+    if args.command == "build":
+        build_similarity_index(args.table, index_dir, rebuild=args.rebuild, workers=args.workers)
+        return 0
+
+    if not (index_dir / META_FILENAME).exists():
+        print(f"❌ No index at {index_dir}; run: python similar_calls.py build --table {args.table}")
+        return 1
+    index = SimilarityIndex(index_dir)
+    if args.command == "stats":
+        stats = index.stats()
+        print(f"  {stats['calls']} calls ({stats['rows'] - stats['calls']} dead rows), "
+              f"{stats['dimensions']} dimensions, {stats['clusters']} clusters")
+        print(f"  {stats['bytes'] / 1e6:.1f} MB on disk, updated {stats['updated_at']}")
+        return 0
+
+    start = time.perf_counter()
+    try:
+        if args.command == "similar":
+            results = index.similar(args.call_id, k=args.k, nprobe=args.nprobe, exact=args.exact)
+        else:
+            results = index.search_text(args.text, k=args.k, nprobe=args.nprobe, exact=args.exact)
+    except KeyError as e:
+        print(f"❌ {e.args[0]}")
+        return 1
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{len(results)} calls in {elapsed:.1f} ms")
+    wanted = [call_id for call_id, _ in results] + ([args.call_id] if args.command == "similar" else [])
+    texts = get_transcripts(args.table, wanted) if args.show and results else {}
+    if args.command == "similar" and args.call_id in texts:
+        print(f"  {args.call_id}  (query)  {_opening(texts[args.call_id])}")
+    for call_id, score in results:
+        print(f"  {call_id}  {score:6.3f}" + (f"  {_opening(texts[call_id])}" if call_id in texts else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,255 @@
+"""
+Simulated Anthropic Client
+==========================
+In-process stand-in for `anthropic.AsyncAnthropic` used to measure the
+generation engine without network access or API credits.
+
+It implements the slice of the client that ParallelTranscriptFactory uses,
+`client.messages.create(...)` and `client.messages.with_raw_response.create(...)`,
+and answers with synthetic transcripts after a simulated delay:
+
+    delay = base latency (constant / uniform / exponential / lognormal)
+          + output_tokens / decode_tokens_per_second   (if a decode rate is set)
+
+Output lengths are drawn from a normal distribution and clipped to max_tokens.
+
+With `stream=True` the same call returns an async iterator of stream events:
+the base latency passes before message_start (time to first token), then
+text arrives in chunks at the decode rate (all at once if no rate is set).
+
+Usage:
+    client = SimulatedAnthropicClient(LatencyModel("lognormal", median=0.5, sigma=0.6))
+    factory = ParallelTranscriptFactory(client=client, max_concurrent=50)
+"""
+
+import asyncio
+import math
+import random
+import uuid
+from types import SimpleNamespace
+from typing import Optional
+
+# Filler used to build synthetic transcript text of a requested length
+_TRANSCRIPT_TURNS = (
+    "Agent: Thank you for calling Frontier Communications, how can I help you today?\n\n"
+    "Customer: Hi, um... my internet has been down since this morning.\n\n"
+    "Agent: I'm sorry to hear that. (typing sounds) Let me run a quick check on your line.\n\n"
+    "Customer: Sure... [inaudible] I already restarted the router twice.\n\n"
+)
+
+# Roughly four characters of English text per token
+_CHARS_PER_TOKEN = 4
+
+# Tokens per content_block_delta event in simulated streams
+_STREAM_CHUNK_TOKENS = 20
+
+
+class LatencyModel:
+    """Random base latency (seconds) for a simulated request."""
+
+    DISTRIBUTIONS = ("constant", "uniform", "exponential", "lognormal")
+
+    def __init__(self, distribution: str = "lognormal", median: float = 0.5, sigma: float = 0.5):
+        """
+        Args:
+            distribution: One of constant, uniform, exponential, lognormal
+            median: Median latency in seconds
+            sigma: Spread: lognormal shape parameter, or the +/- fraction of
+                the median for the uniform distribution
+        """
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Invalid distribution. Must be one of: {self.DISTRIBUTIONS}")
+        self.distribution = distribution
+        self.median = median
+        self.sigma = sigma
+
+    def sample(self, rng: random.Random) -> float:
+        if self.distribution == "constant":
+            return self.median
+        if self.distribution == "uniform":
+            spread = self.median * min(self.sigma, 1.0)
+            return rng.uniform(self.median - spread, self.median + spread)
+        if self.distribution == "exponential":
+            # Median of Exp(lambda) is ln(2)/lambda
+            return rng.expovariate(math.log(2) / self.median)
+        return rng.lognormvariate(math.log(self.median), self.sigma)
+
+    def __repr__(self):
+        return f"LatencyModel({self.distribution}, median={self.median}, sigma={self.sigma})"
+
+
+def _usage(input_tokens: int, output_tokens: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cache_creation_input_tokens=0,
+        cache_read_input_tokens=0
+    )
+
+
+def _count_input_tokens(messages) -> int:
+    chars = 0
+    for message in messages or []:
+        content = message.get("content", "")
+        if isinstance(content, str):
+            chars += len(content)
+        else:
+            chars += sum(len(block.get("text", "")) for block in content)
+    return max(1, chars // _CHARS_PER_TOKEN)
+
+
+class _SimulatedStream:
+    """Async iterator of stream events, like the SDK's AsyncStream."""
+
+    def __init__(self, client, message, ttft: float):
+        self._events = self._generate(client, message, ttft)
+
+    @staticmethod
+    async def _generate(client, message, ttft: float):
+        client.in_flight += 1
+        client.peak_in_flight = max(client.peak_in_flight, client.in_flight)
+        try:
+            await asyncio.sleep(ttft)
+            yield SimpleNamespace(
+                type="message_start",
+                message=SimpleNamespace(id=message.id, model=message.model, usage=message.usage)
+            )
+            text = message.content[0].text
+            step = _STREAM_CHUNK_TOKENS * _CHARS_PER_TOKEN
+            for i in range(0, len(text), step):
+                if client.decode_tokens_per_second:
+                    await asyncio.sleep(_STREAM_CHUNK_TOKENS / client.decode_tokens_per_second)
+                yield SimpleNamespace(
+                    type="content_block_delta",
+                    index=0,
+                    delta=SimpleNamespace(type="text_delta", text=text[i:i + step])
+                )
+            yield SimpleNamespace(
+                type="message_delta",
+                delta=SimpleNamespace(stop_reason="end_turn"),
+                usage=SimpleNamespace(output_tokens=message.usage.output_tokens)
+            )
+            yield SimpleNamespace(type="message_stop")
+            client.requests_served += 1
+        finally:
+            client.in_flight -= 1
+
+    def __aiter__(self):
+        return self._events
+
+    async def close(self):
+        await self._events.aclose()
+
+
+class _RawResponse:
+    """Mimics the object returned by `with_raw_response.create`."""
+
+    def __init__(self, message, headers):
+        self._message = message
+        self.headers = headers
+
+    def parse(self):
+        return self._message
+
+
+class _RawMessages:
+    def __init__(self, messages):
+        self._messages = messages
+
+    async def create(self, **params):
+        message = await self._messages.create(**params)
+        return _RawResponse(message, self._messages.client.response_headers())
+
+
+class _SimulatedMessages:
+    def __init__(self, client):
+        self.client = client
+        self.with_raw_response = _RawMessages(self)
+
+    async def create(self, model: str = "simulated", max_tokens: int = 20000, messages=None, stream=False, **_):
+        client = self.client
+        output_tokens = client.sample_output_tokens(max_tokens)
+        delay = client.latency.sample(client.rng)
+
+        if stream:
+            message = client.build_message(model, messages, output_tokens)
+            return _SimulatedStream(client, message, ttft=delay)
+
+        if client.decode_tokens_per_second:
+            delay += output_tokens / client.decode_tokens_per_second
+
+        client.in_flight += 1
+        client.peak_in_flight = max(client.peak_in_flight, client.in_flight)
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            client.in_flight -= 1
+        client.requests_served += 1
+        return client.build_message(model, messages, output_tokens)
+
+
+class SimulatedAnthropicClient:
+    """Async client whose `messages` API is simulated in-process."""
+
+    def __init__(
+        self,
+        latency: Optional[LatencyModel] = None,
+        output_tokens_mean: int = 1500,
+        output_tokens_sd: int = 400,
+        decode_tokens_per_second: float = 0.0,
+        seed: int = 42
+    ):
+        """
+        Args:
+            latency: Base latency model (default: lognormal, median 0.5s)
+            output_tokens_mean: Mean transcript length in tokens
+            output_tokens_sd: Standard deviation of transcript length
+            decode_tokens_per_second: If set, add output_tokens / rate to each delay
+            seed: Random seed for reproducible runs
+        """
+        self.latency = latency or LatencyModel()
+        self.output_tokens_mean = output_tokens_mean
+        self.output_tokens_sd = output_tokens_sd
+        self.decode_tokens_per_second = decode_tokens_per_second
+        self.rng = random.Random(seed)
+
+        self.requests_served = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+        self.messages = _SimulatedMessages(self)
+
+        # Build the filler once; transcripts are slices of it
+        self._filler = _TRANSCRIPT_TURNS
+        self._ensure_filler(output_tokens_mean + 4 * output_tokens_sd)
+
+    def _ensure_filler(self, tokens: int):
+        chars = tokens * _CHARS_PER_TOKEN
+        if len(self._filler) < chars:
+            repeats = chars // len(_TRANSCRIPT_TURNS) + 1
+            self._filler = _TRANSCRIPT_TURNS * repeats
+
+    def sample_output_tokens(self, max_tokens: int) -> int:
+        tokens = int(self.rng.gauss(self.output_tokens_mean, self.output_tokens_sd))
+        return max(1, min(max_tokens, tokens))
+
+    def transcript_text(self, output_tokens: int) -> str:
+        self._ensure_filler(output_tokens)
+        return self._filler[:output_tokens * _CHARS_PER_TOKEN]
+
+    def build_message(self, model: str, messages, output_tokens: int) -> SimpleNamespace:
+        """A complete simulated Message object."""
+        return SimpleNamespace(
+            id=f"msg_sim_{uuid.uuid4().hex[:16]}",
+            type="message",
+            role="assistant",
+            model=model,
+            content=[SimpleNamespace(type="text", text=self.transcript_text(output_tokens))],
+            stop_reason="end_turn",
+            usage=_usage(_count_input_tokens(messages), output_tokens)
+        )
+
+    @staticmethod
+    def response_headers() -> dict:
+        """Headers of an unthrottled response (the simulation models latency, not quotas)."""
+        return {}
@@ -0,0 +1,68 @@
+"""
+Quick test script for the batch backend
+Runs ParallelTranscriptFactory(backend="batch") against the local mock API
+server, so no API key or credits are needed
+"""
+
+import asyncio
+import tempfile
+from pathlib import Path
+from datetime import datetime
+
+from generate_bulk_transcripts_parallel import ParallelTranscriptFactory
+from mock_api_server import MockAnthropicServer
+
+
+async def test_batch_backend(server):
+    """Generate a few transcripts per category through message batches."""
+
+    print("=" * 80)
+    print("BATCH BACKEND TEST")
+    print("=" * 80)
+    print(f"\nMock API: {server.base_url}")
+
+    factory = ParallelTranscriptFactory(
+        api_key="test-key",
+        base_url=server.base_url,
+        backend="batch",
+        batch_poll_interval=0.2
+    )
+    # Keep test output out of the real category folders
+    factory.base_dir = Path(tempfile.mkdtemp(prefix="batch_test_"))
+    factory.batch_backend.max_requests_per_batch = 4  # force several batches
+
+    start_time = datetime.now()
+
+    results = await factory.generate_batch("technical_support", 10, start_index=1)
+    results += await factory.generate_batch("billing_inquiry", 3, start_index=5)
+
+    elapsed = (datetime.now() - start_time).total_seconds()
+
+    saved = sorted(p.name for p in factory.base_dir.rglob("*.txt"))
+    expected = (
+        [f"billing_inquiry_{i:04d}.txt" for i in range(5, 8)] +
+        [f"technical_support_{i:04d}.txt" for i in range(1, 11)]
+    )
+
+    print(f"\nReturned: {len(results)} results")
+    print(f"Saved: {len(saved)} files in {factory.base_dir}")
+    print(f"Errors: {factory.stats['errors']}")
+    print(f"Time: {elapsed:.2f} seconds")
+
+    if len(results) != 13 or saved != expected or factory.stats["errors"]:
+        print("\n❌ TEST FAILED")
+        print(f"  Expected files: {expected}")
+        print(f"  Saved files:    {saved}")
+        return 1
+
+    if any(not transcript.startswith("Agent:") for _, transcript, _ in results):
+        print("\n❌ TEST FAILED: transcript text was not returned intact")
+        return 1
+
+    print("\n✅ TEST SUCCESSFUL!")
+    return 0
+
+
+if __name__ == "__main__":
+    with MockAnthropicServer(batch_processing_seconds=0.5) as mock_server:
+        exit(asyncio.run(test_batch_backend(mock_server)))
@@ -0,0 +1,192 @@
+"""
+Fault tolerance test script for parallel generation
+Points ParallelTranscriptFactory at the local mock API server with injected
+faults (429s, 529s, slow drips, resets, truncated bodies) and checks that
+runs degrade gracefully instead of failing
+"""
+
+import asyncio
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from datetime import datetime
+
+from generate_bulk_transcripts_parallel import ParallelTranscriptFactory, interleave_jobs
+from mock_api_server import MockAnthropicServer
+from retry_policy import RetryPolicy
+from transcript_writer import AsyncTranscriptWriter
+
+
+async def run_generation(server, count, request_timeout=1.0, max_attempts=6, streaming=False,
+                         transcripts_per_request=1):
+    """Generate `count` transcripts through generate_to_disk and the writer."""
+    factory = ParallelTranscriptFactory(
+        api_key="test-key",
+        base_url=server.base_url,
+        max_concurrent=10,
+        request_timeout=request_timeout,
+        max_attempts=max_attempts,
+        streaming=streaming,
+        stream_idle_timeout=request_timeout,
+        transcripts_per_request=transcripts_per_request
+    )
+    # Short backoffs so the suite runs in seconds
+    factory.retry_policy = RetryPolicy(max_attempts=max_attempts, base_delay=0.05, max_delay=0.5)
+    output_dir = Path(tempfile.mkdtemp(prefix="fault_test_"))
+    factory.base_dir = output_dir
+
+    start_time = datetime.now()
+    try:
+        async with AsyncTranscriptWriter(factory.save_transcript) as writer:
+            jobs = interleave_jobs({"technical_support": count}, {"technical_support": 1})
+            await factory.generate_to_disk(jobs, writer)
+        saved = len(list(output_dir.rglob("*.txt")))
+        leftover_parts = len(list(output_dir.rglob("*.part")))
+    finally:
+        await factory.client.close()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    elapsed = (datetime.now() - start_time).total_seconds()
+    return factory, saved, leftover_parts, elapsed
+
+
+def scenario(name, count, expect_saved, min_retries=0, max_retries=None, max_seconds=30.0,
+             request_timeout=1.0, max_attempts=6, streaming=False, transcripts_per_request=1,
+             max_requests=None, **server_kwargs):
+    """Run one fault scenario and report whether it behaved."""
+    print(f"\n--- {name} ---")
+    with MockAnthropicServer(**server_kwargs) as server:
+        factory, saved, leftover_parts, elapsed = asyncio.run(
+            run_generation(server, count, request_timeout=request_timeout,
+                           max_attempts=max_attempts, streaming=streaming,
+                           transcripts_per_request=transcripts_per_request)
+        )
+        injected = dict(server.faults_injected)
+        requests_served = server.requests_served
+
+    print(f"  Faults injected: {injected or 'none'}")
+    print(f"  Saved: {saved}/{count} | Retries: {factory.stats['retries']} | "
+          f"Errors: {factory.stats['errors']} | Time: {elapsed:.2f}s "
+          f"({saved / elapsed:.1f} transcripts/s) | Requests: {requests_served}")
+
+    problems = []
+    if saved != expect_saved:
+        problems.append(f"expected {expect_saved} saved, got {saved}")
+    if factory.stats["retries"] < min_retries:
+        problems.append(f"expected at least {min_retries} retries")
+    if max_retries is not None and factory.stats["retries"] > max_retries:
+        problems.append(f"expected at most {max_retries} retries")
+    if max_requests is not None and requests_served > max_requests:
+        problems.append(f"expected at most {max_requests} requests")
+    if leftover_parts:
+        problems.append(f"{leftover_parts} .part files left behind")
+    if factory.stats["errors"] != count - expect_saved:
+        problems.append(f"expected {count - expect_saved} errors")
+    if elapsed > max_seconds:
+        problems.append(f"took {elapsed:.1f}s (limit {max_seconds:.0f}s)")
+
+    if problems:
+        print(f"  ❌ FAILED: {'; '.join(problems)}")
+        return False
+    print("  ✓ OK")
+    return True
+
+
+def main():
+    print("=" * 80)
+    print("FAULT TOLERANCE TEST")
+    print("=" * 80)
+
+    results = [
+        scenario("Baseline (no faults)", 40, expect_saved=40),
+        scenario(
+            "Burst of 429s with retry-after",
+            40, expect_saved=40, min_retries=8,
+            fault_script=["rate_limit"] * 8, retry_after=0.2
+        ),
+        scenario(
+            "529 overloaded at 30%",
+            40, expect_saved=40, min_retries=1,
+            fault_rates={"overloaded": 0.3}
+        ),
+        scenario(
+            "500 server errors at 20%",
+            40, expect_saved=40, min_retries=1,
+            fault_rates={"server_error": 0.2}
+        ),
+        scenario(
+            "Slow-drip responses hit the request timeout",
+            20, expect_saved=20, min_retries=3,
+            fault_script=["slow_drip"] * 3, drip_seconds=3.0, request_timeout=0.5
+        ),
+        scenario(
+            "Connection resets",
+            30, expect_saved=30, min_retries=5,
+            fault_script=["connection_reset"] * 5
+        ),
+        scenario(
+            "Truncated bodies",
+            30, expect_saved=30, min_retries=5,
+            fault_script=["truncated"] * 5
+        ),
+        scenario(
+            "400s are not retried and don't stop the run",
+            30, expect_saved=27,
+            fault_script=["bad_request"] * 3
+        ),
+        scenario(
+            "Streaming: slow but steady streams are not cut off",
+            10, expect_saved=10, max_retries=0, streaming=True,
+            fault_script=["slow_drip"] * 3, drip_seconds=3.0, request_timeout=0.5
+        ),
+        scenario(
+            "Streaming: stalled streams hit the idle timeout",
+            10, expect_saved=10, min_retries=2, streaming=True,
+            fault_script=["slow_drip"] * 2, drip_seconds=40.0, request_timeout=0.5
+        ),
+        scenario(
+            "Streaming: streams cut off halfway are retried",
+            20, expect_saved=20, min_retries=4, streaming=True,
+            fault_script=["truncated", "connection_reset"] * 2
+        ),
+        scenario(
+            "Four transcripts per request",
+            40, expect_saved=40, max_retries=0, max_requests=10,
+            transcripts_per_request=4
+        ),
+        scenario(
+            "Four per request: responses cut off by max_tokens are topped up",
+            40, expect_saved=40, max_retries=0, max_requests=13,
+            transcripts_per_request=4, fault_script=["cut_off"] * 3
+        ),
+        scenario(
+            "Four per request, streaming, with overloads",
+            40, expect_saved=40, min_retries=2, streaming=True,
+            transcripts_per_request=4, fault_script=["overloaded", "cut_off", "overloaded"]
+        ),
+        scenario(
+            "Mixed chaos at 40% total",
+            60, expect_saved=60, min_retries=1, max_seconds=60.0, max_attempts=10,
+            fault_rates={
+                "rate_limit": 0.1,
+                "overloaded": 0.1,
+                "connection_reset": 0.1,
+                "truncated": 0.1
+            },
+            retry_after=0.1
+        ),
+    ]
+
+    passed = sum(results)
+    print("\n" + "=" * 80)
+    if passed == len(results):
+        print(f"✅ ALL {passed} SCENARIOS PASSED")
+    else:
+        print(f"❌ {len(results) - passed} of {len(results)} SCENARIOS FAILED")
+    print("=" * 80)
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Quick test script for transcript numbering in the manifest and segment store
+Mixes the bulk generators' {category}_NNNN.txt files with the single-transcript
+generator's transcript_<timestamp>.txt files in one folder, and checks that
+only the numbered ones are counted and drive the next index
+"""
+
+import shutil
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from segment_store import SegmentStore
+from transcript_manifest import MANIFEST_FILENAME, TranscriptManifest, parse_index
+
+CATEGORY = "billing_inquiry"
+
+# Names both generators write into the same category folder
+NUMBERED = ["billing_inquiry_0001.txt", "billing_inquiry_0003.txt"]
+UNNUMBERED = [
+    "transcript_20261017_235959.txt",       # TranscriptFactory.save_transcript
+    "transcript_20261017_235959_0002.txt",  # TranscriptFactory._numbered_jobs
+    "billing_inquiry_0004.txt.part",        # streamed, not finished (not a .txt)
+    "technical_support_0042.txt",           # another category's name
+]
+
+
+def check(label, got, expected):
+    ok = got == expected
+    print(f"  {'✓' if ok else '❌'} {label}: {got}" + ("" if ok else f" (expected {expected})"))
+    return ok
+
+
+def test_manifest(base_dir):
+    """Rescanned and recorded files, and a manifest written before numbering was strict."""
+    folder = base_dir / CATEGORY
+    folder.mkdir()
+    for name in NUMBERED + UNNUMBERED[:2]:
+        (folder / name).write_text("Agent: Hello\n", encoding="utf-8")
+
+    results = []
+    with TranscriptManifest.open(base_dir, categories=[CATEGORY]) as manifest:
+        results.append(check("count after rescan", manifest.count(CATEGORY), 2))
+        results.append(check("next_index after rescan", manifest.next_index(CATEGORY), 4))
+        results.append(check("every .txt still listed", len(manifest.list(CATEGORY)), 4))
+
+        (folder / "transcript_20261018_000001.txt").write_text("Agent: Hi\n", encoding="utf-8")
+        manifest.record(CATEGORY, "transcript_20261018_000001.txt")
+        results.append(check("count after recording a timestamped save", manifest.count(CATEGORY), 2))
+        results.append(check("next_index after recording a timestamped save", manifest.next_index(CATEGORY), 4))
+
+    # An older manifest stored an idx for any name ending in _<digits>
+    with sqlite3.connect(str(base_dir / MANIFEST_FILENAME)) as conn:
+        conn.execute("UPDATE transcripts SET idx = 235959 WHERE filename = 'transcript_20261017_235959.txt'")
+        conn.execute("PRAGMA user_version = 0")
+    with TranscriptManifest(base_dir) as manifest:
+        results.append(check("next_index after upgrading an old manifest", manifest.next_index(CATEGORY), 4))
+    return all(results)
+
+
+def test_segment_store(base_dir):
+    """Packed records follow the same numbering."""
+    results = []
+    with SegmentStore(base_dir) as store:
+        for name in NUMBERED + UNNUMBERED[:2]:
+            store.append(CATEGORY, name, "Agent: Hello\n", index=parse_index(CATEGORY, name))
+        results.append(check("segment store count", store.count(CATEGORY), 2))
+        results.append(check("segment store count of every record", store.count(CATEGORY, numbered=False), 4))
+        results.append(check("segment store next_index", store.next_index(CATEGORY), 4))
+        store.rebuild_index()
+        results.append(check("next_index after rebuilding the segment index", store.next_index(CATEGORY), 4))
+    return all(results)
+
+
+def main():
+    print("=" * 80)
+    print("TRANSCRIPT NUMBERING TEST")
+    print("=" * 80)
+
+    results = [
+        check(f"parse_index({name!r})", parse_index(CATEGORY, name), None) for name in UNNUMBERED
+    ] + [check("parse_index('billing_inquiry_0003.txt')", parse_index(CATEGORY, "billing_inquiry_0003.txt"), 3)]
+
+    for test in (test_manifest, test_segment_store):
+        print(f"\n{test.__doc__}")
+        base_dir = Path(tempfile.mkdtemp(prefix="manifest_test_"))
+        try:
+            results.append(test(base_dir))
+        finally:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    if not all(results):
+        print("\n❌ TEST FAILED")
+        return 1
+    print("\n✅ TEST SUCCESSFUL!")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
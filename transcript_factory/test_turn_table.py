@@ -0,0 +1,45 @@
+"""
+Quick test script for the turn table's word counts and flags
+Parses a few short transcripts and checks that actions, "[inaudible]" and
+ellipses are flagged but not counted as words
+"""
+
+from turn_table import FLAG_ACTION, FLAG_ELLIPSIS, FLAG_INAUDIBLE, parse_turns
+
+# (turn text, expected words, expected flags)
+CASES = [
+    ("Customer: é café … ok", 3, FLAG_ELLIPSIS),
+    ("Customer: [inaudible] hi", 1, FLAG_INAUDIBLE),
+    ("Customer: I can't [INAUDIBLE]", 2, FLAG_INAUDIBLE),
+    ("Agent: um... so....yes", 3, FLAG_ELLIPSIS),
+    ("Agent: (typing sounds) Okay, one moment", 3, FLAG_ACTION),
+    ("Agent: ...", 0, FLAG_ELLIPSIS),
+]
+
+
+def check(label, got, expected):
+    ok = got == expected
+    print(f"  {'✓' if ok else '❌'} {label}: {got}" + ("" if ok else f" (expected {expected})"))
+    return ok
+
+
+def main():
+    print("=" * 80)
+    print("TURN TABLE TEST")
+    print("=" * 80)
+
+    columns = parse_turns(list(range(len(CASES))), [text for text, _, _ in CASES])
+    results = [check("one turn per transcript", len(columns["call_id"]), len(CASES))]
+    for row, (text, words, flags) in enumerate(CASES):
+        results.append(check(f"words of {text!r}", int(columns["words"][row]), words))
+        results.append(check(f"flags of {text!r}", int(columns["flags"][row]), flags))
+
+    if not all(results):
+        print("\n❌ TEST FAILED")
+        return 1
+    print("\n✅ TEST SUCCESSFUL!")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,351 @@
+"""
+Transcript Compression
+======================
+Compresses transcripts one record at a time with a zstd dictionary trained
+on a sample of the corpus. Every call opens with the same greeting, the
+same "Agent:"/"Customer:" turns and the same stage directions. A small
+dictionary holds that shared text, so each record's frame only carries
+what is new in it. Records stay independent: fetching one transcript
+decompresses that one frame, never its neighbours.
+
+    codec = TranscriptCodec.train(sample_texts)
+    value = codec.encode(text)          # base64 frame, safe in a CSV cell
+    codec.decode(value) == text
+
+Compressing needs the optional zstandard package.
+
+A compressed transcripts CSV has a `transcript_zst` column in place of
+`transcript`, and its dictionary sits next to it in {csv}.zdict. Scripts
+that only pass transcripts through (add_customer_ids.py,
+add_call_timestamps.py, merge_and_visualize_outages.py) keep the column
+compressed and copy the dictionary along with their output.
+
+    python transcript_codec.py compress call_transcripts.csv call_transcripts_zst.csv
+    python transcript_codec.py decompress call_transcripts_zst.csv call_transcripts.csv
+    python transcript_codec.py get call_transcripts_zst.csv 1000 1041
+    python transcript_codec.py stats call_transcripts_zst.csv
+"""
+
+import argparse
+import base64
+import csv
+import random
+import shutil
+import sys
+import threading
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    # Only needed to compress or decompress; the path helpers work without it
+    zstandard = None
+
+TEXT_COLUMN = "transcript"
+COMPRESSED_COLUMN = "transcript_zst"
+DICTIONARY_SUFFIX = ".zdict"
+
+# zstd's own default dictionary size; larger gains little on these records
+DEFAULT_DICT_SIZE = 112 * 1024
+# Level 3 is ~50us per transcript; 9 shrinks ~15% more at ~8x the time
+DEFAULT_LEVEL = 3
+# Transcripts sampled to train the dictionary
+DEFAULT_SAMPLE_SIZE = 2000
+
+# Transcripts are far longer than csv's default 128 KB field limit allows for
+csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+
+class TranscriptCodec:
+    """
+    Per-record zstd compression against a shared dictionary.
+
+    Safe to use from several threads: each thread gets its own zstd
+    compressor and decompressor.
+    """
+
+    def __init__(self, dictionary: bytes, level: int = DEFAULT_LEVEL):
+        """
+        Args:
+            dictionary: Trained (or raw content) zstd dictionary bytes
+            level: zstd compression level
+        """
+        if zstandard is None:
+            raise ValueError("Compressed transcripts need zstandard: pip install zstandard")
+        self.dictionary = bytes(dictionary)
+        self.level = level
+        self._dict = zstandard.ZstdCompressionDict(self.dictionary)
+        self._local = threading.local()
+
+    @classmethod
+    def train(cls, samples: Iterable[str], dict_size: int = DEFAULT_DICT_SIZE,
+              level: int = DEFAULT_LEVEL) -> "TranscriptCodec":
+        """
+        Train a dictionary on sample transcripts.
+
+        zstd needs a few dozen samples to train on. With fewer, the samples
+        themselves become a raw content dictionary, which still captures
+        the shared scaffolding.
+
+        Args:
+            samples: Transcript texts representative of the corpus
+            dict_size: Dictionary size in bytes
+            level: zstd compression level
+        """
+        if zstandard is None:
+            raise ValueError("Compressed transcripts need zstandard: pip install zstandard")
+        encoded = [text.encode("utf-8") for text in samples if text]
+        if not encoded:
+            raise ValueError("Need at least one non-empty transcript to train a dictionary")
+        try:
+            dictionary = zstandard.train_dictionary(dict_size, encoded, level=level)
+            return cls(dictionary.as_bytes(), level)
+        except zstandard.ZstdError:
+            return cls(b"".join(encoded)[-dict_size:], level)
+
+    @classmethod
+    def load(cls, path, level: int = DEFAULT_LEVEL) -> "TranscriptCodec":
+        """Load a dictionary saved with save()."""
+        return cls(Path(path).read_bytes(), level)
+
+    def save(self, path):
+        """Write the dictionary to `path`."""
+        Path(path).write_bytes(self.dictionary)
+
+    @property
+    def dict_id(self) -> int:
+        """zstd dictionary ID (0 for a raw content dictionary)."""
+        return self._dict.dict_id()
+
+    def _compressor(self):
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            # No checksum: it is 4 bytes on every ~1 KB frame, and CSV damage
+            # shows up as a base64 or frame error anyway
+            compressor = zstandard.ZstdCompressor(level=self.level, dict_data=self._dict,
+                                                  write_checksum=False)
+            self._local.compressor = compressor
+        return compressor
+
+    def _decompressor(self):
+        decompressor = getattr(self._local, "decompressor", None)
+        if decompressor is None:
+            decompressor = zstandard.ZstdDecompressor(dict_data=self._dict)
+            self._local.decompressor = decompressor
+        return decompressor
+
+    def compress(self, text: str) -> bytes:
+        """Compress one transcript to a standalone zstd frame."""
+        return self._compressor().compress(text.encode("utf-8"))
+
+    def decompress(self, frame: bytes) -> str:
+        """Decompress one frame made by compress()."""
+        return str(self._decompressor().decompress(frame), "utf-8")
+
+    def encode(self, text: str) -> str:
+        """Compress one transcript to base64, for a CSV cell."""
+        return base64.b64encode(self.compress(text)).decode("ascii")
+
+    def decode(self, value: str) -> str:
+        """Decompress one base64 cell made by encode()."""
+        return self.decompress(base64.b64decode(value))
+
+    def decode_many(self, values: Iterable[str]) -> List[str]:
+        """Decompress a run of cells, e.g. the rows of a filtered DataFrame."""
+        return [self.decode(value) for value in values]
+
+
+def dictionary_path(table_path) -> Path:
+    """The dictionary file that goes with a compressed CSV."""
+    return Path(f"{table_path}{DICTIONARY_SUFFIX}")
+
+
+def is_compressed(columns) -> bool:
+    """Whether a table with these columns holds compressed transcripts."""
+    return COMPRESSED_COLUMN in columns
+
+
+def load_codec(table_path) -> TranscriptCodec:
+    """Load the dictionary for a compressed CSV."""
+    path = dictionary_path(table_path)
+    if not path.exists():
+        raise FileNotFoundError(f"{table_path} holds compressed transcripts, but its dictionary "
+                                f"{path} is missing")
+    return TranscriptCodec.load(path)
+
+
+def copy_dictionary(source_table, output_table):
+    """
+    Carry a compressed CSV's dictionary over to a table derived from it.
+
+    If the source isn't compressed, a dictionary left next to the output
+    from an earlier compressed run is removed.
+    """
+    source, output = dictionary_path(source_table), dictionary_path(output_table)
+    if source.exists():
+        if source.resolve() != output.resolve():
+            shutil.copyfile(source, output)
+    elif output.exists():
+        output.unlink()
+
+
+def iter_rows(table_path) -> Iterator[dict]:
+    """Stream a transcripts CSV as dicts, without loading it whole."""
+    with open(table_path, "r", newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def iter_calls(table_path) -> Iterator[Tuple[int, str, str]]:
+    """(call_id, call_reason, transcript) of every row of a transcripts CSV, plain or compressed."""
+    codec = None
+    for row in iter_rows(table_path):
+        if COMPRESSED_COLUMN in row:
+            codec = codec or load_codec(table_path)
+            text = codec.decode(row[COMPRESSED_COLUMN])
+        else:
+            text = row[TEXT_COLUMN]
+        yield int(row["call_id"]), row.get("call_reason", ""), text
+
+
+def sample_texts(texts: List[str], sample_size: int = DEFAULT_SAMPLE_SIZE, seed: int = 0) -> List[str]:
+    """A reproducible random sample to train on."""
+    if len(texts) <= sample_size:
+        return list(texts)
+    return random.Random(seed).sample(texts, sample_size)
+
+
+def _rewrite_table(input_path, output_path, text_in: str, text_out: str, convert):
+    """Copy a transcripts CSV, renaming and converting its text column."""
+    with open(input_path, "r", newline="", encoding="utf-8") as src, \
+         open(output_path, "w", newline="", encoding="utf-8") as dst:
+        reader = csv.DictReader(src)
+        if text_in not in (reader.fieldnames or []):
+            raise ValueError(f"{input_path} has no {text_in} column (found: {reader.fieldnames})")
+        fieldnames = [text_out if name == text_in else name for name in reader.fieldnames]
+        writer = csv.DictWriter(dst, fieldnames=fieldnames, quoting=csv.QUOTE_ALL)
+        writer.writeheader()
+        rows = 0
+        for row in reader:
+            row[text_out] = convert(row.pop(text_in))
+            writer.writerow(row)
+            rows += 1
+    return rows
+
+
+def compress_table(input_path, output_path, level: int = DEFAULT_LEVEL,
+                   dict_size: int = DEFAULT_DICT_SIZE, sample_size: int = DEFAULT_SAMPLE_SIZE) -> int:
+    """
+    Compress the transcript column of a CSV, training a dictionary on it.
+
+    Returns:
+        Number of rows written
+    """
+    # Sampling needs the whole column once; rows are then streamed
+    texts = [row[TEXT_COLUMN] for row in iter_rows(input_path)]
+    codec = TranscriptCodec.train(sample_texts(texts, sample_size), dict_size, level)
+    del texts
+    rows = _rewrite_table(input_path, output_path, TEXT_COLUMN, COMPRESSED_COLUMN, codec.encode)
+    codec.save(dictionary_path(output_path))
+    return rows
+
+
+def decompress_table(input_path, output_path) -> int:
+    """
+    Write a plain copy of a compressed CSV.
+
+    Returns:
+        Number of rows written
+    """
+    codec = load_codec(input_path)
+    return _rewrite_table(input_path, output_path, COMPRESSED_COLUMN, TEXT_COLUMN, codec.decode)
+
+
+def get_transcripts(table_path, call_ids: Iterable[int]) -> dict:
+    """
+    Fetch a few transcripts by call_id, decompressing only those rows.
+
+    Works on plain CSVs too.
+
+    Returns:
+        {call_id: transcript} for the call_ids found
+    """
+    wanted = {str(call_id) for call_id in call_ids}
+    found = {}
+    codec = None
+    for row in iter_rows(table_path):
+        if row["call_id"] not in wanted:
+            continue
+        if COMPRESSED_COLUMN in row:
+            codec = codec or load_codec(table_path)
+            found[int(row["call_id"])] = codec.decode(row[COMPRESSED_COLUMN])
+        else:
+            found[int(row["call_id"])] = row[TEXT_COLUMN]
+        if len(found) == len(wanted):
+            break
+    return found
+
+
+def table_stats(table_path) -> dict:
+    """Row count, stored and decompressed transcript bytes of a compressed CSV."""
+    codec = load_codec(table_path)
+    stats = {"rows": 0, "stored_bytes": 0, "text_bytes": 0, "dictionary_bytes": len(codec.dictionary)}
+    for row in iter_rows(table_path):
+        value = row[COMPRESSED_COLUMN]
+        stats["rows"] += 1
+        stats["stored_bytes"] += len(value)
+        stats["text_bytes"] += len(codec.decode(value).encode("utf-8"))
+    return stats
+
+
+def main():
+    """Compress, decompress or inspect a transcripts CSV."""
+    parser = argparse.ArgumentParser(description="Dictionary-compressed transcripts CSVs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    compress = sub.add_parser("compress", help="Compress the transcript column of a CSV")
+    compress.add_argument("input")
+    compress.add_argument("output")
+    compress.add_argument("--level", type=int, default=DEFAULT_LEVEL,
+                          help=f"zstd level (default: {DEFAULT_LEVEL})")
+    compress.add_argument("--dict-size", type=int, default=DEFAULT_DICT_SIZE,
+                          help=f"Dictionary size in bytes (default: {DEFAULT_DICT_SIZE})")
+
+    decompress = sub.add_parser("decompress", help="Write a plain copy of a compressed CSV")
+    decompress.add_argument("input")
+    decompress.add_argument("output")
+
+    get = sub.add_parser("get", help="Print transcripts by call_id")
+    get.add_argument("table")
+    get.add_argument("call_ids", type=int, nargs="+")
+
+    stats = sub.add_parser("stats", help="Show the compression ratio of a compressed CSV")
+    stats.add_argument("table")
+    args = parser.parse_args()
+
+    if args.command == "compress":
+        rows = compress_table(args.input, args.output, level=args.level, dict_size=args.dict_size)
+        print(f"✓ Compressed {rows} transcripts to {args.output} (dictionary: {dictionary_path(args.output)})")
+    elif args.command == "decompress":
+        rows = decompress_table(args.input, args.output)
+        print(f"✓ Decompressed {rows} transcripts to {args.output}")
+    elif args.command == "get":
+        found = get_transcripts(args.table, args.call_ids)
+        for call_id in args.call_ids:
+            if call_id not in found:
+                print(f"❌ No transcript with call_id {call_id}")
+                return 1
+            print(f"=== call_id {call_id} ===")
+            print(found[call_id])
+    else:
+        stats = table_stats(args.table)
+        ratio = stats["text_bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else 0
+        print(f"  {stats['rows']} transcripts")
+        print(f"  {stats['text_bytes'] / 1e6:.1f} MB of text stored in {stats['stored_bytes'] / 1e6:.1f} MB "
+              f"({ratio:.1f}x, base64 included)")
+        print(f"  Dictionary: {stats['dictionary_bytes'] / 1024:.0f} KB")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,279 @@
+"""
+Transcript Manifest
+===================
+Small SQLite index of the transcript files under a transcripts root
+(one row per {category}/{filename}), so counting, next-index and listing
+queries never have to glob category folders holding 100k+ files.
+
+    manifest = TranscriptManifest.open(base_dir, categories=["billing_inquiry", ...])
+    manifest.count("billing_inquiry")        # numbered transcripts, indexed COUNT(*)
+    manifest.next_index("billing_inquiry")   # MAX(idx) + 1 via the index
+    manifest.list("billing_inquiry")         # sorted filenames
+    manifest.record("billing_inquiry", "billing_inquiry_0042.txt", index=42)
+
+Every .txt in a category folder is listed, but only "{category}_0042.txt"
+names (the bulk generators' numbering) get an index and are counted.
+Anything else, such as the single-transcript generator's
+transcript_20241117_113045.txt, has a NULL index.
+
+Writers record every save. To catch files added or deleted by anything
+else, the manifest also stores each category folder's modification time
+after its own writes; on open, a folder whose mtime moved is rescanned
+once. That check is one stat() per category, not a directory listing.
+
+The database lives at {base_dir}/transcript_manifest.sqlite in WAL mode,
+so several local processes can read and write it at once. SQLite locking
+is not reliable on network filesystems; there, rebuild it after a run
+with: python transcript_manifest.py DIR --rebuild
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+MANIFEST_FILENAME = "transcript_manifest.sqlite"
+
+# PRAGMA user_version of the current schema; 1 = only {category}_NNNN.txt rows have an idx
+_SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    category TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    idx INTEGER,
+    bytes INTEGER,
+    saved_at TEXT,
+    PRIMARY KEY (category, filename)
+);
+CREATE INDEX IF NOT EXISTS transcripts_by_index ON transcripts (category, idx);
+CREATE TABLE IF NOT EXISTS folders (
+    category TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+"""
+
+
+def parse_index(category: str, filename: str) -> Optional[int]:
+    """Numeric index of a "{category}_0042.txt" name, else None."""
+    match = re.fullmatch(rf"{re.escape(category)}_(\d+)\.txt", filename)
+    return int(match.group(1)) if match else None
+
+
+class TranscriptManifest:
+    """SQLite index of transcript files, one row per category/filename."""
+
+    def __init__(self, base_dir, path=None):
+        """
+        Open (or create) the manifest database. Use TranscriptManifest.open()
+        to also bring it in sync with the folders.
+
+        Args:
+            base_dir: Transcripts root; each category is a subfolder
+            path: Database path (default: base_dir/transcript_manifest.sqlite)
+        """
+        self.base_dir = Path(base_dir)
+        self.path = Path(path) if path else self.base_dir / MANIFEST_FILENAME
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+            self._reindex()
+
+    def _reindex(self):
+        """Recompute every row's idx; older manifests numbered any name ending in _<digits>."""
+        with self._lock:
+            rows = self._conn.execute("SELECT category, filename FROM transcripts").fetchall()
+            self._conn.executemany(
+                "UPDATE transcripts SET idx = ? WHERE category = ? AND filename = ?",
+                ((parse_index(category, filename), category, filename) for category, filename in rows)
+            )
+            self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            self._conn.commit()
+
+    @classmethod
+    def open(cls, base_dir, categories: Optional[Iterable[str]] = None, path=None) -> "TranscriptManifest":
+        """
+        Open the manifest and rescan any category folder that changed
+        behind its back (or was never indexed).
+
+        Args:
+            base_dir: Transcripts root
+            categories: Category folders to track (default: every subfolder
+                of base_dir, plus categories already in the manifest)
+            path: Optional database path
+        """
+        manifest = cls(base_dir, path=path)
+        manifest.sync(categories)
+        return manifest
+
+    # -- Consistency ------------------------------------------------------
+
+    def _folder_mtime(self, category: str) -> Optional[int]:
+        try:
+            return (self.base_dir / category).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _stored_mtime(self, category: str) -> Optional[int]:
+        rows = self._query("SELECT mtime_ns FROM folders WHERE category = ?", (category,))
+        return rows[0][0] if rows else None
+
+    def categories(self) -> List[str]:
+        """Categories with at least one indexed transcript."""
+        rows = self._query("SELECT DISTINCT category FROM transcripts ORDER BY category")
+        return [row[0] for row in rows]
+
+    def sync(self, categories: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        Rescan category folders whose modification time no longer matches.
+
+        Returns:
+            Categories that were rescanned
+        """
+        if categories is None:
+            found = set(self.categories())
+            if self.base_dir.exists():
+                found.update(p.name for p in self.base_dir.iterdir() if p.is_dir())
+            categories = sorted(found)
+
+        rescanned = []
+        for category in categories:
+            mtime = self._folder_mtime(category)
+            if mtime is None and self._stored_mtime(category) is None and not self.count(category, numbered=False):
+                continue
+            if mtime != self._stored_mtime(category):
+                self.rescan(category)
+                rescanned.append(category)
+        return rescanned
+
+    def rescan(self, category: str) -> int:
+        """
+        Rebuild one category's rows from its folder.
+
+        Returns:
+            Number of transcripts found
+        """
+        folder = self.base_dir / category
+        rows = []
+        if folder.exists():
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".txt") and entry.is_file():
+                        stat = entry.stat()
+                        saved_at = datetime.fromtimestamp(stat.st_mtime).isoformat(timespec="seconds")
+                        rows.append((category, entry.name, parse_index(category, entry.name),
+                                     stat.st_size, saved_at))
+
+        with self._lock:
+            self._conn.execute("DELETE FROM transcripts WHERE category = ?", (category,))
+            self._conn.executemany("INSERT INTO transcripts VALUES (?, ?, ?, ?, ?)", rows)
+            self._store_mtime(category)
+            self._conn.commit()
+        return len(rows)
+
+    def rebuild(self, categories: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """Rescan every (or the given) category folder unconditionally."""
+        if categories is None:
+            categories = sorted(p.name for p in self.base_dir.iterdir() if p.is_dir())
+        return {category: self.rescan(category) for category in categories}
+
+    def _store_mtime(self, category: str):
+        mtime = self._folder_mtime(category)
+        if mtime is None:
+            self._conn.execute("DELETE FROM folders WHERE category = ?", (category,))
+        else:
+            self._conn.execute("INSERT OR REPLACE INTO folders VALUES (?, ?)", (category, mtime))
+
+    # -- Writes -----------------------------------------------------------
+
+    def record(self, category: str, filename: str, index: Optional[int] = None, size: Optional[int] = None):
+        """
+        Add (or refresh) one saved transcript. Call after the file is on disk.
+
+        Safe to call from writer threads.
+        """
+        if index is None:
+            index = parse_index(category, filename)
+        saved_at = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?, ?)",
+                (category, filename, index, size, saved_at)
+            )
+            self._store_mtime(category)
+            self._conn.commit()
+
+    # -- Queries ----------------------------------------------------------
+
+    def count(self, category: str, numbered: bool = True) -> int:
+        """
+        Number of transcripts in a category.
+
+        Args:
+            category: Category folder
+            numbered: Count only "{category}_NNNN.txt" files; False counts every .txt
+        """
+        if numbered:
+            sql = "SELECT COUNT(*) FROM transcripts WHERE category = ? AND idx IS NOT NULL"
+        else:
+            sql = "SELECT COUNT(*) FROM transcripts WHERE category = ?"
+        return self._query(sql, (category,))[0][0]
+
+    def next_index(self, category: str) -> int:
+        """Index after the highest numbered transcript (1 if there are none)."""
+        highest = self._query("SELECT MAX(idx) FROM transcripts WHERE category = ?", (category,))[0][0]
+        return (highest or 0) + 1
+
+    def list(self, category: str) -> List[str]:
+        """Filenames in a category, sorted by name."""
+        rows = self._query("SELECT filename FROM transcripts WHERE category = ? ORDER BY filename", (category,))
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def main():
+    """Inspect or rebuild a transcripts folder's manifest."""
+    parser = argparse.ArgumentParser(description="Inspect or rebuild the transcript manifest")
+    parser.add_argument("base_dir", nargs="?", default=str(Path(__file__).parent / "transcripts"),
+                       help="Transcripts root (default: ./transcripts)")
+    parser.add_argument("--rebuild", action="store_true",
+                       help="Rescan every category folder, even if unchanged")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        with TranscriptManifest(args.base_dir) as manifest:
+            counts = manifest.rebuild()
+        print(f"✓ Rebuilt manifest for {args.base_dir}")
+    else:
+        with TranscriptManifest.open(args.base_dir) as manifest:
+            counts = {category: manifest.count(category, numbered=False) for category in manifest.categories()}
+
+    for category, count in sorted(counts.items()):
+        print(f"  {category}: {count} transcripts")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
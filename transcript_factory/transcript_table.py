@@ -0,0 +1,195 @@
+"""
+Transcript Tables Without the Transcripts
+=========================================
+add_customer_ids, add_call_timestamps and the outage merge only look at
+call metadata (call_id, call_reason, customer_id, times), but the CSVs
+they read and write carry every call's full transcript. Parsing those
+bodies into pandas, dragging them through merges and row loops and
+serializing them again is most of what those steps cost, in time and in
+memory.
+
+These helpers keep the bodies out of the DataFrame:
+
+    calls = read_metadata("call_transcripts.csv")      # no transcript text
+    ... assign, merge, reorder ...
+    write_with_bodies(calls, "call_transcripts.csv", "out.csv")
+
+read_metadata() skips the transcript column (or transcript_zst, when
+compressed) and fills it with each row's call_id instead: a reference
+that follows the row through merges, filters and column reordering.
+write_with_bodies() writes the frame, copying each referenced body
+straight from its byte range in the (memory-mapped) source CSV as its row
+is written; the bodies are never decoded or parsed. The output is byte
+for byte what DataFrame.to_csv(index=False) writes for the frame with the
+real bodies.
+"""
+
+import csv
+import mmap
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+# Plain transcripts, and transcripts compressed by transcript_codec.py
+BODY_COLUMNS = ("transcript", "transcript_zst")
+
+
+def body_column(columns: Iterable[str]) -> Optional[str]:
+    """The transcript column among `columns`, or None if there isn't one."""
+    columns = list(columns)
+    return next((column for column in BODY_COLUMNS if column in columns), None)
+
+
+def read_header(path) -> list:
+    """Column names of a CSV."""
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def read_metadata(path, **read_csv_kwargs) -> pd.DataFrame:
+    """
+    Load a transcripts CSV without parsing its transcript bodies.
+
+    Args:
+        path: Transcripts CSV with a call_id column
+        **read_csv_kwargs: Passed on to pandas.read_csv
+
+    Returns:
+        Every column of the CSV, in file order. The transcript column holds
+        the row's call_id rather than its text, for write_with_bodies().
+    """
+    header = read_header(path)
+    column = body_column(header)
+    if column is None:
+        return pd.read_csv(path, **read_csv_kwargs)
+
+    df = pd.read_csv(path, usecols=[c for c in header if c != column], **read_csv_kwargs)
+    df.insert(header.index(column), column, df["call_id"])
+    return df
+
+
+# One CSV field, quoted or not, and a whole record. Matching records with a
+# regular expression over the mapped file finds row and field boundaries
+# without a Python-level step per line.
+_FIELD = rb'(?:"[^"]*(?:""[^"]*)*"|[^",\r\n]*)'
+_RECORD = re.compile(_FIELD + rb"(?:," + _FIELD + rb")*(?:\r?\n|\Z)")
+_QUOTED_CHARS = re.compile(rb'[",\r\n]')
+
+
+def _record_pattern(columns: int, key: int, body: int) -> "re.Pattern":
+    """A record of `columns` fields, capturing its call_id and body fields."""
+    fields = [_FIELD] * columns
+    fields[key] = rb"(?P<key>" + _FIELD + rb")"
+    fields[body] = rb"(?P<body>" + _FIELD + rb")"
+    return re.compile(rb",".join(fields) + rb"(?:\r?\n|\Z)")
+
+
+def _requoted(field: bytes) -> bytes:
+    """A raw CSV field as DataFrame.to_csv's minimal quoting writes its value."""
+    if field.startswith(b'"') and not _QUOTED_CHARS.search(field, 1, len(field) - 1):
+        return field[1:-1]
+    return field
+
+
+class BodyIndex:
+    """Where each call_id's transcript sits in a transcripts CSV, for copying bodies one at a time."""
+
+    def __init__(self, path, column: Optional[str] = None):
+        """
+        Scan a transcripts CSV once, recording the byte range of every body.
+
+        Args:
+            path: Transcripts CSV with call_id and transcript (or transcript_zst) columns
+            column: Body column to read (default: whichever the CSV has)
+        """
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError(f"{self.path} is empty")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header_end = _RECORD.match(self._map).end()
+        header = next(csv.reader([self._map[:header_end].decode("utf-8")]))
+        self.column = column or body_column(header)
+        if self.column not in header or "call_id" not in header:
+            self._map.close()
+            raise ValueError(f"{self.path} has no call_id and transcript columns (found: {header})")
+
+        record = _record_pattern(len(header), header.index("call_id"), header.index(self.column))
+        self._spans: Dict[int, Tuple[int, int]] = {}
+        for match in record.finditer(self._map, header_end):
+            if match.end() > match.start():
+                self._spans[int(match.group("key").strip(b'"'))] = match.span("body")
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def __contains__(self, call_id) -> bool:
+        return int(call_id) in self._spans
+
+    def raw(self, call_id) -> bytes:
+        """One call's body field exactly as the CSV holds it, quotes and all."""
+        start, end = self._spans[int(call_id)]
+        return self._map[start:end]
+
+    def body(self, call_id) -> str:
+        """The transcript (or encoded transcript_zst value) of one call."""
+        field = self.raw(call_id)
+        if field.startswith(b'"'):
+            field = field[1:-1].replace(b'""', b'"')
+        return field.decode("utf-8")
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _csv_lines(df: pd.DataFrame) -> list:
+    """Each row of `df` as DataFrame.to_csv formats it, encoded, without the line ending."""
+    text = df.to_csv(index=False, header=False, lineterminator="\n")
+    lines = text.split("\n")[:-1]
+    if len(lines) != len(df):
+        raise ValueError("metadata columns can't contain line breaks")
+    return [line.encode("utf-8") for line in lines]
+
+
+def write_with_bodies(df: pd.DataFrame, source, output_file) -> int:
+    """
+    Write a frame from read_metadata() to CSV, with the transcripts filled in.
+
+    Args:
+        df: Frame whose transcript column holds call_id references
+        source: The CSV the references point into (the one read_metadata() read)
+        output_file: CSV to write
+
+    Returns:
+        Number of rows written
+    """
+    column = body_column(df.columns)
+    if column is None:
+        df.to_csv(output_file, index=False)
+        return len(df)
+
+    position = list(df.columns).index(column)
+    before = _csv_lines(df.iloc[:, :position]) if position > 0 else None
+    after = _csv_lines(df.iloc[:, position + 1:]) if position + 1 < len(df.columns) else None
+    header = df.iloc[:0].to_csv(index=False, lineterminator="\n").rstrip("\n")
+    newline = os.linesep.encode()
+
+    with BodyIndex(source, column) as bodies, open(output_file, "wb") as f:
+        f.write(header.encode("utf-8") + newline)
+        for i, call_id in enumerate(df[column]):
+            row = _requoted(bodies.raw(call_id))
+            if before is not None:
+                row = before[i] + b"," + row
+            if after is not None:
+                row = row + b"," + after[i]
+            f.write(row + newline)
+    return len(df)
@@ -0,0 +1,110 @@
+"""
+Async Transcript Writer
+=======================
+Bounded producer/consumer queue that persists transcripts as soon as they
+finish generating.
+
+Generation tasks `put()` finished transcripts onto a bounded asyncio queue;
+writer tasks pull them off and hand the blocking file write to a worker
+thread, so disk I/O never stalls the event loop. Because the queue is
+bounded, memory stays proportional to the concurrency level instead of the
+total number of transcripts, and a crash only loses what is still in flight.
+"""
+
+import asyncio
+from typing import Callable, Optional
+
+_STOP = object()
+
+
+class AsyncTranscriptWriter:
+    """Persist (category, transcript, index) results through a bounded queue."""
+
+    def __init__(
+        self,
+        save_fn: Callable[[str, str, int], object],
+        max_queue_size: int = 100,
+        num_writers: int = 2,
+        on_saved: Optional[Callable[[str, int], None]] = None
+    ):
+        """
+        Args:
+            save_fn: Blocking function that writes one transcript,
+                e.g. ParallelTranscriptFactory.save_transcript
+            max_queue_size: Producers wait once this many results are pending
+            num_writers: Number of concurrent writer tasks
+            on_saved: Optional callback(category, index) run in the writer
+                thread once a transcript is safely on disk
+        """
+        self.save_fn = save_fn
+        self.on_saved = on_saved
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.num_writers = num_writers
+        self._tasks = []
+
+        self.stats = {
+            "saved": 0,
+            "errors": 0
+        }
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def start(self):
+        """Start the writer tasks."""
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._run())
+                for _ in range(self.num_writers)
+            ]
+
+    async def put(self, category: str, transcript: str, index: int):
+        """
+        Queue a finished transcript for saving (waits if the queue is full).
+
+        Args:
+            category: Call category
+            transcript: Generated transcript text
+            index: Index number for filename
+        """
+        await self.queue.put((category, transcript, index))
+
+    async def _run(self):
+        """Writer loop: save queued transcripts until told to stop."""
+        while True:
+            item = await self.queue.get()
+            try:
+                if item is _STOP:
+                    return
+                await asyncio.to_thread(self._save, *item)
+                self.stats["saved"] += 1
+            except Exception as e:
+                category, _, index = item
+                print(f"\n⚠️  Failed to save {category} #{index}: {type(e).__name__}: {e}")
+                self.stats["errors"] += 1
+            finally:
+                self.queue.task_done()
+
+    def _save(self, category: str, transcript: str, index: int):
+        """Blocking save, run in a worker thread."""
+        self.save_fn(category, transcript, index)
+        if self.on_saved is not None:
+            self.on_saved(category, index)
+
+    async def close(self, timeout: Optional[float] = None):
+        """
+        Flush everything already queued, then stop the writers.
+
+        Args:
+            timeout: Optional limit on how long to wait for the flush
+        """
+        if not self._tasks:
+            return
+        for _ in self._tasks:
+            await self.queue.put(_STOP)
+        await asyncio.wait_for(asyncio.gather(*self._tasks), timeout=timeout)
+        self._tasks = []
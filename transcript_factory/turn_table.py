@@ -0,0 +1,532 @@
+"""
+Transcript Turn Table
+=====================
+Splits every transcript into its speaker turns once, into a columnar table
+that per-speaker statistics, talk-ratio features and turn-level filters
+can read without parsing any text again:
+
+    turns = TurnTable("call_transcripts.turns")
+    turns.speaker_stats()                   # {"agent": {"turns": ..., "words": ...}, ...}
+    turns.talk_ratio()                      # per-call agent/customer words and turns
+    turns.select(speaker=SPEAKER_CUSTOMER, flags=FLAG_INAUDIBLE)   # turn numbers
+
+prompts/prompt.txt has every line start with "Agent:" or "Customer:",
+actions in parentheses, "..." for trailing off and "[inaudible]" for
+unclear speech. A turn starts at a line whose first word(s) form a
+speaker label followed by a colon, and runs until the next such line.
+Labels other than Agent and Customer ("Technical Support Agent", a
+supervisor's name) are kept as SPEAKER_OTHER; "Agent 2" and "Agent
+(Derek)" count as the agent. Text before the first turn (a "# Frontier
+Communications Call Transcript" title) isn't part of any turn.
+
+One row per turn, each column an .npy file in call_transcripts.turns/:
+- call_id (int64), turn_no (uint16, from 0 within the call)
+- speaker (uint8): SPEAKER_AGENT, SPEAKER_CUSTOMER or SPEAKER_OTHER
+- offset, length (uint32): the turn's text in the transcript string,
+  without its label and surrounding whitespace: text[offset:offset + length]
+- words (uint32): words spoken, not counting parenthesized actions,
+  "[inaudible]" or "..."/"…"
+- flags (uint8): FLAG_ACTION | FLAG_INAUDIBLE | FLAG_ELLIPSIS
+Rows are sorted by call_id, then turn_no. The columns are memory-mapped
+when loaded.
+
+Parsing works on a batch of transcripts at a time, joined into one
+string and viewed as a numpy array of code points: label lines, turn
+boundaries, word counts and "..." come from array operations over the
+whole batch, and only actions and "[inaudible]" go through a regular
+expression. Batches are parsed in parallel processes.
+
+Usage:
+    python turn_table.py build              # parse call_transcripts.csv
+    python turn_table.py stats              # per-speaker stats and talk ratio
+    python turn_table.py show 1041          # one call, turn by turn
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from transcript_codec import get_transcripts, iter_calls
+
+META_FILENAME = "turns.json"
+TURNS_SUFFIX = ".turns"
+CALLS_PER_CHUNK = 2000
+FORMAT_VERSION = 2
+
+SPEAKER_AGENT = 1
+SPEAKER_CUSTOMER = 2
+SPEAKER_OTHER = 3
+SPEAKER_NAMES = {SPEAKER_AGENT: "agent", SPEAKER_CUSTOMER: "customer", SPEAKER_OTHER: "other"}
+
+FLAG_ACTION = 1       # "(typing sounds)"
+FLAG_INAUDIBLE = 2    # "[inaudible]"
+FLAG_ELLIPSIS = 4     # "..." or "…"
+FLAG_NAMES = {FLAG_ACTION: "action", FLAG_INAUDIBLE: "inaudible", FLAG_ELLIPSIS: "ellipsis"}
+
+COLUMNS = (
+    ("call_id", np.int64),
+    ("turn_no", np.uint16),
+    ("speaker", np.uint8),
+    ("offset", np.uint32),
+    ("length", np.uint32),
+    ("words", np.uint32),
+    ("flags", np.uint8),
+)
+
+# A speaker label is at most this many characters and MAX_LABEL_SPACES + 1
+# capitalized words ("Technical Support Agent", "Agent (Derek)")
+MAX_LABEL_LENGTH = 40
+MAX_LABEL_SPACES = 3
+
+_ACTION = re.compile(r"\([^()\n]*\)")
+_INAUDIBLE = re.compile(r"\[inaudible\]", re.IGNORECASE)
+
+# Characters a speaker label can hold, by code point (everything >= 128 in slot 128)
+_LABEL_CHAR = np.zeros(129, dtype=bool)
+for _char in "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 ().'-":
+    _LABEL_CHAR[ord(_char)] = True
+_LABEL_CHAR[128] = True
+
+_AGENT = np.array([ord(c) for c in "Agent"], dtype=np.uint32)
+_CUSTOMER = np.array([ord(c) for c in "Customer"], dtype=np.uint32)
+
+
+def default_turns_dir(table_path) -> Path:
+    """The turn table of a transcripts CSV: call_transcripts.csv -> call_transcripts.turns"""
+    table_path = Path(table_path)
+    return table_path.with_name(table_path.stem + TURNS_SUFFIX)
+
+
+def flag_names(flags: int) -> List[str]:
+    """Names of the flags set in a turn's flags value."""
+    return [name for bit, name in FLAG_NAMES.items() if flags & bit]
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and end (exclusive) of every run of True in a boolean array."""
+    edges = np.flatnonzero(mask[1:] != mask[:-1]) + 1
+    if len(mask) and mask[0]:
+        edges = np.concatenate(([0], edges))
+    if len(mask) and mask[-1]:
+        edges = np.append(edges, len(mask))
+    return edges[0::2], edges[1::2]
+
+
+def _next_nonblank(positions: np.ndarray, token_start: np.ndarray, token_end: np.ndarray) -> np.ndarray:
+    """The first non-blank at or after each position (past the end if there's none)."""
+    token = np.searchsorted(token_end, positions, side="right")
+    starts = np.append(token_start, np.iinfo(np.int64).max)
+    return np.maximum(starts[token], positions)
+
+
+def _ellipsis_starts(cp: np.ndarray) -> np.ndarray:
+    """Where "..." starts (at every dot of a longer run but the last two)."""
+    dots = cp == ord(".")
+    starts = np.zeros(len(cp), dtype=bool)
+    starts[:-2] = dots[:-2] & dots[1:-1] & dots[2:]
+    return starts
+
+
+def _span_positions(spans: np.ndarray) -> np.ndarray:
+    """Every position covered by a list of (start, end) spans."""
+    sizes = spans[:, 1] - spans[:, 0]
+    offsets = np.repeat(spans[:, 0] - np.concatenate(([0], np.cumsum(sizes)[:-1])), sizes)
+    return offsets + np.arange(len(offsets))
+
+
+def _label_is(window: np.ndarray, word: np.ndarray) -> np.ndarray:
+    """Which label windows begin with `word`, followed by a space, "(" or ":"."""
+    follows = window[:, len(word)]
+    return (window[:, :len(word)] == word).all(axis=1) & (
+        (follows == ord(" ")) | (follows == ord("(")) | (follows == ord(":")))
+
+
+def _marker_turns(spans: np.ndarray, turn_start: np.ndarray, turn_end: np.ndarray) -> np.ndarray:
+    """Index of the turn each marker starts in, or -1 if it's outside every turn's text."""
+    turn = np.searchsorted(turn_start, spans, side="right") - 1
+    inside = turn >= 0
+    inside[inside] = spans[inside] < turn_end[turn[inside]]
+    return np.where(inside, turn, -1)
+
+
+def parse_turns(call_ids: List[int], texts: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Split a batch of transcripts into turns.
+
+    Args:
+        call_ids: call_id of each transcript
+        texts: The transcripts
+
+    Returns:
+        The turn columns (see COLUMNS), in call order
+    """
+    if not texts:
+        return {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS}
+
+    # Transcripts joined by newlines, so each starts a line; as code points,
+    # array positions are string offsets
+    text = "\n".join(texts)
+    cp = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    size = len(cp)
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    doc_start = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+
+    blank = (cp == ord(" ")) | ((cp >= 9) & (cp <= 13))
+    token_start, token_end = _runs(~blank)
+    newline_at = np.flatnonzero(cp == ord("\n"))
+
+    # Candidate labels: the first non-blank of every line, if a capital
+    line_end = np.append(newline_at, size)
+    first = _next_nonblank(np.concatenate(([0], newline_at + 1)), token_start, token_end)
+    first = first[first < line_end]
+    first = first[(cp[first] >= ord("A")) & ((cp[first] <= ord("Z")) | (cp[first] >= 128))]
+
+    # A label runs to the first character that can't be in one, which has to
+    # be a colon followed by whitespace. A lowercase word ("So here's the
+    # thing:") can't be in one either.
+    position = first[:, None] + np.arange(MAX_LABEL_LENGTH + 1)
+    window = cp[np.minimum(position, size - 1)]
+    breaks = ~_LABEL_CHAR[np.minimum(window, 128)] | (position >= size)
+    breaks[:, 1:] |= (window[:, :-1] == ord(" ")) & (window[:, 1:] >= ord("a")) & (window[:, 1:] <= ord("z"))
+    length = breaks.argmax(axis=1)
+    colon = first + length
+    after = np.minimum(colon + 1, size - 1)
+    is_label = (
+        breaks.any(axis=1)
+        & (window[np.arange(len(first)), length] == ord(":"))
+        & (((window == ord(" ")) & (np.arange(window.shape[1]) < length[:, None])).sum(axis=1) <= MAX_LABEL_SPACES)
+        & ((colon + 1 >= size) | blank[after])
+    )
+    label, colon, window = first[is_label], colon[is_label], window[is_label]
+
+    speaker = np.full(len(label), SPEAKER_OTHER, dtype=np.uint8)
+    speaker[_label_is(window, _AGENT)] = SPEAKER_AGENT
+    speaker[_label_is(window, _CUSTOMER)] = SPEAKER_CUSTOMER
+
+    # A turn's text runs from the first non-blank after its label to the last
+    # non-blank before the next label or the end of its transcript
+    doc = np.searchsorted(doc_start, label, side="right") - 1
+    boundary = doc_start[doc] + lengths[doc]
+    same_doc = np.zeros(len(label), dtype=bool)
+    same_doc[:-1] = doc[1:] == doc[:-1]
+    boundary[same_doc] = label[1:][same_doc[:-1]]
+    start = _next_nonblank(colon + 1, token_start, token_end)
+    end = np.minimum(token_end[np.searchsorted(token_start, boundary) - 1], boundary)
+    empty = start >= boundary
+    start[empty] = colon[empty] + 1
+    end[empty] = start[empty]
+
+    # Words are runs of non-blanks, with actions, "[inaudible]" and
+    # ellipses counted as blank
+    actions = np.array([m.span() for m in _ACTION.finditer(text)], dtype=np.int64).reshape(-1, 2)
+    inaudible = np.array([m.span() for m in _INAUDIBLE.finditer(text)], dtype=np.int64).reshape(-1, 2)
+    dots = np.flatnonzero(_ellipsis_starts(cp))
+    speech = ~blank
+    speech[_span_positions(actions)] = False
+    speech[_span_positions(inaudible)] = False
+    speech[np.concatenate((dots, dots + 1, dots + 2))] = False
+    speech[cp == ord("…")] = False
+    word_start, _ = _runs(speech)
+    words = np.searchsorted(word_start, end) - np.searchsorted(word_start, start)
+
+    flags = np.zeros(len(label), dtype=np.uint8)
+    markers = (
+        (FLAG_ACTION, actions[:, 0]),
+        (FLAG_INAUDIBLE, inaudible[:, 0]),
+        (FLAG_ELLIPSIS, np.union1d(dots, np.flatnonzero(cp == ord("…")))),
+    )
+    for bit, positions in markers:
+        turn = _marker_turns(positions, start, end)
+        flags[turn[turn >= 0]] |= bit
+
+    first_turn = np.searchsorted(doc, doc, side="left")
+    turn_no = np.arange(len(label)) - first_turn
+    if len(turn_no) and turn_no.max() > np.iinfo(np.uint16).max:
+        raise ValueError("a transcript has more turns than the turn table can number")
+
+    columns = {
+        "call_id": np.asarray(call_ids, dtype=np.int64)[doc],
+        "turn_no": turn_no,
+        "speaker": speaker,
+        "offset": start - doc_start[doc],
+        "length": end - start,
+        "words": words,
+        "flags": flags,
+    }
+    return {name: columns[name].astype(dtype, copy=False) for name, dtype in COLUMNS}
+
+
+def _chunks(table_path, calls_per_chunk: int) -> Iterator[Tuple[List[int], List[str]]]:
+    """(call_ids, transcripts) of the CSV, `calls_per_chunk` calls at a time."""
+    call_ids, texts = [], []
+    for call_id, _, text in iter_calls(table_path):
+        call_ids.append(call_id)
+        texts.append(text)
+        if len(texts) >= calls_per_chunk:
+            yield call_ids, texts
+            call_ids, texts = [], []
+    if texts:
+        yield call_ids, texts
+
+
+def _parsed_chunks(table_path, workers: int, calls_per_chunk: int) -> Iterator[Tuple[int, Dict[str, np.ndarray]]]:
+    """(calls, turn columns) of each chunk of the CSV, in order."""
+    chunks = _chunks(table_path, calls_per_chunk)
+    if workers <= 1:
+        for call_ids, texts in chunks:
+            yield len(call_ids), parse_turns(call_ids, texts)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for call_ids, texts in chunks:
+            # Keep at most two chunks per worker of text in memory at once
+            if len(pending) >= 2 * workers:
+                calls, future = pending.popleft()
+                yield calls, future.result()
+            pending.append((len(call_ids), pool.submit(parse_turns, call_ids, texts)))
+        while pending:
+            calls, future = pending.popleft()
+            yield calls, future.result()
+
+
+def save_turn_table(columns: Dict[str, np.ndarray], output_dir, meta: dict):
+    """Write the turn columns and their metadata, replacing any previous table."""
+    output_dir = Path(output_dir)
+    staging = output_dir.with_name(output_dir.name + ".tmp")
+    if staging.exists():
+        shutil.rmtree(staging)
+    staging.mkdir(parents=True)
+    for name, _ in COLUMNS:
+        np.save(staging / f"{name}.npy", columns[name])
+    with open(staging / META_FILENAME, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    staging.rename(output_dir)
+
+
+def build_turn_table(table_path, output_dir=None, workers: Optional[int] = None,
+                     calls_per_chunk: int = CALLS_PER_CHUNK) -> Dict[str, int]:
+    """
+    Parse every transcript of a CSV into the turn table.
+
+    Args:
+        table_path: Transcripts CSV, plain or compressed
+        output_dir: Table directory (default: next to the CSV, e.g. call_transcripts.turns)
+        workers: Parsing processes (default: CPU count)
+        calls_per_chunk: Transcripts parsed together as one batch
+
+    Returns:
+        Counts of calls and turns
+    """
+    output_dir = Path(output_dir) if output_dir else default_turns_dir(table_path)
+    workers = workers or os.cpu_count() or 1
+    start = time.time()
+    print(f"Parsing turns of {table_path} into {output_dir}...")
+
+    calls, parts = 0, []
+    for chunk_calls, columns in _parsed_chunks(table_path, workers, calls_per_chunk):
+        calls += chunk_calls
+        parts.append(columns)
+    columns = {name: np.concatenate([part[name] for part in parts]) if parts else np.zeros(0, dtype=dtype)
+               for name, dtype in COLUMNS}
+
+    # CSV order is usually call_id order already
+    if np.any(np.diff(columns["call_id"]) < 0):
+        order = np.argsort(columns["call_id"], kind="stable")
+        columns = {name: column[order] for name, column in columns.items()}
+
+    turns = len(columns["call_id"])
+    meta = {
+        "version": FORMAT_VERSION,
+        "source": str(table_path),
+        "calls": calls,
+        "turns": turns,
+        "speakers": {str(code): name for code, name in SPEAKER_NAMES.items()},
+        "flags": {str(bit): name for bit, name in FLAG_NAMES.items()},
+        "built_at": datetime.now().isoformat(),
+    }
+    save_turn_table(columns, output_dir, meta)
+    print(f"✓ {turns} turns from {calls} calls in {time.time() - start:.1f}s")
+    return {"calls": calls, "turns": turns}
+
+
+class TurnTable:
+    """The turn columns of a transcripts CSV, memory-mapped."""
+
+    def __init__(self, path):
+        """
+        Open a turn table written by build_turn_table().
+
+        Args:
+            path: Table directory, e.g. call_transcripts.turns
+        """
+        self.path = Path(path)
+        meta_path = self.path / META_FILENAME
+        if not meta_path.exists():
+            raise FileNotFoundError(f"No turn table at {self.path}")
+        with open(meta_path, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{self.path} has turn table version {self.meta.get('version')}, "
+                             f"expected {FORMAT_VERSION}; rebuild it")
+
+        # numpy can't map an empty array
+        mmap_mode = "r" if self.meta["turns"] else None
+        for name, _ in COLUMNS:
+            setattr(self, name, np.load(self.path / f"{name}.npy", mmap_mode=mmap_mode))
+
+    def __len__(self) -> int:
+        return len(self.call_id)
+
+    def turns_of(self, call_id: int) -> slice:
+        """Rows of one call's turns."""
+        return slice(int(np.searchsorted(self.call_id, call_id, side="left")),
+                     int(np.searchsorted(self.call_id, call_id, side="right")))
+
+    def turn_text(self, row: int, transcript: str) -> str:
+        """One turn's text, cut from its call's transcript."""
+        offset = int(self.offset[row])
+        return transcript[offset:offset + int(self.length[row])]
+
+    def select(self, speaker: Optional[int] = None, flags: int = 0,
+               call_ids: Optional[Iterable[int]] = None) -> np.ndarray:
+        """
+        Rows of the turns matching every given condition.
+
+        Args:
+            speaker: Only this speaker's turns (SPEAKER_AGENT, ...)
+            flags: Only turns with any of these flags set (FLAG_INAUDIBLE | ...)
+            call_ids: Only turns of these calls
+
+        Returns:
+            Row numbers, in table order
+        """
+        keep = np.ones(len(self), dtype=bool)
+        if speaker is not None:
+            keep &= self.speaker == speaker
+        if flags:
+            keep &= (self.flags & flags) != 0
+        if call_ids is not None:
+            keep &= np.isin(self.call_id, np.fromiter(call_ids, dtype=np.int64))
+        return np.flatnonzero(keep)
+
+    def speaker_stats(self) -> Dict[str, Dict[str, float]]:
+        """Turns, words and characters of each speaker, and how many of their turns carry each flag."""
+        size = max(SPEAKER_NAMES) + 1
+        turns = np.bincount(self.speaker, minlength=size)
+        words = np.bincount(self.speaker, weights=self.words, minlength=size)
+        chars = np.bincount(self.speaker, weights=self.length, minlength=size)
+        flagged = {name: np.bincount(self.speaker, weights=(self.flags & bit) != 0, minlength=size)
+                   for bit, name in FLAG_NAMES.items()}
+
+        stats = {}
+        for code, name in SPEAKER_NAMES.items():
+            stats[name] = {
+                "turns": int(turns[code]),
+                "words": int(words[code]),
+                "chars": int(chars[code]),
+                "words_per_turn": float(words[code] / turns[code]) if turns[code] else 0.0,
+            }
+            stats[name].update({f"{flag}_turns": int(counts[code]) for flag, counts in flagged.items()})
+        return stats
+
+    def talk_ratio(self) -> Dict[str, np.ndarray]:
+        """
+        Per-call talk features, one entry per call with any turns.
+
+        Returns:
+            call_id, agent_turns, customer_turns, agent_words, customer_words
+            and agent_share (agent words over agent plus customer words; NaN
+            for a call where neither says anything)
+        """
+        call_id = np.asarray(self.call_id)
+        new_call = np.ones(len(call_id), dtype=bool)
+        new_call[1:] = call_id[1:] != call_id[:-1]
+        call = np.cumsum(new_call) - 1
+        calls = int(new_call.sum())
+
+        features = {"call_id": call_id[new_call]}
+        for code in (SPEAKER_AGENT, SPEAKER_CUSTOMER):
+            name = SPEAKER_NAMES[code]
+            mine = self.speaker == code
+            features[f"{name}_turns"] = np.bincount(call, weights=mine, minlength=calls).astype(np.int64)
+            features[f"{name}_words"] = np.bincount(call, weights=np.where(mine, self.words, 0),
+                                                    minlength=calls).astype(np.int64)
+        spoken = features["agent_words"] + features["customer_words"]
+        features["agent_share"] = np.divide(features["agent_words"], spoken,
+                                            out=np.full(calls, np.nan), where=spoken > 0)
+        return features
+
+
+def main():
+    """Build, summarize or print the turn table."""
+    default_table = str(Path(__file__).parent / "call_transcripts.csv")
+    parser = argparse.ArgumentParser(description="Columnar speaker-turn table of the call transcripts")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Parse every transcript of a CSV into turns")
+    build.add_argument("--table", default=default_table, help="Transcripts CSV (default: ./call_transcripts.csv)")
+    build.add_argument("--turns", help="Table directory (default: next to the CSV, .turns)")
+    build.add_argument("--workers", type=int, help="Parsing processes (default: CPU count)")
+
+    stats = sub.add_parser("stats", help="Per-speaker statistics and talk ratio")
+    stats.add_argument("--table", default=default_table, help="Transcripts CSV (default: ./call_transcripts.csv)")
+    stats.add_argument("--turns", help="Table directory (default: next to the CSV, .turns)")
+
+    show = sub.add_parser("show", help="Print one call turn by turn")
+    show.add_argument("call_id", type=int, help="call_id to print")
+    show.add_argument("--table", default=default_table, help="Transcripts CSV (default: ./call_transcripts.csv)")
+    show.add_argument("--turns", help="Table directory (default: next to the CSV, .turns)")
+    args = parser.parse_args()
+
+    turns_dir = Path(args.turns) if args.turns else default_turns_dir(args.table)
+    if args.command == "build":
+        build_turn_table(args.table, turns_dir, workers=args.workers)
+        return 0
+
+    if not (turns_dir / META_FILENAME).exists():
+        print(f"❌ No turn table at {turns_dir}; run: python turn_table.py build --table {args.table}")
+        return 1
+    table = TurnTable(turns_dir)
+
+    if args.command == "stats":
+        print(f"{len(table)} turns from {table.meta['calls']} calls")
+        for name, speaker in table.speaker_stats().items():
+            flags = ", ".join(f"{speaker[f'{flag}_turns']} {flag}" for flag in FLAG_NAMES.values())
+            print(f"  {name:<9} {speaker['turns']:>9} turns {speaker['words']:>11} words "
+                  f"({speaker['words_per_turn']:.1f}/turn); turns with {flags}")
+        share = table.talk_ratio()["agent_share"]
+        share = share[~np.isnan(share)]
+        if len(share):
+            print(f"  agent share of words per call: median {np.median(share):.2f}, "
+                  f"10th-90th percentile {np.percentile(share, 10):.2f}-{np.percentile(share, 90):.2f}; "
+                  f"customer talks more in {int((share < 0.5).sum())} calls")
+        return 0
+
+    rows = table.turns_of(args.call_id)
+    transcript = get_transcripts(args.table, [args.call_id]).get(args.call_id)
+    if transcript is None or rows.start == rows.stop:
+        print(f"❌ No turns for call {args.call_id}")
+        return 1
+    for row in range(rows.start, rows.stop):
+        flags = ", ".join(flag_names(int(table.flags[row])))
+        text = " ".join(table.turn_text(row, transcript).split())
+        print(f"{table.turn_no[row]:>4} {SPEAKER_NAMES[int(table.speaker[row])]:<9} "
+              f"{table.words[row]:>4}w {f'[{flags}]' if flags else '':<28} {text[:100]}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -17,10 +17,12 @@ What this script does:
 Usage (from transcript_factory directory):
     python visualize_outages.py
 
-You will see matplotlib windows pop up with the plots.
+You will see matplotlib windows pop up with the plots. Pass
+--output-dir DIR to save them as PNGs instead (the pipeline does this).
 """
 
 import os
+from typing import List, Optional
 
 import matplotlib.pyplot as plt
 import pandas as pd
@@ -28,6 +30,10 @@ import pandas as pd
 
 INPUT_FILE = "call_transcripts_with_customers_with_times.csv"
 
+# PNG names used when saving instead of showing
+COMBINED_PLOT_FILE = "outage_call_volume.png"
+PER_EVENT_PLOT_FILE = "outage_call_volume_by_event.png"
+
 
 def load_data(input_file: str) -> pd.DataFrame:
     if not os.path.exists(input_file):
@@ -123,13 +129,19 @@ def plot_per_event_subplots(grouped: pd.DataFrame) -> None:
     fig.tight_layout(rect=[0, 0, 1, 0.96])
 
 
-def main():
+def visualize_outages(input_file: str = INPUT_FILE, output_dir: Optional[str] = None) -> List[str]:
+    """
+    Plot outage call volumes from the timestamped calls CSV.
+
+    Shows the plots interactively, or saves them as PNGs in output_dir
+    (returning their paths) when one is given.
+    """
     print("=" * 60)
     print("VISUALIZE OUTAGE CALL VOLUMES")
     print("=" * 60)
 
-    print(f"Loading data from {INPUT_FILE}...")
-    df = load_data(INPUT_FILE)
+    print(f"Loading data from {input_file}...")
+    df = load_data(input_file)
     print(f"Loaded {len(df)} calls.")
 
     print("Preparing outage time series (5-minute buckets)...")
@@ -137,13 +149,36 @@ def main():
 
     print("Creating plots...")
     plot_combined_timeseries(grouped)
+    combined = plt.gcf()
     plot_per_event_subplots(grouped)
+    per_event = plt.gcf()
 
-    print("Showing plots. Close the windows to exit.")
-    plt.show()
+    if output_dir is None:
+        print("Showing plots. Close the windows to exit.")
+        plt.show()
+        return []
 
+    os.makedirs(output_dir, exist_ok=True)
+    saved = []
+    for fig, filename in ((combined, COMBINED_PLOT_FILE), (per_event, PER_EVENT_PLOT_FILE)):
+        path = os.path.join(output_dir, filename)
+        fig.savefig(path, dpi=150)
+        plt.close(fig)
+        saved.append(path)
+        print(f"Saved {path}")
+    return saved
 
-if __name__ == "__main__":
-    main()
 
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Visualize outage call volumes")
+    parser.add_argument("--input", default=INPUT_FILE, help="Timestamped calls CSV")
+    parser.add_argument("--output-dir", help="Save PNGs here instead of showing the plots")
+    args = parser.parse_args()
+
+    visualize_outages(args.input, args.output_dir)
 
+
+if __name__ == "__main__":
+    main()